@@ -0,0 +1,290 @@
+"""
+Benchmarks of the estimation, GPU parsing and fit analysis hot paths and of CLI cold start.
+
+    python -m benchmarks.run              compare against benchmarks/baselines.json, exit 1 on regressions
+    python -m benchmarks.run --update     store the current timings as the new baselines
+
+Hub benchmarks run against a local hub-server stand-in replaying synthetic repos,
+so they need no network access or API key.
+"""
+from contextlib import ExitStack, redirect_stdout
+from unittest.mock import patch
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from src.hfest.commands import estimate_resource, estimate_size, serve
+from src.hfest.core.grid import evaluate_grid
+from src.hfest.core.hardware import GPU_CATALOG
+from src.hfest.core.memory import PRECISION_BYTES
+from src.hfest.utils import scheduler
+from src.hfest.utils.cassette import Cassette, HubStandIn, interaction_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_FILE = os.path.join(ROOT, "benchmarks", "baselines.json")
+# entries per page of the tree listing, as on the Hub
+TREE_PAGE_SIZE = 1000
+
+
+def hub_repo_cassette(path, model_id, num_siblings):
+    '''a cassette with whoami, model info, the paged tree listing and config.json of a synthetic repo'''
+    cassette = Cassette(path)
+    json_headers = {"Content-Type": "application/json"}
+    if num_siblings == 1:
+        files = ["model.safetensors"]
+    else:
+        files = [f"model-{i + 1:05d}-of-{num_siblings:05d}.safetensors" for i in range(num_siblings)]
+    cassette.record(interaction_key("GET", "/api/whoami-v2"), 200, json_headers,
+                    json.dumps({"type": "user", "name": "bench"}).encode())
+    model_info = {"usedStorage": num_siblings * 2 * 1024 ** 3, "safetensors": {"total": num_siblings * 1000 ** 3}}
+    cassette.record(interaction_key("GET", f"/api/models/{model_id}", "fields=usedStorage&fields=safetensors"),
+                    200, json_headers, json.dumps(model_info).encode())
+    entries = [{"type": "file", "path": f, "size": 2 * 1024 ** 3, "lfs": {"oid": f"{i:064x}"}} for i, f in enumerate(files)]
+    entries.append({"type": "file", "path": "config.json", "size": 100})
+    tree = f"/api/models/{model_id}/tree/main"
+    for page, start in enumerate(range(0, len(entries), TREE_PAGE_SIZE)):
+        query = "recursive=true&expand=false" + (f"&cursor={page}" if page else "")
+        headers = dict(json_headers)
+        if start + TREE_PAGE_SIZE < len(entries):
+            # links name the real Hub, hfest follows them on its configured endpoint
+            headers["Link"] = f'<https://huggingface.co{tree}?recursive=true&expand=false&cursor={page + 1}>; rel="next"'
+        cassette.record(interaction_key("GET", tree, query), 200, headers,
+                        json.dumps(entries[start:start + TREE_PAGE_SIZE]).encode())
+    config = json.dumps({"model_type": "llama", "torch_dtype": "bfloat16"}).encode()
+    config_headers = {"X-Repo-Commit": "0" * 40, "ETag": '"config"', "Content-Length": str(len(config))}
+    cassette.record(interaction_key("HEAD", f"/{model_id}/resolve/main/config.json"), 200, config_headers, b"")
+    cassette.record(interaction_key("GET", f"/{model_id}/resolve/main/config.json"), 200, config_headers, config)
+    return cassette
+
+def replayed_hub(stack, num_siblings):
+    '''point hfest at a stand-in serving a synthetic repo, returns its model ID'''
+    workdir = stack.enter_context(tempfile.TemporaryDirectory())
+    model_id = f"bench/repo-{num_siblings}"
+    server = HubStandIn(hub_repo_cassette(os.path.join(workdir, "hub.json"), model_id, num_siblings))
+    server.start()
+    stack.callback(server.stop)
+    # the benchmark measures hfest, not the configured rate limit
+    stack.enter_context(patch.object(scheduler, "_scheduler", scheduler.RequestScheduler(
+        requests_per_second=1e6, burst=1e6, backoff_base=0)))
+    stack.enter_context(patch.object(estimate_size, "read_config", return_value={"api_key": "bench"}))
+    stack.enter_context(patch.object(estimate_size, "hub_endpoint", return_value=server.url))
+    stack.enter_context(patch.object(tempfile, "tempdir", workdir))
+    return model_id
+
+def bench_estimate_model_files(num_siblings):
+    def setup(stack):
+        args = argparse.Namespace(model_id=replayed_hub(stack, num_siblings))
+
+        def run():
+            with redirect_stdout(io.StringIO()):
+                assert estimate_size.estimate_model_files(args) is not None
+        return run
+    return setup
+
+def nvidia_smi_output(num_gpus):
+    return "\n".join(f"{i}, NVIDIA H100 80GB HBM3, 81559 MiB, {i * 1024} MiB, {81559 - i * 1024} MiB"
+                     for i in range(num_gpus)) + "\n"
+
+def nvidia_mig_outputs(num_gpus):
+    '''query, MIG mode, `nvidia-smi -L` and `nvidia-smi` outputs of num_gpus H100s each split into seven 1g.10gb MIG devices'''
+    query = "\n".join(f"{i}, NVIDIA H100 80GB HBM3, 81559 MiB, 700 MiB, 80859 MiB" for i in range(num_gpus)) + "\n"
+    mig_mode = "\n".join(f"{i}, Enabled" for i in range(num_gpus)) + "\n"
+    listing, table = "", "| MIG devices:                                                                            |\n"
+    for i in range(num_gpus):
+        listing += f"GPU {i}: NVIDIA H100 80GB HBM3 (UUID: GPU-{i:08d})\n"
+        for mig in range(7):
+            listing += f"  MIG 1g.10gb      Device  {mig}: (UUID: MIG-{i:04d}{mig:04d})\n"
+            table += f"|  {i}   {mig + 7}   0   {mig}  |              13MiB /  9984MiB    | 16      0 |  1   0    1    0    1 |\n"
+            table += "|                  |                 0MiB / 16383MiB  |           |                       |\n"
+    return query, mig_mode, listing, table
+
+def bench_nvidia_mig_parser(num_gpus):
+    def setup(stack):
+        query, mig_mode, listing, table = nvidia_mig_outputs(num_gpus)
+        outputs = {('nvidia-smi', '-L'): listing, ('nvidia-smi',): table,
+                   ('nvidia-smi', '--query-gpu=index,mig.mode.current', '--format=csv,noheader'): mig_mode}
+        stack.enter_context(patch.object(estimate_resource.subprocess, "check_output",
+                                         side_effect=lambda cmd, **kw: outputs.get(tuple(cmd), query)))
+
+        def run():
+            assert len(estimate_resource.get_nvidia_gpu_info()) == num_gpus * 7
+        return run
+    return setup
+
+def rocm_smi_outputs(num_gpus):
+    meminfo = "GPU ID,Total VRAM (B),Used VRAM (B)\n" + "".join(
+        f"card{i},206141652992 B,{i * 1024 ** 3} B\n" for i in range(num_gpus))
+    names = "GPU ID,Device Name\n" + "".join(f"card{i},AMD Instinct MI300X\n" for i in range(num_gpus))
+    return meminfo, names
+
+def bench_nvidia_parser(num_gpus):
+    def setup(stack):
+        stack.enter_context(patch.object(estimate_resource.subprocess, "check_output",
+                                         return_value=nvidia_smi_output(num_gpus)))
+
+        def run():
+            assert len(estimate_resource.get_nvidia_gpu_info()) == num_gpus
+        return run
+    return setup
+
+def bench_amd_parser(num_gpus):
+    def setup(stack):
+        meminfo, names = rocm_smi_outputs(num_gpus)
+        stack.enter_context(patch.object(estimate_resource.subprocess, "check_output",
+                                         side_effect=lambda cmd, **kw: names if "--showname" in cmd else meminfo))
+
+        def run():
+            assert len(estimate_resource.get_amd_gpu_info()) == num_gpus
+        return run
+    return setup
+
+def bench_analyze_fit(num_models, num_gpus):
+    def setup(stack):
+        gpu_info = [{'index': str(i), 'name': "NVIDIA H100 80GB HBM3", 'memory.total': "81559 MiB",
+                     'memory.used': "0 MiB", 'memory.free': f"{81559 - i * 512} MiB"} for i in range(num_gpus)]
+        models = [{'safetensors': (i + 1) * 1024 ** 3, 'pytorch': 0, 'onnx': 0,
+                   'MODEL_DTYPES': ('bfloat16' if i % 2 else 'float32', [])} for i in range(num_models)]
+
+        def run():
+            with redirect_stdout(io.StringIO()):
+                for model in models:
+                    estimate_resource.analyze_fit(model, gpu_info)
+        return run
+    return setup
+
+def bench_evaluate_grid(num_models, num_contexts, num_batches):
+    def setup(stack):
+        device_sets = [(spec, count) for spec in GPU_CATALOG.values() for count in (1, 2, 4, 8) if count <= spec.gpus_per_node]
+        models = [((i + 1) * 1e9, 2 * 32 * 8 * 128 * 2) for i in range(num_models)]
+        contexts = [1024 * (i + 1) for i in range(num_contexts)]
+        batches = list(range(1, num_batches + 1))
+
+        def run():
+            evaluate_grid(models, list(PRECISION_BYTES), contexts, batches, device_sets)
+        return run
+    return setup
+
+def bench_serve_fit(stack):
+    '''one /v1/fit round trip on a kept-alive connection with the model metadata cached'''
+    model_id = replayed_hub(stack, 100)
+    stack.enter_context(patch.object(serve, "detect_gpu_info", return_value=[
+        {'index': str(i), 'name': "NVIDIA H100 80GB HBM3", 'memory.total': "81559 MiB",
+         'memory.used': "0 MiB", 'memory.free': "81559 MiB"} for i in range(8)]))
+    service = serve.EstimationService("bench", gpu_refresh=0)
+    service.start()
+    stack.callback(service.close)
+    server = serve.EstimationServer(service, port=0)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    stack.callback(server.server_close)
+    stack.callback(server.shutdown)
+    session = stack.enter_context(requests.Session())
+    query = {'model_id': model_id, 'precision': "int8", 'context': 8192}
+
+    def run():
+        assert session.post(f"{server.url}/v1/fit", json=query).json()['model']['status'] == "ok"
+    return run
+
+def bench_cli_cold_start(stack):
+    def run():
+        subprocess.run([sys.executable, "-m", "src.hfest.cli", "--version"], cwd=ROOT,
+                       check=True, stdout=subprocess.DEVNULL)
+    return run
+
+# name: (setup, calls per sample)
+BENCHMARKS = {
+    "estimate_model_files[siblings=1]": (bench_estimate_model_files(1), 5),
+    "estimate_model_files[siblings=100]": (bench_estimate_model_files(100), 5),
+    "estimate_model_files[siblings=10000]": (bench_estimate_model_files(10000), 2),
+    "get_nvidia_gpu_info[gpus=16]": (bench_nvidia_parser(16), 2000),
+    "get_nvidia_gpu_info[gpus=1024]": (bench_nvidia_parser(1024), 50),
+    "get_nvidia_gpu_info[mig=8x7]": (bench_nvidia_mig_parser(8), 500),
+    "get_amd_gpu_info[gpus=16]": (bench_amd_parser(16), 2000),
+    "get_amd_gpu_info[gpus=1024]": (bench_amd_parser(1024), 50),
+    "analyze_fit[models=200,gpus=64]": (bench_analyze_fit(200, 64), 1),
+    "evaluate_grid[cells=1M]": (bench_evaluate_grid(8, 16, 40), 5),
+    "serve_fit[cached]": (bench_serve_fit, 200),
+    "cli_cold_start": (bench_cli_cold_start, 1),
+}
+
+
+def measure(setup, number, repeat):
+    '''median seconds per call over repeat samples of number calls, after one warm-up call'''
+    with ExitStack() as stack:
+        run = setup(stack)
+        run()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            samples.append((time.perf_counter() - start) / number)
+    return statistics.median(samples)
+
+def compare_to_baseline(results, baselines, tolerance):
+    '''rows of (name, seconds, baseline seconds or None, regressed)'''
+    rows = []
+    for name, seconds in results.items():
+        baseline = baselines.get(name)
+        rows.append((name, seconds, baseline, baseline is not None and seconds > baseline * (1 + tolerance)))
+    return rows
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('benchmarks', {})
+
+def save_baselines(path, results):
+    data = {'python': platform.python_version(), 'machine': platform.machine(), 'benchmarks': results}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="hfest benchmarks")
+    parser.add_argument("--update", action="store_true", help="Store the timings as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown over the baseline (0.5 = 50%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark, the median is reported")
+    parser.add_argument("--only", type=str, default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument("--baselines", type=str, default=BASELINES_FILE, help="Baselines file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (setup, number) in BENCHMARKS.items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = measure(setup, number, args.repeat)
+
+    if args.update:
+        baselines = load_baselines(args.baselines)
+        baselines.update(results)
+        save_baselines(args.baselines, baselines)
+
+    rows = compare_to_baseline(results, load_baselines(args.baselines), args.tolerance)
+    print(f"{'Benchmark':<40}{'Median (ms)':>14}{'Baseline (ms)':>16}{'Change':>10}")
+    for name, seconds, baseline, regressed in rows:
+        if baseline is None:
+            print(f"{name:<40}{seconds * 1000:>14.3f}{'-':>16}{'-':>10}")
+            continue
+        change = f"{(seconds / baseline - 1) * 100:+.1f}%"
+        print(f"{name:<40}{seconds * 1000:>14.3f}{baseline * 1000:>16.3f}{change:>10}"
+              + ("  REGRESSION" if regressed else ""))
+
+    regressions = [row for row in rows if row[3]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than their baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
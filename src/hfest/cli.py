@@ -1,7 +1,9 @@
 import argparse
 import sys
 
-from .commands import config, estimate_size, estimate_resource
+from .commands import config, estimate_size, estimate_resource, estimate_load_time, index, sweep, hub_server, shell, serve, watch, plan_capacity, plan_cluster, sweep_grid, find_quantized
+from .utils.profiling import profiler
+from .utils import metrics
 from .version import __version__
 
 def main():
@@ -13,6 +15,14 @@ def main():
 
     parser.add_argument('--version', action='version', 
                         version=f'%(prog)s {__version__}')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print a per-phase breakdown of wall time, requests, bytes and cache hits to stderr')
+    parser.add_argument('--trace', type=str, default=None, metavar='FILE',
+                        help='Write per-phase timings as a Chrome trace JSON file')
+    parser.add_argument('--metrics', type=str, default=None, metavar='FILE',
+                        help='Write Prometheus metrics (Hub calls, latencies, caches, GPU memory) to FILE when the command ends')
+    parser.add_argument('--metrics_port', type=int, default=None, metavar='PORT',
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while the command runs')
 
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
@@ -20,6 +30,28 @@ def main():
     estimate_size.setup_parser(subparsers)
     # estimate-resource
     estimate_resource.setup_parser(subparsers)  
+    # estimate-load-time
+    estimate_load_time.setup_parser(subparsers)
+    # index
+    index.setup_parser(subparsers)
+    # sweep
+    sweep.setup_parser(subparsers)
+    # sweep-grid
+    sweep_grid.setup_parser(subparsers)
+    # hub-server
+    hub_server.setup_parser(subparsers)
+    # shell
+    shell.setup_parser(subparsers)
+    # serve
+    serve.setup_parser(subparsers)
+    # watch
+    watch.setup_parser(subparsers)
+    # plan-capacity
+    plan_capacity.setup_parser(subparsers)
+    # plan-cluster
+    plan_cluster.setup_parser(subparsers)
+    # find-quantized
+    find_quantized.setup_parser(subparsers)
     # config
     config.setup_parser(subparsers)
 
@@ -34,11 +66,68 @@ def main():
         parser.print_help(file=sys.stderr)
         sys.exit(1)
 
+    metrics_server = None
+    if args.metrics_port is not None:
+        try:
+            metrics_server = metrics.serve_metrics(port=args.metrics_port)
+        except OSError as e:
+            print(f"ERROR: Unable to serve metrics on port {args.metrics_port}: {e}", file=sys.stderr)
+            sys.exit(1)
+    try:
+        if args.profile or args.trace:
+            profiler.enable()
+            try:
+                with profiler.phase(args.command):
+                    return run_command(args)
+            finally:
+                profiler.disable()
+                report_profile(args)
+        return run_command(args)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if args.metrics:
+            metrics.registry.write(args.metrics)
+            print(f"Metrics written to {args.metrics}", file=sys.stderr)
+
+def report_profile(args):
+    if args.profile:
+        print("----------------------------------------", file=sys.stderr)
+        for line in profiler.format_breakdown():
+            print(line, file=sys.stderr)
+    if args.trace:
+        profiler.write_chrome_trace(args.trace)
+        print(f"Trace written to {args.trace}", file=sys.stderr)
+
+def run_command(args):
     # Handle commands
     if args.command == "estimate-size":
         return estimate_size.handle(args)
     elif args.command == "estimate-resource":
         return estimate_resource.handle(args)
+    elif args.command == "estimate-load-time":
+        return estimate_load_time.handle(args)
+    elif args.command == "index":
+        return index.handle(args)
+    elif args.command == "sweep":
+        return sweep.handle(args)
+    elif args.command == "sweep-grid":
+        return sweep_grid.handle(args)
+    elif args.command == "hub-server":
+        return hub_server.handle(args)
+    elif args.command == "shell":
+        return shell.handle(args)
+    elif args.command == "serve":
+        return serve.handle(args)
+    elif args.command == "watch":
+        return watch.handle(args)
+    elif args.command == "plan-capacity":
+        return plan_capacity.handle(args)
+    elif args.command == "plan-cluster":
+        return plan_cluster.handle(args)
+    elif args.command == "find-quantized":
+        return find_quantized.handle(args)
     elif args.command == "config":
         return config.handle(args)
     
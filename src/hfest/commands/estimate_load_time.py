@@ -0,0 +1,212 @@
+from .estimate_size import estimate_model_files
+from .estimate_resource import detect_os, detect_gpu, get_nvidia_pcie_info
+from ..utils.profiling import profiler
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter
+from ..core.results import LoadTimeEstimate, LoadTimePrediction, model_estimate_from_total
+from huggingface_hub import constants
+import mmap
+import os
+import re
+import tempfile
+import time
+
+# fallback host-to-device bandwidth in GB/s (PCIe Gen3 x16) when it can't be detected
+DEFAULT_PCIE_BANDWIDTH = 15.75
+# throughput in GB/s of deserializing a pickled (.bin) checkpoint on a single CPU core
+DEFAULT_UNPICKLE_BANDWIDTH = 1.5
+
+def parse_size(value):
+    '''parse a human readable size such as 4K, 1M, 256M or 1G into bytes'''
+    match = re.match(r'^\s*(\d+)\s*([KMG]?)I?B?\s*$', str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(number) * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit]
+
+def _drop_page_cache(fd):
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def benchmark_disk_read(directory, block_size=1024 ** 2, total_size=256 * 1024 ** 2, io_method="mmap"):
+    '''
+    Write a scratch file in directory and time a sequential read of it.
+    Returns the measured read bandwidth in GB/s.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    total_size = max(block_size, total_size - total_size % block_size)
+    fd, path = tempfile.mkstemp(prefix=".hfest-bench-", dir=directory)
+    try:
+        chunk = os.urandom(block_size)
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(total_size // block_size):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            _drop_page_cache(f.fileno())
+
+        if io_method == "direct":
+            read_fd = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECT', 0))
+            # O_DIRECT needs a page-aligned buffer, anonymous mmaps are
+            buffer = mmap.mmap(-1, block_size)
+            try:
+                start = time.perf_counter()
+                while os.readv(read_fd, [buffer]) > 0:
+                    pass
+                elapsed = time.perf_counter() - start
+            finally:
+                buffer.close()
+                os.close(read_fd)
+        else:
+            with open(path, 'rb') as f:
+                _drop_page_cache(f.fileno())
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    start = time.perf_counter()
+                    for offset in range(0, total_size, block_size):
+                        mapped[offset:offset + block_size]
+                    elapsed = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    return (total_size / (1024 ** 3)) / max(elapsed, 1e-9)
+
+def get_shard_sizes(estimated_total, model_type):
+    '''
+    return byte sizes of every shard, unknown shards take the average of the known ones.
+    Only the primary variant is counted when the repo holds several, one is loaded at a time
+    '''
+    files = estimated_total.get('MODEL_FILES', {}).get(model_type, [])
+    primary = [v for v in (estimated_total.get('VARIANTS') or {}).values() if v['format'] == model_type and v['primary']]
+    if primary:
+        primary_files = set(primary[0]['files'])
+        files = [(path, size) for path, size in files if path in primary_files]
+    known = [size for _, size in files if size != "Unknown"]
+    if not known:
+        return []
+    avg_size = sum(known) / len(known)
+    return [size if size != "Unknown" else avg_size for _, size in files]
+
+def predict_load_time(shard_sizes, disk_bandwidth, pcie_bandwidth, workers=1, unpickle_bandwidth=None):
+    '''
+    Predict seconds to load shards onto a GPU.
+    safetensors shards are mmapped and copied straight to the device, pickled
+    shards additionally pay a deserialization pass (unpickle_bandwidth).
+    Sequential loading pays every stage per shard, parallel loading is bound by
+    whichever shared resource (disk, PCIe link, CPU workers) saturates first.
+    '''
+    gb = [size / (1024 ** 3) for size in shard_sizes]
+    if not gb:
+        return {'sequential': 0.0, 'parallel': 0.0}
+
+    def shard_time(size):
+        t = size / disk_bandwidth + size / pcie_bandwidth
+        if unpickle_bandwidth:
+            t += size / unpickle_bandwidth
+        return t
+
+    sequential = sum(shard_time(size) for size in gb)
+
+    total = sum(gb)
+    workers = max(1, min(workers, len(gb)))
+    bounds = [total / disk_bandwidth, total / pcie_bandwidth, max(shard_time(size) for size in gb)]
+    if unpickle_bandwidth:
+        bounds.append(total / (unpickle_bandwidth * workers))
+    parallel = min(sequential, max(bounds))
+    return {'sequential': sequential, 'parallel': parallel}
+
+def detect_pcie_bandwidth():
+    gpu_set = detect_gpu(detect_os())
+    if "NVIDIA" in gpu_set:
+        with profiler.phase("probe:nvidia-pcie"):
+            pcie_info = [p for p in get_nvidia_pcie_info() if p['bandwidth'] > 0]
+        if pcie_info:
+            return min(p['bandwidth'] for p in pcie_info)
+    return None
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("estimate-load-time", help="Estimate how long it takes to load model weights onto the GPU")
+    parser.add_argument("model_id", help="Hugging Face model ID (e.g., meta-llama/Llama-2-7b)")
+    parser.add_argument("--cache_dir", type=str, default=constants.HF_HUB_CACHE, help="Directory on the volume the model would be loaded from")
+    parser.add_argument("--io_method", type=str, default="mmap", help="Read method of the disk benchmark (mmap, direct)")
+    parser.add_argument("--block_size", type=str, default="1M", help="Block size of the disk benchmark (e.g., 4K, 1M)")
+    parser.add_argument("--bench_size", type=str, default="256M", help="Amount of data read by the disk benchmark")
+    parser.add_argument("--disk_bandwidth", type=float, default=None, help="Skip the disk benchmark and use this read bandwidth (GB/s)")
+    parser.add_argument("--pcie_bandwidth", type=float, default=None, help="Host-to-device bandwidth (GB/s), detected from the GPU when omitted")
+    parser.add_argument("--workers", type=int, default=4, help="Number of shards loaded in parallel")
+    add_output_argument(parser)
+    return parser
+
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        status, result = estimate_load_time(args)
+    if result is not None:
+        writer.write(result)
+    writer.close()
+    return status
+
+def estimate_load_time(args):
+    print(f"Model: {args.model_id}")
+    print("----------------------------------------")
+    io_methods = ['mmap', 'direct']
+    if args.io_method not in io_methods:
+        print(f"Invalid io method: {args.io_method}")
+        print(f"Valid io methods: {io_methods}")
+        return 1, None
+    try:
+        block_size = parse_size(args.block_size)
+        bench_size = parse_size(args.bench_size)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1, None
+
+    estimated_total = estimate_model_files(args)
+    result = LoadTimeEstimate(model=model_estimate_from_total(args.model_id, estimated_total), workers=args.workers)
+    if estimated_total is None:
+        return 1, result
+    print("----------------------------------------")
+
+    disk_bandwidth = args.disk_bandwidth
+    if disk_bandwidth is None:
+        try:
+            with profiler.phase("disk-benchmark"):
+                disk_bandwidth = benchmark_disk_read(args.cache_dir, block_size, bench_size, args.io_method)
+        except OSError as e:
+            print(f"ERROR: Disk benchmark failed on {args.cache_dir}: {e}")
+            return 1, result
+    print(f"Disk Read Bandwidth: {disk_bandwidth:.2f} GB/s ({args.io_method}, {args.block_size} blocks)")
+
+    pcie_bandwidth = args.pcie_bandwidth or detect_pcie_bandwidth()
+    if pcie_bandwidth is None:
+        pcie_bandwidth = DEFAULT_PCIE_BANDWIDTH
+        print(f"Host-to-Device Bandwidth: {pcie_bandwidth:.2f} GB/s (not detected, assuming PCIe Gen3 x16)")
+    else:
+        print(f"Host-to-Device Bandwidth: {pcie_bandwidth:.2f} GB/s")
+    print("----------------------------------------")
+    result.disk_bandwidth_gbps = disk_bandwidth
+    result.pcie_bandwidth_gbps = pcie_bandwidth
+
+    loaders = (('safetensors', 'safetensors (mmap)', None),
+               ('pytorch', 'pytorch .bin (unpickle)', DEFAULT_UNPICKLE_BANDWIDTH),
+               ('onnx', 'onnx', None),
+               )
+    found = False
+    for model_type, label, unpickle_bandwidth in loaders:
+        shard_sizes = get_shard_sizes(estimated_total, model_type)
+        if not shard_sizes:
+            continue
+        found = True
+        prediction = predict_load_time(shard_sizes, disk_bandwidth, pcie_bandwidth,
+                                       workers=args.workers, unpickle_bandwidth=unpickle_bandwidth)
+        print(f"[{label}] {len(shard_sizes)} shard(s), {sum(shard_sizes) / (1024 ** 3):.2f} GB:")
+        print(f"  • Sequential load: {prediction['sequential']:.1f} s")
+        print(f"  • Parallel load ({args.workers} workers): {prediction['parallel']:.1f} s")
+        result.predictions.append(LoadTimePrediction(
+            format=model_type, shards=len(shard_sizes), bytes=sum(shard_sizes),
+            sequential_seconds=prediction['sequential'], parallel_seconds=prediction['parallel'],
+        ))
+
+    if not found:
+        print("No model files with known sizes, unable to estimate load time.")
+        return 1, result
+    return 0, result
@@ -1,13 +1,28 @@
-from .estimate_size import estimate_model_files
+from .estimate_size import (estimate_model_files, iter_model_args, validate_model_id, prefetch_model_config,
+                            discard_model_config_prefetch, partial_estimate, print_partial_estimate,
+                            add_revision_arguments, validate_revision_args, estimate_revisions, compare_revisions)
+from ..utils.config import read_config
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter, run_in_background
+from ..utils.profiling import profiler
+from ..utils.scheduler import get_scheduler
+from ..utils import metrics
+from ..core.results import (FitCheck, ResourceEstimate, EvictionPlan, model_estimate_from_total, gpu_device_from_info,
+                            gpu_process_from_info)
+from contextlib import nullcontext
+import os
 import subprocess
 import platform
 import re
+import requests
 
 RED = "\033[91m"
 GREEN = "\033[92m"
 YELLOW = "\033[93m"
 RESET = "\033[0m"
 
+# share of the weights kept free on top of them for activations and fragmentation
+MARGIN_OF_SAFETY = 0.2
+
 def detect_os():
     os_name = platform.system()
     print(f"Operating System: {os_name}")
@@ -117,7 +132,13 @@ def get_nvidia_gpu_info():
                 'memory.used': values[3],
                 'memory.free': values[4]
             })
-            
+
+        if get_nvidia_mig_mode():
+            # a failing MIG probe keeps the whole GPUs rather than losing all of them
+            try:
+                gpu_info = expand_mig_devices(gpu_info, get_nvidia_mig_info())
+            except Exception as e:
+                print(f"Could not list MIG devices, using whole GPUs: {str(e)}")
         return gpu_info
     
     except subprocess.CalledProcessError as e:
@@ -133,7 +154,242 @@ def get_nvidia_gpu_info():
         
     except Exception as e:
         return f"Error getting NVIDIA GPU info: {str(e)}"
-    
+
+# compute slices of a whole GPU, MIG profiles are named after the slices they take (3g.40gb)
+MIG_COMPUTE_SLICES = {'A30': 4}
+DEFAULT_MIG_COMPUTE_SLICES = 7
+
+def get_nvidia_mig_mode():
+    '''
+    indices of the GPUs in MIG mode. a query of its own, drivers that don't know
+    mig.mode.current reject every field asked with it
+    '''
+    try:
+        output = subprocess.check_output(['nvidia-smi',
+                                          '--query-gpu=index,mig.mode.current',
+                                          '--format=csv,noheader'],
+                                        universal_newlines=True)
+    except (subprocess.CalledProcessError, OSError):
+        return set()
+    enabled = set()
+    for line in output.strip().split('\n'):
+        values = [x.strip() for x in line.split(',')]
+        if len(values) > 1 and values[1] == "Enabled":
+            enabled.add(values[0])
+    return enabled
+
+def parse_nvidia_smi_mig_table(table):
+    '''
+    MIG devices table of `nvidia-smi` as {(gpu index, GI ID, CI ID): (MIG device index, used MiB, total MiB)}
+    and its Processes table as {pid: (gpu index, GI ID, CI ID)}, processes on whole GPUs are left out
+    '''
+    devices, processes = {}, {}
+    section = None
+    for line in table.split('\n'):
+        if "MIG devices:" in line:
+            section = "mig"
+            continue
+        if "Processes:" in line:
+            section = "processes"
+            continue
+        # |  0    1   0   0  |    13MiB / 19968MiB  | 42      0 |  3   0    2    0    0 |
+        match = re.match(r"\|\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+\|\s+(\d+)MiB\s+/\s+(\d+)MiB", line)
+        if section == "mig" and match:
+            devices[match.group(1, 2, 3)] = (match.group(4), match.group(5), match.group(6))
+        # |    0    2    0      4242      C   python3                                      10226MiB |
+        match = re.match(r"\|\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+[A-Z+]+\s", line)
+        if section == "processes" and match:
+            processes[int(match.group(4))] = match.group(1, 2, 3)
+    return devices, processes
+
+def get_nvidia_mig_info():
+    '''
+    MIG devices as {(gpu index, MIG device index): {profile, memory.total, memory.used}},
+    profiles from `nvidia-smi -L` and memory from the MIG devices table of `nvidia-smi`
+    '''
+    listing = subprocess.check_output(['nvidia-smi', '-L'], universal_newlines=True)
+    mig_devices = {}
+    gpu = None
+    for line in listing.split('\n'):
+        match = re.match(r"GPU (\d+):", line)
+        if match:
+            gpu = match.group(1)
+            continue
+        match = re.match(r"\s+MIG (\S+)\s+Device\s+(\d+):", line)
+        if match and gpu is not None:
+            mig_devices[(gpu, match.group(2))] = {'profile': match.group(1)}
+
+    table = subprocess.check_output(['nvidia-smi'], universal_newlines=True)
+    devices, _ = parse_nvidia_smi_mig_table(table)
+    for (gpu, _, _), (mig, used, total) in devices.items():
+        device = mig_devices.setdefault((gpu, mig), {'profile': None})
+        device['memory.used'] = f"{used} MiB"
+        device['memory.total'] = f"{total} MiB"
+    return mig_devices
+
+def get_nvidia_mig_process_devices():
+    '''
+    {pid: MIG device index ("0:1")} for processes running on MIG devices. --query-compute-apps
+    only reports the parent GPU, the Processes table gives the GPU instance they run in
+    '''
+    try:
+        table = subprocess.check_output(['nvidia-smi'], universal_newlines=True)
+        devices, processes = parse_nvidia_smi_mig_table(table)
+    except Exception:
+        return {}
+    return {pid: f"{key[0]}:{devices[key][0]}" for pid, key in processes.items() if key in devices}
+
+def expand_mig_devices(gpu_info, mig_devices):
+    '''
+    replace GPUs in MIG mode by their MIG devices, each a separate device with its own
+    memory and a share of the compute (compute_fraction). GPUs without MIG devices are kept
+    '''
+    expanded = []
+    for gpu in gpu_info:
+        slices = sorted(((int(mig), device) for (index, mig), device in mig_devices.items()
+                         if index == gpu['index'] and 'memory.total' in device), key=lambda item: item[0])
+        if not slices:
+            expanded.append(gpu)
+            continue
+        max_slices = next((n for model, n in MIG_COMPUTE_SLICES.items() if model in (gpu['name'] or "")),
+                          DEFAULT_MIG_COMPUTE_SLICES)
+        for mig, device in slices:
+            profile = device['profile']
+            match = re.match(r"(\d+)g\.", profile or "")
+            total = float(device['memory.total'].split(" ")[0])
+            used = float(device['memory.used'].split(" ")[0])
+            expanded.append({
+                'index': f"{gpu['index']}:{mig}",
+                'name': f"{gpu['name']} MIG {profile}" if profile else f"{gpu['name']} MIG",
+                'memory.total': device['memory.total'],
+                'memory.used': device['memory.used'],
+                'memory.free': f"{total - used:g} MiB",
+                'parent': gpu['index'],
+                'partition': profile,
+                'compute_fraction': int(match.group(1)) / max_slices if match else None,
+            })
+    return expanded
+
+def process_owner(pid):
+    '''user name owning a process, None when it can't be looked up (other OS, PID namespace)'''
+    try:
+        import pwd
+        return pwd.getpwuid(os.stat(f"/proc/{pid}").st_uid).pw_name
+    except (ImportError, OSError, KeyError):
+        return None
+
+def get_nvidia_process_info():
+    try:
+        uuids = subprocess.check_output(['nvidia-smi',
+                                         '--query-gpu=index,uuid',
+                                         '--format=csv,noheader'],
+                                        universal_newlines=True)
+        gpu_index = {}
+        for line in uuids.strip().split('\n'):
+            values = [x.strip() for x in line.split(',')]
+            gpu_index[values[1]] = values[0]
+        # MIG devices are the devices fit checks run against, processes are counted on them
+        mig_index = get_nvidia_mig_process_devices() if get_nvidia_mig_mode() else {}
+
+        output = subprocess.check_output(['nvidia-smi',
+                                          '--query-compute-apps=gpu_uuid,pid,process_name,used_memory',
+                                          '--format=csv,noheader'],
+                                        universal_newlines=True)
+        processes = []
+        for line in output.strip().split('\n'):
+            if not line.strip():
+                continue
+            # process names can contain commas, the memory is always last
+            values = [x.strip() for x in line.split(',')]
+            uuid, pid, used_memory = values[0], values[1], values[-1]
+            processes.append({
+                'gpu_index': mig_index.get(int(pid), gpu_index.get(uuid, uuid)),
+                'pid': int(pid),
+                'name': ",".join(values[2:-1]),
+                'user': process_owner(pid),
+                # [N/A] or empty when the driver hides usage, e.g. without permissions on Windows
+                'used_memory': used_memory if used_memory[:1].isdigit() else "0 MiB",
+            })
+        return processes
+
+    except FileNotFoundError:
+        return "nvidia-smi command not found. NVIDIA drivers may not be installed."
+
+    except Exception as e:
+        return f"Error getting NVIDIA GPU processes: {str(e)}"
+
+def apply_evictions(gpu_info, processes, pids):
+    '''copy of gpu_info with the memory of the given processes counted as free'''
+    evicted = [gpu.copy() for gpu in gpu_info]
+    for gpu in evicted:
+        freed = sum(float(p['used_memory'].split(" ")[0]) for p in processes
+                    if p['gpu_index'] == str(gpu['index']) and p['pid'] in pids)
+        total = float(gpu['memory.total'].split(" ")[0])
+        free = min(total, float(gpu['memory.free'].split(" ")[0]) + freed)
+        gpu['memory.free'] = f"{free:g} MiB"
+        gpu['memory.used'] = f"{total - free:g} MiB"
+    return evicted
+
+def eviction_plans(checks, processes, kv_cache_bytes=0, margin_of_safety=MARGIN_OF_SAFETY):
+    '''
+    for every failed check, the fewest processes to stop on that GPU (largest first)
+    for the model to fit. fits is False when stopping all of them isn't enough
+    '''
+    kv_cache = kv_cache_bytes / (1024 ** 3)
+    plans = []
+    for check in checks:
+        if check.fits:
+            continue
+        needed = (check.required_gb - kv_cache) * (1 + margin_of_safety) + kv_cache
+        candidates = sorted((p for p in processes if p['gpu_index'] == check.gpu_index),
+                            key=lambda p: float(p['used_memory'].split(" ")[0]), reverse=True)
+        pids, freed = [], 0.0
+        for process in candidates:
+            if check.free_gb + freed >= needed:
+                break
+            pids.append(process['pid'])
+            freed += float(process['used_memory'].split(" ")[0]) / 1024
+        if pids:
+            plans.append(EvictionPlan(format=check.format, precision=check.precision, gpu_index=check.gpu_index,
+                                      pids=pids, freed_gb=freed, fits=check.free_gb + freed >= needed))
+    return plans
+
+def print_gpu_processes(processes):
+    print(f"GPU processes (largest first): {len(processes)}")
+    for p in sorted(processes, key=lambda p: float(p['used_memory'].split(" ")[0]), reverse=True):
+        print(f"  • GPU {p['gpu_index']}: PID {p['pid']} {p['name']} ({p['user'] or 'unknown user'}) {p['used_memory']}")
+
+def print_eviction_plans(plans):
+    for plan in plans:
+        pids = ", ".join(str(pid) for pid in plan.pids)
+        if plan.fits:
+            print(f"  • {YELLOW}[FITS IF EVICTED]{RESET} {plan.precision} on GPU {plan.gpu_index}: stop PID {pids} to free {plan.freed_gb:.2f} GB")
+        else:
+            print(f"  • {RED}[NOT ENOUGH EVEN IF EVICTED]{RESET} {plan.precision} on GPU {plan.gpu_index}: stopping PID {pids} frees only {plan.freed_gb:.2f} GB")
+
+# effective per-lane throughput in GB/s for each PCIe generation (after encoding overhead)
+PCIE_LANE_BANDWIDTH = {1: 0.25, 2: 0.5, 3: 0.985, 4: 1.969, 5: 3.938, 6: 7.563}
+
+def get_nvidia_pcie_info():
+    try:
+        output = subprocess.check_output(['nvidia-smi',
+                                          '--query-gpu=index,pcie.link.gen.current,pcie.link.width.current',
+                                          '--format=csv,noheader'],
+                                        universal_newlines=True)
+        pcie_info = []
+        for line in output.strip().split('\n'):
+            values = [x.strip() for x in line.split(',')]
+            gen, width = int(values[1]), int(values[2])
+            pcie_info.append({
+                'index': values[0],
+                'pcie.link.gen': gen,
+                'pcie.link.width': width,
+                'bandwidth': PCIE_LANE_BANDWIDTH.get(gen, 0) * width
+            })
+        return pcie_info
+    except Exception:
+        return []
+
 def get_amd_gpu_info():
     try:
         # Run rocm-smi command to get memory info
@@ -239,16 +495,26 @@ def get_apple_gpu_info():
     except:
         return [gpu_info]
 
-def compare_single_setup(estimated_total, precision, gpu_info, margin_of_safety = 0.2):
+def compare_single_setup(estimated_total, precision, gpu_info, margin_of_safety = MARGIN_OF_SAFETY, kv_cache_bytes = 0, verbose = True):
     # how many resources would it take?
 
     size = (estimated_total / precision) / (1024 ** 3)
+    kv_cache = kv_cache_bytes / (1024 ** 3)
+    required = size + kv_cache
+    checks = []
     for gpu in gpu_info:
         gpu_free = float(gpu['memory.free'].split(" ")[0]) / 1024 
-        if size + size * margin_of_safety > gpu_free:
-            print(f"  • {RED}[NOT ENOUGH MEMORY]{RESET} on GPU {gpu['index']}: {gpu['name']}. Model size {size:.2f} GB vs Free GPU memory {gpu_free:.2f} GB")
+        fits = size + size * margin_of_safety + kv_cache <= gpu_free
+        checks.append({'gpu_index': str(gpu['index']), 'gpu_name': gpu['name'],
+                       'required_gb': required, 'free_gb': gpu_free, 'fits': fits})
+        if not verbose:
+            continue
+        model_size = f"Model size {size:.2f} GB" + (f" + KV cache {kv_cache:.2f} GB" if kv_cache_bytes else "")
+        if not fits:
+            print(f"  • {RED}[NOT ENOUGH MEMORY]{RESET} on GPU {gpu['index']}: {gpu['name']}. {model_size} vs Free GPU memory {gpu_free:.2f} GB")
         else:
-            print(f"  • {GREEN}[MEMORY CHECK PASSED]{RESET} for {gpu['index']}: {gpu['name']}. Model size {size:.2f} GB vs Free GPU memory {gpu_free:.2f} GB")
+            print(f"  • {GREEN}[MEMORY CHECK PASSED]{RESET} for {gpu['index']}: {gpu['name']}. {model_size} vs Free GPU memory {gpu_free:.2f} GB")
+    return checks
 
 def compare_distributed(estimated_total, precision, gpu_info, margin_of_safety = 0.2):
     return 0
@@ -256,123 +522,329 @@ def compare_distributed(estimated_total, precision, gpu_info, margin_of_safety =
 def make_recommendation(result):
     return 0
 
+PRECISION_LEVELS = ['float32','float16', 'bfloat16', 'int8','int4']
+PRECISION_BITS = {'float32': 32, 'float16': 16, 'bfloat16': 16, 'int8': 8, 'int4': 4}
+FILETYPE_LABELS = (('safetensors', 'Safetensors'),
+                   ('pytorch', 'PyTorch'),
+                   ('onnx', 'ONNX'),
+                   )
+
+def detect_gpu_info():
+    # detect host GPU specifications (from something like nvidia-smi)
+    with profiler.phase("detect-os"):
+        detected_os = detect_os()
+    with profiler.phase("detect-gpu"):
+        gpu_set = detect_gpu(detected_os)
+    gpu_info = []
+    probes = (("NVIDIA", get_nvidia_gpu_info),
+              ("AMD", get_amd_gpu_info),
+              ("INTEL", get_intel_gpu_info),
+              ("APPLE", get_apple_gpu_info),
+              )
+    for vendor, probe in probes:
+        if vendor not in gpu_set:
+            continue
+        with profiler.phase(f"probe:{vendor.lower()}"):
+            result = probe()
+        # probes return an error message instead of a list when the vendor tool fails
+        if isinstance(result, str):
+            print(result)
+        else:
+            gpu_info.extend(result)
+    metrics.record_gpu_info(gpu_info)
+    return gpu_info
+
+def detect_hardware(with_processes=False):
+    '''detect_gpu_info, plus the processes holding GPU memory when with_processes is set'''
+    gpu_info = detect_gpu_info()
+    processes = []
+    if with_processes and gpu_info:
+        with profiler.phase("probe:processes"):
+            result = get_nvidia_process_info()
+        if isinstance(result, str):
+            print(result)
+        else:
+            processes = result
+    return gpu_info, processes
+
+def virtual_gpu_info(index, name, memory_gb):
+    '''a hypothetical GPU with all memory free, in the format the probes return'''
+    memory_mb = memory_gb * 1024
+    return {'index': str(index), 'name': name, 'memory.total': f"{memory_mb} MiB",
+            'memory.used': "0 MiB", 'memory.free': f"{memory_mb} MiB", 'virtual': True}
+
+def print_gpu_info(gpu_info):
+    print(f"Number of Available GPUs: {len(gpu_info)}")
+    for gpu in gpu_info:
+        free = int(float(gpu['memory.free'].split(" ")[0]))
+        total = int(float(gpu['memory.total'].split(" ")[0]))
+        print(f"  • GPU {gpu['index']}: {gpu['name']} ({total - free}/{total} MB)")
+
+def fit_targets(estimated_total, precision="all", filetype="auto", verbose=True):
+    '''
+    the model file format analyze_fit checks and the precision levels it can reach,
+    as (format, label, [(precision, divisor of the stored size)]). format is None
+    when there is nothing to check
+    '''
+    detected_main_dtype = estimated_total.get('MODEL_DTYPES', (None, []))[0]
+    if detected_main_dtype not in PRECISION_BITS:
+        if verbose:
+            print("Cannot compare model size and GPU memory. Model data type is unknown.")
+        return None, None, []
+    main_bits = PRECISION_BITS[detected_main_dtype]
+
+    # only the stored precision and the ones after it can be reached by quantization,
+    # bfloat16 weights aren't checked as float16
+    precision_levels = PRECISION_LEVELS[PRECISION_LEVELS.index(detected_main_dtype):]
+    if precision != 'all':
+        precision_levels = [q for q in precision_levels if q == precision]
+
+    if len(precision_levels) == 0:
+        if verbose:
+            print("Cannot compare model size and GPU memory. Desired precision level is larger than what the model has.")
+        return None, None, []
+
+    # MODEL PRIORITY: 1. SAFETENSORS 2. PYTORCH BIN 3. ONNX
+    for model_type, label in FILETYPE_LABELS:
+        if filetype not in ('auto', model_type):
+            continue
+        if estimated_total.get(model_type, 0) <= 0:
+            continue
+        return model_type, label, [(q, main_bits / PRECISION_BITS[q]) for q in precision_levels]
+    return None, None, []
+
+def analyze_fit(estimated_total, gpu_info, precision="all", filetype="auto", kv_cache_bytes=0, verbose=True):
+    '''
+    compare the model size at each precision level with the free memory of every GPU.
+    kv_cache_bytes is added to every requirement, the margin of safety only applies to the weights.
+    verbose=False only returns the checks, for callers that don't print a report
+    '''
+    model_type, label, targets = fit_targets(estimated_total, precision, filetype, verbose)
+    checks = []
+    for q, divisor in targets:
+        if verbose:
+            print(f"[{q.upper()} - SINGLE] {label} Model File Size vs Free GPU Memory:")
+        # Single Settings, all models are fitted into GPU
+        for check in compare_single_setup(estimated_total[model_type], divisor, gpu_info,
+                                          kv_cache_bytes=kv_cache_bytes, verbose=verbose):
+            checks.append(FitCheck(format=model_type, precision=q, **check))
+        # IF SHARDED AND DISTRIBUTED
+        compare_distributed(estimated_total[model_type], divisor, gpu_info)
+    return checks
+
+def analyze_variants(estimated_total, gpu_info, filetype="auto", kv_cache_bytes=0, verbose=True):
+    '''
+    when the repo holds several loadable variants (subfolders, other file names, ONNX
+    exports), check each one at its stored size: only one of them is loaded at a time
+    '''
+    variants = {name: variant for name, variant in (estimated_total.get('VARIANTS') or {}).items()
+                if filetype in ('auto', variant['format'])}
+    checks = []
+    if len(estimated_total.get('VARIANTS') or {}) < 2 or not variants:
+        return checks
+    for name, variant in variants.items():
+        if verbose:
+            print(f"[VARIANT {name}] {variant['format']} files as stored vs Free GPU Memory:")
+        for check in compare_single_setup(variant['bytes'], 1, gpu_info, kv_cache_bytes=kv_cache_bytes, verbose=verbose):
+            checks.append(FitCheck(format=variant['format'], precision="stored", variant=name, **check))
+    return checks
+
+def print_fit_table(revisions, checks):
+    '''fit checks of every revision side by side, one row per format, precision and GPU'''
+    rows = {}
+    for column, revision_checks in enumerate(checks):
+        for check in revision_checks:
+            key = (check.format, check.precision, check.gpu_index)
+            rows.setdefault(key, [None] * len(revisions))[column] = check
+    if not rows:
+        print("No fit checks to compare.")
+        return
+    print("Fit by revision:")
+    table = [[""] + list(revisions)]
+    for (model_type, precision, gpu_index), cells in rows.items():
+        table.append([f"{precision} {model_type} on GPU {gpu_index}"] +
+                     [f"{c.required_gb:.2f} GB {'fits' if c.fits else 'NO FIT'}" if c is not None else "-" for c in cells])
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    for row in table:
+        print(("  " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths))).rstrip())
+
+def compare_revision_fits(model_args, revisions, totals, gpu_info, threshold=None):
+    '''
+    compare_revisions plus the fit checks of every revision side by side, returns the
+    RevisionComparison with a ResourceEstimate per revision
+    '''
+    comparison = compare_revisions(model_args.model_id, revisions, totals,
+                                   getattr(model_args, 'fail_if_growth', None), threshold)
+    print("----------------------------------------")
+    checks = [analyze_fit(total, gpu_info, model_args.precision, model_args.filetype, verbose=False)
+              if total is not None else [] for total in totals]
+    print_fit_table(revisions, checks)
+    gpus = [gpu_device_from_info(gpu) for gpu in gpu_info]
+    comparison.results = [ResourceEstimate(model=model, gpus=gpus, checks=revision_checks)
+                          for model, revision_checks in zip(comparison.results, checks)]
+    return comparison
+
 def setup_parser(subparsers):
     parser = subparsers.add_parser("estimate-resource", help = "Estimate model size and resource needed to run the model")
     parser.add_argument("model_id", help="Hugging Face model ID (e.g., meta-llama/Llama-2-7b)")
+    parser.add_argument("extra_model_ids", nargs="*", metavar="model_id", help="Additional model IDs to estimate in the same run")
     parser.add_argument("--filetype", type=str, default="auto", help="Specify model file type for estimation (auto, safetensors, pytorch, onnx)")
     parser.add_argument("--gpu_config", type=str, default="all", help="GPU config the model is running on (all, single, distributed)")
     parser.add_argument("--precision", type=str, default="all", help="precision level of post-training quantization (all, fp32, fp16, int8, int4)")
+    parser.add_argument("--processes", action="store_true", help="Attribute GPU memory to processes and suggest which to stop when a model doesn't fit (NVIDIA)")
+    parser.add_argument("--evict", type=int, nargs="+", default=[], metavar="PID", help="What-if: count the GPU memory of these processes as free")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS", help="Time budget of the command, past it the best estimate so far is returned with a confidence per field")
+    add_revision_arguments(parser)
+    add_output_argument(parser)
     return parser
 
-def handle(args):
-    print(f"Model: {args.model_id}")
-    print("----------------------------------------")
-    # VALIDATE ARGS
+def validate_args(args):
     # validate filetype
     filetypes = ['safetensors', 'pytorch', 'onnx']
     if args.filetype not in filetypes + ['auto']:
         print(f"Invalid file type: {args.filetype}")
         print(f"Valid file types: {filetypes}")
-        return 1           
+        return False
     # validate args.gpu_config
     gpu_configs = ['single', 'distributed']
     if args.gpu_config not in gpu_configs + ['all']:
         print(f"Invalid gpu config: {args.gpu_config}")
         print(f"Valid gpu configs: {gpu_configs}")
-        return 1       
+        return False
     # validate args.precision 
-    precision_levels = ['float32','float16', 'bfloat16', 'int8','int4']
-    if args.precision not in (precision_levels + ['all']):
+    if args.precision not in (PRECISION_LEVELS + ['all']):
         print(f"Invalid precision: {args.precision}")
-        print(f"Valid precisions: {precision_levels}")
-        return 1
+        print(f"Valid precisions: {PRECISION_LEVELS}")
+        return False
+    if getattr(args, 'deadline', None) is not None and args.deadline <= 0:
+        print("--deadline must be positive")
+        return False
+    if getattr(args, 'deadline', None) is not None and len(set(getattr(args, 'revisions', None) or [])) > 1:
+        print("--deadline applies to a single revision")
+        return False
+    return True
 
-    # estimate model size
-    estimated_total = estimate_model_files(args)
-    print("----------------------------------------")
-    # detect host GPU specifications (from something like nvidia-smi)
-    # detect nvidia GPU
-    detected_os = detect_os()
-    gpu_set = detect_gpu(detected_os)
-    gpu_info = []
-    if "NVIDIA" in gpu_set:
-        gpu_info.extend(get_nvidia_gpu_info())
-    if "AMD" in gpu_set:
-        gpu_info.extend(get_amd_gpu_info())
-    if "INTEL" in gpu_set:
-        gpu_info.extend(get_intel_gpu_info())  
-    if "APPLE" in gpu_set:
-        gpu_info.extend(get_apple_gpu_info())  
-
-    if isinstance(gpu_info, list):
-        print(f"Number of Available GPUs: {len(gpu_info)}")
-        for gpu in gpu_info:
-            free = int(gpu['memory.free'].split(" ")[0])
-            total = int(gpu['memory.total'].split(" ")[0])
-            print(f"  • GPU {gpu['index']}: {gpu['name']} ({total - free}/{total} MB)")
-            # print(f"  • Total memory: {gpu['memory.total']}")
-            # print(f"  • Used memory: {gpu['memory.used']}")
-            # print(f"  • Free memory: {gpu['memory.free']}")
+def estimate_within(model_args, deadline):
+    '''
+    estimate_model_files, stopped when the time budget runs out. Returns
+    (estimated_total, partial) where partial tells the estimate is the best one
+    found before the deadline
+    '''
+    if deadline is None:
+        return estimate_model_files(model_args), False
+    progress = {}
+    try:
+        return run_in_background(estimate_model_files, model_args, progress).join(get_scheduler().remaining()), False
+    except (TimeoutError, requests.Timeout) as e:
+        print(f"\nDeadline of {deadline:g}s reached: {e}")
+    estimated_total = partial_estimate(model_args.model_id, progress)
+    if estimated_total is None:
+        print("Nothing is known about this model yet, index it with hfest index add to get an answer from the catalog.")
     else:
-        print(gpu_info)
+        print_partial_estimate(estimated_total)
+    return estimated_total, True
 
-    # compare gpu spec with model size, is it possible to run on it?
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    api_key = read_config().get('api_key')
+    evict = getattr(args, 'evict', None) or []
+    with_processes = getattr(args, 'processes', False) or bool(evict)
+    deadline = getattr(args, 'deadline', None)
+    gpu_info = None
+    processes = []
+    status = 0
+    with human_output(output_format):
+        # every model shares the options, so they are checked before any result is written
+        if not validate_args(args):
+            return 1
+        threshold = validate_revision_args(args)
+        if threshold is False:
+            return 1
+    # every Hub request and the hardware detection share the budget
+    with get_scheduler().budget(deadline) if deadline is not None else nullcontext():
+        for model_args in iter_model_args(args):
+            with human_output(output_format):
+                print(f"Model: {model_args.model_id}")
+                print("----------------------------------------")
+                revisions = list(dict.fromkeys(getattr(model_args, 'revisions', None) or []))
+                model_args.revision = revisions[0] if len(revisions) == 1 else None
 
-    # MODEL PRIORITY
-    # 1. SAFETENSORS
-    print("----------------------------------------")
+                # hardware detection and the config.json download don't depend on the
+                # model metadata, run them while estimate_model_files waits on the Hub
+                hardware = run_in_background(detect_hardware, with_processes) if gpu_info is None else None
+                if api_key is not None and validate_model_id(model_args.model_id) and not revisions:
+                    prefetch_model_config(model_args.model_id, token=api_key)
 
-    # Work with precisions
-    precisions = [None] * len(precision_levels)
-    detected_main_dtype = estimated_total.get('MODEL_DTYPES', {})[0]
-    for i, q in enumerate(precision_levels):
-        if q == detected_main_dtype:
-            precision_levels[:i] = [''] * i
-            divisor = 1
-            for j, _ in enumerate(precisions[i:]):
-                precisions[i + j] = divisor
-                if i+1 < len(precision_levels) and precision_levels[i+1] != 'bfloat16':
-                    divisor *= 2
-            break
-
-
-    if args.precision != 'all':
-        precision_levels = [p if p == args.precision else '' for p in precision_levels]
-
-    if all(item == "" for item in precision_levels):
-        print("Cannot compare model size and GPU memory. Desired precision level is larger than what the model has.")
- 
-    if estimated_total.get('safetensors', 0) > 0:
-        for i, q in enumerate(precision_levels):
-            if q == "":
-                continue
-            print(f"[{q.upper()} - SINGLE] Safetensors Model File Size vs Free GPU Memory:")
-            # Single Settings, all models are fitted into GPU
-            compare_single_setup(estimated_total['safetensors'], precisions[i], gpu_info)
-            # IF SHARDED AND DISTRIBUTED
-            compare_distributed(estimated_total['safetensors'], precisions[i], gpu_info)
-
-    # 2. PYTORCH BIN
-    elif estimated_total.get('pytorch', 0) > 0:
-        for i, q in enumerate(precision_levels):
-            if q == "":
-                continue
-            print(f"[{q.upper()} - SINGLE] PyTorch Model File Size vs Free GPU Memory:")
-            # Single Settings, all models are fitted into GPU
-            compare_single_setup(estimated_total['pytorch'], precisions[i], gpu_info)
-            # IF SHARDED AND DISTRIBUTED
-            compare_distributed(estimated_total['pytorch'], precisions[i], gpu_info)
-    # 3. ONNX ()
-    elif estimated_total.get('onnx', 0) > 0:
-        for i, q in enumerate(precision_levels):
-            if q == "":
-                continue
-            print(f"[{q.upper()} - SINGLE] ONNX Model File Size vs Free GPU Memory:")
-            # Single Settings, all models are fitted into GPU
-            compare_single_setup(estimated_total['onnx'], precisions[i], gpu_info)
-            # IF SHARDED AND DISTRIBUTED
-            compare_distributed(estimated_total['onnx'], precisions[i], gpu_info)
-    # 4. OTHERS
+                # estimate model size, of every revision at once when comparing several
+                partial = False
+                totals = None
+                try:
+                    if len(revisions) > 1:
+                        estimated_total = None
+                        totals = estimate_revisions(model_args, revisions)
+                    else:
+                        estimated_total, partial = estimate_within(model_args, deadline)
+                finally:
+                    discard_model_config_prefetch(model_args.model_id)
+                    print("----------------------------------------")
+                    # GPUs are detected once and shared by every model of the run
+                    if hardware is not None:
+                        try:
+                            gpu_info, processes = hardware.join(get_scheduler().remaining())
+                        except TimeoutError:
+                            print("GPU detection did not finish within the deadline.")
+                            gpu_info, processes = [], []
+                        if evict:
+                            gpu_info = apply_evictions(gpu_info, processes, set(evict))
+                            unknown = set(evict) - {p['pid'] for p in processes}
+                            if unknown:
+                                print(f"No GPU memory held by PID {', '.join(str(pid) for pid in sorted(unknown))}")
+                print_gpu_info(gpu_info)
+                if with_processes:
+                    print_gpu_processes(processes)
+                if evict:
+                    print(f"What-if: memory of PID {', '.join(str(pid) for pid in evict)} counted as free")
 
-    
-    return 0   
\ No newline at end of file
+                # compare gpu spec with model size, is it possible to run on it?
+                print("----------------------------------------")
+                if totals is not None:
+                    comparison = compare_revision_fits(model_args, revisions, totals, gpu_info, threshold)
+                checks = []
+                if estimated_total is not None:
+                    checks = analyze_fit(estimated_total, gpu_info, model_args.precision, model_args.filetype)
+                    if checks and not any(check.fits for check in checks):
+                        print(f"No precision fits. To rank the AWQ, GPTQ and GGUF versions of the model that do: "
+                              f"hfest find-quantized {model_args.model_id}")
+                plans = []
+                if with_processes:
+                    # evicted processes are already counted as free
+                    plans = eviction_plans(checks, [p for p in processes if p['pid'] not in evict])
+                    print_eviction_plans(plans)
+                if estimated_total is not None:
+                    checks += analyze_variants(estimated_total, gpu_info, model_args.filetype)
+
+            if totals is not None:
+                for result in comparison.results:
+                    result.processes = [gpu_process_from_info(p) for p in processes]
+                    result.evicted_pids = list(evict)
+                writer.write(comparison)
+                if comparison.status != "ok":
+                    status = 1
+                continue
+            model = model_estimate_from_total(model_args.model_id, estimated_total)
+            model.revision = model_args.revision
+            if partial and estimated_total is not None:
+                model.status = "partial"
+            writer.write(ResourceEstimate(
+                model=model,
+                gpus=[gpu_device_from_info(gpu) for gpu in gpu_info],
+                checks=checks,
+                processes=[gpu_process_from_info(p) for p in processes],
+                evicted_pids=list(evict),
+                evictions=plans,
+            ))
+            if estimated_total is None:
+                status = 1
+    writer.close()
+    return status
@@ -1,28 +1,385 @@
-from ..utils.config import read_config
-from huggingface_hub import hf_hub_download, scan_cache_dir, HfApi, login
+from ..utils.config import read_config, hub_endpoint, HEADER_CACHE_DIR, INDEX_FILE
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter, run_in_background
+from ..core.results import (model_estimate_from_total, estimate_confidence, TensorChange, RevisionDiff,
+                            RevisionComparison)
+from ..core.params import count_parameters, bytes_by_precision
+from ..core.memory import PRECISION_BYTES
+from ..core.catalog import Catalog
+from ..core.headers import (parse_safetensors_header, parse_gguf_header, tensor_param_counts, merged_tensors, diff_tensors,
+                            IncompleteHeader)
+from ..utils.blob_cache import BlobCache
+from ..utils.scheduler import get_scheduler
+from ..utils.profiling import profiler
+from ..utils import metrics
+from huggingface_hub import hf_hub_download, scan_cache_dir, HfApi
 from huggingface_hub.utils import disable_progress_bars
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
 import requests
 import re
+import sqlite3
 import sys
 import tempfile
+import threading
 import os
+from urllib.parse import quote, urlsplit, parse_qsl
 
+MODEL_EXTENSIONS = (('safetensors',['safetensors']), 
+                    ('pytorch', ['bin', 'pt', 'pth']),
+                    ('onnx', ['onnx']),
+                    )
+
+# first read of a safetensors header, most headers fit in it
+SAFETENSORS_PROBE_BYTES = 128 * 1024
+# the safetensors format caps headers at 100 MB
+SAFETENSORS_MAX_HEADER_BYTES = 100 * 1000 * 1000
+# GGUF headers hold the tokenizer, a few MB for large vocabularies
+GGUF_PROBE_BYTES = 1024 * 1024
+GGUF_MAX_HEADER_BYTES = 64 * 1024 * 1024
+# paths per paths-info query
+PATHS_INFO_BATCH = 100
+# external weights of ONNX models larger than 2 GB, loaded with the .onnx file of the same name
+ONNX_DATA_SUFFIXES = ('.onnx_data', '.onnx.data')
+# shards of one checkpoint, model-00001-of-00004.safetensors
+SHARD_PATTERN = re.compile(r'-\d+-of-\d+$')
+NEXT_LINK_PATTERN = re.compile(r'<([^>]+)>;\s*rel="next"')
+# a full commit hash, the files of such a revision never change
+COMMIT_SHA_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+# --fail_if_growth thresholds: 5%, 512MB, 2GB or a bare number of bytes
+GROWTH_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\s*(%|[KMGT]B)?$', re.IGNORECASE)
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+# tensors listed per kind of change, the rest are counted
+DIFF_PRINT_LIMIT = 10
+# models per page of the Hub model listing
+MODELS_PAGE_SIZE = 1000
 
 def setup_parser(subparsers):
     parser = subparsers.add_parser("estimate-size", help="Estimate model size")
     parser.add_argument("model_id", help="Hugging Face model ID (e.g., meta-llama/Llama-2-7b)")
+    parser.add_argument("extra_model_ids", nargs="*", metavar="model_id", help="Additional model IDs to estimate in the same run")
+    add_revision_arguments(parser)
+    add_output_argument(parser)
     return parser
 
+def add_revision_arguments(parser):
+    parser.add_argument("--revision", dest="revisions", nargs="+", default=None, metavar="REVISION",
+                        help="Branches, tags or commit SHAs to estimate, several are compared side by side with the first one (default: main)")
+    parser.add_argument("--fail_if_growth", type=str, default=None, metavar="THRESHOLD",
+                        help="With several revisions, exit with 1 when the weights of one grow over the first by more than THRESHOLD (5%%, 512MB, 2GB)")
+
 
 def validate_model_id(model_id):
     pattern = r'^[a-zA-Z0-9_.-]+/[a-zA-Z0-9_.-]+$'
     return bool(re.match(pattern, model_id))
 
-def estimate_model_files(args):
+def iter_model_args(args):
+    '''yield one args namespace per requested model, args itself for single model runs'''
+    extra_model_ids = getattr(args, 'extra_model_ids', None) or []
+    yield args
+    for model_id in extra_model_ids:
+        model_args = argparse.Namespace(**vars(args))
+        model_args.model_id = model_id
+        model_args.extra_model_ids = []
+        yield model_args
+
+def request_model_info(model_id, api_key, fields=('usedStorage', 'safetensors', 'siblings'), revision=None):
+    '''query the Hub model info endpoint, of a revision when given, returns the raw response'''
+    path = f"/api/models/{model_id}" + (f"/revision/{quote(revision, safe='')}" if revision else "")
+    return get_scheduler().request(
+        "model-info", "GET",
+        f"{hub_endpoint()}{path}",
+        params={'fields': list(fields)},
+        headers={"Authorization":f"Bearer {api_key}"}
+        )
+
+def _fetch_model_config(model_id, token=None, revision=None):
+    # one directory per repo (and revision) so concurrent downloads don't overwrite each other
+    local_dir = os.path.join(tempfile.gettempdir(), "hfest", model_id.replace("/", "--"))
+    if revision:
+        local_dir = os.path.join(local_dir, quote(revision, safe=''))
+    config_file = os.path.join(local_dir, "config.json")
+    # a branch may have moved, hf_hub_download asks the Hub for the ETag of the cached copy.
+    # Only the config of a commit is read without a request
+    cached = bool(revision) and COMMIT_SHA_PATTERN.match(revision) is not None and os.path.exists(config_file)
+    profiler.record_cache(cached)
+    metrics.cache_requests.inc(cache="config_file", result="hit" if cached else "miss")
+    if not cached:
+        config_file = get_scheduler().call(
+            "config", hf_hub_download,
+            repo_id=model_id,
+            filename="config.json",
+            token=token,
+            revision=revision,
+            local_dir=local_dir,
+            endpoint=hub_endpoint(),
+        )
+    with open(config_file, 'r') as f:
+        return json.load(f)
+
+# tokens whoami already accepted, a long running process checks each one once
+_verified_tokens = set()
+
+_config_prefetches = {}
+_config_prefetch_lock = threading.Lock()
+_config_prefetch_executor = None
+
+def prefetch_model_config(model_id, token=None):
+    '''start downloading config.json in the background, download_model_config picks up the result'''
+    global _config_prefetch_executor
+    with _config_prefetch_lock:
+        if model_id in _config_prefetches:
+            return
+        if _config_prefetch_executor is None:
+            _config_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hfest-config")
+        _config_prefetches[model_id] = _config_prefetch_executor.submit(_fetch_model_config, model_id, token)
+
+def discard_model_config_prefetch(model_id):
+    with _config_prefetch_lock:
+        future = _config_prefetches.pop(model_id, None)
+    if future is not None:
+        future.cancel()
+
+def download_model_config(model_id, token=None, revision=None):
+    '''download and parse config.json of a model, prefetches are of the default branch'''
+    if revision:
+        return _fetch_model_config(model_id, token, revision)
+    with _config_prefetch_lock:
+        future = _config_prefetches.pop(model_id, None)
+    if future is not None:
+        try:
+            return future.result()
+        except Exception:
+            # the prefetch may have run before login, retry in the foreground
+            pass
+    return _fetch_model_config(model_id, token)
+
+def config_downloader(model_id, revision=None):
+    '''download_model_config of a model with the configured token, for core.memory.model_config'''
+    return lambda: download_model_config(model_id, token=read_config().get('api_key'), revision=revision)
+
+_header_cache = None
+
+def header_cache():
+    global _header_cache
+    if _header_cache is None:
+        _header_cache = BlobCache(HEADER_CACHE_DIR)
+    return _header_cache
+
+def read_file_range(model_id, filename, start, end, token=None, revision="main"):
+    '''bytes start to end (inclusive) of a repo file, fewer when the file is shorter'''
+    response = get_scheduler().request(
+        "range-read", "GET",
+        f"{hub_endpoint()}/{model_id}/resolve/{quote(revision, safe='')}/{quote(filename)}",
+        headers={"Authorization": f"Bearer {token}", "Range": f"bytes={start}-{end}"},
+        )
+    response.raise_for_status()
+    if response.status_code == 200:
+        # the server ignored the range and sent the whole file
+        return response.content[start:end + 1]
+    return response.content
+
+def fetch_tensor_header(model_id, filename, token=None, revision="main"):
+    '''parse the tensor header of a safetensors or GGUF file with range reads'''
+    if filename.endswith('.gguf'):
+        data = read_file_range(model_id, filename, 0, GGUF_PROBE_BYTES - 1, token, revision)
+        while True:
+            try:
+                return parse_gguf_header(data)
+            except IncompleteHeader:
+                if len(data) >= GGUF_MAX_HEADER_BYTES or len(data) % GGUF_PROBE_BYTES:
+                    raise ValueError(f"GGUF header of {filename} is truncated or larger than {GGUF_MAX_HEADER_BYTES} bytes")
+                data += read_file_range(model_id, filename, len(data), 2 * len(data) - 1, token, revision)
+
+    data = read_file_range(model_id, filename, 0, SAFETENSORS_PROBE_BYTES - 1, token, revision)
+    try:
+        return parse_safetensors_header(data)
+    except IncompleteHeader as e:
+        if e.needed > SAFETENSORS_MAX_HEADER_BYTES or len(data) < SAFETENSORS_PROBE_BYTES:
+            raise ValueError(f"safetensors header of {filename} is truncated or larger than {SAFETENSORS_MAX_HEADER_BYTES} bytes")
+        data += read_file_range(model_id, filename, len(data), e.needed - 1, token, revision)
+        return parse_safetensors_header(data)
+
+def read_tensor_header(model_id, filename, oid=None, token=None, revision="main", size=None):
+    '''
+    parsed tensor header of a repo file, with the file size when given. Headers are
+    cached by the LFS sha256 of the file, so a file shared by forks, revisions or
+    quantized repos is read once
+    '''
+    def fetch():
+        return {**fetch_tensor_header(model_id, filename, token, revision), 'size': size}
+    if not BlobCache.valid(oid):
+        return fetch()
+    return header_cache().get_or_fetch(oid, fetch)
+
+def read_model_headers(api, model_id, filenames, token=None, revision="main", file_infos=None):
+    '''
+    {filename: (size, header)} of model files: batched paths-info queries for the sizes
+    and oids of files missing from file_infos ({filename: (size, oid)}, e.g. from the
+    tree listing), then the headers that aren't cached yet, read concurrently
+    '''
+    file_infos = file_infos or {}
+    known = [(path, *file_infos[path]) for path in filenames if path in file_infos]
+    missing = [path for path in filenames if path not in file_infos]
+    for start in range(0, len(missing), PATHS_INFO_BATCH):
+        for info in get_scheduler().call("paths-info", api.get_paths_info, repo_id=model_id,
+                                         paths=missing[start:start + PATHS_INFO_BATCH], revision=revision):
+            known.append((info.path, info.size, info.lfs.sha256 if info.lfs is not None else None))
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="hfest-headers") as executor:
+        futures = {}
+        for path, size, oid in known:
+            futures[path] = (size, executor.submit(read_tensor_header, model_id, path, oid, token, revision, size))
+        return {path: (size, future.result()) for path, (size, future) in futures.items()}
+
+def next_page(response):
+    '''
+    (url, params) of the page after response from its Link header, (None, None) on the
+    last page. The link names the Hub that answered, it's moved onto hub_endpoint() so
+    every page goes through the configured endpoint
+    '''
+    match = NEXT_LINK_PATTERN.search((response.headers or {}).get('Link', ''))
+    if match is None:
+        return None, None
+    next_url = urlsplit(match.group(1))
+    return f"{hub_endpoint()}{next_url.path}", dict(parse_qsl(next_url.query))
+
+def iter_repo_tree(model_id, token=None, revision="main"):
+    '''
+    yield (path, size, oid) of every file of a repo, one page of the tree API at a time,
+    so repos with many thousands of files are never held in memory at once. oid is the
+    LFS sha256, None for files stored in git. Raises RuntimeError when a page fails
+    '''
+    url = f"{hub_endpoint()}/api/models/{model_id}/tree/{quote(revision, safe='')}"
+    params = {'recursive': 'true', 'expand': 'false'}
+    while url is not None:
+        response = get_scheduler().request("tree", "GET", url, params=params,
+                                           headers={"Authorization": f"Bearer {token}"})
+        if response.status_code != 200:
+            raise RuntimeError(f"Listing the files of {model_id} failed with status code: {response.status_code}")
+        for entry in json.loads(response.content):
+            if entry.get('type') == 'file':
+                yield entry['path'], entry.get('size'), (entry.get('lfs') or {}).get('oid')
+        url, params = next_page(response)
+
+def iter_hub_model_entries(api_key, author=None, filter=None, search=None, limit=None):
+    '''
+    Page through /api/models following the Link headers, one page in memory at a time.
+    Yields the listing entries (id, tags, downloads...). Raises RuntimeError when a page
+    can't be fetched.
+    '''
+    params = {'author': author, 'filter': filter, 'search': search, 'limit': MODELS_PAGE_SIZE}
+    url = f"{hub_endpoint()}/api/models"
+    headers = {"Authorization": f"Bearer {api_key}"}
+    count = 0
+    while url:
+        response = get_scheduler().request("list-models", "GET", url, params=params, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"Listing models failed with status code: {response.status_code}")
+        for model in json.loads(response.content):
+            yield model
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        url, params = next_page(response)
+
+def iter_hub_models(api_key, author=None, filter=None, search=None, limit=None):
+    '''model IDs of iter_hub_model_entries'''
+    for model in iter_hub_model_entries(api_key, author, filter, search, limit):
+        yield model.get('id') or model.get('modelId')
+
+def model_file_format(path):
+    '''safetensors, pytorch or onnx when path is a weight file, None otherwise'''
+    if path.endswith(ONNX_DATA_SUFFIXES):
+        return 'onnx'
+    extension = path.split('.')[-1]
+    for model_type, extensions in MODEL_EXTENSIONS:
+        if extension in extensions:
+            return model_type
+    return None
+
+def variant_name(path):
+    '''
+    the loadable variant a weight file belongs to: its folder and file name without the
+    shard numbering, so fp16/model-00001-of-00002.safetensors is fp16/model and
+    onnx/decoder_model_merged_quantized.onnx is its own variant
+    '''
+    directory, _, filename = path.rpartition('/')
+    if filename.endswith(ONNX_DATA_SUFFIXES):
+        stem = filename[:filename.rindex('.onnx')]
+    else:
+        stem = filename.rpartition('.')[0] or filename
+    if '-of-' in stem:
+        stem = SHARD_PATTERN.sub('', stem)
+    return f"{directory}/{stem}" if directory else stem
+
+def group_variants(model_files):
+    '''
+    {variant: {format, files, bytes, primary}} of the MODEL_FILES lists. The primary
+    variant of each format sizes the format total: the top-level one, else the largest
+    '''
+    variants = {}
+    for model_type, files in model_files.items():
+        for path, size in files:
+            name = variant_name(path)
+            variant = variants.get(name)
+            if variant is None:
+                variant = variants[name] = {'format': model_type, 'files': [], 'bytes': 0, 'primary': False}
+            variant['files'].append(path)
+            if size != "Unknown":
+                variant['bytes'] += size
+    for model_type, _ in MODEL_EXTENSIONS:
+        candidates = [name for name, v in variants.items() if v['format'] == model_type]
+        if candidates:
+            primary = max(candidates, key=lambda name: ('/' not in name, variants[name]['bytes']))
+            variants[primary]['primary'] = True
+    return variants
+
+def print_variants(variants):
+    print(f"Model Variants: {len(variants)}")
+    for name, variant in variants.items():
+        label = " (sizes the format total)" if variant['primary'] else ""
+        print(f"  • {name} ({variant['format']}): {len(variant['files'])} file(s) "
+              f"({variant['bytes'] / (1024 ** 3):.2f} GB){label}")
+
+def print_header_params(tensor_headers):
+    '''print the parameter count per dtype of read headers, returns the total'''
+    counts = {}
+    for _, header in tensor_headers.values():
+        for dtype, params in tensor_param_counts(header).items():
+            counts[dtype] = counts.get(dtype, 0) + params
+    total = sum(counts.values())
+    print(f"Model Parameter Count: {total:,} (read from {len(tensor_headers)} file header(s))")
+    for dtype, params in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"  • {dtype}: {params:,}")
+    return total
+
+def print_param_breakdown(param_breakdown):
+    layers = param_breakdown['layers']
+    print(f"Model Parameter Count: {param_breakdown['total']:,} (computed from config.json, {param_breakdown['model_type']})")
+    print(f"  • embeddings: {param_breakdown['embedding']:,}")
+    if min(layers) == max(layers):
+        print(f"  • {len(layers)} layers: {layers[0]:,} each")
+    else:
+        print(f"  • {len(layers)} layers: {sum(layers):,} ({min(layers):,} to {max(layers):,} per layer)")
+    if param_breakdown['lm_head']:
+        print(f"  • LM head: {param_breakdown['lm_head']:,}")
+    sizes = ", ".join(f"{precision} {nbytes / (1024 ** 3):.2f} GB"
+                      for precision, nbytes in bytes_by_precision(param_breakdown['total']).items())
+    print(f"  • weights: {sizes}")
+
+def estimate_model_files(args, progress=None):
+    '''
+    estimate the model files of args.model_id, returns the estimated_total dict or None.
+    progress, when given, is updated with the fields of the result as they become
+    known, for callers that stop waiting at a deadline. args.revision picks a branch,
+    tag or commit other than main, args.read_headers reads the safetensors headers
+    even when the Hub has the parameter count (revision diffs compare the tensors)
+    '''
     disable_progress_bars()
 
     config = read_config()
+    revision = getattr(args, 'revision', None)
+    read_headers = getattr(args, 'read_headers', False)
 
     if not validate_model_id(args.model_id):
         print(f"Invalid model ID format: {args.model_id}")
@@ -33,23 +390,20 @@ def estimate_model_files(args):
         print("ERROR: No HuggingFace API key specified.")
         return None
     
-    # Initialize the API
-    api = HfApi()
-    login(config['api_key'])
+    # Initialize the API, whoami checks the token against the configured endpoint
+    api = HfApi(endpoint=hub_endpoint(), token=config['api_key'])
+    if config['api_key'] not in _verified_tokens:
+        get_scheduler().call("whoami", api.whoami)
+        _verified_tokens.add(config['api_key'])
     sys.stdout.write("Repository Size: calculating...\r")
     sys.stdout.flush()
-    response = requests.get(
-        f"https://huggingface.co/api/models/{args.model_id}",
-        params={'fields': ['usedStorage', 'safetensors', 'siblings']},
-        headers={"Authorization":f"Bearer {config['api_key']}"}
-        )
+    # the file list comes from the paged tree API, not the siblings of the model info
+    response = request_model_info(args.model_id, config['api_key'], fields=('usedStorage', 'safetensors'), revision=revision)
     total_used_storage = None
     model_params_size = None
-    repo_files = None
 
     if response.status_code == 200:
         content = json.loads(response.content)
-        repo_files = content.get('siblings', None)
         model_params_size = content.get('safetensors',{}).get('total',0)
         total_used_storage = float(content.get('usedStorage', 0)) / (1024 ** 3)
     elif response.status_code == 401:
@@ -80,25 +434,37 @@ def estimate_model_files(args):
     sys.stdout.write(f"Repository Size: {total_used_storage:.2f} GB\n")
     sys.stdout.flush()
 
-    formatted_param_count = f"{model_params_size:,}"
-    sys.stdout.write(f"Model Parameter Count: {formatted_param_count}\n")
-    sys.stdout.flush()
+    if int(model_params_size) > 0:
+        formatted_param_count = f"{model_params_size:,}"
+        sys.stdout.write(f"Model Parameter Count: {formatted_param_count}\n")
+        sys.stdout.flush()
 
-    model_extensions = (('safetensors',['safetensors']), 
-                        ('pytorch', ['bin', 'pt', 'pth']),
-                        ('onnx', ['onnx']),
-                        )
-    
-    model_files = {k[0]: [] for k in model_extensions}
-    
-    if isinstance(repo_files, list) and len(repo_files) > 0:
-        for r in repo_files:
-            for k, v in model_extensions:
-                if r['rfilename'].split('.')[-1] in v:
-                    model_files[k].append(r['rfilename'])
-    else:
+    model_files = {k[0]: [] for k in MODEL_EXTENSIONS}
+    # {path: (size, oid)} of the weight files, the other files are only counted
+    tree_files = {}
+    num_repo_files = 0
+    try:
+        for path, size, oid in iter_repo_tree(args.model_id, config['api_key'], revision or "main"):
+            num_repo_files += 1
+            model_type = model_file_format(path)
+            if model_type is not None:
+                model_files[model_type].append(path)
+                tree_files[path] = (size, oid)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return None
+    if num_repo_files == 0:
         print("Is an empty repository")
         return None
+    listed_files = {model_type: [(file, tree_files[file][0] if tree_files[file][0] is not None else "Unknown") for file in files]
+                    for model_type, files in model_files.items()}
+    # {variant: {format, files, bytes, primary}}, a repo may hold several loadable copies
+    # of the model in subfolders or under other file names
+    variants = group_variants(listed_files)
+    if progress is not None:
+        progress.update(REPO_SIZE=total_used_storage, PARAM_COUNT=int(model_params_size),
+                        PARAM_SOURCE="safetensors" if int(model_params_size) > 0 else None,
+                        MODEL_FILES=listed_files)
     
         
     # for k,v in model_files.items():
@@ -113,16 +479,34 @@ def estimate_model_files(args):
     
     main_dtype = None
     additional_dtypes = []
-    if num_model_type == 1 and int(model_params_size) > 0:
+    model_config = None
+    param_breakdown = None
+    param_source = "safetensors" if int(model_params_size) > 0 else None
+    tensor_headers = None
+    # without safetensors metadata on the Hub the file headers give the exact count and file sizes
+    if model_files['safetensors'] and (read_headers or (int(model_params_size) == 0 and num_model_type == 1)):
         try:
-            config_file = hf_hub_download(
-                    repo_id=args.model_id,
-                    filename="config.json",
-                    local_dir=tempfile.gettempdir(),
-
-                )
-            with open(config_file, 'r') as f:
-                config_json = json.load(f)
+            # one copy of the weights, other variants would count the parameters again
+            primary = next(v for v in variants.values() if v['format'] == 'safetensors' and v['primary'])
+            tensor_headers = read_model_headers(api, args.model_id, primary['files'], config['api_key'],
+                                                revision or "main", file_infos=tree_files)
+            if int(model_params_size) == 0:
+                model_params_size = print_header_params(tensor_headers)
+                param_source = "headers"
+        except Exception as e:
+            tensor_headers = None
+            print(f"Unable to read the safetensors headers: {e}")
+    # without safetensors metadata config.json still gives the parameter count
+    if num_model_type == 1:
+        try:
+            config_json = download_model_config(args.model_id, token=config['api_key'], revision=revision)
+            model_config = config_json
+            if int(model_params_size) == 0:
+                param_breakdown = count_parameters(config_json)
+                if param_breakdown is not None:
+                    model_params_size = param_breakdown['total']
+                    param_source = "config"
+                    print_param_breakdown(param_breakdown)
             main_dtype = config_json.get('torch_dtype', None)
             if "quantization_config" in config_json:
                 additional_dtypes.append(config_json["quantization_config"]["quant_method"])
@@ -134,20 +518,38 @@ def estimate_model_files(args):
     
         except Exception as e:
             print(f"Failed to download and process config.json, unable to infer data types {e}")
+    if int(model_params_size) == 0:
+        print("Model Parameter Count: 0")
     
     model_dtypes = (main_dtype, additional_dtypes)
+    if progress is not None:
+        progress.update(PARAM_COUNT=int(model_params_size), PARAM_SOURCE=param_source, MODEL_DTYPES=model_dtypes,
+                        MODEL_CONFIG=model_config)
     sys.stdout.write("Estimated Model File Distribution: calculating...\r")
     sys.stdout.flush()
     
     # fetch real model size 
-    estimated_total = {k[0]: 0 for k in model_extensions}
+    estimated_total = {k[0]: 0 for k in MODEL_EXTENSIONS}
     estimated_total['MODEL_DTYPES'] = model_dtypes
+    estimated_total['REPO_SIZE'] = total_used_storage
+    estimated_total['PARAM_COUNT'] = int(model_params_size)
+    # count_parameters result when the count comes from config.json, None otherwise
+    estimated_total['PARAM_BREAKDOWN'] = param_breakdown
+    # safetensors, headers, config or None when the count is unknown
+    estimated_total['PARAM_SOURCE'] = param_source
+    # {filename: (size, header)} when the safetensors headers were read, None otherwise
+    estimated_total['TENSOR_HEADERS'] = tensor_headers
+    # config.json when it was downloaded, None otherwise
+    estimated_total['MODEL_CONFIG'] = model_config
+    # how each format total was sized: headers or files (every file size known), params
+    # (parameter count times dtype) or average (known file sizes extrapolated to the others)
+    estimated_total['SIZE_SOURCE'] = {}
+    # per-file sizes from the tree listing, "Unknown" when it had none
+    estimated_total['MODEL_FILES'] = listed_files
+    estimated_total['VARIANTS'] = variants
     for i, (model_type, model_name) in enumerate(model_files.items()):
-        file_infos = []
-        
-        for file in model_name[:10]:  # Limit to first 10 files to avoid API abuse
-            file_info = api.get_paths_info(repo_id=args.model_id, paths=[file])[0]
-            file_infos.append((file, file_info.size if hasattr(file_info, 'size') and file_info.size else "Unknown"))
+        file_infos = listed_files[model_type]
+        format_variants = [v for v in variants.values() if v['format'] == model_type]
 
         # for file, size in file_infos:
         #     if size != "Unknown":
@@ -162,31 +564,269 @@ def estimate_model_files(args):
                 sys.stdout.write("Estimated Model File Distribution:\n") 
                 sys.stdout.flush()
 
-            DTYPES = {'float32':32, 
-                     'bfloat16': 16, 
-                     'float16':16, 
-                     'int8':8}
+            # a count worked out from config.json is less exact than the listed file sizes
+            sizes_listed = param_source == "config" and all(size != "Unknown" for _, size in file_infos)
 
-            if main_dtype and len(additional_dtypes) == 0:
+            if model_type == 'safetensors' and tensor_headers is not None:
+                # every file size is known
+                estimated_total[model_type] = sum(size for size, _ in tensor_headers.values())
+                estimated_total['SIZE_SOURCE'][model_type] = 'headers'
+                print(f"  • {model_type}: {len(model_name)} file(s) ({estimated_total[model_type] / (1024**3):.2f} GB)")
+            elif (main_dtype in PRECISION_BYTES and len(additional_dtypes) == 0 and int(model_params_size) > 0
+                  and not sizes_listed):
                 print(f"Estimating Using dtypes {main_dtype} of {int(model_params_size)} params")
-                estimated_total[model_type] = DTYPES[main_dtype] * (4 * int(model_params_size)) / 32
+                estimated_total[model_type] = PRECISION_BYTES[main_dtype] * int(model_params_size)
+                estimated_total['SIZE_SOURCE'][model_type] = 'params'
                 print(f"  • {model_type}: {len(model_name)} file(s) ({estimated_total[model_type] / (1024**3):.2f} GB)")
             else:
                 known_sizes = [size for _, size in file_infos if size != "Unknown"]
-                if known_sizes:
+                if len(format_variants) > 1:
+                    # summing every variant would count the model several times
+                    primary = next(v for v in format_variants if v['primary'])
+                    estimated_total[model_type] = primary['bytes']
+                    estimated_total['SIZE_SOURCE'][model_type] = 'files'
+                    print(f"  • {model_type}: {len(model_name)} file(s) in {len(format_variants)} variants "
+                          f"({estimated_total[model_type] / (1024**3):.2f} GB for one)")
+                elif known_sizes:
                     avg_size = sum(known_sizes) / len(known_sizes)
                     estimated_total[model_type] = avg_size * len(model_name)
+                    estimated_total['SIZE_SOURCE'][model_type] = 'files' if len(known_sizes) == len(model_name) else 'average'
                     print(f"  • {model_type}: {len(model_name)} file(s) ({estimated_total[model_type] / (1024**3):.2f} GB)")
         else:
             print(f"  • {model_type}: {len(model_name)} file(s) (0 GB)")
 
+    if len(variants) > 1:
+        print_variants(variants)
+
+    if progress is not None:
+        progress.update(estimated_total)
+    return estimated_total
+
+def partial_estimate(model_id, progress, index_path=None):
+    '''
+    best estimated_total from the progress of a run stopped at its deadline. Fields
+    it didn't reach come from the local catalog (hfest index), then file bytes from
+    the parameter count. None when nothing is known about the model
+    '''
+    estimated_total = {k[0]: 0 for k in MODEL_EXTENSIONS}
+    estimated_total.update(progress)
+    size_sources = estimated_total['SIZE_SOURCE'] = dict(estimated_total.get('SIZE_SOURCE') or {})
+    index_path = index_path or INDEX_FILE
+    entry = None
+    if os.path.exists(index_path):
+        try:
+            with Catalog(index_path) as catalog:
+                entry = catalog.get(model_id)
+        except sqlite3.Error:
+            entry = None
+
+    if not estimated_total.get('PARAM_COUNT') and entry is not None and entry.param_count:
+        estimated_total['PARAM_COUNT'] = entry.param_count
+        estimated_total['PARAM_SOURCE'] = 'index'
+    main_dtype, additional_dtypes = estimated_total.get('MODEL_DTYPES') or (None, [])
+    if main_dtype is None and entry is not None and entry.main_dtype:
+        main_dtype = entry.main_dtype
+        estimated_total['DTYPE_SOURCE'] = 'index'
+    estimated_total['MODEL_DTYPES'] = (main_dtype, additional_dtypes)
+
+    if not any(estimated_total[k[0]] for k in MODEL_EXTENSIONS):
+        files = estimated_total.get('MODEL_FILES') or {}
+        model_type = next((k[0] for k in MODEL_EXTENSIONS if files.get(k[0])), 'safetensors')
+        param_count = estimated_total.get('PARAM_COUNT') or 0
+        if entry is not None and entry.file_bytes and entry.format:
+            estimated_total[entry.format] = entry.file_bytes
+            size_sources[entry.format] = 'index'
+        elif param_count:
+            # most checkpoints on the hub are stored in half precision
+            estimated_total[model_type] = param_count * PRECISION_BYTES.get(main_dtype, PRECISION_BYTES['float16'])
+            size_sources[model_type] = 'heuristic'
+    if not estimated_total.get('PARAM_COUNT') and not any(estimated_total[k[0]] for k in MODEL_EXTENSIONS):
+        return None
     return estimated_total
 
+def print_partial_estimate(estimated_total):
+    confidence = estimate_confidence(estimated_total, estimated_total.get('PARAM_SOURCE'))
+    print("Best estimate so far:")
+    print(f"  • Model Parameter Count: {estimated_total.get('PARAM_COUNT') or 0:,} ({confidence['param_count']})")
+    print(f"  • Main data type: {estimated_total['MODEL_DTYPES'][0]} ({confidence['main_dtype']})")
+    for model_type, _ in MODEL_EXTENSIONS:
+        if f"files.{model_type}" in confidence:
+            print(f"  • {model_type}: {estimated_total[model_type] / (1024**3):.2f} GB ({confidence[f'files.{model_type}']})")
+
+def parse_growth_threshold(text):
+    '''"5%" -> (0.05, None), "512MB" -> (None, 536870912.0), a bare number is bytes. Raises ValueError'''
+    match = GROWTH_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid growth threshold {text!r}, expected a percentage (5%) or a size (512MB, 2GB)")
+    value, unit = float(match.group(1)), (match.group(2) or "").upper()
+    if unit == "%":
+        return value / 100, None
+    return None, value * SIZE_UNITS.get(unit, 1)
+
+def validate_revision_args(args):
+    '''check --revision and --fail_if_growth, returns the growth threshold pair or False'''
+    revisions = getattr(args, 'revisions', None) or []
+    fail_if_growth = getattr(args, 'fail_if_growth', None)
+    if fail_if_growth is None:
+        return None
+    if len(set(revisions)) < 2:
+        print("--fail_if_growth needs at least two revisions to compare")
+        return False
+    try:
+        return parse_growth_threshold(fail_if_growth)
+    except ValueError as e:
+        print(e)
+        return False
+
+def estimate_revisions(args, revisions):
+    '''
+    estimate_model_files of every revision of args.model_id at once, returns their
+    estimated_total in order. Each report is printed whole, in order, and the safetensors
+    headers are read so the revisions' tensors can be compared
+    '''
+    tasks = []
+    for revision in revisions:
+        revision_args = argparse.Namespace(**vars(args))
+        revision_args.revision = revision
+        revision_args.read_headers = True
+        tasks.append(run_in_background(estimate_model_files, revision_args))
+    totals = []
+    for revision, task in zip(revisions, tasks):
+        print(f"Revision: {revision}")
+        totals.append(task.join())
+        print("----------------------------------------")
+    return totals
+
+def weight_bytes(estimated_total):
+    '''(format, bytes) of the weights a fit check loads: the first format with files, as in analyze_fit'''
+    for model_type, _ in MODEL_EXTENSIONS:
+        if estimated_total.get(model_type, 0) > 0:
+            return model_type, estimated_total[model_type]
+    return None, 0
+
+def diff_revisions(base, base_total, revision, estimated_total, threshold=None):
+    '''RevisionDiff of a revision against the base one, threshold is a parse_growth_threshold pair'''
+    _, base_bytes = weight_bytes(base_total)
+    model_type, model_bytes = weight_bytes(estimated_total)
+    diff = RevisionDiff(base=base, revision=revision, format=model_type, base_bytes=base_bytes, bytes=model_bytes,
+                        growth_bytes=model_bytes - base_bytes,
+                        growth=(model_bytes - base_bytes) / base_bytes if base_bytes else None)
+    old_headers, new_headers = base_total.get('TENSOR_HEADERS'), estimated_total.get('TENSOR_HEADERS')
+    if old_headers is not None and new_headers is not None:
+        old = merged_tensors(header for _, header in old_headers.values())
+        new = merged_tensors(header for _, header in new_headers.values())
+        added, removed, changed = diff_tensors(old, new)
+        diff.added = [TensorChange(name, new_dtype=new[name][0], new_shape=list(new[name][1])) for name in added]
+        diff.removed = [TensorChange(name, old_dtype=old[name][0], old_shape=list(old[name][1])) for name in removed]
+        diff.changed = [TensorChange(name, old[name][0], list(old[name][1]), new[name][0], list(new[name][1]))
+                        for name in changed]
+    if threshold is not None:
+        fraction, max_bytes = threshold
+        if max_bytes is not None:
+            diff.exceeds_threshold = diff.growth_bytes > max_bytes
+        else:
+            diff.exceeds_threshold = diff.growth is not None and diff.growth > fraction
+    return diff
+
+def print_revision_table(revisions, totals):
+    '''sizes of every revision side by side, one column per revision'''
+    rows = [("Parameters", lambda total: f"{total.get('PARAM_COUNT') or 0:,}"),
+            ("Main data type", lambda total: str(total.get('MODEL_DTYPES', (None, []))[0]))]
+    for model_type, _ in MODEL_EXTENSIONS:
+        if any(total is not None and total.get(model_type) for total in totals):
+            rows.append((model_type, lambda total, key=model_type: f"{total.get(key, 0) / (1024 ** 3):.2f} GB"))
+    table = [["Revision"] + list(revisions)]
+    table += [[label] + [value(total) if total is not None else "error" for total in totals] for label, value in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+    for row in table:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+def describe_tensor(dtype, shape):
+    return f"{dtype} {list(shape)}"
+
+def print_revision_diff(diff):
+    growth = f"{'+' if diff.growth_bytes >= 0 else '-'}{abs(diff.growth_bytes) / (1024 ** 3):.2f} GB"
+    if diff.growth is not None:
+        growth += f" ({diff.growth:+.1%})"
+    print(f"{diff.revision} vs {diff.base}: {growth}")
+    if diff.added is None:
+        print("  • Tensors: unknown, the safetensors headers of both revisions are needed")
+        return
+    if not (diff.added or diff.removed or diff.changed):
+        print("  • Same tensors")
+    for kind, changes in (("added", diff.added), ("removed", diff.removed), ("re-typed", diff.changed)):
+        if not changes:
+            continue
+        print(f"  • {len(changes)} tensor(s) {kind}:")
+        for change in changes[:DIFF_PRINT_LIMIT]:
+            if change.old_dtype is None:
+                print(f"      {change.name}: {describe_tensor(change.new_dtype, change.new_shape)}")
+            elif change.new_dtype is None:
+                print(f"      {change.name}: {describe_tensor(change.old_dtype, change.old_shape)}")
+            else:
+                print(f"      {change.name}: {describe_tensor(change.old_dtype, change.old_shape)} -> "
+                      f"{describe_tensor(change.new_dtype, change.new_shape)}")
+        if len(changes) > DIFF_PRINT_LIMIT:
+            print(f"      ... and {len(changes) - DIFF_PRINT_LIMIT} more")
+
+def compare_revisions(model_id, revisions, totals, fail_if_growth=None, threshold=None):
+    '''
+    print the revisions side by side and what changed from the first one, returns the
+    RevisionComparison with a ModelEstimate per revision. Its status is error when a
+    revision couldn't be estimated and growth when one grew past the threshold
+    '''
+    comparison = RevisionComparison(model_id=model_id, revisions=list(revisions), fail_if_growth=fail_if_growth)
+    for revision, estimated_total in zip(revisions, totals):
+        model = model_estimate_from_total(model_id, estimated_total)
+        model.revision = revision
+        comparison.results.append(model)
+    print_revision_table(revisions, totals)
+    base, base_total = revisions[0], totals[0]
+    if base_total is not None:
+        for revision, estimated_total in zip(revisions[1:], totals[1:]):
+            if estimated_total is not None:
+                comparison.diffs.append(diff_revisions(base, base_total, revision, estimated_total, threshold))
+    if comparison.diffs:
+        print("----------------------------------------")
+    for diff in comparison.diffs:
+        print_revision_diff(diff)
+    grown = [diff for diff in comparison.diffs if diff.exceeds_threshold]
+    for diff in grown:
+        print(f"FAILED: {diff.revision} grows the weights by {diff.growth_bytes / (1024 ** 3):.2f} GB over {diff.base}, "
+              f"more than --fail_if_growth {fail_if_growth}")
+    if any(total is None for total in totals):
+        comparison.status = "error"
+    elif grown:
+        comparison.status = "growth"
+    return comparison
+
 def handle(args):
-    print(f"Model: {args.model_id}")
-    print("----------------------------------------")
-    estimated_total = estimate_model_files(args)
-    if estimated_total is None:
-        return 1
-    
-    return 0
\ No newline at end of file
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    status = 0
+    for model_args in iter_model_args(args):
+        revisions = list(dict.fromkeys(getattr(model_args, 'revisions', None) or []))
+        with human_output(output_format):
+            print(f"Model: {model_args.model_id}")
+            print("----------------------------------------")
+            threshold = validate_revision_args(model_args)
+            if threshold is False:
+                return 1
+            if len(revisions) > 1:
+                comparison = compare_revisions(model_args.model_id, revisions, estimate_revisions(model_args, revisions),
+                                               getattr(model_args, 'fail_if_growth', None), threshold)
+            else:
+                model_args.revision = revisions[0] if revisions else None
+                estimated_total = estimate_model_files(model_args)
+        if len(revisions) > 1:
+            writer.write(comparison)
+            if comparison.status != "ok":
+                status = 1
+            continue
+        model = model_estimate_from_total(model_args.model_id, estimated_total)
+        model.revision = model_args.revision
+        writer.write(model)
+        if estimated_total is None:
+            status = 1
+    writer.close()
+    return status
@@ -0,0 +1,253 @@
+from .estimate_size import (estimate_model_files, validate_model_id, iter_repo_tree, iter_hub_model_entries,
+                            model_file_format, variant_name, group_variants, read_tensor_header, config_downloader,
+                            MODEL_EXTENSIONS)
+from .estimate_resource import compare_single_setup, detect_gpu_info, print_gpu_info, virtual_gpu_info, GREEN, RED, RESET
+from ..core.capacity import DECODE_BANDWIDTH_EFFICIENCY
+from ..core.hardware import find_gpu, match_detected_gpu
+from ..core.headers import tensor_param_counts
+from ..core.memory import kv_cache_bytes
+from ..core.results import DerivativeOption, DerivativeSearch, model_estimate_from_total
+from ..utils.config import read_config
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter, run_in_background
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import re
+
+# tags and repo name words telling how a derivative is quantized
+QUANT_METHODS = {
+    'gguf': ('gguf',),
+    'awq': ('awq',),
+    'gptq': ('gptq',),
+    'exl2': ('exl2',),
+    'bnb': ('bitsandbytes', 'bnb'),
+    'fp8': ('fp8',),
+}
+# words a quantized copy adds to the name of its base model (Llama-3.1-8B-Instruct-AWQ-INT4)
+QUANT_WORD_PATTERN = re.compile(r'^(gguf|awq|gptq|exl2|bnb|bitsandbytes|fp8|quantized|quant|imatrix|hf|i?q\d.*|'
+                                r'int\d+|\d+bits?|w\d+a\d+|\d+(\.\d+)?bpw|g\d+|dynamic)$')
+# GGUF quantization types in file names: Q4_K_M, IQ3_XXS, Q8_0, BF16
+GGUF_QUANT_PATTERN = re.compile(r'(?<![a-z0-9])(i?q\d_[a-z0-9]+(?:_[a-z0-9]+)*|bf16|f16|f32)(?![a-z0-9])', re.IGNORECASE)
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("find-quantized", help="Find the AWQ, GPTQ, GGUF... versions of a model and rank those that fit the GPUs")
+    parser.add_argument("model_id", help="Hugging Face model ID of the base model (e.g., meta-llama/Llama-3.1-8B-Instruct)")
+    parser.add_argument("--methods", type=str, default="all", help=f"Comma separated quantization methods to keep ({', '.join(QUANT_METHODS)}) or all")
+    parser.add_argument("--context", type=int, default=4096, help="Tokens of KV cache to reserve")
+    parser.add_argument("--min_bits", type=float, default=4.0, help="Leave out variants storing fewer bits per parameter of the base model")
+    parser.add_argument("--gpu", type=str, nargs="+", default=None, metavar="TYPE", help="Check against these catalog GPUs (e.g. L4 A10) instead of the detected ones")
+    parser.add_argument("--limit", type=int, default=50, help="Derivative repos taken from the base_model relations and from the search, each")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of repos listed at the same time")
+    parser.add_argument("--top", type=int, default=10, help="Variants to print")
+    add_output_argument(parser)
+    return parser
+
+
+def quant_method(model_id, tags=()):
+    '''the quantization method of a repo from its tags or name, None when it doesn't look quantized'''
+    words = {tag.lower() for tag in tags or ()} | set(re.split(r'[-_.]', model_id.split('/')[-1].lower()))
+    for method, markers in QUANT_METHODS.items():
+        if any(marker in words for marker in markers):
+            return method
+    return None
+
+def is_quantized_copy(model_id, base_id):
+    '''whether a repo name is the base model name plus quantization words only, for search results'''
+    name, base_name = model_id.split('/')[-1].lower(), base_id.split('/')[-1].lower()
+    if base_name not in name:
+        return False
+    rest = name.replace(base_name, ' ', 1)
+    return all(QUANT_WORD_PATTERN.match(word) for word in re.split(r'[-_\s]+', rest) if word)
+
+def find_derivatives(model_id, api_key, limit=50, methods=None):
+    '''
+    {repo: method} of the quantized derivatives of a model: the repos naming it as their
+    quantized base_model, then the search results for its name that are quantized copies
+    of it. methods, when given, keeps those methods only
+    '''
+    found = {}
+    for entry in iter_hub_model_entries(api_key, filter=f"base_model:quantized:{model_id}", limit=limit):
+        repo = entry.get('id') or entry.get('modelId')
+        found.setdefault(repo, quant_method(repo, entry.get('tags')) or "other")
+    for entry in iter_hub_model_entries(api_key, search=model_id.split('/')[-1], limit=limit):
+        repo = entry.get('id') or entry.get('modelId')
+        method = quant_method(repo, entry.get('tags'))
+        if repo != model_id and method is not None and is_quantized_copy(repo, model_id):
+            found.setdefault(repo, method)
+    if methods is not None:
+        found = {repo: method for repo, method in found.items() if method in methods}
+    return found
+
+def gguf_quantization(name):
+    match = GGUF_QUANT_PATTERN.search(name.split('/')[-1])
+    return match.group(1).upper() if match else None
+
+def header_quantization(model_id, path, size, oid, token=None):
+    '''the tensor type holding most parameters of a file, read from its header. None when unreadable'''
+    try:
+        counts = tensor_param_counts(read_tensor_header(model_id, path, oid, token, size=size))
+    except Exception:
+        return None
+    return max(counts, key=counts.get) if counts else None
+
+def derivative_variants(model_id, method, token=None):
+    '''
+    DerivativeOption of each loadable variant of a repo, sized from its tree listing:
+    every GGUF file (or set of split files) is one, other formats count one copy of the
+    weights. The GGUF type comes from the file name, else from the file header
+    '''
+    gguf_files = {}
+    listed_files = {model_type: [] for model_type, _ in MODEL_EXTENSIONS}
+    for path, size, oid in iter_repo_tree(model_id, token):
+        if path.endswith('.gguf'):
+            # vision projectors are loaded next to the language model, not instead of it
+            if path.split('/')[-1].startswith('mmproj'):
+                continue
+            gguf_files.setdefault(variant_name(path), []).append((path, size or 0, oid))
+        elif model_file_format(path) is not None:
+            listed_files[model_file_format(path)].append((path, size if size is not None else "Unknown"))
+
+    options = []
+    for name, files in gguf_files.items():
+        path, size, oid = files[0]
+        quantization = gguf_quantization(name) or header_quantization(model_id, path, size, oid, token)
+        options.append(DerivativeOption(model_id=model_id, variant=name, method="gguf", quantization=quantization,
+                                        files=len(files), bytes=sum(size for _, size, _ in files)))
+    variants = group_variants(listed_files)
+    for model_type, _ in MODEL_EXTENSIONS:
+        primary = next((name for name, v in variants.items() if v['format'] == model_type and v['primary']), None)
+        if primary is not None:
+            variant = variants[primary]
+            options.append(DerivativeOption(model_id=model_id, variant=primary, method=method if method != "gguf" else "other",
+                                            files=len(variant['files']), bytes=variant['bytes']))
+            break
+    return [option for option in options if option.bytes > 0]
+
+def decode_tokens_per_second(gpu, nbytes):
+    '''single sequence decode reading every weight and the KV cache per token, None for GPUs outside the catalog'''
+    spec = match_detected_gpu(gpu['name']) or find_gpu(gpu['name'] or "")
+    if spec is None or nbytes <= 0:
+        return None
+    return spec.bandwidth_gbps * 1e9 * DECODE_BANDWIDTH_EFFICIENCY * (gpu.get('compute_fraction') or 1.0) / nbytes
+
+def check_option(option, param_count, gpu_info, kv_cache=0):
+    '''fill in the bits per weight and the fit of an option on its best GPU, returns the option'''
+    if param_count:
+        option.bits_per_weight = option.bytes * 8 / param_count
+    option.required_gb = (option.bytes + kv_cache) / (1024 ** 3)
+    best = None
+    for gpu, check in zip(gpu_info, compare_single_setup(option.bytes, 1, gpu_info, kv_cache_bytes=kv_cache, verbose=False)):
+        if not check['fits']:
+            continue
+        tokens_per_second = decode_tokens_per_second(gpu, option.bytes + kv_cache)
+        key = (tokens_per_second or 0, check['free_gb'])
+        if best is None or key > best[0]:
+            best = (key, check, tokens_per_second)
+    if best is not None:
+        _, check, option.tokens_per_second = best
+        option.fits = True
+        option.gpu_index, option.gpu_name = check['gpu_index'], check['gpu_name']
+    return option
+
+def rank_options(options):
+    '''variants that fit first, then by decode tokens/s, then smallest'''
+    return sorted(options, key=lambda option: (not option.fits, -(option.tokens_per_second or 0), option.bytes))
+
+def print_options(options):
+    for i, option in enumerate(options):
+        label = f"{GREEN}[FITS]{RESET}" if option.fits else f"{RED}[NOT ENOUGH MEMORY]{RESET}"
+        quantization = f" {option.quantization}" if option.quantization else ""
+        bits = f", {option.bits_per_weight:.1f} bits" if option.bits_per_weight else ""
+        line = (f"{i + 1:>3}. {label} {option.model_id} ({option.variant}) {option.method}{quantization}: "
+                f"{option.bytes / (1024 ** 3):.2f} GB{bits}, {option.required_gb:.2f} GB needed")
+        if option.fits:
+            line += f" on GPU {option.gpu_index}: {option.gpu_name}"
+            if option.tokens_per_second is not None:
+                line += f", ~{option.tokens_per_second:.0f} tokens/s"
+        print(line)
+
+def parse_methods(text):
+    if text == "all":
+        return None
+    return [method.strip().lower() for method in text.split(",")]
+
+def validate_args(args):
+    if not validate_model_id(args.model_id):
+        print(f"Invalid model ID format: {args.model_id}")
+        return False
+    methods = parse_methods(args.methods)
+    for method in methods or []:
+        if method not in QUANT_METHODS:
+            print(f"Invalid quantization method: {method}")
+            print(f"Valid methods: {list(QUANT_METHODS)}")
+            return False
+    for name in args.gpu or []:
+        if find_gpu(name) is None:
+            print(f"Unknown GPU type: {name}")
+            return False
+    if args.context < 0 or args.min_bits < 0:
+        print("--context and --min_bits can't be negative")
+        return False
+    if args.limit < 1 or args.concurrency < 1 or args.top < 1:
+        print("--limit, --concurrency and --top must be positive")
+        return False
+    return True
+
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        if not validate_args(args):
+            return 1
+        api_key = read_config().get('api_key')
+        if api_key is None:
+            print("ERROR: No HuggingFace API key specified.")
+            return 1
+        hardware = None if args.gpu else run_in_background(detect_gpu_info)
+
+        print(f"Model: {args.model_id}")
+        print("----------------------------------------")
+        # the base model gives the parameter count and the KV cache size, its derivatives
+        # can still be checked when it is gated
+        estimated_total = estimate_model_files(argparse.Namespace(model_id=args.model_id))
+        print("----------------------------------------")
+        if args.gpu:
+            specs = [find_gpu(name) for name in args.gpu]
+            gpu_info = [virtual_gpu_info(i, spec.name, spec.memory_gb) for i, spec in enumerate(specs)]
+        else:
+            gpu_info = hardware.join()
+        print_gpu_info(gpu_info)
+        print("----------------------------------------")
+
+        search = DerivativeSearch(model=model_estimate_from_total(args.model_id, estimated_total), context=args.context)
+        param_count = (estimated_total or {}).get('PARAM_COUNT') or 0
+        kv_cache = kv_cache_bytes(estimated_total or {}, args.context, config_downloader(args.model_id))
+        try:
+            derivatives = find_derivatives(args.model_id, api_key, args.limit, parse_methods(args.methods))
+        except RuntimeError as e:
+            print(f"ERROR: {e}")
+            return 1
+        search.repos = len(derivatives)
+        print(f"Quantized derivatives found: {len(derivatives)}")
+
+        # repos are listed concurrently, a repo failing is reported and left out
+        options = []
+        with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="hfest-derivatives") as executor:
+            futures = {repo: executor.submit(derivative_variants, repo, method, api_key) for repo, method in derivatives.items()}
+            for repo, future in futures.items():
+                try:
+                    options.extend(future.result())
+                except Exception as e:
+                    print(f"  • {repo}: {e}")
+        options = [check_option(option, param_count, gpu_info, kv_cache) for option in options]
+        kept = [option for option in options if option.bits_per_weight is None or option.bits_per_weight >= args.min_bits]
+        if len(kept) < len(options):
+            print(f"Left out {len(options) - len(kept)} variant(s) below {args.min_bits:g} bits per weight (--min_bits)")
+        search.checked = len(kept)
+        search.options = rank_options(kept)[:args.top]
+        print(f"Variants checked: {len(kept)}" + (f", with {args.context} tokens of KV cache" if kv_cache else ""))
+        print_options(search.options)
+        if not any(option.fits for option in search.options):
+            print("No quantized variant fits the GPUs.")
+    writer.write(search)
+    writer.close()
+    return 0 if any(option.fits for option in search.options) else 1
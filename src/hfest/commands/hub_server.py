@@ -0,0 +1,65 @@
+from ..utils.cassette import Cassette, HubStandIn
+from ..utils.config import DEFAULT_ENDPOINT
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("hub-server", help="Serve recorded Hub responses locally, or record them from the Hub")
+    parser.add_argument("--cassette", type=str, required=True, help="Cassette file the responses are recorded to or replayed from")
+    parser.add_argument("--record", action="store_true", help="Forward requests to the upstream Hub and record the responses")
+    parser.add_argument("--upstream", type=str, default=DEFAULT_ENDPOINT, help="Hub to forward requests to in record mode")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on, 0 picks a free port")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="Delay added before every response, in milliseconds")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="Random extra delay of up to this many milliseconds")
+    parser.add_argument("--throttle_every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--retry_after", type=float, default=None, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the latency jitter, for reproducible runs")
+    return parser
+
+def handle(args):
+    cassette = Cassette(args.cassette)
+    try:
+        loaded = cassette.load()
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Unable to read cassette {args.cassette}: {e}")
+        return 1
+    if not loaded and not args.record:
+        print(f"ERROR: Cassette {args.cassette} not found. Record it first with --record.")
+        return 1
+    if args.latency_ms < 0 or args.jitter_ms < 0 or args.throttle_every < 0:
+        print("ERROR: --latency_ms, --jitter_ms and --throttle_every can't be negative.")
+        return 1
+
+    try:
+        server = HubStandIn(
+            cassette,
+            host=args.host,
+            port=args.port,
+            upstream=args.upstream if args.record else None,
+            latency=args.latency_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            throttle_every=args.throttle_every,
+            retry_after=args.retry_after,
+            seed=args.seed,
+        )
+    except OSError as e:
+        print(f"ERROR: Unable to listen on {args.host}:{args.port}: {e}")
+        return 1
+
+    if args.record:
+        print(f"Recording {args.upstream} to {args.cassette} at {server.url}")
+    else:
+        print(f"Replaying {len(cassette)} response(s) from {args.cassette} at {server.url}")
+    print(f"Point hfest at it with: hfest config set endpoint {server.url}  (or HF_ENDPOINT={server.url})")
+    print("Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.record:
+            cassette.save()
+    print(f"Stopped: {server.report()}")
+    if args.record:
+        print(f"Cassette saved to {args.cassette} ({len(cassette)} response(s))")
+    return 0
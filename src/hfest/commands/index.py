@@ -0,0 +1,217 @@
+from .estimate_size import (validate_model_id, request_model_info, download_model_config, iter_repo_tree,
+                            model_file_format, group_variants, read_model_headers, MODEL_EXTENSIONS, PATHS_INFO_BATCH)
+from ..core.headers import tensor_param_counts
+from ..core.catalog import Catalog, SORT_COLUMNS
+from ..core.memory import kv_cache_bytes_per_token, config_value, dominant_dtype, PRECISION_BYTES
+from ..utils.config import read_config, hub_endpoint, INDEX_FILE, ensure_config_dir
+from ..utils.scheduler import get_scheduler
+from ..utils.profiling import profiler
+from ..utils import metrics
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter
+from huggingface_hub import HfApi
+from huggingface_hub.utils import disable_progress_bars
+import json
+
+HTTP_ERRORS = {401: "Authentication error: Invalid or expired API token.",
+               403: "Authorization error: You don't have access to this model repository.",
+               404: "Model not found.",
+               429: "Rate limit exceeded."}
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("index", help="Manage the local catalog of model estimates")
+    parser.add_argument("--db", type=str, default=INDEX_FILE, help="Path of the catalog database")
+    index_subparsers = parser.add_subparsers(dest="index_command", help="Index commands")
+
+    add_parser = index_subparsers.add_parser("add", help="Add models to the catalog, or refresh them if their commit changed")
+    add_parser.add_argument("model_ids", nargs="+", help="Hugging Face model IDs")
+
+    index_subparsers.add_parser("refresh", help="Refresh every model in the catalog whose commit changed")
+
+    remove_parser = index_subparsers.add_parser("remove", help="Remove models from the catalog")
+    remove_parser.add_argument("model_ids", nargs="+", help="Hugging Face model IDs")
+
+    query_parser = index_subparsers.add_parser("query", help="Find catalog models that fit a memory budget")
+    query_parser.add_argument("--max_memory", type=float, default=None, help="Memory budget in GB (e.g., 24)")
+    query_parser.add_argument("--precision", type=str, default="float16", help="Precision the model is run at (float32, float16, bfloat16, int8, int4)")
+    query_parser.add_argument("--context", type=int, default=0, help="Context length in tokens reserved in the KV cache")
+    query_parser.add_argument("--batch_size", type=int, default=1, help="Number of concurrent sequences in the KV cache")
+    query_parser.add_argument("--architecture", type=str, default=None, help="Only models of this architecture (e.g., LlamaForCausalLM)")
+    query_parser.add_argument("--format", type=str, default=None, help="Only models stored in this format (safetensors, pytorch, onnx)")
+    query_parser.add_argument("--min_params", type=int, default=None, help="Minimum parameter count")
+    query_parser.add_argument("--max_params", type=int, default=None, help="Maximum parameter count")
+    query_parser.add_argument("--sort", type=str, default="param_count", choices=SORT_COLUMNS, help="Rank results by this column")
+    query_parser.add_argument("--limit", type=int, default=None, help="Maximum number of results")
+    add_output_argument(query_parser)
+    return parser
+
+def fetch_catalog_record(model_id, api_key, known_sha=None):
+    '''
+    Collect the catalog record of a model from the Hub.
+    Returns (record, dtype_params, error). record is None and error is None
+    when the repository commit equals known_sha, so nothing needs refreshing.
+    dtype_params maps safetensors dtypes to parameter counts.
+    '''
+    response = request_model_info(model_id, api_key, fields=('sha', 'safetensors', 'config'))
+    if response.status_code != 200:
+        return None, None, HTTP_ERRORS.get(response.status_code, f"API request failed with status code: {response.status_code}")
+    content = json.loads(response.content)
+    sha = content.get('sha')
+    unchanged = sha is not None and sha == known_sha
+    profiler.record_cache(unchanged)
+    metrics.cache_requests.inc(cache="catalog", result="hit" if unchanged else "miss")
+    if unchanged:
+        return None, None, None
+
+    safetensors = content.get('safetensors') or {}
+    dtype_params = safetensors.get('parameters') or {}
+    param_count = int(safetensors.get('total', 0) or 0)
+    revision = sha or "main"
+
+    # the same listing and variant grouping as estimate-size, so a repo holding several
+    # copies of the weights is sized by one of them
+    model_files = {k[0]: [] for k in MODEL_EXTENSIONS}
+    tree_files = {}
+    has_config = False
+    for path, size, oid in iter_repo_tree(model_id, api_key, revision):
+        has_config = has_config or path == "config.json"
+        model_type = model_file_format(path)
+        if model_type is not None:
+            model_files[model_type].append(path)
+            tree_files[path] = (size, oid)
+    variants = group_variants({model_type: [(path, tree_files[path][0] or 0) for path in files]
+                               for model_type, files in model_files.items()})
+    model_format, primary = None, None
+    for k, _ in MODEL_EXTENSIONS:
+        primary = next((v for v in variants.values() if v['format'] == k and v['primary']), None)
+        if primary is not None:
+            model_format = k
+            break
+
+    file_bytes = 0
+    if primary is not None:
+        api = HfApi(endpoint=hub_endpoint(), token=api_key)
+        if model_format == 'safetensors' and param_count == 0:
+            # no safetensors metadata on the Hub, the file headers give the exact count
+            try:
+                tensor_headers = read_model_headers(api, model_id, primary['files'], api_key, revision,
+                                                    file_infos=tree_files)
+                dtype_params = {}
+                for _, header in tensor_headers.values():
+                    for dtype, params in tensor_param_counts(header).items():
+                        dtype_params[dtype] = dtype_params.get(dtype, 0) + params
+                param_count = sum(dtype_params.values())
+            except Exception:
+                dtype_params = {}
+        # the tree listing sizes every file, paths-info only fills the gaps
+        missing = [path for path in primary['files'] if tree_files[path][0] is None]
+        for start in range(0, len(missing), PATHS_INFO_BATCH):
+            for info in get_scheduler().call("paths-info", api.get_paths_info, repo_id=model_id,
+                                             paths=missing[start:start + PATHS_INFO_BATCH], revision=revision):
+                tree_files[info.path] = (info.size, tree_files[info.path][1])
+        file_bytes = sum(tree_files[path][0] or 0 for path in primary['files'])
+
+    config_json = {}
+    if has_config:
+        try:
+            # the config of the commit the files were listed at
+            config_json = download_model_config(model_id, token=api_key, revision=sha)
+        except Exception:
+            config_json = {}
+    hub_config = content.get('config') or {}
+    architectures = config_json.get('architectures') or hub_config.get('architectures') or [None]
+    main_dtype = config_json.get('torch_dtype') or dominant_dtype(dtype_params)
+    if param_count == 0 and file_bytes and main_dtype in PRECISION_BYTES:
+        # no safetensors metadata, infer from the file sizes
+        param_count = int(file_bytes / PRECISION_BYTES[main_dtype])
+
+    record = {
+        'model_id': model_id,
+        'sha': sha,
+        'architecture': architectures[0],
+        'model_type': config_json.get('model_type') or hub_config.get('model_type'),
+        'format': model_format,
+        'main_dtype': main_dtype,
+        'param_count': param_count,
+        'file_bytes': int(file_bytes),
+        'num_layers': config_value(config_json, 'num_hidden_layers'),
+        'kv_bytes_per_token': kv_cache_bytes_per_token(config_json),
+    }
+    return record, dtype_params, None
+
+def refresh_models(catalog, model_ids, api_key):
+    '''refresh models whose commit changed, returns the number of failures'''
+    failures = 0
+    for model_id in model_ids:
+        if not validate_model_id(model_id):
+            print(f"[FAILED] {model_id}: Invalid model ID format")
+            failures += 1
+            continue
+        known_sha = catalog.get_sha(model_id)
+        try:
+            record, dtype_params, error = fetch_catalog_record(model_id, api_key, known_sha)
+        except Exception as e:
+            record, error = None, str(e)
+        if error is not None:
+            print(f"[FAILED] {model_id}: {error}")
+            failures += 1
+        elif record is None:
+            print(f"[UNCHANGED] {model_id} ({known_sha})")
+        else:
+            catalog.upsert(record, dtype_params)
+            print(f"[UPDATED] {model_id} ({record['sha']})")
+    return failures
+
+def handle(args):
+    '''handle the index command'''
+    if args.index_command is None:
+        print("Please specify an index subcommand. Use --help for more information.")
+        return 1
+
+    if args.db == INDEX_FILE:
+        ensure_config_dir()
+    with Catalog(args.db) as catalog:
+        if args.index_command in ("add", "refresh"):
+            config = read_config()
+            if config['api_key'] is None:
+                print("ERROR: No HuggingFace API key specified.")
+                return 1
+            disable_progress_bars()
+            model_ids = args.model_ids if args.index_command == "add" else catalog.model_ids()
+            return 1 if refresh_models(catalog, model_ids, config['api_key']) else 0
+
+        elif args.index_command == "remove":
+            status = 0
+            for model_id in args.model_ids:
+                if catalog.remove(model_id):
+                    print(f"Removed {model_id}")
+                else:
+                    print(f"Model {model_id} is not in the catalog.")
+                    status = 1
+            return status
+
+        elif args.index_command == "query":
+            return handle_query(args, catalog)
+
+def handle_query(args, catalog):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        if args.precision not in PRECISION_BYTES:
+            print(f"Invalid precision: {args.precision}")
+            print(f"Valid precisions: {list(PRECISION_BYTES)}")
+            return 1
+        entries = catalog.query(precision=args.precision, max_memory_gb=args.max_memory,
+                                context_length=args.context, batch_size=args.batch_size,
+                                architecture=args.architecture, model_format=args.format,
+                                min_params=args.min_params, max_params=args.max_params,
+                                sort=args.sort, limit=args.limit)
+        print(f"{len(entries)} model(s) at {args.precision}"
+              + (f" within {args.max_memory:.2f} GB" if args.max_memory is not None else "")
+              + (f" with {args.context} tokens of context" if args.context else ""))
+        for entry in entries:
+            print(f"  • {entry.model_id}: {entry.param_count:,} params, {entry.architecture}, "
+                  f"{entry.format}, requires {entry.required_gb:.2f} GB")
+    for entry in entries:
+        writer.write(entry)
+    writer.close()
+    return 0
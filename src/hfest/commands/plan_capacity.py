@@ -0,0 +1,165 @@
+from .estimate_size import estimate_model_files, validate_model_id, config_downloader
+from .estimate_resource import PRECISION_LEVELS, GREEN, RED, RESET
+from ..core.capacity import parse_mix, replica_performance, size_replicas, TP_DEGREES
+from ..core.hardware import GPU_CATALOG, find_gpu
+from ..core.memory import PRECISION_BYTES, weight_bytes, kv_cache_bytes
+from ..core.results import CapacityOption, CapacityPlan, model_estimate_from_total
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter
+import argparse
+import dataclasses
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("plan-capacity", help="Find the cheapest GPUs serving a model at a target QPS and latency")
+    parser.add_argument("model_id", help="Hugging Face model ID (e.g., meta-llama/Llama-2-7b)")
+    parser.add_argument("--qps", type=float, required=True, help="Requests per second to serve")
+    parser.add_argument("--ttft_ms", type=float, default=1000.0, help="p95 time to first token target, in milliseconds")
+    parser.add_argument("--tpot_ms", type=float, default=None, help="Time per output token target, in milliseconds")
+    parser.add_argument("--mix", type=str, default="512:128", help="Request mix as INPUT:OUTPUT[:WEIGHT] token counts, comma separated (e.g. 512:128:0.7,2048:256:0.3)")
+    parser.add_argument("--precision", type=str, default="auto", help="Weight precision (auto = the stored dtype, float32, float16, bfloat16, int8, int4)")
+    parser.add_argument("--gpus", type=str, default=None, help=f"Comma separated GPU types to consider (default: {', '.join(GPU_CATALOG)})")
+    parser.add_argument("--price", type=str, action="append", default=[], metavar="GPU=USD", help="Hourly price of a GPU type, overrides the catalog")
+    parser.add_argument("--max_batch", type=int, default=256, help="Most sequences a replica batches")
+    parser.add_argument("--max_utilization", type=float, default=0.8, help="Highest utilization a replica is planned at")
+    add_output_argument(parser)
+    return parser
+
+
+def parse_prices(prices):
+    '''["H100-SXM=3.2"] -> {"H100-SXM": 3.2}, raises ValueError on unknown GPUs or malformed prices'''
+    parsed = {}
+    for item in prices:
+        name, _, price = item.partition("=")
+        spec = find_gpu(name.strip())
+        if spec is None:
+            raise ValueError(f"Unknown GPU type: {name}")
+        parsed[spec.name] = float(price)
+    return parsed
+
+def select_gpus(names, prices):
+    '''catalog entries of the requested GPU types with the price overrides applied'''
+    if names:
+        specs = []
+        for name in names.split(","):
+            spec = find_gpu(name.strip())
+            if spec is None:
+                raise ValueError(f"Unknown GPU type: {name.strip()}")
+            specs.append(spec)
+    else:
+        specs = list(GPU_CATALOG.values())
+    return [dataclasses.replace(spec, price_per_hour=prices[spec.name]) if spec.name in prices else spec
+            for spec in specs]
+
+def plan_options(specs, param_count, precision, kv_bytes_per_token, mix, qps, ttft, tpot=None,
+                 max_batch=256, max_utilization=0.8):
+    '''
+    every (GPU type, tensor parallel degree) option sized for the SLO, cheapest first.
+    Options missing the SLO come last with the reason. ttft and tpot are in seconds
+    '''
+    # replica_performance keeps MEMORY_UTILIZATION of the GPU memory as headroom
+    weights = weight_bytes(param_count, precision)
+    options = []
+    for spec in specs:
+        for tp in TP_DEGREES:
+            if tp > spec.gpus_per_node:
+                continue
+            option = CapacityOption(gpu=spec.name, tensor_parallel=tp)
+            options.append(option)
+            performance = replica_performance(spec, tp, weights, param_count, kv_bytes_per_token, mix, max_batch, tpot)
+            if performance is None:
+                option.reason = f"weights and one sequence need more than {tp} x {spec.memory_gb:g} GB"
+                continue
+            option.batch_size = performance['batch']
+            option.replica_capacity_rps = performance['capacity']
+            option.tpot_ms = performance['step'] * 1000
+            if tpot is not None and performance['step'] > tpot:
+                option.reason = f"a decode step takes {option.tpot_ms:.1f} ms"
+                continue
+            replicas, utilization, ttft_p95 = size_replicas(performance, qps, ttft, max_utilization)
+            option.ttft_p95_ms = ttft_p95 * 1000
+            if replicas is None:
+                option.reason = f"prefill alone takes {option.ttft_p95_ms:.0f} ms"
+                continue
+            option.replicas = replicas
+            option.gpus = replicas * tp
+            option.utilization = utilization
+            option.cost_per_hour = option.gpus * spec.price_per_hour
+            option.meets_slo = True
+    # cheapest first, fewer GPUs breaking ties
+    return sorted(options, key=lambda o: (not o.meets_slo, o.cost_per_hour or 0, o.gpus or 0))
+
+def print_options(options):
+    print(f"{'GPU':<10} {'TP':>3} {'Replicas':>8} {'GPUs':>5} {'Batch':>6} {'Util':>6} {'TTFT p95':>10} {'TPOT':>8} {'USD/h':>8}")
+    for i, option in enumerate(options):
+        if not option.meets_slo:
+            print(f"{option.gpu:<10} {option.tensor_parallel:>3}  {RED}[NO]{RESET} {option.reason}")
+            continue
+        label = f" {GREEN}[CHEAPEST]{RESET}" if i == 0 else ""
+        print(f"{option.gpu:<10} {option.tensor_parallel:>3} {option.replicas:>8} {option.gpus:>5} {option.batch_size:>6} "
+              f"{option.utilization:>6.0%} {option.ttft_p95_ms:>8.0f}ms {option.tpot_ms:>6.1f}ms {option.cost_per_hour:>8.2f}{label}")
+
+def validate_args(args):
+    if not validate_model_id(args.model_id):
+        print(f"Invalid model ID format: {args.model_id}")
+        return False
+    if args.precision not in PRECISION_LEVELS + ['auto']:
+        print(f"Invalid precision: {args.precision}")
+        print(f"Valid precisions: {PRECISION_LEVELS}")
+        return False
+    if args.qps <= 0 or args.ttft_ms <= 0 or (args.tpot_ms is not None and args.tpot_ms <= 0) or args.max_batch < 1:
+        print("--qps, --ttft_ms, --tpot_ms and --max_batch must be positive")
+        return False
+    if not 0 < args.max_utilization <= 1:
+        print("--max_utilization must be in (0, 1]")
+        return False
+    return True
+
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        if not validate_args(args):
+            return 1
+        try:
+            mix = parse_mix(args.mix)
+            specs = select_gpus(args.gpus, parse_prices(args.price))
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return 1
+
+        print(f"Model: {args.model_id}")
+        print("----------------------------------------")
+        estimated_total = estimate_model_files(argparse.Namespace(model_id=args.model_id))
+        print("----------------------------------------")
+        plan = CapacityPlan(model=model_estimate_from_total(args.model_id, estimated_total), qps=args.qps,
+                            ttft_p95_ms=args.ttft_ms, tpot_ms=args.tpot_ms, mix=[list(item) for item in mix])
+        param_count = (estimated_total or {}).get('PARAM_COUNT') or 0
+        if param_count == 0:
+            print("ERROR: The parameter count of the model is unknown, unable to plan capacity.")
+            writer.write(plan)
+            writer.close()
+            return 1
+
+        precision = args.precision
+        if precision == 'auto':
+            main_dtype = estimated_total.get('MODEL_DTYPES', (None, []))[0]
+            precision = main_dtype if main_dtype in PRECISION_BYTES else 'float16'
+        plan.precision = precision
+        kv_per_token = kv_cache_bytes(estimated_total, 1, config_downloader(args.model_id))
+        tpot = args.tpot_ms / 1000 if args.tpot_ms is not None else None
+        plan.options = plan_options(specs, param_count, precision, kv_per_token, mix, args.qps, args.ttft_ms / 1000,
+                                    tpot, args.max_batch, args.max_utilization)
+        plan.best = plan.options[0] if plan.options and plan.options[0].meets_slo else None
+
+        mix_text = ", ".join(f"{i}->{o} tokens ({w:.0%})" for i, o, w in mix)
+        print(f"Target: {args.qps:g} requests/s, p95 TTFT <= {args.ttft_ms:g} ms"
+              + (f", TPOT <= {args.tpot_ms:g} ms" if args.tpot_ms is not None else "") + f", mix {mix_text}, {precision} weights")
+        print_options(plan.options)
+        if plan.best is None:
+            print("No configuration meets the SLO.")
+        else:
+            best = plan.best
+            print(f"Cheapest: {best.replicas} replica(s) of {best.tensor_parallel} x {best.gpu} "
+                  f"({best.gpus} GPUs, {best.cost_per_hour:.2f} USD/h, {best.utilization:.0%} utilized)")
+    writer.write(plan)
+    writer.close()
+    return 0 if plan.best is not None else 1
@@ -0,0 +1,130 @@
+from .estimate_size import estimate_model_files, validate_model_id, config_downloader
+from .estimate_resource import PRECISION_LEVELS, MARGIN_OF_SAFETY, GREEN, RESET
+from ..core.hardware import NETWORKS, parse_cluster
+from ..core.memory import PRECISION_BYTES, config_value, kv_cache_bytes_per_token, weight_bytes, model_config
+from ..core.parallel import rank_placements
+from ..core.results import ClusterPlan, ParallelOption, model_estimate_from_total
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter
+import argparse
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("plan-cluster", help="Recommend tensor, pipeline and data parallel splits of a model over a multi-node cluster")
+    parser.add_argument("model_id", help="Hugging Face model ID (e.g., meta-llama/Llama-3.1-405B)")
+    parser.add_argument("--cluster", type=str, required=True, help="Nodes x GPUs per node x GPU type (e.g. 4x8xH100-SXM, or 4xH100-SXM)")
+    parser.add_argument("--network", type=str, default="ib-ndr", help=f"Fabric between nodes ({', '.join(NETWORKS)}) or a NIC speed in Gbit/s")
+    parser.add_argument("--nics_per_node", type=int, default=None, help="NICs of each node (default: one per GPU)")
+    parser.add_argument("--intra", type=str, default=None, choices=["nvlink", "pcie"], help="Links between the GPUs of a node (default: what the GPU type has)")
+    parser.add_argument("--precision", type=str, default="auto", help="Weight precision (auto = the stored dtype, float32, float16, bfloat16, int8, int4)")
+    parser.add_argument("--batch", type=int, default=64, help="Sequences each replica decodes at once")
+    parser.add_argument("--context", type=int, default=4096, help="Tokens of context of each sequence")
+    parser.add_argument("--micro_batches", type=int, default=4, help="Micro-batches the batch is split into for pipeline parallelism")
+    parser.add_argument("--top", type=int, default=10, help="Splits to print")
+    add_output_argument(parser)
+    return parser
+
+
+def parallel_option(placement):
+    return ParallelOption(
+        tensor_parallel=placement['tp'],
+        pipeline_parallel=placement['pp'],
+        data_parallel=placement['dp'],
+        memory_per_gpu_gb=placement['memory_per_gpu'] / 1024 ** 3,
+        fits=placement['fits'],
+        tokens_per_second=placement['tokens_per_second'],
+        step_ms=placement['step'] * 1000,
+        compute_ms=placement['compute'] * 1000,
+        all_reduce_ms=placement['all_reduce'] * 1000,
+        p2p_ms=placement['p2p'] * 1000,
+        bubble=placement['bubble'],
+        penalty=placement['penalty'],
+        tp_crosses_nodes=placement['tp_crosses_nodes'],
+        inter_node_hops=placement['inter_node_hops'],
+    )
+
+def print_options(options, memory_gb):
+    print(f"{'TPxPPxDP':<12} {'GB/GPU':>8} {'Tokens/s':>10} {'Step':>9} {'All-reduce':>11} {'P2P':>8} {'Bubble':>7} {'Penalty':>8}")
+    for i, option in enumerate(options):
+        split = f"{option.tensor_parallel}x{option.pipeline_parallel}x{option.data_parallel}"
+        if not option.fits:
+            print(f"{split:<12} {option.memory_per_gpu_gb:>8.1f}  does not fit in {memory_gb:g} GB")
+            continue
+        notes = []
+        if i == 0:
+            notes.append(f"{GREEN}[BEST]{RESET}")
+        if option.tp_crosses_nodes:
+            notes.append("TP across nodes")
+        label = (" " + " ".join(notes)) if notes else ""
+        print(f"{split:<12} {option.memory_per_gpu_gb:>8.1f} {option.tokens_per_second:>10.0f} {option.step_ms:>7.1f}ms "
+              f"{option.all_reduce_ms:>9.2f}ms {option.p2p_ms:>6.3f}ms {option.bubble:>7.0%} {option.penalty:>8.0%}{label}")
+
+def validate_args(args):
+    if not validate_model_id(args.model_id):
+        print(f"Invalid model ID format: {args.model_id}")
+        return False
+    if args.precision not in PRECISION_LEVELS + ['auto']:
+        print(f"Invalid precision: {args.precision}")
+        print(f"Valid precisions: {PRECISION_LEVELS}")
+        return False
+    if args.batch < 1 or args.context < 1 or args.micro_batches < 1 or args.top < 1:
+        print("--batch, --context, --micro_batches and --top must be positive")
+        return False
+    if args.nics_per_node is not None and args.nics_per_node < 1:
+        print("--nics_per_node must be positive")
+        return False
+    return True
+
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        if not validate_args(args):
+            return 1
+        try:
+            cluster = parse_cluster(args.cluster, args.network, args.nics_per_node, args.intra)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            return 1
+
+        print(f"Model: {args.model_id}")
+        print("----------------------------------------")
+        estimated_total = estimate_model_files(argparse.Namespace(model_id=args.model_id))
+        print("----------------------------------------")
+        plan = ClusterPlan(model=model_estimate_from_total(args.model_id, estimated_total), cluster=cluster.gpu.name,
+                           nodes=cluster.nodes, gpus_per_node=cluster.gpus_per_node,
+                           intra_gbps=cluster.intra_gbps, inter_gbps=cluster.inter_gbps)
+        param_count = (estimated_total or {}).get('PARAM_COUNT') or 0
+        config_json = model_config(estimated_total, config_downloader(args.model_id)) if param_count else {}
+        layers = config_value(config_json, 'num_hidden_layers')
+        hidden = config_value(config_json, 'hidden_size')
+        if not param_count or not layers or not hidden:
+            print("ERROR: The parameter count or the layers of the model are unknown, unable to plan the cluster.")
+            writer.write(plan)
+            writer.close()
+            return 1
+
+        precision = args.precision
+        if precision == 'auto':
+            main_dtype = estimated_total.get('MODEL_DTYPES', (None, []))[0]
+            precision = main_dtype if main_dtype in PRECISION_BYTES else 'float16'
+        plan.precision = precision
+        model = {'params': param_count, 'weight_bytes': weight_bytes(param_count, precision), 'layers': layers,
+                 'hidden': hidden, 'kv_bytes_per_token': kv_cache_bytes_per_token(config_json)}
+        placements = rank_placements(cluster, model, args.batch, args.context, args.micro_batches,
+                                     heads=config_value(config_json, 'num_attention_heads'),
+                                     margin_of_safety=MARGIN_OF_SAFETY)
+        plan.options = [parallel_option(placement) for placement in placements]
+        plan.best = plan.options[0] if plan.options and plan.options[0].fits else None
+
+        print(f"Cluster: {cluster.nodes} x {cluster.gpus_per_node} x {cluster.gpu.name} "
+              f"({cluster.intra_gbps:g} GB/s per GPU within a node, {cluster.inter_gbps:g} GB/s between nodes)")
+        print(f"Workload: {args.batch} sequences of {args.context} tokens per replica in {args.micro_batches} micro-batches, {precision} weights")
+        print_options(plan.options[:args.top], cluster.gpu.memory_gb)
+        if plan.best is None:
+            print("No split fits the model in GPU memory.")
+        else:
+            best = plan.best
+            print(f"Recommended: TP={best.tensor_parallel} PP={best.pipeline_parallel} DP={best.data_parallel}, "
+                  f"{best.tokens_per_second:.0f} tokens/s with {best.penalty:.0%} lost to communication and the pipeline bubble")
+    writer.write(plan)
+    writer.close()
+    return 0 if plan.best is not None else 1
@@ -0,0 +1,370 @@
+from .estimate_size import estimate_model_files, validate_model_id, download_model_config
+from .estimate_resource import detect_gpu_info, analyze_fit, virtual_gpu_info, PRECISION_LEVELS, FILETYPE_LABELS
+from ..core.memory import kv_cache_bytes_per_token
+from ..core.results import ModelEstimate, ResourceEstimate, model_estimate_from_total, gpu_device_from_info
+from ..utils.config import read_config
+from ..utils.output import capture_thread_output
+from ..utils.scheduler import get_scheduler
+from ..utils import metrics
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.adapters import HTTPAdapter
+import argparse
+import json
+import requests
+import threading
+import time
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class EstimateError(Exception):
+    pass
+
+
+class CoalescingCache:
+    '''
+    Values cached for ttl seconds, at most max_entries of them: expired entries are
+    dropped when read or when the cache is full, then the least recently used ones.
+    Concurrent gets of a missing key share one fetch: the first caller runs it, the
+    others wait for its result. Failed fetches are not cached, every waiter gets the exception.
+    '''
+
+    def __init__(self, ttl, name="metadata", max_entries=1024):
+        self.ttl = ttl
+        self.name = name
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, fetch):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.cache_requests.inc(cache=self.name, result="hit")
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+                self.evictions += 1
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        metrics.cache_requests.inc(cache=self.name, result="miss" if owner else "coalesced")
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except Exception as e:
+            with self.lock:
+                del self.inflight[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            del self.inflight[key]
+            if len(self.entries) > self.max_entries:
+                self._evict()
+        future.set_result(value)
+        return value
+
+    def _evict(self):
+        '''drop the expired entries, then the least recently used ones over max_entries'''
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self.entries.items() if expires <= now]:
+            del self.entries[key]
+            self.evictions += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                    'evictions': self.evictions}
+
+
+class EstimationService:
+    '''
+    Estimates and fit checks for the serve command: model metadata comes from a
+    coalescing cache, the GPU inventory is refreshed on a background thread.
+    '''
+
+    def __init__(self, api_key, cache_ttl=600.0, gpu_refresh=30.0, workers=8, cache_size=1024):
+        self.api_key = api_key
+        self.cache = CoalescingCache(cache_ttl, max_entries=cache_size)
+        self.gpu_refresh = gpu_refresh
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hfest-serve")
+        self.gpu_info = []
+        self.gpu_updated = None
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+
+    def refresh_gpus(self):
+        with capture_thread_output():
+            gpu_info = detect_gpu_info()
+        # swapped in one assignment, requests in flight keep the list they read
+        self.gpu_info = gpu_info
+        self.gpu_updated = time.time()
+
+    def start(self):
+        self.refresh_gpus()
+        if self.gpu_refresh and self.gpu_refresh > 0:
+            self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self.refresh_thread.start()
+
+    def _refresh_loop(self):
+        while not self.stop_event.wait(self.gpu_refresh):
+            try:
+                self.refresh_gpus()
+            except Exception:
+                # keep serving the last inventory
+                pass
+
+    def close(self):
+        self.stop_event.set()
+        self.pool.shutdown(wait=False)
+
+    def _fetch_estimate(self, model_id):
+        with capture_thread_output() as output:
+            estimated_total = estimate_model_files(argparse.Namespace(model_id=model_id))
+        if estimated_total is None:
+            errors = [line[len("ERROR: "):] for line in output.getvalue().splitlines() if line.startswith("ERROR: ")]
+            raise EstimateError(errors[-1] if errors else "Unable to estimate model files")
+        return estimated_total
+
+    def estimate(self, model_id):
+        return self.cache.get(('estimate', model_id), lambda: self._fetch_estimate(model_id))
+
+    def model_config(self, model_id, estimated_total):
+        if estimated_total.get('MODEL_CONFIG') is not None:
+            return estimated_total['MODEL_CONFIG']
+        return self.cache.get(('config', model_id), lambda: download_model_config(model_id, token=self.api_key))
+
+    def fit(self, query, failures=None):
+        '''
+        ResourceEstimate of one query, errors are reported in the model status.
+        failures maps model IDs whose fetch already failed to the error, so they aren't fetched again
+        '''
+        model_id = query.get('model_id') if isinstance(query, dict) else None
+        try:
+            options = parse_fit_query(query)
+            if failures and model_id in failures:
+                raise failures[model_id]
+            estimated_total = self.estimate(model_id)
+            kv_cache_bytes = 0
+            if options['context']:
+                per_token = kv_cache_bytes_per_token(self.model_config(model_id, estimated_total))
+                kv_cache_bytes = per_token * options['context'] * options['batch_size']
+        except (EstimateError, ValueError) as e:
+            return ResourceEstimate(model=ModelEstimate(model_id=str(model_id), status="error", error=str(e)))
+        except Exception as e:
+            return ResourceEstimate(model=ModelEstimate(model_id=str(model_id), status="error", error=f"Estimate failed: {e}"))
+
+        gpu_info = options['gpus'] if options['gpus'] is not None else self.gpu_info
+        checks = analyze_fit(estimated_total, gpu_info, options['precision'], options['filetype'],
+                             kv_cache_bytes=kv_cache_bytes, verbose=False)
+        return ResourceEstimate(
+            model=model_estimate_from_total(model_id, estimated_total),
+            gpus=[gpu_device_from_info(gpu) for gpu in gpu_info],
+            checks=checks,
+        )
+
+    def fit_batch(self, queries):
+        '''fetch the distinct models of a batch concurrently, then answer every query'''
+        model_ids = {q.get('model_id') for q in queries if isinstance(q, dict) and isinstance(q.get('model_id'), str)
+                     and validate_model_id(q['model_id'])}
+        futures = {model_id: self.pool.submit(self.estimate, model_id) for model_id in model_ids}
+        failures = {model_id: future.exception() for model_id, future in futures.items() if future.exception()}
+        return [self.fit(query, failures) for query in queries]
+
+    def health(self):
+        return {'status': 'ok', 'gpus': len(self.gpu_info), 'gpu_updated': self.gpu_updated,
+                'cache': self.cache.stats()}
+
+
+def parse_fit_query(query):
+    '''validate a fit query, raises ValueError with the reason'''
+    if not isinstance(query, dict):
+        raise ValueError("A query must be a JSON object")
+    model_id = query.get('model_id')
+    if not isinstance(model_id, str) or not validate_model_id(model_id):
+        raise ValueError(f"Invalid model ID format: {model_id}")
+    precision = query.get('precision', 'all')
+    if precision not in PRECISION_LEVELS + ['all']:
+        raise ValueError(f"Invalid precision: {precision}")
+    filetype = query.get('filetype', 'auto')
+    if filetype not in [k for k, _ in FILETYPE_LABELS] + ['auto']:
+        raise ValueError(f"Invalid file type: {filetype}")
+    context, batch_size = query.get('context', 0), query.get('batch_size', 1)
+    if not isinstance(context, int) or context < 0:
+        raise ValueError(f"Invalid context: {context}")
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError(f"Invalid batch_size: {batch_size}")
+
+    gpus = None
+    if query.get('gpus') is not None:
+        # check against hypothetical GPUs instead of the detected ones
+        gpus = []
+        for gpu in query['gpus']:
+            try:
+                name, memory_gb, count = str(gpu['name']), float(gpu['memory_gb']), int(gpu.get('count', 1))
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("gpus entries need a name and memory_gb, and optionally a count")
+            gpus += [virtual_gpu_info(f"v{len(gpus) + i}", name, memory_gb) for i in range(count)]
+    return {'precision': precision, 'filetype': filetype, 'context': context, 'batch_size': batch_size, 'gpus': gpus}
+
+
+class EstimationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, host="127.0.0.1", port=8766):
+        super().__init__((host, port), EstimationHandler)
+        self.service = service
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class EstimationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # one write per response, see HubStandInHandler
+    wbufsize = 1 << 16
+
+    def do_GET(self):
+        self.measured(self.route_get)
+
+    def do_POST(self):
+        self.measured(self.route_post)
+
+    def measured(self, route):
+        # one label per route, not per model
+        path = "/v1/models" if self.path.startswith("/v1/models/") else self.path
+        if path not in ("/v1/health", "/v1/gpus", "/v1/models", "/v1/fit", "/metrics"):
+            path = "other"
+        self.status = None
+        metrics.http_in_flight.inc()
+        try:
+            with metrics.http_request_seconds.time(path=path):
+                route()
+        finally:
+            metrics.http_in_flight.dec()
+            metrics.http_requests.inc(path=path, status=str(self.status))
+
+    def route_get(self):
+        service = self.server.service
+        if self.path == "/metrics":
+            return self.send_body(200, 'text/plain; version=0.0.4; charset=utf-8', metrics.registry.render().encode())
+        if self.path == "/v1/health":
+            return self.send_json(200, service.health())
+        if self.path == "/v1/gpus":
+            return self.send_json(200, [asdict(gpu_device_from_info(gpu)) for gpu in service.gpu_info])
+        if self.path.startswith("/v1/models/"):
+            model_id = self.path[len("/v1/models/"):]
+            if not validate_model_id(model_id):
+                return self.send_json(400, {'error': f"Invalid model ID format: {model_id}"})
+            try:
+                return self.send_json(200, model_estimate_from_total(model_id, service.estimate(model_id)).to_dict())
+            except EstimateError as e:
+                return self.send_json(200, ModelEstimate(model_id=model_id, status="error", error=str(e)).to_dict())
+            except Exception as e:
+                return self.send_json(200, ModelEstimate(model_id=model_id, status="error",
+                                                         error=f"Estimate failed: {e}").to_dict())
+        self.send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def route_post(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self.send_json(413, {'error': "Request body too large"})
+        body = self.rfile.read(length)
+        if self.path != "/v1/fit":
+            return self.send_json(404, {'error': f"Unknown path: {self.path}"})
+        try:
+            query = json.loads(body)
+        except ValueError:
+            return self.send_json(400, {'error': "Request body is not valid JSON"})
+        service = self.server.service
+        if isinstance(query, list):
+            return self.send_json(200, [result.to_dict() for result in service.fit_batch(query)])
+        self.send_json(200, service.fit(query).to_dict())
+
+    def send_json(self, status, payload):
+        self.send_body(status, 'application/json', json.dumps(payload).encode())
+
+    def send_body(self, status, content_type, body):
+        self.status = status
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("serve", help="Serve estimates and fit checks as a local HTTP/JSON API")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8766, help="Port to listen on, 0 picks a free port")
+    parser.add_argument("--cache_ttl", type=float, default=600, help="Seconds model metadata stays cached")
+    parser.add_argument("--cache_size", type=int, default=1024, help="Models kept in the metadata cache, least recently used ones are dropped first")
+    parser.add_argument("--gpu_refresh", type=float, default=30, help="Seconds between GPU inventory refreshes, 0 disables them")
+    parser.add_argument("--workers", type=int, default=8, help="Models of a batch fetched concurrently, and pooled Hub connections")
+    return parser
+
+def handle(args):
+    api_key = read_config().get('api_key')
+    if api_key is None:
+        print("ERROR: No HuggingFace API key specified.")
+        return 1
+    if args.workers < 1 or args.cache_size < 1 or args.cache_ttl < 0 or args.gpu_refresh < 0:
+        print("ERROR: --workers and --cache_size must be at least 1, --cache_ttl and --gpu_refresh can't be negative.")
+        return 1
+
+    # keep Hub connections alive between requests
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=args.workers, pool_maxsize=args.workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    get_scheduler().session = session
+
+    service = EstimationService(api_key, cache_ttl=args.cache_ttl, gpu_refresh=args.gpu_refresh, workers=args.workers,
+                                cache_size=args.cache_size)
+    service.start()
+    try:
+        server = EstimationServer(service, host=args.host, port=args.port)
+    except OSError as e:
+        service.close()
+        print(f"ERROR: Unable to listen on {args.host}:{args.port}: {e}")
+        return 1
+
+    print(f"Serving estimates at {server.url} ({len(service.gpu_info)} GPU(s) detected)")
+    print("  GET  /v1/health, /v1/gpus, /v1/models/{model_id}, /metrics")
+    print("  POST /v1/fit  a query object or a list of them")
+    print("Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    print(f"Stopped: {service.cache.stats()}")
+    return 0
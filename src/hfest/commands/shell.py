@@ -0,0 +1,222 @@
+from .estimate_size import estimate_model_files, validate_model_id, config_downloader
+from .estimate_resource import (detect_gpu_info, print_gpu_info, analyze_fit, virtual_gpu_info,
+                                PRECISION_LEVELS, FILETYPE_LABELS)
+from ..core.memory import kv_cache_bytes
+from ..utils.output import run_in_background
+import argparse
+import cmd
+import shlex
+
+SEPARATOR = "----------------------------------------"
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("shell", help="Interactive session that keeps auth, model metadata and detected GPUs in memory")
+    parser.add_argument("model_ids", nargs="*", help="Models to estimate when the session starts")
+    return parser
+
+
+class HfestShell(cmd.Cmd):
+    '''
+    Estimates are fetched from the Hub once per model and GPUs are detected once
+    per session, changing settings or GPUs only reruns the fit analysis.
+    '''
+    intro = "hfest shell. Type help or ? to list commands, quit to leave."
+    prompt = "hfest> "
+
+    def __init__(self, stdin=None):
+        super().__init__(stdin=stdin)
+        if stdin is not None:
+            self.use_rawinput = False
+        self.estimates = {}
+        self.gpu_info = None
+        self.hardware = None
+        self.virtual_gpus = 0
+        self.current = None
+        self.settings = {'precision': 'all', 'filetype': 'auto', 'context': 0, 'batch_size': 1}
+
+    def gpus(self):
+        '''GPUs of the session, waiting for the background detection on first use'''
+        if self.gpu_info is None:
+            hardware = self.hardware or run_in_background(detect_gpu_info)
+            self.hardware = None
+            self.gpu_info = hardware.join()
+        return self.gpu_info
+
+    def kv_cache_bytes(self, model_id):
+        # config.json is only downloaded once context is set, a failure is kept as an empty config
+        return kv_cache_bytes(self.estimates[model_id], self.settings['context'] * self.settings['batch_size'],
+                              config_downloader(model_id))
+
+    def fit(self, model_id):
+        print(f"Model: {model_id}")
+        print(SEPARATOR)
+        print_gpu_info(self.gpus())
+        print(SEPARATOR)
+        return analyze_fit(self.estimates[model_id], self.gpus(), self.settings['precision'],
+                           self.settings['filetype'], kv_cache_bytes=self.kv_cache_bytes(model_id))
+
+    def refit(self):
+        if self.current is not None:
+            self.fit(self.current)
+
+    def do_estimate(self, line):
+        '''estimate MODEL_ID [MODEL_ID ...]: fetch models from the Hub (once) and check them against the GPUs'''
+        model_ids = line.split()
+        if not model_ids:
+            print("Usage: estimate MODEL_ID [MODEL_ID ...]")
+            return
+        for model_id in model_ids:
+            if model_id not in self.estimates:
+                if self.gpu_info is None and self.hardware is None:
+                    # detect GPUs while the first model is fetched
+                    self.hardware = run_in_background(detect_gpu_info)
+                print(f"Model: {model_id}")
+                print(SEPARATOR)
+                try:
+                    estimated_total = estimate_model_files(argparse.Namespace(model_id=model_id))
+                except Exception as e:
+                    # a Hub or network failure skips this model, the session and its caches stay
+                    print(f"ERROR: Unable to estimate {model_id}: {e}")
+                    estimated_total = None
+                print(SEPARATOR)
+                if estimated_total is None:
+                    continue
+                self.estimates[model_id] = estimated_total
+            self.current = model_id
+            self.fit(model_id)
+
+    def do_fit(self, line):
+        '''fit [MODEL_ID]: rerun the fit analysis from memory, for the last model by default'''
+        model_id = line.strip() or self.current
+        if model_id is None:
+            print("No model estimated yet. Use: estimate MODEL_ID")
+            return
+        if model_id not in self.estimates:
+            print(f"{model_id} is not loaded. Use: estimate {model_id}")
+            return
+        self.current = model_id
+        self.fit(model_id)
+
+    def do_set(self, line):
+        '''set precision|filetype|context|batch_size VALUE: change a setting and rerun the fit analysis'''
+        parts = line.split()
+        if len(parts) != 2 or parts[0] not in self.settings:
+            print(f"Usage: set {'|'.join(self.settings)} VALUE")
+            return
+        key, value = parts
+        if key == 'precision' and value not in PRECISION_LEVELS + ['all']:
+            print(f"Invalid precision: {value}")
+            print(f"Valid precisions: {PRECISION_LEVELS}")
+            return
+        if key == 'filetype' and value not in [k for k, _ in FILETYPE_LABELS] + ['auto']:
+            print(f"Invalid file type: {value}")
+            print(f"Valid file types: {[k for k, _ in FILETYPE_LABELS]}")
+            return
+        if key in ('context', 'batch_size'):
+            try:
+                value = int(value)
+            except ValueError:
+                value = -1
+            if value < (1 if key == 'batch_size' else 0):
+                print(f"Invalid {key}: {parts[1]}")
+                return
+        self.settings[key] = value
+        self.refit()
+
+    def do_show(self, line):
+        '''show: print the settings, loaded models and GPUs'''
+        for key, value in self.settings.items():
+            print(f"{key}: {value}")
+        print(f"models: {', '.join(self.estimates) or '-'}")
+        if self.gpu_info is not None:
+            print_gpu_info(self.gpu_info)
+
+    def do_gpus(self, line):
+        '''gpus: list the detected and added GPUs'''
+        print_gpu_info(self.gpus())
+
+    def do_add_gpu(self, line):
+        '''add_gpu NAME MEMORY_GB [COUNT]: add hypothetical GPUs with all memory free, e.g. add_gpu "H100 80GB" 80 2'''
+        try:
+            parts = shlex.split(line)
+            name, memory_gb = parts[0], float(parts[1])
+            count = int(parts[2]) if len(parts) > 2 else 1
+        except (ValueError, IndexError):
+            print("Usage: add_gpu NAME MEMORY_GB [COUNT]")
+            return
+        for _ in range(count):
+            self.gpus().append(virtual_gpu_info(f"v{self.virtual_gpus}", name, memory_gb))
+            self.virtual_gpus += 1
+        self.refit()
+
+    def do_remove_gpu(self, line):
+        '''remove_gpu INDEX: drop a GPU from the analysis, e.g. remove_gpu 0 or remove_gpu v1'''
+        index = line.strip()
+        remaining = [gpu for gpu in self.gpus() if str(gpu['index']) != index]
+        if len(remaining) == len(self.gpus()):
+            print(f"No GPU with index {index}")
+            return
+        self.gpu_info = remaining
+        self.refit()
+
+    def do_refresh(self, line):
+        '''refresh [gpus|models]: detect GPUs again and/or refetch the loaded models from the Hub'''
+        target = line.strip()
+        if target not in ('', 'gpus', 'models'):
+            print("Usage: refresh [gpus|models]")
+            return
+        if target in ('', 'gpus'):
+            added = [gpu for gpu in self.gpus() if gpu.get('virtual')]
+            self.gpu_info = detect_gpu_info() + added
+        if target in ('', 'models'):
+            for model_id in list(self.estimates):
+                try:
+                    estimated_total = estimate_model_files(argparse.Namespace(model_id=model_id))
+                except Exception as e:
+                    print(f"ERROR: Unable to refresh {model_id}, keeping the loaded estimate: {e}")
+                    continue
+                if estimated_total is None:
+                    del self.estimates[model_id]
+                else:
+                    self.estimates[model_id] = estimated_total
+            if self.current not in self.estimates:
+                self.current = None
+        self.refit()
+
+    def do_models(self, line):
+        '''models: list the models loaded in this session'''
+        for model_id, estimated_total in self.estimates.items():
+            sizes = ", ".join(f"{k}: {estimated_total.get(k, 0) / (1024 ** 3):.2f} GB"
+                              for k, _ in FILETYPE_LABELS if estimated_total.get(k, 0) > 0)
+            print(f"{'*' if model_id == self.current else ' '} {model_id} ({sizes or 'no model files'})")
+
+    def do_quit(self, line):
+        '''quit: leave the shell'''
+        return True
+
+    do_exit = do_quit
+
+    def do_EOF(self, line):
+        print()
+        return True
+
+    def emptyline(self):
+        pass
+
+    def default(self, line):
+        print(f"Unknown command: {line.split()[0]}. Type help to list commands.")
+
+
+def handle(args):
+    shell = HfestShell()
+    invalid = [model_id for model_id in args.model_ids if not validate_model_id(model_id)]
+    if invalid:
+        print(f"Invalid model ID format: {', '.join(invalid)}")
+        return 1
+    if args.model_ids:
+        shell.do_estimate(" ".join(args.model_ids))
+    try:
+        shell.cmdloop()
+    except KeyboardInterrupt:
+        print()
+    return 0
@@ -0,0 +1,183 @@
+from .estimate_size import iter_hub_models
+from .index import fetch_catalog_record
+from ..core.catalog import Catalog
+from ..core.results import SweepResult
+from ..core.memory import PRECISION_BYTES
+from ..utils.config import read_config, CONFIG_DIR, INDEX_FILE, ensure_config_dir
+from ..utils.output import human_output, ResultWriter
+from ..utils.scheduler import get_scheduler
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from huggingface_hub.utils import disable_progress_bars
+import hashlib
+import json
+import os
+
+SWEEP_DIR = os.path.join(CONFIG_DIR, "sweeps")
+
+
+class SweepCheckpoint:
+    '''
+    Progress of a sweep: the IDs of the estimated models, one per line. Failed models
+    aren't recorded so a resumed sweep retries them. The Hub listing
+    order isn't stable and models get deleted, so a resumed sweep skips these IDs
+    wherever they show up rather than a prefix of the listing. Lines are appended as
+    models finish, so saving costs the same at any size.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.done_ids = set()
+        self._file = None
+
+    @property
+    def completed(self):
+        return len(self.done_ids)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r') as f:
+            self.done_ids = {line.strip() for line in f if line.strip()}
+        return True
+
+    def open(self):
+        '''rewrite the file with the loaded IDs (none after --restart) and keep it open for appends'''
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.writelines(f"{model_id}\n" for model_id in sorted(self.done_ids))
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a')
+
+    def finish(self, model_id):
+        '''mark a model done'''
+        self.done_ids.add(model_id)
+        if self._file is not None:
+            self._file.write(f"{model_id}\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def resume_listing(listing, checkpoint):
+    '''model IDs still to estimate, skipping what a previous run finished'''
+    for model_id in listing:
+        if model_id not in checkpoint.done_ids:
+            yield model_id
+
+
+def estimate_sweep_model(model_id, api_key):
+    try:
+        record, _, error = fetch_catalog_record(model_id, api_key)
+    except Exception as e:
+        record, error = None, str(e)
+    if error is not None:
+        return SweepResult(model_id=model_id, status="error", error=error), None
+    return SweepResult(
+        model_id=model_id,
+        sha=record['sha'],
+        architecture=record['architecture'],
+        format=record['format'],
+        main_dtype=record['main_dtype'],
+        param_count=record['param_count'],
+        bytes={precision: record['param_count'] * size for precision, size in PRECISION_BYTES.items()},
+    ), record
+
+
+def checkpoint_path(args):
+    if args.checkpoint:
+        return args.checkpoint
+    key = json.dumps({'author': args.author, 'filter': args.filter, 'search': args.search}, sort_keys=True)
+    return os.path.join(SWEEP_DIR, hashlib.sha256(key.encode()).hexdigest()[:16] + ".txt")
+
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("sweep", help="Estimate every model of an author or search filter on the Hub")
+    parser.add_argument("--author", type=str, default=None, help="Only models of this user or organization")
+    parser.add_argument("--filter", type=str, default=None, help="Only models with this tag (e.g., text-generation)")
+    parser.add_argument("--search", type=str, default=None, help="Only models whose ID contains this string")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of models listed")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of models estimated at the same time")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Checkpoint file, derived from the filters when omitted")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    parser.add_argument("--index", action="store_true", help="Also store every estimate in the local catalog (see hfest index)")
+    parser.add_argument("--output", type=str, default="text", choices=['text', 'ndjson'],
+                        help="Output format (text, ndjson). ndjson streams one result per line to stdout")
+    return parser
+
+
+def handle(args):
+    if not (args.author or args.filter or args.search):
+        print("Please specify at least one of --author, --filter or --search.")
+        return 1
+    config = read_config()
+    if config['api_key'] is None:
+        print("ERROR: No HuggingFace API key specified.")
+        return 1
+    disable_progress_bars()
+
+    ensure_config_dir()
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    checkpoint = SweepCheckpoint(checkpoint_path(args))
+    if not args.restart and checkpoint.load():
+        print(f"Resuming sweep after {checkpoint.completed} model(s) from {checkpoint.path}")
+    checkpoint.open()
+
+    writer = ResultWriter(args.output)
+    catalog = Catalog(INDEX_FILE) if args.index else None
+    # the listing is paged lazily, so only one page and the in-flight models are held in memory
+    listing = iter_hub_models(config['api_key'], author=args.author, filter=args.filter,
+                              search=args.search, limit=args.limit)
+
+    failures = 0
+    with human_output(args.output), ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        in_flight = {}
+
+        def collect(done):
+            nonlocal failures
+            for future in done:
+                model_id = in_flight.pop(future)
+                result, record = future.result()
+                position = checkpoint.completed + failures + 1
+                writer.write(result)
+                if result.status == "ok":
+                    print(f"[{position}] {model_id}: {result.param_count:,} params, {result.format}")
+                    if catalog is not None:
+                        catalog.upsert(record)
+                    checkpoint.finish(model_id)
+                else:
+                    # rate limits, 5xx and timeouts pass, so a resumed sweep tries the model again
+                    print(f"[{position}] {model_id}: FAILED {result.error}")
+                    failures += 1
+
+        try:
+            for model_id in resume_listing(listing, checkpoint):
+                if len(in_flight) >= args.concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(estimate_sweep_model, model_id, config['api_key'])] = model_id
+            collect(wait(in_flight).done)
+        except RuntimeError as e:
+            collect(wait(in_flight).done)
+            print(f"ERROR: {e}. Progress saved to {checkpoint.path}")
+            return 1
+        except KeyboardInterrupt:
+            executor.shutdown(wait=True, cancel_futures=True)
+            collect([f for f in list(in_flight) if f.done() and not f.cancelled()])
+            print(f"Interrupted, progress saved to {checkpoint.path}")
+            return 130
+        finally:
+            checkpoint.close()
+            if catalog is not None:
+                catalog.close()
+
+        print(f"Sweep finished: {checkpoint.completed} model(s), {failures} failure(s). Checkpoint: {checkpoint.path}")
+        if failures:
+            print("Failed models are retried when the sweep is run again.")
+        print("Hub requests:")
+        for line in get_scheduler().report():
+            print(f"  • {line}")
+    writer.close()
+    return 1 if failures else 0
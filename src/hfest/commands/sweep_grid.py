@@ -0,0 +1,147 @@
+from .estimate_size import estimate_model_files, validate_model_id, config_downloader
+from .estimate_resource import PRECISION_LEVELS, MARGIN_OF_SAFETY
+from ..core import grid
+from ..core.grid import parse_axis, parse_device_set, evaluate_grid
+from ..core.hardware import GPU_CATALOG
+from ..core.memory import PRECISION_BYTES, kv_cache_bytes
+from ..utils.profiling import profiler
+import argparse
+import csv
+import os
+import time
+
+GRID_FORMATS = ['csv', 'parquet']
+# columns of the export, in order
+COLUMNS = ['model_id', 'precision', 'context', 'batch', 'devices', 'weights_gb', 'overhead_gb', 'kv_cache_gb',
+           'required_gb', 'memory_gb', 'fits', 'tokens_per_second']
+# rows per write, keeps the Python objects of a CSV export small
+CSV_CHUNK_ROWS = 65536
+
+def default_device_sets():
+    return ",".join(f"{count}x{name}" for name, spec in GPU_CATALOG.items()
+                    for count in (1, 2, 4, 8) if count <= spec.gpus_per_node)
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("sweep-grid", help="Export memory, fit and throughput over a grid of precisions, contexts, batch sizes and GPUs")
+    parser.add_argument("model_id", nargs="+", help="Hugging Face model ID(s) (e.g., meta-llama/Llama-2-7b)")
+    parser.add_argument("--precisions", type=str, default=",".join(PRECISION_LEVELS), help="Comma separated precisions")
+    parser.add_argument("--contexts", type=str, default="1k:128k:x2", help="Context lengths, comma separated values or START:STOP:STEP / START:STOP:xFACTOR ranges")
+    parser.add_argument("--batches", type=str, default="1:256:x2", help="Batch sizes, same syntax as --contexts")
+    parser.add_argument("--devices", type=str, default=None, help="Comma separated device sets as COUNTxGPU (default: 1 to 8 of every catalog GPU)")
+    parser.add_argument("--out", type=str, required=True, help="File to write, .csv or .parquet")
+    parser.add_argument("--format", type=str, default=None, choices=GRID_FORMATS, help="Export format (default: from the --out extension)")
+    return parser
+
+
+def model_inputs(model_id):
+    '''(params, kv bytes per token) of a model, None when its parameter count is unknown'''
+    estimated_total = estimate_model_files(argparse.Namespace(model_id=model_id))
+    param_count = (estimated_total or {}).get('PARAM_COUNT') or 0
+    if param_count == 0:
+        print(f"ERROR: The parameter count of {model_id} is unknown, leaving it out of the grid.")
+        return None
+    return param_count, kv_cache_bytes(estimated_total, 1, config_downloader(model_id))
+
+def write_csv(path, columns, labels):
+    '''write the grid in chunks, the label columns are looked up from their index columns'''
+    rows = len(columns['fits'])
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for start in range(0, rows, CSV_CHUNK_ROWS):
+            chunk = slice(start, start + CSV_CHUNK_ROWS)
+            values = []
+            for name in COLUMNS:
+                if name in labels:
+                    index_name, names = labels[name]
+                    values.append([names[i] for i in columns[index_name][chunk].tolist()])
+                elif columns[name].dtype.kind == 'f':
+                    values.append(grid.np.round(columns[name][chunk], 4).tolist())
+                else:
+                    values.append(columns[name][chunk].tolist())
+            writer.writerows(zip(*values))
+
+def write_parquet(path, columns, labels):
+    '''write the grid with the label columns dictionary encoded, needs pyarrow'''
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow, install it with: pip install hfest[parquet]")
+    arrays = []
+    for name in COLUMNS:
+        if name in labels:
+            index_name, names = labels[name]
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(columns[index_name].astype('int32')), pa.array(names)))
+        else:
+            arrays.append(pa.array(columns[name]))
+    pq.write_table(pa.Table.from_arrays(arrays, names=COLUMNS), path)
+
+def validate_args(args):
+    for model_id in args.model_id:
+        if not validate_model_id(model_id):
+            print(f"Invalid model ID format: {model_id}")
+            return False
+    for precision in args.precisions.split(","):
+        if precision.strip() not in PRECISION_BYTES:
+            print(f"Invalid precision: {precision}")
+            print(f"Valid precisions: {PRECISION_LEVELS}")
+            return False
+    output_format = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    if output_format not in GRID_FORMATS:
+        print(f"Unknown export format of {args.out}, use a .csv or .parquet file or --format")
+        return False
+    return True
+
+def handle(args):
+    if grid.np is None:
+        print("ERROR: sweep-grid needs numpy, install it with: pip install hfest[grid]")
+        return 1
+    if not validate_args(args):
+        return 1
+    try:
+        precisions = [precision.strip() for precision in args.precisions.split(",")]
+        contexts = parse_axis(args.contexts)
+        batches = parse_axis(args.batches)
+        device_sets = [parse_device_set(item) for item in (args.devices or default_device_sets()).split(",")]
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    model_ids, models = [], []
+    for model_id in dict.fromkeys(args.model_id):
+        print(f"Model: {model_id}")
+        print("----------------------------------------")
+        inputs = model_inputs(model_id)
+        print("----------------------------------------")
+        if inputs is not None:
+            model_ids.append(model_id)
+            models.append(inputs)
+    if not models:
+        print("ERROR: No model to evaluate.")
+        return 1
+
+    start = time.perf_counter()
+    with profiler.phase("evaluate_grid"):
+        columns = evaluate_grid(models, precisions, contexts, batches,
+                                [(spec, count) for _, spec, count in device_sets], MARGIN_OF_SAFETY)
+    evaluated = time.perf_counter() - start
+    labels = {'model_id': ('model_index', model_ids), 'precision': ('precision_index', precisions),
+              'devices': ('devices_index', [label for label, _, _ in device_sets])}
+    output_format = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    try:
+        with profiler.phase(f"write_{output_format}"):
+            if output_format == 'parquet':
+                write_parquet(args.out, columns, labels)
+            else:
+                write_csv(args.out, columns, labels)
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        return 1
+
+    cells = len(columns['fits'])
+    print(f"{cells} cells ({len(models)} models x {len(precisions)} precisions x {len(contexts)} contexts x "
+          f"{len(batches)} batch sizes x {len(device_sets)} device sets) evaluated in {evaluated:.2f}s, "
+          f"{int(columns['fits'].sum())} fit")
+    print(f"Written to {args.out}")
+    return 0
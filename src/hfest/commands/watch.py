@@ -0,0 +1,179 @@
+from .estimate_size import estimate_model_files, validate_model_id, config_downloader
+from .estimate_resource import (detect_gpu_info, print_gpu_info, fit_targets, MARGIN_OF_SAFETY,
+                                PRECISION_LEVELS, FILETYPE_LABELS, GREEN, RED, RESET)
+from ..core.memory import kv_cache_bytes
+from ..core.results import WatchEvent
+from ..utils.gpu_monitor import open_gpu_probe, GpuProbeError
+from ..utils.output import add_output_argument, get_output_format, human_output, ResultWriter, capture_thread_output
+from ..utils import metrics
+import argparse
+import time
+
+def setup_parser(subparsers):
+    parser = subparsers.add_parser("watch", help="Poll free GPU memory and report when models start or stop fitting")
+    parser.add_argument("model_ids", nargs="+", help="Candidate models to watch")
+    parser.add_argument("--precision", type=str, default="all", help="precision level to check (all, float32, float16, bfloat16, int8, int4)")
+    parser.add_argument("--filetype", type=str, default="auto", help="Model file type to check (auto, safetensors, pytorch, onnx)")
+    parser.add_argument("--context", type=int, default=0, help="Tokens of KV cache to reserve per sequence")
+    parser.add_argument("--batch_size", type=int, default=1, help="Sequences the KV cache is reserved for")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between two polls of GPU memory")
+    parser.add_argument("--count", type=int, default=0, help="Stop after this many polls (0 = until interrupted)")
+    add_output_argument(parser)
+    return parser
+
+
+class RequirementTable:
+    '''
+    Free memory each model needs on one GPU at each precision, computed once so a
+    poll only compares numbers: rows of (model_id, format, precision, required_gb, needed_free_gb)
+    where needed_free_gb includes the margin of safety on the weights.
+    '''
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, model_id, estimated_total, precision="all", filetype="auto", kv_cache_bytes=0):
+        model_type, _, targets = fit_targets(estimated_total, precision, filetype)
+        kv_cache = kv_cache_bytes / (1024 ** 3)
+        for q, divisor in targets:
+            size = (estimated_total[model_type] / divisor) / (1024 ** 3)
+            self.rows.append((model_id, model_type, q, size + kv_cache, size * (1 + MARGIN_OF_SAFETY) + kv_cache))
+        return len(targets)
+
+
+class FitWatcher:
+    '''
+    Remembers on which GPU each row of a RequirementTable fits. update() returns an
+    event for every change, the first poll only reports what fits already.
+    '''
+
+    def __init__(self, table):
+        self.table = table
+        self.state = {}
+
+    def update(self, gpu_info, now=None):
+        now = time.time() if now is None else now
+        events = []
+        seen = set()
+        for gpu in gpu_info:
+            free = float(gpu['memory.free'].split(" ")[0]) / 1024
+            for model_id, model_type, q, required, needed in self.table.rows:
+                key = (model_id, q, str(gpu['index']))
+                seen.add(key)
+                fits = needed <= free
+                previous = self.state.get(key)
+                self.state[key] = fits
+                if previous == fits or (previous is None and not fits):
+                    continue
+                events.append(WatchEvent(time=now, event="fits" if fits else "unfit", model_id=model_id,
+                                         format=model_type, precision=q, gpu_index=str(gpu['index']),
+                                         gpu_name=gpu['name'], required_gb=required, free_gb=free))
+        # GPUs that went away (or stopped reporting) start over when they return
+        for key in set(self.state) - seen:
+            del self.state[key]
+        return events
+
+
+def print_event(event):
+    if event.event == "fits":
+        label = f"{GREEN}[FITS]{RESET}"
+    else:
+        label = f"{RED}[NO LONGER FITS]{RESET}"
+    stamp = time.strftime("%H:%M:%S", time.localtime(event.time))
+    print(f"{stamp} {label} {event.model_id} ({event.format}, {event.precision}) on GPU {event.gpu_index}: "
+          f"{event.gpu_name}. Needs {event.required_gb:.2f} GB, {event.free_gb:.2f} GB free", flush=True)
+
+def validate_args(args):
+    if args.precision not in PRECISION_LEVELS + ['all']:
+        print(f"Invalid precision: {args.precision}")
+        print(f"Valid precisions: {PRECISION_LEVELS}")
+        return False
+    filetypes = [k for k, _ in FILETYPE_LABELS]
+    if args.filetype not in filetypes + ['auto']:
+        print(f"Invalid file type: {args.filetype}")
+        print(f"Valid file types: {filetypes}")
+        return False
+    if args.interval <= 0 or args.context < 0 or args.batch_size < 1 or args.count < 0:
+        print("--interval and --batch_size must be positive, --context and --count can't be negative")
+        return False
+    invalid = [model_id for model_id in args.model_ids if not validate_model_id(model_id)]
+    if invalid:
+        print(f"Invalid model ID format: {', '.join(invalid)}")
+        return False
+    return True
+
+def read_with_vendor_tools():
+    # the OS and vendor detection report is printed once, not on every poll
+    with capture_thread_output():
+        return detect_gpu_info()
+
+def read_with_probe(probe):
+    def read():
+        gpu_info = probe.read()
+        metrics.record_gpu_info(gpu_info)
+        return gpu_info
+    return read
+
+def handle(args):
+    output_format = get_output_format(args)
+    writer = ResultWriter(output_format)
+    with human_output(output_format):
+        if not validate_args(args):
+            return 1
+        table = RequirementTable()
+        status = 0
+        for model_id in args.model_ids:
+            print(f"Model: {model_id}")
+            print("----------------------------------------")
+            estimated_total = estimate_model_files(argparse.Namespace(model_id=model_id))
+            print("----------------------------------------")
+            if estimated_total is None:
+                status = 1
+                continue
+            kv_cache = kv_cache_bytes(estimated_total, args.context * args.batch_size, config_downloader(model_id))
+            if table.add(model_id, estimated_total, args.precision, args.filetype, kv_cache) == 0:
+                print(f"Nothing to watch for {model_id} at precision {args.precision}.")
+        if not table.rows:
+            print("No model to watch.")
+            return 1
+
+        probe = open_gpu_probe()
+        if probe is None:
+            # every poll spawns the vendor tools, slower but works everywhere estimate-resource does
+            print("No in-process GPU probe (NVML or amdgpu sysfs) available, polling with the vendor tools.")
+            gpu_info = detect_gpu_info()
+            read_gpus = read_with_vendor_tools
+        else:
+            print(f"Polling GPU memory through {probe.name} every {args.interval:g}s.")
+            read_gpus = read_with_probe(probe)
+            gpu_info = read_gpus()
+        print_gpu_info(gpu_info)
+        print("----------------------------------------")
+
+    watcher = FitWatcher(table)
+    polls = 0
+    next_poll = time.monotonic()
+    try:
+        while True:
+            events = watcher.update(gpu_info)
+            for event in events:
+                writer.write(event)
+                if output_format == 'text':
+                    print_event(event)
+            polls += 1
+            if args.count and polls >= args.count:
+                break
+            next_poll += args.interval
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+            gpu_info = read_gpus()
+    except KeyboardInterrupt:
+        pass
+    except GpuProbeError as e:
+        with human_output(output_format):
+            print(f"ERROR: {e}")
+        status = 1
+    finally:
+        if probe is not None:
+            probe.close()
+        writer.close()
+    return status
@@ -0,0 +1,96 @@
+"""Throughput and latency model of LLM serving, and the search for the cheapest deployment meeting an SLO."""
+import math
+
+# share of peak FLOPS reached by prefill, and of peak memory bandwidth by decode
+PREFILL_MFU = 0.5
+DECODE_BANDWIDTH_EFFICIENCY = 0.8
+# tensor parallelism speedup lost to the all-reduces of every layer
+TP_EFFICIENCY = {1: 1.0, 2: 0.9, 4: 0.8, 8: 0.7}
+# all-reduces over PCIe instead of NVLink
+PCIE_TP_EFFICIENCY = 0.75
+TP_DEGREES = (1, 2, 4, 8)
+# share of GPU memory for weights and KV cache, the rest holds activations and CUDA graphs
+MEMORY_UTILIZATION = 0.9
+MAX_REPLICAS = 1024
+
+
+def parse_mix(text):
+    '''
+    "512:128:0.7,2048:256:0.3" -> [(input_tokens, output_tokens, weight)] with the
+    weights summing to 1. The weight may be left out, the items then weigh the same
+    '''
+    mix = []
+    for item in text.split(","):
+        parts = item.strip().split(":")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid mix item {item!r}, expected INPUT:OUTPUT[:WEIGHT]")
+        input_tokens, output_tokens = int(parts[0]), int(parts[1])
+        weight = float(parts[2]) if len(parts) == 3 else 1.0
+        if input_tokens < 1 or output_tokens < 1 or weight <= 0:
+            raise ValueError(f"Invalid mix item {item!r}, token counts and weight must be positive")
+        mix.append((input_tokens, output_tokens, weight))
+    total = sum(weight for _, _, weight in mix)
+    return [(i, o, weight / total) for i, o, weight in mix]
+
+def replica_performance(spec, tp, weight_bytes, param_count, kv_bytes_per_token, mix, max_batch=256, tpot=None):
+    '''
+    Serving performance of one replica of tp GPUs of spec with continuous batching.
+    Prefill is compute bound, a decode step reads every weight and the KV cache of
+    the batch once. The batch is the most sequences of the mix the KV cache holds,
+    reduced until a decode step takes at most tpot seconds when given.
+    Returns {batch, prefill (seconds per mix item), step, capacity (requests/s)},
+    or None when the weights or a single sequence don't fit
+    '''
+    efficiency = TP_EFFICIENCY[tp] * (1.0 if spec.nvlink or tp == 1 else PCIE_TP_EFFICIENCY)
+    flops = spec.tflops * 1e12 * tp * efficiency * PREFILL_MFU
+    bandwidth = spec.bandwidth_gbps * 1e9 * tp * efficiency * DECODE_BANDWIDTH_EFFICIENCY
+    free = spec.memory_gb * 1024 ** 3 * tp * MEMORY_UTILIZATION - weight_bytes
+    sequence_tokens = sum((i + o) * w for i, o, w in mix)
+    if kv_bytes_per_token:
+        batch = min(max_batch, int(free // (kv_bytes_per_token * sequence_tokens)))
+    else:
+        batch = max_batch if free > 0 else 0
+    if batch < 1:
+        return None
+    # sequences are half way through their output on average
+    context = sum((i + o / 2) * w for i, o, w in mix)
+
+    def step_time(batch):
+        return max((weight_bytes + batch * context * kv_bytes_per_token) / bandwidth,
+                   2 * param_count * batch / flops)
+
+    while tpot is not None and batch > 1 and step_time(batch) > tpot:
+        batch //= 2
+    step = step_time(batch)
+    prefill = [max(2 * param_count * i / flops, weight_bytes / bandwidth) for i, _, _ in mix]
+    # GPU seconds per request: its prefill, and its share of the decode steps
+    service = sum(w * (p + o * step / batch) for p, (_, o, w) in zip(prefill, mix))
+    return {'batch': batch, 'prefill': prefill, 'step': step, 'capacity': 1 / service}
+
+def p95_queue_wait(arrival_rate, capacity):
+    '''95th percentile of the wait before service in an M/M/1 queue, inf when it is saturated'''
+    if arrival_rate >= capacity:
+        return math.inf
+    utilization = arrival_rate / capacity
+    if utilization <= 0.05:
+        return 0.0
+    return math.log(utilization / 0.05) / (capacity - arrival_rate)
+
+def size_replicas(performance, qps, ttft, max_utilization=0.8):
+    '''
+    fewest replicas serving qps with utilization at most max_utilization and a p95
+    time to first token (queue wait plus the longest prefill of the mix) at most ttft.
+    Returns (replicas, utilization, ttft_p95), replicas is None when no count does
+    '''
+    capacity = performance['capacity']
+    prefill = max(performance['prefill'])
+    replicas = max(1, math.ceil(qps / (capacity * max_utilization)))
+    while replicas <= MAX_REPLICAS:
+        arrival_rate = qps / replicas
+        ttft_p95 = p95_queue_wait(arrival_rate, capacity) + prefill
+        if ttft_p95 <= ttft:
+            return replicas, arrival_rate / capacity, ttft_p95
+        if prefill > ttft:
+            break
+        replicas += 1
+    return None, None, prefill
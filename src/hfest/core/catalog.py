@@ -0,0 +1,172 @@
+"""Local SQLite catalog of model metadata and estimates."""
+from dataclasses import dataclass, asdict
+from typing import Optional
+import sqlite3
+import time
+
+from .memory import PRECISION_BYTES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model_id TEXT PRIMARY KEY,
+    sha TEXT,
+    architecture TEXT,
+    model_type TEXT,
+    format TEXT,
+    main_dtype TEXT,
+    param_count INTEGER NOT NULL DEFAULT 0,
+    file_bytes INTEGER NOT NULL DEFAULT 0,
+    bytes_float32 INTEGER NOT NULL DEFAULT 0,
+    bytes_float16 INTEGER NOT NULL DEFAULT 0,
+    bytes_int8 INTEGER NOT NULL DEFAULT 0,
+    bytes_int4 INTEGER NOT NULL DEFAULT 0,
+    num_layers INTEGER,
+    kv_bytes_per_token INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS dtype_params (
+    model_id TEXT NOT NULL REFERENCES models(model_id) ON DELETE CASCADE,
+    dtype TEXT NOT NULL,
+    param_count INTEGER NOT NULL,
+    PRIMARY KEY (model_id, dtype)
+);
+CREATE INDEX IF NOT EXISTS idx_models_param_count ON models(param_count);
+CREATE INDEX IF NOT EXISTS idx_models_bytes_float32 ON models(bytes_float32);
+CREATE INDEX IF NOT EXISTS idx_models_bytes_float16 ON models(bytes_float16);
+CREATE INDEX IF NOT EXISTS idx_models_bytes_int8 ON models(bytes_int8);
+CREATE INDEX IF NOT EXISTS idx_models_bytes_int4 ON models(bytes_int4);
+CREATE INDEX IF NOT EXISTS idx_models_architecture ON models(architecture);
+CREATE INDEX IF NOT EXISTS idx_models_format ON models(format);
+"""
+
+# column holding the weight bytes for each precision, bfloat16 shares the float16 one
+PRECISION_COLUMNS = {'float32': 'bytes_float32', 'float16': 'bytes_float16', 'bfloat16': 'bytes_float16',
+                     'int8': 'bytes_int8', 'int4': 'bytes_int4'}
+SORT_COLUMNS = ('param_count', 'required_bytes', 'model_id')
+
+
+@dataclass
+class CatalogEntry:
+    """A model row of the catalog, with the memory required by a query when one was given."""
+    model_id: str
+    sha: Optional[str]
+    architecture: Optional[str]
+    model_type: Optional[str]
+    format: Optional[str]
+    main_dtype: Optional[str]
+    param_count: int
+    file_bytes: int
+    kv_bytes_per_token: int
+    required_gb: Optional[float] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _entry(row, required_gb=None):
+    return CatalogEntry(
+        model_id=row['model_id'], sha=row['sha'], architecture=row['architecture'],
+        model_type=row['model_type'], format=row['format'], main_dtype=row['main_dtype'],
+        param_count=row['param_count'], file_bytes=row['file_bytes'],
+        kv_bytes_per_token=row['kv_bytes_per_token'], required_gb=required_gb,
+    )
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        # catalogs created before the per-dtype table got its name
+        tables = {row['name'] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'tensors' in tables and 'dtype_params' not in tables:
+            self.conn.execute("ALTER TABLE tensors RENAME TO dtype_params")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_sha(self, model_id):
+        row = self.conn.execute("SELECT sha FROM models WHERE model_id = ?", (model_id,)).fetchone()
+        return row['sha'] if row else None
+
+    def get(self, model_id):
+        '''the CatalogEntry of a model, None when it isn't indexed'''
+        row = self.conn.execute("SELECT * FROM models WHERE model_id = ?", (model_id,)).fetchone()
+        return _entry(row) if row else None
+
+    def model_ids(self):
+        return [row['model_id'] for row in self.conn.execute("SELECT model_id FROM models ORDER BY model_id")]
+
+    def upsert(self, record, dtype_params=None):
+        '''
+        Insert or replace a model.
+        record holds the models columns except the per-precision bytes, which are
+        derived from param_count. dtype_params maps dtype to parameter count.
+        '''
+        row = dict(record)
+        for precision, column in PRECISION_COLUMNS.items():
+            row[column] = int(row.get('param_count', 0) * PRECISION_BYTES[precision])
+        row['updated_at'] = time.time()
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self.conn:
+            self.conn.execute(f"INSERT OR REPLACE INTO models ({columns}) VALUES ({placeholders})", tuple(row.values()))
+            self.conn.execute("DELETE FROM dtype_params WHERE model_id = ?", (row['model_id'],))
+            self.conn.executemany("INSERT INTO dtype_params (model_id, dtype, param_count) VALUES (?, ?, ?)",
+                                  [(row['model_id'], dtype, count) for dtype, count in (dtype_params or {}).items()])
+
+    def remove(self, model_id):
+        with self.conn:
+            return self.conn.execute("DELETE FROM models WHERE model_id = ?", (model_id,)).rowcount > 0
+
+    def dtype_params(self, model_id):
+        rows = self.conn.execute("SELECT dtype, param_count FROM dtype_params WHERE model_id = ?", (model_id,))
+        return {row['dtype']: row['param_count'] for row in rows}
+
+    def query(self, precision='float16', max_memory_gb=None, context_length=0, batch_size=1,
+              margin_of_safety=0.2, architecture=None, model_format=None,
+              min_params=None, max_params=None, sort='param_count', limit=None):
+        '''
+        Filter and rank models without contacting the Hub.
+        Required memory is the weights at precision plus margin_of_safety, the
+        same margin compare_single_setup applies, plus the KV cache of
+        batch_size sequences of context_length tokens.
+        '''
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort column: {sort}")
+        weights = PRECISION_COLUMNS[precision]
+        required = f"({weights} * ? + kv_bytes_per_token * ?)"
+        params = [1 + margin_of_safety, context_length * batch_size]
+        where = [f"{weights} > 0"]
+        if max_memory_gb is not None:
+            where.append(f"{required} <= ?")
+            params += [1 + margin_of_safety, context_length * batch_size, max_memory_gb * 1024 ** 3]
+        if architecture:
+            where.append("architecture = ?")
+            params.append(architecture)
+        if model_format:
+            where.append("format = ?")
+            params.append(model_format)
+        if min_params is not None:
+            where.append("param_count >= ?")
+            params.append(min_params)
+        if max_params is not None:
+            where.append("param_count <= ?")
+            params.append(max_params)
+        order = "model_id ASC" if sort == 'model_id' else f"{sort} DESC"
+        sql = (f"SELECT *, {required} AS required_bytes FROM models WHERE {' AND '.join(where)} "
+               f"ORDER BY {order}")
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [_entry(row, row['required_bytes'] / (1024 ** 3)) for row in self.conn.execute(sql, params)]
@@ -0,0 +1,114 @@
+"""Memory, fit and decode throughput over a cartesian grid of models, precisions, contexts, batches and device sets."""
+import re
+
+from .capacity import PREFILL_MFU, DECODE_BANDWIDTH_EFFICIENCY, TP_EFFICIENCY, PCIE_TP_EFFICIENCY
+from .hardware import find_gpu
+from .memory import PRECISION_BYTES
+
+try:
+    import numpy as np
+except ImportError:  # optional, pip install hfest[grid]
+    np = None
+
+DEVICE_SET_PATTERN = re.compile(r'^(?:(\d+)x)?(.+)$', re.IGNORECASE)
+# grid axes in the order cells are laid out, the last one varies fastest
+AXES = ('model', 'precision', 'context', 'batch', 'devices')
+
+
+def parse_axis(text):
+    '''
+    "1024,4096,32k" -> [1024, 4096, 32768]. An item may also be a range, START:STOP:STEP
+    adding STEP or START:STOP:xFACTOR multiplying by FACTOR, STOP included.
+    Raises ValueError on anything that isn't a positive integer
+    '''
+    def number(value):
+        value = value.strip().lower()
+        return int(value[:-1]) * 1024 if value.endswith("k") else int(value)
+
+    values = []
+    for item in text.split(","):
+        parts = item.split(":")
+        if len(parts) == 1:
+            values.append(number(parts[0]))
+            continue
+        if len(parts) != 3:
+            raise ValueError(f"Invalid range {item!r}, expected START:STOP:STEP or START:STOP:xFACTOR")
+        start, stop = number(parts[0]), number(parts[1])
+        step = parts[2].strip().lower()
+        geometric = step.startswith("x")
+        step = int(step[1:]) if geometric else number(step)
+        if start < 1 or step < (2 if geometric else 1):
+            raise ValueError(f"Invalid range {item!r}")
+        value = start
+        while value <= stop:
+            values.append(value)
+            value = value * step if geometric else value + step
+    if any(value < 1 for value in values):
+        raise ValueError(f"Invalid axis {text!r}, values must be positive")
+    return values
+
+def parse_device_set(text):
+    '''"8xH100-SXM" -> (label, GpuSpec, count), a bare GPU type is one GPU. Raises ValueError'''
+    match = DEVICE_SET_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid device set {text!r}, expected COUNTxTYPE")
+    count = int(match.group(1)) if match.group(1) else 1
+    spec = find_gpu(match.group(2))
+    if spec is None:
+        raise ValueError(f"Unknown GPU type: {match.group(2)}")
+    if count < 1:
+        raise ValueError(f"Invalid device set {text!r}, the GPU count must be positive")
+    return f"{count}x{spec.name}", spec, count
+
+def tp_efficiency(spec, count):
+    '''throughput kept by tensor parallelism over count GPUs, see core.capacity'''
+    efficiency = TP_EFFICIENCY[max(degree for degree in TP_EFFICIENCY if degree <= count)]
+    return efficiency * (1.0 if spec.nvlink or count == 1 else PCIE_TP_EFFICIENCY)
+
+def evaluate_grid(models, precisions, contexts, batches, device_sets, margin_of_safety=0.2):
+    '''
+    models are (params, kv_bytes_per_token) pairs and device_sets (GpuSpec, count) pairs.
+    Every cell is computed at once by broadcasting one array axis per grid axis: weights,
+    their margin of safety (the same overhead as compare_single_setup), the KV cache of
+    batch sequences of context tokens, whether it all fits in the memory of the set, and
+    the decode tokens/s of a tensor parallel replica over the set (0 where it doesn't fit).
+    Returns {column: flat array} with cells in AXES order, the *_index columns point into
+    the inputs
+    '''
+    if np is None:
+        raise RuntimeError("sweep-grid needs numpy, install it with: pip install hfest[grid]")
+    params = np.array([m[0] for m in models], dtype=np.float64).reshape(-1, 1, 1, 1, 1)
+    kv_per_token = np.array([m[1] for m in models], dtype=np.float64).reshape(-1, 1, 1, 1, 1)
+    precision_bytes = np.array([PRECISION_BYTES[p] for p in precisions], dtype=np.float64).reshape(1, -1, 1, 1, 1)
+    context = np.array(contexts, dtype=np.float64).reshape(1, 1, -1, 1, 1)
+    batch = np.array(batches, dtype=np.float64).reshape(1, 1, 1, -1, 1)
+    memory = np.array([spec.memory_gb * count for spec, count in device_sets], dtype=np.float64).reshape(1, 1, 1, 1, -1)
+    efficiency = np.array([tp_efficiency(spec, count) for spec, count in device_sets], dtype=np.float64)
+    bandwidth = (np.array([spec.bandwidth_gbps * 1e9 * count for spec, count in device_sets])
+                 * efficiency * DECODE_BANDWIDTH_EFFICIENCY).reshape(1, 1, 1, 1, -1)
+    flops = (np.array([spec.tflops * 1e12 * count for spec, count in device_sets])
+             * efficiency * PREFILL_MFU).reshape(1, 1, 1, 1, -1)
+
+    weights = params * precision_bytes
+    kv_cache = kv_per_token * context * batch
+    required = weights * (1 + margin_of_safety) + kv_cache
+    fits = required <= memory * 1024 ** 3
+    # a decode step reads every weight and the KV cache of the batch, or is compute bound
+    step = np.maximum((weights + kv_cache) / bandwidth, 2 * params * batch / flops)
+    tokens_per_second = np.where(fits, batch / step, 0.0)
+
+    shape = (len(models), len(precisions), len(contexts), len(batches), len(device_sets))
+    columns = {}
+    for axis, name in enumerate(AXES):
+        index = np.arange(shape[axis]).reshape([-1 if i == axis else 1 for i in range(len(shape))])
+        columns[f"{name}_index"] = np.broadcast_to(index, shape).ravel()
+    columns['context'] = np.broadcast_to(context, shape).ravel().astype(np.int64)
+    columns['batch'] = np.broadcast_to(batch, shape).ravel().astype(np.int64)
+    columns['weights_gb'] = np.broadcast_to(weights / 1024 ** 3, shape).ravel()
+    columns['overhead_gb'] = columns['weights_gb'] * margin_of_safety
+    columns['kv_cache_gb'] = np.broadcast_to(kv_cache / 1024 ** 3, shape).ravel()
+    columns['required_gb'] = np.broadcast_to(required / 1024 ** 3, shape).ravel()
+    columns['memory_gb'] = np.broadcast_to(memory, shape).ravel()
+    columns['fits'] = fits.ravel()
+    columns['tokens_per_second'] = tokens_per_second.ravel()
+    return columns
@@ -0,0 +1,136 @@
+"""Catalog of datacenter and workstation GPUs used by the planners."""
+from dataclasses import dataclass
+import re
+
+
+@dataclass(frozen=True)
+class GpuSpec:
+    """Published specs of one GPU model. price_per_hour is a rough on-demand cloud price in USD."""
+    name: str
+    memory_gb: float
+    # HBM/GDDR bandwidth in GB/s
+    bandwidth_gbps: float
+    # dense bf16/fp16 tensor throughput in TFLOPS
+    tflops: float
+    price_per_hour: float
+    # GPUs per node and whether they are linked by NVLink/Infinity Fabric, tensor parallelism
+    # past one node or over PCIe pays more for its all-reduces
+    gpus_per_node: int = 8
+    nvlink: bool = True
+    # GPU to GPU bandwidth inside a node in GB/s, one direction
+    link_gbps: float = 32
+
+
+GPU_CATALOG = {spec.name: spec for spec in (
+    GpuSpec("H200", 141, 4800, 989, 5.0, link_gbps=450),
+    GpuSpec("H100-SXM", 80, 3350, 989, 4.0, link_gbps=450),
+    GpuSpec("H100-PCIe", 80, 2000, 756, 3.0, nvlink=False, link_gbps=64),
+    GpuSpec("A100-80GB", 80, 2039, 312, 2.5, link_gbps=300),
+    GpuSpec("A100-40GB", 40, 1555, 312, 1.8, link_gbps=300),
+    GpuSpec("MI300X", 192, 5300, 1307, 4.0, link_gbps=448),
+    GpuSpec("L40S", 48, 864, 362, 1.5, nvlink=False),
+    GpuSpec("A10", 24, 600, 125, 1.0, gpus_per_node=4, nvlink=False),
+    GpuSpec("L4", 24, 300, 121, 0.8, nvlink=False),
+    GpuSpec("RTX-4090", 24, 1008, 165, 0.7, nvlink=False),
+)}
+
+
+# fabrics between nodes: (Gbit/s of one NIC, latency of one message in seconds)
+NETWORKS = {
+    'ib-xdr': (800, 5e-6),
+    'ib-ndr': (400, 5e-6),
+    'ib-hdr': (200, 5e-6),
+    'roce-400': (400, 10e-6),
+    'roce-200': (200, 10e-6),
+    'eth-100': (100, 30e-6),
+    'eth-25': (25, 30e-6),
+}
+# GPU to GPU links inside a node: (GB/s of a PCIe link, message latency of NVLink and of PCIe)
+PCIE_GBPS = 32
+NVLINK_LATENCY = 3e-6
+PCIE_LATENCY = 10e-6
+
+CLUSTER_PATTERN = re.compile(r'^(\d+)x(?:(\d+)x)?(.+)$', re.IGNORECASE)
+# names the vendor tools report (NVIDIA H100 80GB HBM3, NVIDIA A100-SXM4-40GB MIG 3g.20gb,
+# AMD Instinct MI300X) -> catalog entry, the first match wins
+DETECTED_GPU_PATTERNS = tuple((re.compile(pattern, re.IGNORECASE), name) for pattern, name in (
+    (r'H200', "H200"),
+    (r'H100.*PCIe', "H100-PCIe"),
+    (r'H100', "H100-SXM"),
+    (r'A100.*40GB', "A100-40GB"),
+    (r'A100', "A100-80GB"),
+    (r'MI300X', "MI300X"),
+    (r'L40S', "L40S"),
+    (r'\bA10\b', "A10"),
+    (r'\bL4\b', "L4"),
+    (r'RTX[ -]4090', "RTX-4090"),
+))
+
+
+@dataclass(frozen=True)
+class Cluster:
+    """nodes of gpus_per_node GPUs. Bandwidths are per GPU in GB/s, latencies in seconds."""
+    gpu: GpuSpec
+    nodes: int
+    gpus_per_node: int
+    intra_gbps: float
+    intra_latency: float
+    inter_gbps: float
+    inter_latency: float
+
+    @property
+    def total_gpus(self):
+        return self.nodes * self.gpus_per_node
+
+
+def find_gpu(name):
+    '''the catalog entry of a GPU, matching names case insensitively. None when unknown'''
+    for key, spec in GPU_CATALOG.items():
+        if key.lower() == name.lower():
+            return spec
+    return None
+
+def match_detected_gpu(name):
+    '''the catalog entry of a GPU as named by nvidia-smi or rocm-smi, None when unknown'''
+    for pattern, key in DETECTED_GPU_PATTERNS:
+        if pattern.search(name or ""):
+            return GPU_CATALOG[key]
+    return None
+
+def parse_cluster(text, network="ib-ndr", nics_per_node=None, intra=None):
+    '''
+    "4x8xH100-SXM" (nodes x GPUs per node x GPU type) or "4xH100-SXM" (the usual GPUs per node)
+    -> Cluster. network is a fabric of NETWORKS or a NIC speed in Gbit/s, with one NIC per
+    GPU unless nics_per_node is given. intra is "nvlink" or "pcie", by default what the GPU
+    type has. Raises ValueError on anything it doesn't know
+    '''
+    match = CLUSTER_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid cluster {text!r}, expected NODESxGPUSxTYPE or NODESxTYPE")
+    spec = find_gpu(match.group(3))
+    if spec is None:
+        raise ValueError(f"Unknown GPU type: {match.group(3)}")
+    nodes = int(match.group(1))
+    gpus_per_node = int(match.group(2)) if match.group(2) else spec.gpus_per_node
+    if nodes < 1 or gpus_per_node < 1:
+        raise ValueError(f"Invalid cluster {text!r}, node and GPU counts must be positive")
+
+    if network in NETWORKS:
+        nic_gbits, inter_latency = NETWORKS[network]
+    else:
+        try:
+            nic_gbits, inter_latency = float(network), NETWORKS['roce-400'][1]
+        except ValueError:
+            raise ValueError(f"Unknown network {network!r}, expected one of {', '.join(NETWORKS)} or Gbit/s")
+    nics = nics_per_node if nics_per_node is not None else gpus_per_node
+    inter_gbps = nic_gbits / 8 * nics / gpus_per_node
+
+    if intra is None:
+        intra = "nvlink" if spec.nvlink else "pcie"
+    if intra == "nvlink":
+        intra_gbps, intra_latency = spec.link_gbps, NVLINK_LATENCY
+    elif intra == "pcie":
+        intra_gbps, intra_latency = min(spec.link_gbps, PCIE_GBPS) if spec.nvlink else spec.link_gbps, PCIE_LATENCY
+    else:
+        raise ValueError(f"Unknown link {intra!r}, expected nvlink or pcie")
+    return Cluster(spec, nodes, gpus_per_node, intra_gbps, intra_latency, inter_gbps, inter_latency)
@@ -0,0 +1,134 @@
+"""Parsers for the tensor headers of safetensors and GGUF files, read from the first bytes of a file."""
+import json
+import struct
+
+# ggml tensor types, by the id GGUF stores
+GGML_TYPES = {0: 'F32', 1: 'F16', 2: 'Q4_0', 3: 'Q4_1', 6: 'Q5_0', 7: 'Q5_1', 8: 'Q8_0', 9: 'Q8_1',
+              10: 'Q2_K', 11: 'Q3_K', 12: 'Q4_K', 13: 'Q5_K', 14: 'Q6_K', 15: 'Q8_K', 16: 'IQ2_XXS',
+              17: 'IQ2_XS', 18: 'IQ3_XXS', 19: 'IQ1_S', 20: 'IQ4_NL', 21: 'IQ3_S', 22: 'IQ2_S', 23: 'IQ4_XS',
+              24: 'I8', 25: 'I16', 26: 'I32', 27: 'I64', 28: 'F64', 29: 'IQ1_M', 30: 'BF16'}
+
+# GGUF metadata value types: struct format of the scalars, 8 is a string and 9 an array
+GGUF_SCALARS = {0: '<B', 1: '<b', 2: '<H', 3: '<h', 4: '<I', 5: '<i', 6: '<f', 7: '<?', 10: '<Q', 11: '<q', 12: '<d'}
+GGUF_STRING = 8
+GGUF_ARRAY = 9
+GGUF_MAGIC = b"GGUF"
+
+
+class IncompleteHeader(Exception):
+    '''the header continues past the bytes read, needed is the total to read when known'''
+
+    def __init__(self, needed=None):
+        super().__init__(f"header needs {needed or 'more'} bytes")
+        self.needed = needed
+
+
+def safetensors_header_size(prefix):
+    '''bytes of the JSON header, from the 8 byte little endian length the file starts with'''
+    if len(prefix) < 8:
+        raise IncompleteHeader(8)
+    return struct.unpack('<Q', prefix[:8])[0]
+
+def parse_safetensors_header(data):
+    '''
+    {format, header_bytes, tensors: {name: [dtype, shape]}, metadata} from the
+    start of a safetensors file
+    '''
+    size = safetensors_header_size(data)
+    if len(data) < 8 + size:
+        raise IncompleteHeader(8 + size)
+    header = json.loads(data[8:8 + size])
+    metadata = header.pop('__metadata__', None) or {}
+    tensors = {name: [info['dtype'], info['shape']] for name, info in header.items()}
+    return {'format': 'safetensors', 'header_bytes': 8 + size, 'tensors': tensors, 'metadata': metadata}
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def take(self, size):
+        if self.offset + size > len(self.data):
+            raise IncompleteHeader()
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))[0]
+
+    def string(self):
+        return self.take(self.unpack('<Q')).decode('utf-8', errors='replace')
+
+    def value(self, value_type):
+        if value_type == GGUF_STRING:
+            return self.string()
+        if value_type == GGUF_ARRAY:
+            item_type, count = self.unpack('<I'), self.unpack('<Q')
+            if item_type in GGUF_SCALARS:
+                # skipped in one step, tokenizer arrays hold hundreds of thousands of items
+                self.take(count * struct.calcsize(GGUF_SCALARS[item_type]))
+            else:
+                for _ in range(count):
+                    self.value(item_type)
+            return None
+        if value_type not in GGUF_SCALARS:
+            raise ValueError(f"Unknown GGUF value type {value_type}")
+        return self.unpack(GGUF_SCALARS[value_type])
+
+def parse_gguf_header(data):
+    '''
+    {format, header_bytes, tensors: {name: [ggml type, shape]}, metadata} from the
+    start of a GGUF (v2 or v3) file. Array metadata (the tokenizer) is skipped
+    '''
+    reader = _Reader(data)
+    if reader.take(4) != GGUF_MAGIC:
+        raise ValueError("Not a GGUF file")
+    version = reader.unpack('<I')
+    if version < 2:
+        raise ValueError(f"Unsupported GGUF version {version}")
+    tensor_count, kv_count = reader.unpack('<Q'), reader.unpack('<Q')
+    metadata = {}
+    for _ in range(kv_count):
+        key = reader.string()
+        value = reader.value(reader.unpack('<I'))
+        if value is not None:
+            metadata[key] = value
+    tensors = {}
+    for _ in range(tensor_count):
+        name = reader.string()
+        dims = [reader.unpack('<Q') for _ in range(reader.unpack('<I'))]
+        ggml_type = reader.unpack('<I')
+        reader.unpack('<Q')  # data offset
+        # GGUF lists dimensions fastest varying first, safetensors the other way round
+        tensors[name] = [GGML_TYPES.get(ggml_type, str(ggml_type)), dims[::-1]]
+    return {'format': 'gguf', 'header_bytes': reader.offset, 'tensors': tensors, 'metadata': metadata}
+
+def tensor_param_counts(header):
+    '''{dtype: parameters} of a parsed header'''
+    counts = {}
+    for dtype, shape in header['tensors'].values():
+        params = 1
+        for dim in shape:
+            params *= dim
+        counts[dtype] = counts.get(dtype, 0) + params
+    return counts
+
+def merged_tensors(headers):
+    '''{name: [dtype, shape]} of the parsed headers of every shard of a checkpoint'''
+    tensors = {}
+    for header in headers:
+        tensors.update(header['tensors'])
+    return tensors
+
+def diff_tensors(old, new):
+    '''
+    (added, removed, changed) between two {name: [dtype, shape]} maps: the tensors only
+    in new, only in old, and in both with another dtype or shape, each sorted by name
+    '''
+    added = sorted(name for name in new if name not in old)
+    removed = sorted(name for name in old if name not in new)
+    changed = sorted(name for name in new if name in old and
+                     (new[name][0] != old[name][0] or list(new[name][1]) != list(old[name][1])))
+    return added, removed, changed
@@ -0,0 +1,77 @@
+"""Memory model of a transformer: weights at each precision and the KV cache."""
+
+PRECISION_BYTES = {'float32': 4, 'float16': 2, 'bfloat16': 2, 'int8': 1, 'int4': 0.5}
+
+# safetensors dtype names as reported by the Hub, mapped to precision levels
+SAFETENSORS_DTYPES = {'F64': 'float32', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+                      'F8_E4M3': 'int8', 'F8_E5M2': 'int8', 'I64': 'float32', 'I32': 'float32',
+                      'I16': 'float16', 'I8': 'int8', 'U8': 'int8', 'BOOL': 'int8'}
+
+# config.json key aliases used by the different architectures
+CONFIG_ALIASES = {
+    'num_hidden_layers': ('num_hidden_layers', 'n_layer', 'num_layers', 'n_layers'),
+    'num_attention_heads': ('num_attention_heads', 'n_head', 'num_heads'),
+    'num_key_value_heads': ('num_key_value_heads', 'num_kv_heads', 'multi_query_group_num'),
+    'hidden_size': ('hidden_size', 'n_embd', 'd_model'),
+}
+
+def config_value(config_json, key, default=None):
+    '''read a config.json value through its architecture specific aliases'''
+    # multimodal models keep the language model settings in a nested config
+    config_json = config_json.get('text_config', config_json) or config_json
+    for alias in CONFIG_ALIASES.get(key, (key,)):
+        if config_json.get(alias) is not None:
+            return config_json[alias]
+    return default
+
+def kv_cache_bytes_per_token(config_json, bytes_per_value=2):
+    '''
+    Bytes of KV cache one token occupies across all layers:
+    2 (key and value) * layers * kv heads * head dim * bytes per value.
+    Returns 0 when the config doesn't describe a transformer decoder.
+    '''
+    layers = config_value(config_json, 'num_hidden_layers')
+    heads = config_value(config_json, 'num_attention_heads')
+    hidden = config_value(config_json, 'hidden_size')
+    if not layers or not heads or not hidden:
+        return 0
+    kv_heads = config_value(config_json, 'num_key_value_heads', heads)
+    if config_json.get('multi_query', False):
+        kv_heads = 1
+    head_dim = config_value(config_json, 'head_dim') or hidden // heads
+    return int(2 * layers * kv_heads * head_dim * bytes_per_value)
+
+def weight_bytes(param_count, precision):
+    return param_count * PRECISION_BYTES[precision]
+
+def dominant_dtype(tensor_summary):
+    '''precision level holding most parameters of a {safetensors dtype: count} summary'''
+    if not tensor_summary:
+        return None
+    dtype = max(tensor_summary, key=tensor_summary.get)
+    return SAFETENSORS_DTYPES.get(dtype)
+
+def model_config(estimated_total, download_config):
+    '''
+    config.json of an estimate: the one it carries, else download_config()'s, kept in
+    the estimate so it is downloaded once. {} when the download fails
+    '''
+    if estimated_total.get('MODEL_CONFIG') is None:
+        try:
+            estimated_total['MODEL_CONFIG'] = download_config()
+        except Exception as e:
+            print(f"Failed to download config.json: {e}")
+            estimated_total['MODEL_CONFIG'] = {}
+    return estimated_total['MODEL_CONFIG'] or {}
+
+def kv_cache_bytes(estimated_total, tokens, download_config):
+    '''bytes of KV cache tokens tokens of an estimated model take, 0 when config.json can't tell'''
+    if tokens == 0:
+        return 0
+    config_json = model_config(estimated_total, download_config)
+    per_token = kv_cache_bytes_per_token(config_json)
+    if per_token == 0 and config_json:
+        print("config.json doesn't describe the attention layers, KV cache is not counted.")
+    elif per_token == 0:
+        print("KV cache is not counted without config.json.")
+    return per_token * tokens
@@ -0,0 +1,96 @@
+"""Placement of a model on a cluster: tensor, pipeline and data parallel splits and their communication cost."""
+import math
+
+from .capacity import PREFILL_MFU, DECODE_BANDWIDTH_EFFICIENCY, MEMORY_UTILIZATION
+
+# bytes of one activation value sent between GPUs (fp16/bf16)
+ACTIVATION_BYTES = 2
+
+
+def parallel_splits(total_gpus, layers, heads=None):
+    '''
+    (tp, pp, dp) splits using every GPU: tp a power of two dividing the attention heads,
+    pp at most one stage per layer
+    '''
+    tp = 1
+    while tp <= total_gpus:
+        if total_gpus % tp == 0 and (not heads or heads % tp == 0):
+            for pp in range(1, min(layers, total_gpus // tp) + 1):
+                if total_gpus % (tp * pp) == 0:
+                    yield tp, pp, total_gpus // (tp * pp)
+        tp *= 2
+
+def ring_all_reduce(size, ranks, gbps, latency):
+    '''seconds of a ring all-reduce of size bytes over ranks GPUs linked at gbps GB/s each'''
+    if ranks == 1:
+        return 0.0
+    return 2 * (ranks - 1) / ranks * size / (gbps * 1e9) + 2 * (ranks - 1) * latency
+
+def stage_nodes(cluster, tp, pp):
+    '''node of the first GPU of each pipeline stage, tensor parallel groups are packed into nodes'''
+    return [stage * tp // cluster.gpus_per_node for stage in range(pp)]
+
+def placement_cost(cluster, tp, pp, model, batch, context, micro_batches, margin_of_safety=0.2):
+    '''
+    Decode throughput of the model split tp x pp, with dp = GPUs / (tp x pp) replicas.
+    model holds params, weight_bytes, layers, hidden and kv_bytes_per_token; every replica
+    serves batch sequences of context tokens in micro_batches. Each layer costs its compute
+    (bound by FLOPS or by reading the weights and KV cache) plus two all-reduces of the
+    activations across the tensor parallel group, each stage adds the send to the next one,
+    and a step takes max(micro_batches, pp) stage times, so fewer micro-batches than stages
+    leave a bubble. penalty is the share of the step lost to communication and the bubble
+    '''
+    gpu = cluster.gpu
+    dp = cluster.total_gpus // (tp * pp)
+    layers = model['layers']
+    memory = (model['weight_bytes'] * (1 + margin_of_safety) + model['kv_bytes_per_token'] * context * batch) / (tp * pp)
+    micro_batches = max(1, min(micro_batches, batch))
+    sequences = batch / micro_batches
+    layers_per_stage = math.ceil(layers / pp)
+
+    flops = gpu.tflops * 1e12 * tp * PREFILL_MFU
+    bandwidth = gpu.bandwidth_gbps * 1e9 * tp * DECODE_BANDWIDTH_EFFICIENCY
+    layer_bytes = (model['weight_bytes'] + sequences * context * model['kv_bytes_per_token']) / layers
+    compute = max(2 * model['params'] / layers * sequences / flops, layer_bytes / bandwidth)
+
+    activations = sequences * model['hidden'] * ACTIVATION_BYTES
+    tp_crosses_nodes = tp > cluster.gpus_per_node
+    if tp_crosses_nodes:
+        all_reduce = 2 * ring_all_reduce(activations, tp, cluster.inter_gbps, cluster.inter_latency)
+    else:
+        all_reduce = 2 * ring_all_reduce(activations, tp, cluster.intra_gbps, cluster.intra_latency)
+
+    nodes = stage_nodes(cluster, tp, pp)
+    inter_node_hops = sum(1 for a, b in zip(nodes, nodes[1:]) if a != b)
+    p2p = 0.0
+    if pp > 1:
+        # the slowest hop paces the pipeline
+        if inter_node_hops:
+            p2p = activations / (cluster.inter_gbps * 1e9) + cluster.inter_latency
+        else:
+            p2p = activations / (cluster.intra_gbps * 1e9) + cluster.intra_latency
+
+    stage = layers_per_stage * (compute + all_reduce) + p2p
+    step = max(micro_batches, pp) * stage
+    ideal = micro_batches * layers / pp * compute
+    return {
+        'tp': tp, 'pp': pp, 'dp': dp,
+        'memory_per_gpu': memory,
+        'fits': memory <= gpu.memory_gb * 1024 ** 3 * MEMORY_UTILIZATION,
+        'step': step,
+        'tokens_per_second': dp * batch / step,
+        'compute': layers_per_stage * compute,
+        'all_reduce': layers_per_stage * all_reduce,
+        'p2p': p2p,
+        'bubble': max(pp - micro_batches, 0) / max(micro_batches, pp),
+        'penalty': 1 - ideal / step,
+        'tp_crosses_nodes': tp_crosses_nodes,
+        'inter_node_hops': inter_node_hops,
+    }
+
+def rank_placements(cluster, model, batch, context, micro_batches, heads=None, margin_of_safety=0.2):
+    '''every split of the cluster, the fitting ones first by throughput, then the rest by memory'''
+    placements = [placement_cost(cluster, tp, pp, model, batch, context, micro_batches, margin_of_safety)
+                  for tp, pp, _ in parallel_splits(cluster.total_gpus, model['layers'], heads)]
+    return sorted(placements, key=lambda p: (not p['fits'], -p['tokens_per_second'] if p['fits'] else p['memory_per_gpu'],
+                                              p['penalty']))
@@ -0,0 +1,155 @@
+"""Exact parameter counts of common transformer architectures, computed from config.json alone."""
+from .memory import PRECISION_BYTES, config_value, weight_bytes
+
+# families sharing the Llama layout: RMSNorm, gated MLP, separate or fused q/k/v/o projections
+LLAMA_LIKE = {'llama', 'mistral', 'mixtral', 'qwen2', 'qwen2_moe', 'qwen3', 'qwen3_moe', 'gemma', 'gemma2', 'phi3'}
+# tie_word_embeddings when config.json doesn't say, from the transformers config classes
+TIED_BY_DEFAULT = {'gemma', 'gemma2', 'falcon', 't5'}
+
+
+def _get(config_json, key, default=None):
+    value = config_json.get(key)
+    return default if value is None else value
+
+def _tied(config_json, model_type):
+    return bool(_get(config_json, 'tie_word_embeddings', model_type in TIED_BY_DEFAULT))
+
+def _llama_layers(config_json, model_type):
+    hidden = config_value(config_json, 'hidden_size')
+    heads = config_value(config_json, 'num_attention_heads')
+    kv_heads = config_value(config_json, 'num_key_value_heads', heads)
+    head_dim = config_value(config_json, 'head_dim') or hidden // heads
+    layers = config_value(config_json, 'num_hidden_layers')
+
+    qkv = (heads + 2 * kv_heads) * head_dim
+    attention = hidden * qkv + heads * head_dim * hidden
+    if model_type in ('qwen2', 'qwen2_moe'):
+        attention += qkv  # q/k/v biases
+    elif _get(config_json, 'attention_bias', False):
+        attention += qkv + hidden  # q/k/v/o biases
+    if model_type in ('qwen3', 'qwen3_moe'):
+        attention += 2 * head_dim  # RMSNorm of each query and key head
+
+    experts = _get(config_json, 'num_local_experts') or _get(config_json, 'num_experts')
+    if experts:
+        expert_intermediate = _get(config_json, 'moe_intermediate_size', config_json.get('intermediate_size'))
+        # every expert is a gated MLP, plus the router
+        mlp = experts * 3 * hidden * expert_intermediate + hidden * experts
+        shared = _get(config_json, 'shared_expert_intermediate_size')
+        if shared:
+            # qwen2_moe: an always-on expert with a scalar gate
+            mlp += 3 * hidden * shared + hidden
+    else:
+        mlp = 3 * hidden * config_json['intermediate_size']
+
+    # gemma2 norms before and after both attention and MLP
+    norms = 4 * hidden if model_type == 'gemma2' else 2 * hidden
+    return [attention + mlp + norms] * layers, hidden
+
+def _phi_layers(config_json):
+    hidden = config_json['hidden_size']
+    heads = config_json['num_attention_heads']
+    kv_heads = _get(config_json, 'num_key_value_heads', heads)
+    head_dim = hidden // heads
+    intermediate = config_json['intermediate_size']
+    # parallel attention and MLP behind one LayerNorm, biases everywhere
+    attention = hidden * (heads + 2 * kv_heads) * head_dim + (heads + 2 * kv_heads) * head_dim + hidden * hidden + hidden
+    mlp = 2 * hidden * intermediate + intermediate + hidden
+    return [attention + mlp + 2 * hidden] * config_json['num_hidden_layers'], 2 * hidden
+
+def _gpt_neox_layers(config_json):
+    hidden = config_json['hidden_size']
+    intermediate = _get(config_json, 'intermediate_size', 4 * hidden)
+    bias = _get(config_json, 'attention_bias', True)
+    attention = 3 * hidden * hidden + hidden * hidden + (4 * hidden if bias else 0)
+    mlp = 2 * hidden * intermediate + intermediate + hidden
+    return [attention + mlp + 4 * hidden] * config_json['num_hidden_layers'], 2 * hidden
+
+def _falcon_layers(config_json):
+    hidden = config_value(config_json, 'hidden_size')
+    heads = config_value(config_json, 'num_attention_heads')
+    head_dim = hidden // heads
+    new_architecture = _get(config_json, 'new_decoder_architecture', False)
+    if new_architecture:
+        kv_heads = _get(config_json, 'num_kv_heads', heads)
+    elif _get(config_json, 'multi_query', True):
+        kv_heads = 1
+    else:
+        kv_heads = heads
+    bias = _get(config_json, 'bias', False)
+    attention = hidden * (heads + 2 * kv_heads) * head_dim + hidden * hidden
+    ffn = _get(config_json, 'ffn_hidden_size', 4 * hidden)
+    mlp = 2 * hidden * ffn
+    if bias:
+        attention += (heads + 2 * kv_heads) * head_dim + hidden
+        mlp += ffn + hidden
+    if new_architecture and _get(config_json, 'num_ln_in_parallel_attn', 2) == 2:
+        norms = 4 * hidden
+    elif _get(config_json, 'parallel_attn', True):
+        norms = 2 * hidden
+    else:
+        norms = 4 * hidden
+    return [attention + mlp + norms] * config_value(config_json, 'num_hidden_layers'), 2 * hidden
+
+def _bert_count(config_json):
+    hidden = config_json['hidden_size']
+    intermediate = config_json['intermediate_size']
+    embedding = (config_json['vocab_size'] + _get(config_json, 'max_position_embeddings', 512)
+                 + _get(config_json, 'type_vocab_size', 2)) * hidden + 2 * hidden
+    layer = 4 * (hidden * hidden + hidden) + 2 * hidden + 2 * hidden * intermediate + intermediate + hidden + 2 * hidden
+    return {'embedding': embedding, 'layers': [layer] * config_json['num_hidden_layers'],
+            'final_norm': 0, 'lm_head': 0, 'pooler': hidden * hidden + hidden}
+
+def _t5_count(config_json):
+    d_model = config_json['d_model']
+    inner = config_json['d_kv'] * config_json['num_heads']
+    gated = 'gated' in _get(config_json, 'feed_forward_proj', 'relu')
+    ff = (3 if gated else 2) * d_model * config_json['d_ff']
+    attention = 4 * d_model * inner
+    relative_bias = _get(config_json, 'relative_attention_num_buckets', 32) * config_json['num_heads']
+    encoder = [attention + ff + 2 * d_model] * config_json['num_layers']
+    decoder = [2 * attention + ff + 3 * d_model] * _get(config_json, 'num_decoder_layers', config_json['num_layers'])
+    # only the first layer of each stack holds the relative position bias
+    encoder[0] += relative_bias
+    decoder[0] += relative_bias
+    return {'embedding': config_json['vocab_size'] * d_model, 'layers': encoder + decoder,
+            'final_norm': 2 * d_model, 'lm_head': 0 if _tied(config_json, 't5') else config_json['vocab_size'] * d_model}
+
+def count_parameters(config_json):
+    '''
+    parameter count of a model from its config.json, as a dict with the embedding,
+    each layer, the final norm, the LM head and the total. Tied embeddings are
+    counted once. Returns None for architectures that aren't modeled
+    '''
+    config_json = config_json or {}
+    model_type = config_json.get('model_type')
+    try:
+        if model_type in ('bert', 'roberta'):
+            counts = _bert_count(config_json)
+        elif model_type in ('t5', 'mt5'):
+            counts = _t5_count(config_json)
+        else:
+            if model_type in LLAMA_LIKE:
+                layers, final_norm = _llama_layers(config_json, model_type)
+            elif model_type == 'phi':
+                layers, final_norm = _phi_layers(config_json)
+            elif model_type == 'gpt_neox':
+                layers, final_norm = _gpt_neox_layers(config_json)
+            elif model_type == 'falcon':
+                layers, final_norm = _falcon_layers(config_json)
+            else:
+                return None
+            embedding = config_json['vocab_size'] * config_value(config_json, 'hidden_size')
+            lm_head = 0 if _tied(config_json, model_type) else embedding
+            if model_type == 'phi':
+                lm_head += config_json['vocab_size']  # phi's LM head has a bias
+            counts = {'embedding': embedding, 'layers': layers, 'final_norm': final_norm, 'lm_head': lm_head}
+    except (KeyError, TypeError, ZeroDivisionError):
+        return None
+    counts['model_type'] = model_type
+    counts['total'] = (counts['embedding'] + sum(counts['layers']) + counts['final_norm']
+                       + counts['lm_head'] + counts.get('pooler', 0))
+    return counts
+
+def bytes_by_precision(param_count):
+    return {precision: weight_bytes(param_count, precision) for precision in PRECISION_BYTES}
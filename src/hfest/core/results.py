@@ -0,0 +1,395 @@
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+
+@dataclass
+class FileGroup:
+    """Model files of one format (safetensors, pytorch, onnx)."""
+    count: int = 0
+    bytes: float = 0
+
+
+@dataclass
+class ModelVariant:
+    """One loadable copy of the weights in a repo: a subfolder, another file name or an ONNX export."""
+    format: str
+    count: int = 0
+    bytes: float = 0
+    # the variant sizing the total of its format
+    primary: bool = False
+
+
+@dataclass
+class ModelEstimate:
+    """Result of estimate-size for a single model."""
+    model_id: str
+    # set when a branch, tag or commit other than the default one was asked for
+    revision: Optional[str] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    repo_size_gb: Optional[float] = None
+    param_count: Optional[int] = None
+    # where param_count comes from: safetensors (Hub metadata), headers (read from the safetensors
+    # file headers) or config (computed from config.json)
+    param_source: Optional[str] = None
+    main_dtype: Optional[str] = None
+    additional_dtypes: List[str] = field(default_factory=list)
+    files: Dict[str, FileGroup] = field(default_factory=dict)
+    # by folder and file name, only when the repo holds more than one
+    variants: Dict[str, ModelVariant] = field(default_factory=dict)
+    # how far each field can be trusted: exact (read from the Hub or the file headers), derived
+    # (computed from config.json or the parameter count), index (from the local catalog),
+    # heuristic (extrapolated) or unknown. Keys are param_count, main_dtype and files.<format>
+    confidence: Dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class GpuDevice:
+    """A schedulable GPU, or a partition (MIG device) of one with parent_index set."""
+    index: str
+    name: Optional[str]
+    memory_total_mb: float
+    memory_free_mb: float
+    parent_index: Optional[str] = None
+    partition: Optional[str] = None
+    compute_fraction: Optional[float] = None
+
+
+@dataclass
+class FitCheck:
+    """Whether a model in a given format and precision fits on one GPU."""
+    format: str
+    precision: str
+    gpu_index: str
+    gpu_name: Optional[str]
+    required_gb: float
+    free_gb: float
+    fits: bool
+    # set when the check is of one variant of the repo at its stored size
+    variant: Optional[str] = None
+
+
+@dataclass
+class GpuProcess:
+    """A process holding GPU memory."""
+    gpu_index: str
+    pid: int
+    name: str
+    user: Optional[str]
+    used_mb: float
+
+
+@dataclass
+class EvictionPlan:
+    """Processes to stop on one GPU, largest first, for a failed fit check to pass."""
+    format: str
+    precision: str
+    gpu_index: str
+    pids: List[int]
+    freed_gb: float
+    fits: bool
+
+
+@dataclass
+class ResourceEstimate:
+    """Result of estimate-resource for a single model."""
+    model: ModelEstimate
+    gpus: List[GpuDevice] = field(default_factory=list)
+    checks: List[FitCheck] = field(default_factory=list)
+    processes: List[GpuProcess] = field(default_factory=list)
+    evicted_pids: List[int] = field(default_factory=list)
+    evictions: List[EvictionPlan] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class LoadTimePrediction:
+    format: str
+    shards: int
+    bytes: float
+    sequential_seconds: float
+    parallel_seconds: float
+
+
+@dataclass
+class LoadTimeEstimate:
+    """Result of estimate-load-time for a single model."""
+    model: ModelEstimate
+    disk_bandwidth_gbps: Optional[float] = None
+    pcie_bandwidth_gbps: Optional[float] = None
+    workers: int = 1
+    predictions: List[LoadTimePrediction] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class SweepResult:
+    """Estimate of one model found by a sweep."""
+    model_id: str
+    status: str = "ok"
+    error: Optional[str] = None
+    sha: Optional[str] = None
+    architecture: Optional[str] = None
+    format: Optional[str] = None
+    main_dtype: Optional[str] = None
+    param_count: int = 0
+    bytes: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class WatchEvent:
+    """A model starting or stopping to fit on one GPU, reported by watch."""
+    time: float
+    event: str
+    model_id: str
+    format: str
+    precision: str
+    gpu_index: str
+    gpu_name: Optional[str]
+    required_gb: float
+    free_gb: float
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class CapacityOption:
+    """One deployment considered by plan-capacity: replicas of tensor_parallel GPUs each."""
+    gpu: str
+    tensor_parallel: int
+    replicas: Optional[int] = None
+    gpus: Optional[int] = None
+    batch_size: Optional[int] = None
+    # requests per second one replica serves at full utilization
+    replica_capacity_rps: Optional[float] = None
+    utilization: Optional[float] = None
+    ttft_p95_ms: Optional[float] = None
+    tpot_ms: Optional[float] = None
+    cost_per_hour: Optional[float] = None
+    meets_slo: bool = False
+    reason: Optional[str] = None
+
+
+@dataclass
+class CapacityPlan:
+    """Result of plan-capacity for a single model: the cheapest option meeting the SLO and every option."""
+    model: ModelEstimate
+    precision: Optional[str] = None
+    qps: float = 0.0
+    ttft_p95_ms: float = 0.0
+    tpot_ms: Optional[float] = None
+    mix: List[List[float]] = field(default_factory=list)
+    best: Optional[CapacityOption] = None
+    options: List[CapacityOption] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class ParallelOption:
+    """One tensor x pipeline x data parallel split considered by plan-cluster, times are per decode step."""
+    tensor_parallel: int
+    pipeline_parallel: int
+    data_parallel: int
+    memory_per_gpu_gb: float
+    fits: bool
+    tokens_per_second: float
+    step_ms: float
+    compute_ms: float
+    all_reduce_ms: float
+    p2p_ms: float
+    bubble: float
+    # share of the step lost to all-reduces, sends between stages and the bubble
+    penalty: float
+    tp_crosses_nodes: bool
+    inter_node_hops: int
+
+
+@dataclass
+class ClusterPlan:
+    """Result of plan-cluster for a single model: the splits of the cluster, the recommended one first."""
+    model: ModelEstimate
+    cluster: str
+    nodes: int
+    gpus_per_node: int
+    precision: Optional[str] = None
+    intra_gbps: Optional[float] = None
+    inter_gbps: Optional[float] = None
+    best: Optional[ParallelOption] = None
+    options: List[ParallelOption] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class TensorChange:
+    """A tensor added, removed or re-typed between two revisions, the missing side left unset."""
+    name: str
+    old_dtype: Optional[str] = None
+    old_shape: Optional[List[int]] = None
+    new_dtype: Optional[str] = None
+    new_shape: Optional[List[int]] = None
+
+
+@dataclass
+class RevisionDiff:
+    """Weights of a revision compared with the base (first) revision."""
+    base: str
+    revision: str
+    format: Optional[str] = None
+    base_bytes: float = 0
+    bytes: float = 0
+    growth_bytes: float = 0
+    # growth as a fraction of base_bytes, None when the base has no weights
+    growth: Optional[float] = None
+    # None when the safetensors headers of either revision couldn't be read
+    added: Optional[List[TensorChange]] = None
+    removed: Optional[List[TensorChange]] = None
+    changed: Optional[List[TensorChange]] = None
+    exceeds_threshold: bool = False
+
+
+@dataclass
+class RevisionComparison:
+    """Result of estimate-size or estimate-resource over several revisions of one model."""
+    model_id: str
+    revisions: List[str]
+    status: str = "ok"
+    # ModelEstimate (estimate-size) or ResourceEstimate (estimate-resource) of each revision, in order
+    results: list = field(default_factory=list)
+    diffs: List[RevisionDiff] = field(default_factory=list)
+    fail_if_growth: Optional[str] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class DerivativeOption:
+    """One loadable variant of a quantized derivative repo, checked against the GPUs by find-quantized."""
+    model_id: str
+    variant: str
+    # gguf, awq, gptq, exl2, bnb or fp8
+    method: str
+    # e.g. Q4_K_M for GGUF files, from the file name or else the tensor header
+    quantization: Optional[str] = None
+    files: int = 0
+    bytes: float = 0
+    # stored bits per parameter of the base model, scales and unquantized layers included
+    bits_per_weight: Optional[float] = None
+    required_gb: Optional[float] = None
+    fits: bool = False
+    # the GPU giving the most decode tokens/s among those it fits on
+    gpu_index: Optional[str] = None
+    gpu_name: Optional[str] = None
+    # single sequence decode, None when the GPU isn't in the catalog
+    tokens_per_second: Optional[float] = None
+
+
+@dataclass
+class DerivativeSearch:
+    """Result of find-quantized for a base model: its quantized derivatives ranked by fit, then throughput."""
+    model: ModelEstimate
+    context: int = 0
+    # derivative repos found on the Hub and variants checked
+    repos: int = 0
+    checked: int = 0
+    options: List[DerivativeOption] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# confidence of a value by where it came from, see the *_SOURCE keys of estimate_model_files.
+# Hub metadata, headers and listed file sizes are read, config.json counts and sizes from the
+# parameter count are computed by formula
+SOURCE_CONFIDENCE = {'safetensors': 'exact', 'headers': 'exact', 'files': 'exact', 'config': 'derived',
+                     'params': 'derived', 'index': 'index', 'average': 'heuristic', 'heuristic': 'heuristic'}
+
+def estimate_confidence(estimated_total, param_source=None):
+    '''confidence tag of the parameter count, main dtype and each file format of an estimate'''
+    main_dtype = estimated_total.get('MODEL_DTYPES', (None, []))[0]
+    confidence = {
+        'param_count': SOURCE_CONFIDENCE.get(param_source, 'unknown') if estimated_total.get('PARAM_COUNT') else 'unknown',
+        'main_dtype': SOURCE_CONFIDENCE.get(estimated_total.get('DTYPE_SOURCE'), 'exact') if main_dtype else 'unknown',
+    }
+    size_sources = estimated_total.get('SIZE_SOURCE') or {}
+    model_files = estimated_total.get('MODEL_FILES') or {}
+    for key, value in estimated_total.items():
+        if key.isupper() or not (value or model_files.get(key)):
+            continue
+        confidence[f"files.{key}"] = SOURCE_CONFIDENCE.get(size_sources.get(key), 'heuristic') if value else 'unknown'
+    return confidence
+
+def model_estimate_from_total(model_id, estimated_total):
+    '''build a ModelEstimate from the dictionary returned by estimate_model_files'''
+    if estimated_total is None:
+        return ModelEstimate(model_id=model_id, status="error", error="Unable to estimate model files")
+
+    main_dtype, additional_dtypes = estimated_total.get('MODEL_DTYPES', (None, []))
+    model_files = estimated_total.get('MODEL_FILES', {})
+    files = {}
+    for key, value in estimated_total.items():
+        # upper-case keys hold metadata, the rest are per-format byte totals
+        if key.isupper():
+            continue
+        files[key] = FileGroup(count=len(model_files.get(key, [])), bytes=value)
+    variants = estimated_total.get('VARIANTS') or {}
+    if len(variants) < 2:
+        variants = {}
+
+    param_source = estimated_total.get('PARAM_SOURCE')
+    if param_source is None and estimated_total.get('PARAM_BREAKDOWN'):
+        param_source = "config"
+    elif param_source is None and estimated_total.get('PARAM_COUNT'):
+        param_source = "safetensors"
+
+    return ModelEstimate(
+        model_id=model_id,
+        repo_size_gb=estimated_total.get('REPO_SIZE'),
+        param_count=estimated_total.get('PARAM_COUNT'),
+        param_source=param_source,
+        main_dtype=main_dtype,
+        additional_dtypes=list(additional_dtypes),
+        files=files,
+        variants={name: ModelVariant(format=v['format'], count=len(v['files']), bytes=v['bytes'], primary=v['primary'])
+                  for name, v in variants.items()},
+        confidence=estimate_confidence(estimated_total, param_source),
+    )
+
+
+def gpu_device_from_info(gpu):
+    '''build a GpuDevice from one of the dictionaries returned by the GPU probes'''
+    return GpuDevice(
+        index=str(gpu['index']),
+        name=gpu['name'],
+        memory_total_mb=float(gpu['memory.total'].split(" ")[0]),
+        memory_free_mb=float(gpu['memory.free'].split(" ")[0]),
+        parent_index=gpu.get('parent'),
+        partition=gpu.get('partition'),
+        compute_fraction=gpu.get('compute_fraction'),
+    )
+
+
+def gpu_process_from_info(process):
+    '''build a GpuProcess from one of the dictionaries returned by get_nvidia_process_info'''
+    return GpuProcess(
+        gpu_index=process['gpu_index'],
+        pid=process['pid'],
+        name=process['name'],
+        user=process['user'],
+        used_mb=float(process['used_memory'].split(" ")[0]),
+    )
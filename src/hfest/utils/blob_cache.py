@@ -0,0 +1,99 @@
+"""Content-addressed cache of per-file metadata keyed by the LFS sha256, shared by concurrent hfest processes."""
+from contextlib import contextmanager
+import json
+import os
+import re
+import tempfile
+
+from .profiling import profiler
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+OID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobCache:
+    '''
+    One JSON file per blob under root/<first two hex digits>/<oid>.json. The same
+    file in another repo, fork or revision has the same oid, so it is fetched once.
+    Writes go to a temporary file renamed into place, and fetches of one oid are
+    serialized by a lock file so concurrent processes wait for the first one.
+    '''
+
+    def __init__(self, root, name="headers"):
+        self.root = root
+        self.name = name
+
+    @staticmethod
+    def valid(oid):
+        return isinstance(oid, str) and bool(OID_PATTERN.match(oid))
+
+    def path(self, oid):
+        if not self.valid(oid):
+            raise ValueError(f"Not a sha256 oid: {oid!r}")
+        return os.path.join(self.root, oid[:2], f"{oid}.json")
+
+    def get(self, oid):
+        try:
+            with open(self.path(oid), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # missing, or left corrupt by a crash before the atomic writes
+            return None
+
+    def put(self, oid, entry):
+        path = self.path(oid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def lock(self, oid):
+        '''exclusive lock of one oid across processes'''
+        path = self.path(oid)[:-len(".json")] + ".lock"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def get_or_fetch(self, oid, fetch):
+        '''the cached entry of oid, calling fetch and storing its result on a miss'''
+        entry = self.get(oid)
+        if entry is None:
+            with self.lock(oid):
+                # another process may have fetched it while this one waited
+                entry = self.get(oid)
+                if entry is None:
+                    profiler.record_cache(False)
+                    metrics.cache_requests.inc(cache=self.name, result="miss")
+                    entry = fetch()
+                    self.put(oid, entry)
+                    return entry
+        profiler.record_cache(True)
+        metrics.cache_requests.inc(cache=self.name, result="hit")
+        return entry
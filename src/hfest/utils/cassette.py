@@ -0,0 +1,266 @@
+"""Cassettes of recorded Hub responses and a local HTTP server that records or replays them."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+
+CASSETTE_VERSION = 1
+
+# headers that describe the connection or the transfer, not the response
+DROPPED_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+                   'content-length', 'date', 'server', 'set-cookie'}
+# request headers passed on to the upstream Hub while recording
+FORWARDED_HEADERS = ('Authorization', 'Range', 'Content-Type')
+
+
+def interaction_key(method, path, query="", range_header=None, body=b"", content_type=None):
+    '''
+    requests match on method, path, query in any order, the Range header and the
+    body. Form bodies (paths-info) match in any order too, other bodies by digest.
+    '''
+    pairs = sorted(parse_qsl(query, keep_blank_values=True))
+    key = f"{method.upper()} {path}"
+    if pairs:
+        key += "?" + urlencode(pairs)
+    if range_header:
+        key += f" [{range_header}]"
+    if body:
+        if (content_type or "").startswith("application/x-www-form-urlencoded"):
+            key += " " + urlencode(sorted(parse_qsl(body.decode('utf-8', errors='replace'), keep_blank_values=True)))
+        else:
+            key += " sha256:" + hashlib.sha256(body).hexdigest()
+    return key
+
+
+class Cassette:
+    '''
+    Recorded Hub responses, keyed by interaction_key. Bodies are stored as text
+    when they decode as UTF-8 and as base64 otherwise (range reads of weight files).
+    Request headers, and so the API token, are never stored.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        '''read the cassette file, returns False when there is none'''
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version: {data.get('version')}")
+        self.interactions = {i['key']: i['response'] for i in data.get('interactions', [])}
+        return True
+
+    def save(self):
+        with self.lock:
+            interactions = [{'key': key, 'response': response} for key, response in sorted(self.interactions.items())]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': interactions}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def record(self, key, status, headers, body):
+        response = {'status': status, 'headers': headers}
+        try:
+            response['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            response['body_base64'] = base64.b64encode(body).decode('ascii')
+        with self.lock:
+            self.interactions[key] = response
+
+    def lookup(self, key):
+        '''(status, headers, body) of a recorded response, None when it wasn't recorded'''
+        with self.lock:
+            response = self.interactions.get(key)
+        if response is None:
+            return None
+        if 'body_base64' in response:
+            body = base64.b64decode(response['body_base64'])
+        else:
+            body = response.get('body', '').encode('utf-8')
+        return response['status'], dict(response['headers']), body
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+class HubStandInStats:
+    def __init__(self):
+        self.requests = 0
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.throttled = 0
+
+
+class HubStandIn(ThreadingHTTPServer):
+    '''
+    A local stand-in for the Hub. In replay mode it answers from a cassette, in
+    record mode it forwards each request to upstream and records the response.
+    latency (seconds, plus up to jitter) is added before every response, and
+    every throttle_every-th request is answered with a 429.
+    '''
+    daemon_threads = True
+
+    def __init__(self, cassette, host="127.0.0.1", port=0, upstream=None, latency=0.0, jitter=0.0,
+                 throttle_every=0, retry_after=None, seed=None):
+        super().__init__((host, port), HubStandInHandler)
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats = HubStandInStats()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def recording(self):
+        return self.upstream is not None
+
+    def start(self):
+        '''serve on a background thread, returns the base URL'''
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def next_request(self):
+        '''count a request, returns (delay, throttled)'''
+        with self.lock:
+            self.stats.requests += 1
+            throttled = bool(self.throttle_every) and self.stats.requests % self.throttle_every == 0
+            if throttled:
+                self.stats.throttled += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        return delay, throttled
+
+    def count(self, outcome):
+        with self.lock:
+            setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+    def fetch_upstream(self, method, path_and_query, headers, body=b""):
+        '''forward a request to the Hub, returns (status, headers, body) with URLs pointing back here'''
+        forwarded = {name: headers[name] for name in FORWARDED_HEADERS if headers.get(name)}
+        # byte exact Content-Length on HEAD and no compressed bodies to re-encode
+        forwarded['Accept-Encoding'] = 'identity'
+        # HEAD keeps redirects so the client sees the metadata headers of the
+        # resolve endpoint, GET follows them to the file content
+        response = requests.request(method, self.upstream + path_and_query, headers=forwarded, data=body or None,
+                                    allow_redirects=(method != 'HEAD'), timeout=60)
+        kept = {}
+        for name, value in response.headers.items():
+            lower = name.lower()
+            if lower in DROPPED_HEADERS or lower.startswith('x-xet'):
+                continue
+            kept[name] = value
+        if method == 'HEAD' and 'Content-Length' in response.headers:
+            kept['Content-Length'] = response.headers['Content-Length']
+        for name in ('Link', 'Location'):
+            if name in kept:
+                kept[name] = self.rewrite_url(kept[name], path_and_query)
+        return response.status_code, kept, b'' if method == 'HEAD' else response.content
+
+    def rewrite_url(self, value, path_and_query):
+        '''point upstream URLs at the stand-in, URLs on other hosts (file CDNs) at the requested path'''
+        if self.upstream in value:
+            return value.replace(self.upstream, self.url)
+        if value.startswith("http") and urlsplit(value).netloc != urlsplit(self.upstream).netloc:
+            return self.url + path_and_query
+        return value
+
+    def report(self):
+        stats = self.stats
+        mode = "recorded" if self.recording else "replayed"
+        count = stats.recorded if self.recording else stats.replayed
+        return (f"{stats.requests} request(s), {count} {mode}, {stats.misses} not in cassette, "
+                f"{stats.throttled} throttled")
+
+
+class HubStandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body leave in one write, separate small writes on a kept-alive
+    # connection stall on delayed ACKs for ~40ms per response
+    wbufsize = 1 << 16
+
+    def do_GET(self):
+        self.handle_hub_request('GET')
+
+    def do_HEAD(self):
+        self.handle_hub_request('HEAD')
+
+    def do_POST(self):
+        self.handle_hub_request('POST')
+
+    def handle_hub_request(self, method):
+        server = self.server
+        # read the body even when throttling, the connection is reused
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        delay, throttled = server.next_request()
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            headers = {'Content-Type': 'application/json'}
+            if server.retry_after is not None:
+                headers['Retry-After'] = f"{server.retry_after:g}"
+            return self.send(method, 429, headers, b'{"error": "Rate limit exceeded (injected by hfest hub-server)"}')
+
+        split = urlsplit(self.path)
+        key = interaction_key(method, split.path, split.query, self.headers.get('Range'),
+                              body, self.headers.get('Content-Type'))
+        if server.recording:
+            try:
+                status, headers, body = server.fetch_upstream(method, self.path, self.headers, body)
+            except requests.RequestException as e:
+                return self.send(method, 502, {'Content-Type': 'application/json'},
+                                 json.dumps({'error': f"Upstream request failed: {e}"}).encode())
+            server.cassette.record(key, status, headers, body)
+            server.count('recorded')
+            return self.send(method, status, headers, body)
+
+        recorded = server.cassette.lookup(key)
+        if recorded is None:
+            server.count('misses')
+            return self.send(method, 404, {'Content-Type': 'application/json'},
+                             json.dumps({'error': f"No recorded response for {key}"}).encode())
+        server.count('replayed')
+        self.send(method, *recorded)
+
+    def send(self, method, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() != 'content-length':
+                self.send_header(name, value)
+        # HEAD answers carry the length of the body a GET would return
+        self.send_header('Content-Length', headers.get('Content-Length', str(len(body))) if method == 'HEAD' else str(len(body)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -4,11 +4,27 @@ import os
 # Default config location
 CONFIG_DIR = os.path.expanduser("~/.config/hfest")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+# Local catalog of model estimates
+INDEX_FILE = os.path.join(CONFIG_DIR, "index.db")
+# Parsed tensor headers, one file per LFS sha256
+HEADER_CACHE_DIR = os.path.join(CONFIG_DIR, "headers")
+DEFAULT_ENDPOINT = "https://huggingface.co"
 
 # Default configuration
 DEFAULT_CONFIG = {
     "default_model_path": None,
     "api_key": None,
+    # Hub base URL, e.g. a local stand-in started with hfest hub-server
+    "endpoint": None,
+    # comma separated Hub mirrors, tried in order when the endpoint fails
+    "mirrors": None,
+    # send a request still unanswered after this many milliseconds to the next mirror too
+    "hedge_after_ms": None,
+    # Hub request scheduler, see utils/scheduler.py for the defaults
+    "requests_per_second": None,
+    "burst": None,
+    "max_retries": None,
+    "max_concurrency": None,
 }
 
 def ensure_config_dir():
@@ -34,7 +50,8 @@ def read_config():
     try:
         if os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, 'r') as f:
-                return json.load(f)
+                # keys added in newer versions keep their default
+                return {**DEFAULT_CONFIG, **json.load(f)}
         else:
             # Create default config
             save_config(DEFAULT_CONFIG)
@@ -49,3 +66,26 @@ def update_config(key, value):
     config = read_config()
     config[key] = value
     return save_config(config)
+
+
+def hub_endpoints():
+    """Hub base URLs in order of preference: the endpoint config key (or HF_ENDPOINT, or huggingface.co), then the mirrors."""
+    config = read_config()
+    mirrors = config.get('mirrors') or []
+    if isinstance(mirrors, str):
+        mirrors = mirrors.split(",")
+    endpoints = []
+    for endpoint in [config.get('endpoint') or os.environ.get("HF_ENDPOINT") or DEFAULT_ENDPOINT] + list(mirrors):
+        endpoint = endpoint.strip().rstrip("/")
+        if endpoint and endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints
+
+def hub_endpoint():
+    """Hub base URL: the first of hub_endpoints() that hasn't failed recently."""
+    endpoints = hub_endpoints()
+    if len(endpoints) == 1:
+        return endpoints[0]
+    # the scheduler tracks mirror health, and imports this module
+    from .scheduler import get_scheduler
+    return get_scheduler().mirrors.order(endpoints)[0]
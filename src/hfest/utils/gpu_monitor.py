@@ -0,0 +1,140 @@
+"""In-process GPU memory probes for polling free memory without spawning nvidia-smi or rocm-smi."""
+import ctypes
+import glob
+import os
+import platform
+
+NVML_SUCCESS = 0
+NVML_NAME_LENGTH = 96
+
+
+class GpuProbeError(Exception):
+    pass
+
+
+class NvmlMemory(ctypes.Structure):
+    _fields_ = [('total', ctypes.c_ulonglong), ('free', ctypes.c_ulonglong), ('used', ctypes.c_ulonglong)]
+
+
+def _mib(nbytes):
+    return f"{nbytes // (1024 ** 2)} MiB"
+
+
+class NvmlProbe:
+    '''
+    NVIDIA GPUs through the NVML library the driver ships (what nvidia-smi uses),
+    GPUs in MIG mode as their MIG devices. Device handles and names are looked up
+    once, read() only queries memory.
+    '''
+    name = "nvml"
+
+    def __init__(self, library=None):
+        if library is None:
+            filename = "nvml.dll" if platform.system() == "Windows" else "libnvidia-ml.so.1"
+            try:
+                library = ctypes.CDLL(filename)
+            except OSError as e:
+                raise GpuProbeError(f"NVML is not available: {e}")
+        self.nvml = library
+        self.check(self.nvml.nvmlInit_v2(), "nvmlInit")
+        try:
+            count = ctypes.c_uint()
+            self.check(self.nvml.nvmlDeviceGetCount_v2(ctypes.byref(count)), "nvmlDeviceGetCount")
+            self.devices = []
+            for index in range(count.value):
+                handle = ctypes.c_void_p()
+                self.check(self.nvml.nvmlDeviceGetHandleByIndex_v2(index, ctypes.byref(handle)), "nvmlDeviceGetHandleByIndex")
+                name = ctypes.create_string_buffer(NVML_NAME_LENGTH)
+                self.check(self.nvml.nvmlDeviceGetName(handle, name, NVML_NAME_LENGTH), "nvmlDeviceGetName")
+                self.devices += self.mig_devices(index, handle) or [(str(index), name.value.decode('utf-8', errors='replace'), handle)]
+            if not self.devices:
+                raise GpuProbeError("NVML found no GPUs")
+        except GpuProbeError:
+            self.nvml.nvmlShutdown()
+            raise
+
+    def mig_devices(self, index, handle):
+        '''(index, name, handle) of the MIG devices of a GPU in MIG mode, which replace the GPU itself'''
+        if not hasattr(self.nvml, 'nvmlDeviceGetMigMode'):
+            return []
+        current, pending = ctypes.c_uint(), ctypes.c_uint()
+        # GPUs without MIG support answer NVML_ERROR_NOT_SUPPORTED
+        if self.nvml.nvmlDeviceGetMigMode(handle, ctypes.byref(current), ctypes.byref(pending)) != NVML_SUCCESS or current.value != 1:
+            return []
+        count = ctypes.c_uint()
+        self.check(self.nvml.nvmlDeviceGetMaxMigDeviceCount(handle, ctypes.byref(count)), "nvmlDeviceGetMaxMigDeviceCount")
+        devices = []
+        for mig in range(count.value):
+            mig_handle = ctypes.c_void_p()
+            # unused MIG slots answer NVML_ERROR_NOT_FOUND
+            if self.nvml.nvmlDeviceGetMigDeviceHandleByIndex(handle, mig, ctypes.byref(mig_handle)) != NVML_SUCCESS:
+                continue
+            name = ctypes.create_string_buffer(NVML_NAME_LENGTH)
+            self.check(self.nvml.nvmlDeviceGetName(mig_handle, name, NVML_NAME_LENGTH), "nvmlDeviceGetName")
+            devices.append((f"{index}:{mig}", name.value.decode('utf-8', errors='replace'), mig_handle))
+        return devices
+
+    @staticmethod
+    def check(result, call):
+        if result != NVML_SUCCESS:
+            raise GpuProbeError(f"{call} failed with NVML error {result}")
+
+    def read(self):
+        gpu_info = []
+        memory = NvmlMemory()
+        for index, name, handle in self.devices:
+            self.check(self.nvml.nvmlDeviceGetMemoryInfo(handle, ctypes.byref(memory)), "nvmlDeviceGetMemoryInfo")
+            gpu_info.append({'index': index, 'name': name, 'memory.total': _mib(memory.total),
+                             'memory.used': _mib(memory.used), 'memory.free': _mib(memory.free)})
+        return gpu_info
+
+    def close(self):
+        self.nvml.nvmlShutdown()
+
+
+class AmdSysfsProbe:
+    '''
+    AMD GPUs through the amdgpu sysfs memory counters (what rocm-smi reads).
+    The counter files stay open, read() only rereads them.
+    '''
+    name = "amdgpu-sysfs"
+
+    def __init__(self, root="/sys/class/drm"):
+        self.devices = []
+        for path in sorted(glob.glob(os.path.join(root, "card[0-9]*", "device", "mem_info_vram_total")),
+                           key=lambda p: int(p.split(os.sep)[-3][4:])):
+            device = os.path.dirname(path)
+            card = device.split(os.sep)[-2]
+            name = "AMD GPU"
+            if os.path.exists(os.path.join(device, "product_name")):
+                with open(os.path.join(device, "product_name")) as f:
+                    name = f.read().strip() or name
+            total = os.open(path, os.O_RDONLY)
+            used = os.open(os.path.join(device, "mem_info_vram_used"), os.O_RDONLY)
+            self.devices.append((card[4:], name, total, used))
+        if not self.devices:
+            raise GpuProbeError("No amdgpu memory counters found")
+
+    def read(self):
+        gpu_info = []
+        for index, name, total_fd, used_fd in self.devices:
+            total = int(os.pread(total_fd, 32, 0))
+            used = int(os.pread(used_fd, 32, 0))
+            gpu_info.append({'index': index, 'name': name, 'memory.total': _mib(total),
+                             'memory.used': _mib(used), 'memory.free': _mib(total - used)})
+        return gpu_info
+
+    def close(self):
+        for _, _, total_fd, used_fd in self.devices:
+            os.close(total_fd)
+            os.close(used_fd)
+
+
+def open_gpu_probe():
+    '''the first in-process probe that finds GPUs, None when there is none'''
+    for probe in (NvmlProbe, AmdSysfsProbe):
+        try:
+            return probe()
+        except (GpuProbeError, OSError, ValueError):
+            continue
+    return None
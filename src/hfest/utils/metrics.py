@@ -0,0 +1,243 @@
+"""Counters, gauges and histograms rendered in the Prometheus text format, served over HTTP or written to a file."""
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        '''(suffix, label values, extra labels, value) tuples of the current values'''
+        with self.lock:
+            return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    '''a value that goes up and down. collect, when given, computes every value at render time'''
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        return [("", key, (), value) for key, value in sorted(self.collect().items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self.lock:
+            counts, _ = self.values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), collect=None):
+        return self.add(Gauge(name, help, labels, collect))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            f.write(self.render())
+
+
+registry = Registry()
+
+hub_requests = registry.counter(
+    "hfest_hub_requests_total", "Hub requests by endpoint and HTTP status (ok when the client library hides it)",
+    ("endpoint", "status"))
+hub_request_seconds = registry.histogram(
+    "hfest_hub_request_duration_seconds", "Latency of single Hub request attempts", ("endpoint",))
+hub_in_flight = registry.gauge(
+    "hfest_hub_requests_in_flight", "Hub requests currently waiting on a response", ("endpoint",))
+hub_failovers = registry.counter(
+    "hfest_hub_failovers_total", "Hub requests that failed on a mirror and moved to the next one", ("mirror",))
+hub_hedged = registry.counter(
+    "hfest_hub_hedged_requests_total", "Hub requests also sent to a second mirror after the hedge delay, by winner",
+    ("winner",))
+http_requests = registry.counter(
+    "hfest_http_requests_total", "Requests answered by hfest serve", ("path", "status"))
+http_request_seconds = registry.histogram(
+    "hfest_http_request_duration_seconds", "Latency of requests answered by hfest serve", ("path",))
+http_in_flight = registry.gauge(
+    "hfest_http_requests_in_flight", "Requests hfest serve is currently answering")
+cache_requests = registry.counter(
+    "hfest_cache_requests_total", "Cache lookups by cache and result (hit, miss, coalesced)", ("cache", "result"))
+
+def _cache_hit_ratios():
+    with cache_requests.lock:
+        values = dict(cache_requests.values)
+    lookups = {}
+    for (cache, result), count in values.items():
+        hits, total = lookups.get(cache, (0, 0))
+        # a coalesced lookup waited on another fetch instead of making its own
+        lookups[cache] = (hits + (count if result in ('hit', 'coalesced') else 0), total + count)
+    return {(cache,): hits / total for cache, (hits, total) in lookups.items() if total}
+
+cache_hit_ratio = registry.gauge(
+    "hfest_cache_hit_ratio", "Share of cache lookups that didn't fetch", ("cache",), collect=_cache_hit_ratios)
+gpu_memory_free = registry.gauge(
+    "hfest_gpu_memory_free_bytes", "Free memory of each GPU at the last detection", ("index", "name"))
+gpu_memory_total = registry.gauge(
+    "hfest_gpu_memory_total_bytes", "Total memory of each GPU at the last detection", ("index", "name"))
+
+
+def record_gpu_info(gpu_info):
+    '''replace the GPU gauges with a fresh probe result'''
+    gpu_memory_free.clear()
+    gpu_memory_total.clear()
+    for gpu in gpu_info:
+        labels = {'index': gpu['index'], 'name': gpu['name']}
+        gpu_memory_free.set(float(gpu['memory.free'].split(" ")[0]) * 1024 ** 2, **labels)
+        gpu_memory_total.set(float(gpu['memory.total'].split(" ")[0]) * 1024 ** 2, **labels)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            body, status = b"Not found\n", 404
+        else:
+            body, status = registry.render().encode(), 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics(host="127.0.0.1", port=9464):
+    '''serve /metrics on a background thread, returns the server'''
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True).start()
+    return server
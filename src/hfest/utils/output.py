@@ -0,0 +1,154 @@
+from contextlib import contextmanager, redirect_stdout
+import io
+import json
+import sys
+import threading
+
+OUTPUT_FORMATS = ['text', 'json', 'ndjson']
+
+def add_output_argument(parser):
+    """Add the --output option shared by every command."""
+    parser.add_argument("--output", type=str, default="text", choices=OUTPUT_FORMATS,
+                        help="Output format (text, json, ndjson). json and ndjson write results to stdout and progress to stderr")
+
+def get_output_format(args):
+    return getattr(args, 'output', 'text') or 'text'
+
+@contextmanager
+def human_output(output_format):
+    """In structured modes, move human readable text to stderr so stdout only carries results."""
+    if output_format == 'text':
+        yield
+    else:
+        with redirect_stdout(sys.stderr):
+            yield
+
+class ResultWriter:
+    """
+    Write typed results (anything with a to_dict method) to stdout.
+    ndjson streams one line per result as soon as it is written, json collects
+    results and dumps a single array on close, text writes nothing because the
+    human readable text has already been printed.
+    """
+
+    def __init__(self, output_format, stream=None):
+        self.output_format = output_format
+        self.stream = stream if stream is not None else sys.stdout
+        self.results = []
+
+    def write(self, result):
+        if self.output_format == 'ndjson':
+            self.stream.write(json.dumps(result.to_dict()) + "\n")
+            self.stream.flush()
+        elif self.output_format == 'json':
+            self.results.append(result.to_dict())
+
+    def close(self):
+        if self.output_format == 'json':
+            json.dump(self.results, self.stream, indent=2)
+            self.stream.write("\n")
+            self.stream.flush()
+
+class _ThreadRoutedStream:
+    """Stream that sends writes of registered threads to their own buffer and everything else through."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text):
+        return self.buffers.get(threading.get_ident(), self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+_routing_lock = threading.Lock()
+_routing_users = 0
+
+def _acquire_router():
+    '''install the thread routed stdout if needed, returns it'''
+    global _routing_users
+    with _routing_lock:
+        if not isinstance(sys.stdout, _ThreadRoutedStream):
+            sys.stdout = _ThreadRoutedStream(sys.stdout)
+        _routing_users += 1
+        return sys.stdout
+
+def _release_router(router):
+    global _routing_users
+    with _routing_lock:
+        _routing_users -= 1
+        if _routing_users == 0 and sys.stdout is router:
+            sys.stdout = router.stream
+
+@contextmanager
+def capture_thread_output():
+    '''
+    Collect what the current thread prints into a StringIO, leaving the output
+    of other threads alone (redirect_stdout would swap stdout for all of them).
+    '''
+    router = _acquire_router()
+    buffer = io.StringIO()
+    ident = threading.get_ident()
+    router.buffers[ident] = buffer
+    try:
+        yield buffer
+    finally:
+        router.buffers.pop(ident, None)
+        _release_router(router)
+
+class BackgroundTask:
+    """
+    Run fn on a thread while the caller keeps printing. What fn prints is
+    buffered and replayed by join, so the two outputs don't interleave.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        self.router = _acquire_router()
+        self.buffer = io.StringIO()
+        self.result = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.finished = False
+        self.abandoned = False
+        self.thread = threading.Thread(target=self._run, args=(fn, args, kwargs), daemon=True)
+        self.thread.start()
+
+    def _run(self, fn, args, kwargs):
+        self.router.buffers[threading.get_ident()] = self.buffer
+        try:
+            self.result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.router.buffers.pop(threading.get_ident(), None)
+            with self.lock:
+                self.finished = True
+                abandoned = self.abandoned
+            if abandoned:
+                _release_router(self.router)
+
+    def join(self, timeout=None):
+        '''
+        wait for fn, print what it printed and return its result. Raises TimeoutError
+        when fn is still running after timeout seconds; what it prints after that is dropped
+        '''
+        self.thread.join(timeout)
+        with self.lock:
+            if not self.finished:
+                # the thread releases the router when it ends, so its output stays buffered
+                self.abandoned = True
+        if self.abandoned:
+            sys.stdout.write(self.buffer.getvalue())
+            raise TimeoutError(f"still running after {timeout:g}s")
+        _release_router(self.router)
+        sys.stdout.write(self.buffer.getvalue())
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def run_in_background(fn, *args, **kwargs):
+    return BackgroundTask(fn, *args, **kwargs)
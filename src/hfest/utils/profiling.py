@@ -0,0 +1,110 @@
+"""Per-phase wall time, request, byte and cache counters, printed with --profile or written as a Chrome trace."""
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class Profiler:
+    '''
+    Records one event per phase run. Requests, bytes and cache lookups are
+    attributed to the innermost phase running on the calling thread. A
+    disabled profiler only pays for a flag check.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def disable(self):
+        self.enabled = False
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        event = {'name': name, 'start': time.perf_counter(), 'duration': 0.0,
+                 'thread': threading.get_ident(), 'requests': 0, 'bytes': 0,
+                 'cache_hits': 0, 'cache_misses': 0}
+        stack = self._stack()
+        stack.append(event)
+        try:
+            yield
+        finally:
+            stack.pop()
+            event['duration'] = time.perf_counter() - event['start']
+            with self.lock:
+                self.events.append(event)
+
+    def _current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def record_request(self, nbytes=0):
+        if not self.enabled:
+            return
+        event = self._current()
+        if event is not None:
+            event['requests'] += 1
+            event['bytes'] += nbytes or 0
+
+    def record_cache(self, hit):
+        if not self.enabled:
+            return
+        event = self._current()
+        if event is not None:
+            event['cache_hits' if hit else 'cache_misses'] += 1
+
+    def summary(self):
+        '''aggregate events by phase name, in order of first appearance'''
+        phases = {}
+        for event in sorted(self.events, key=lambda e: e['start']):
+            phase = phases.setdefault(event['name'], {'name': event['name'], 'calls': 0, 'wall': 0.0,
+                                                      'requests': 0, 'bytes': 0,
+                                                      'cache_hits': 0, 'cache_misses': 0})
+            phase['calls'] += 1
+            phase['wall'] += event['duration']
+            for key in ('requests', 'bytes', 'cache_hits', 'cache_misses'):
+                phase[key] += event[key]
+        return list(phases.values())
+
+    def format_breakdown(self):
+        lines = [f"{'Phase':<28}{'Calls':>7}{'Wall (s)':>11}{'Requests':>10}{'Bytes':>12}{'Cache hit/miss':>16}"]
+        for phase in self.summary():
+            lines.append(f"{phase['name']:<28}{phase['calls']:>7}{phase['wall']:>11.3f}{phase['requests']:>10}"
+                         f"{phase['bytes']:>12,}{phase['cache_hits']:>10}/{phase['cache_misses']}")
+        return lines
+
+    def chrome_trace(self):
+        '''events in the Chrome trace event format (chrome://tracing, Perfetto)'''
+        pid = os.getpid()
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                'name': event['name'], 'ph': 'X', 'pid': pid, 'tid': event['thread'],
+                'ts': (event['start'] - self.origin) * 1e6, 'dur': event['duration'] * 1e6,
+                'args': {key: event[key] for key in ('requests', 'bytes', 'cache_hits', 'cache_misses')},
+            })
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+profiler = Profiler()
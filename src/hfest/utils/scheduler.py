@@ -0,0 +1,412 @@
+"""Central scheduler every Hub request goes through: shared rate limit, retries and per-endpoint concurrency."""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+import requests
+from huggingface_hub import get_session
+
+from .config import read_config, hub_endpoints
+from .profiling import profiler
+from . import metrics
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+DEFAULT_SCHEDULER_CONFIG = {
+    "requests_per_second": 10.0,
+    "burst": 20,
+    "max_retries": 5,
+    "max_concurrency": 8,
+    "hedge_after_ms": None,
+}
+
+# requests each Hub endpoint may have in flight at the same time
+ENDPOINT_CONCURRENCY = {
+    "whoami": 1,
+    "list-models": 1,
+    "model-info": 8,
+    "paths-info": 8,
+    "tree": 8,
+    "config": 4,
+    "range-read": 16,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The time budget of the command ran out before a Hub request could be sent or retried."""
+
+
+class TokenBucket:
+    """Thread safe token bucket refilled at rate tokens per second up to capacity."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        '''take one token, blocking until one is available. Returns the seconds waited'''
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self, seconds):
+        '''a server asked to back off, hold every caller for the given seconds'''
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class MirrorHealth:
+    '''
+    Health of the Hub mirrors: a mirror that failed (connection error, timeout or
+    5xx) goes behind the others for cooldown seconds, otherwise the configured
+    order is kept. A success clears the failure
+    '''
+
+    def __init__(self, cooldown=30.0):
+        self.cooldown = cooldown
+        self.failed_until = {}
+        self.lock = threading.Lock()
+
+    def order(self, endpoints):
+        now = time.monotonic()
+        with self.lock:
+            healthy = [e for e in endpoints if self.failed_until.get(e, 0) <= now]
+            failed = sorted((e for e in endpoints if e not in healthy), key=lambda e: self.failed_until[e])
+        return healthy + failed
+
+    def success(self, endpoint):
+        with self.lock:
+            self.failed_until.pop(endpoint, None)
+
+    def failure(self, endpoint):
+        with self.lock:
+            self.failed_until[endpoint] = time.monotonic() + self.cooldown
+
+
+class EndpointStats:
+    def __init__(self, limit):
+        self.limit = limit
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limit_policy = None
+
+
+def retry_after_seconds(headers):
+    '''parse a Retry-After header given either in seconds or as an HTTP date'''
+    value = (headers or {}).get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    '''
+    Runs Hub requests under a shared token bucket and a concurrency limit per
+    endpoint. 429 and 5xx responses are retried, honoring Retry-After when the
+    server sends one and using jittered exponential backoff otherwise.
+    With Hub mirrors configured, request() fails over between them and, when
+    hedge_after (seconds) is set, also sends a slow request to the next mirror.
+    '''
+
+    def __init__(self, requests_per_second=10.0, burst=20, max_retries=5, max_concurrency=8,
+                 backoff_base=0.5, backoff_max=30.0, endpoint_concurrency=None, hedge_after=None):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.endpoint_concurrency = dict(ENDPOINT_CONCURRENCY, **(endpoint_concurrency or {}))
+        self.stats = {}
+        self.semaphores = {}
+        self.lock = threading.Lock()
+        # a requests.Session keeps Hub connections alive across requests, the
+        # module level requests functions open a new connection each time
+        self.session = None
+        # time.monotonic() after which no request is sent or retried, see budget()
+        self.deadline = None
+        self.mirrors = MirrorHealth()
+        self.hedge_after = hedge_after
+        self._mirror_executor = None
+
+    @contextmanager
+    def budget(self, seconds):
+        '''
+        run the block under a time budget: requests get the remaining time as their
+        timeout, and raise DeadlineExceeded instead of starting or retrying once it
+        is spent. The budget is process wide, it is meant for one-shot commands
+        '''
+        previous = self.deadline
+        self.deadline = time.monotonic() + seconds
+        try:
+            yield
+        finally:
+            self.deadline = previous
+
+    def remaining(self):
+        '''seconds left in the budget, None without one'''
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def _endpoint(self, endpoint):
+        with self.lock:
+            if endpoint not in self.semaphores:
+                limit = min(self.endpoint_concurrency.get(endpoint, self.max_concurrency), self.max_concurrency)
+                self.semaphores[endpoint] = threading.BoundedSemaphore(limit)
+                self.stats[endpoint] = EndpointStats(limit)
+            return self.semaphores[endpoint], self.stats[endpoint]
+
+    def backoff(self, attempt):
+        '''full jitter: a random delay up to base * 2 ** attempt, capped at backoff_max'''
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _run(self, endpoint, send, status_of):
+        with profiler.phase(f"hub:{endpoint}"):
+            return self._run_attempts(endpoint, send, status_of)
+
+    def _run_attempts(self, endpoint, send, status_of):
+        semaphore, stats = self._endpoint(endpoint)
+        attempt = 0
+        while True:
+            if self.remaining() == 0:
+                raise DeadlineExceeded(f"time budget spent before the {endpoint} request")
+            self.bucket.acquire()
+            if self.remaining() == 0:
+                raise DeadlineExceeded(f"time budget spent before the {endpoint} request")
+            with semaphore:
+                with self.lock:
+                    stats.requests += 1
+                    stats.in_flight += 1
+                    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+                metrics.hub_in_flight.inc(endpoint=endpoint)
+                start = time.perf_counter()
+                try:
+                    outcome, status, headers, nbytes = send()
+                except Exception:
+                    metrics.hub_requests.inc(endpoint=endpoint, status="error")
+                    raise
+                finally:
+                    metrics.hub_request_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+                    metrics.hub_in_flight.dec(endpoint=endpoint)
+                    with self.lock:
+                        stats.in_flight -= 1
+            metrics.hub_requests.inc(endpoint=endpoint, status=str(status) if status is not None else "ok")
+            profiler.record_request(nbytes)
+
+            if headers is not None and headers.get('RateLimit-Policy'):
+                stats.rate_limit_policy = headers.get('RateLimit-Policy')
+            if status not in RETRY_STATUS_CODES:
+                return outcome
+            with self.lock:
+                stats.errors += 1
+                if status == 429:
+                    stats.throttled += 1
+            if attempt >= self.max_retries:
+                return status_of(outcome)
+
+            delay = retry_after_seconds(headers)
+            server_delay = delay is not None
+            if not server_delay:
+                delay = self.backoff(attempt)
+            remaining = self.remaining()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded(f"time budget spent while retrying the {endpoint} request")
+            if server_delay:
+                # the quota is shared, so every caller waits, not only this one
+                self.bucket.drain(delay)
+            with self.lock:
+                stats.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def request(self, endpoint, method, url, **kwargs):
+        '''send an HTTP request, returns the response of the last attempt'''
+        def send():
+            remaining = self.remaining()
+            if remaining is not None:
+                kwargs['timeout'] = min(kwargs.get('timeout') or remaining, remaining)
+            response = self._send_mirrored(method, url, kwargs)
+            nbytes = len(response.content) if isinstance(response.content, bytes) else 0
+            return response, response.status_code, response.headers, nbytes
+        return self._run(endpoint, send, lambda response: response)
+
+    def _send_http(self, method, url, kwargs):
+        return getattr(self.session or requests, method.lower())(url, **kwargs)
+
+    def _send_mirrored(self, method, url, kwargs):
+        '''
+        send to the healthiest Hub mirror, moving on to the next one after a connection
+        error, timeout or 5xx. A request unanswered after hedge_after seconds is sent
+        to the next mirror as well and the first usable answer wins
+        '''
+        endpoints = hub_endpoints()
+        base = next((e for e in endpoints if url.startswith(e + "/")), None)
+        if base is None or len(endpoints) == 1:
+            return self._send_http(method, url, kwargs)
+        path = url[len(base):]
+        queue = self.mirrors.order(endpoints)
+        pending = {}
+        with self.lock:
+            if self._mirror_executor is None:
+                self._mirror_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hfest-mirror")
+            executor = self._mirror_executor
+
+        def launch():
+            mirror = queue.pop(0)
+            pending[executor.submit(self._send_http, method, mirror + path, dict(kwargs))] = mirror
+
+        first = queue[0]
+        launch()
+        hedged = False
+        last_error = last_response = None
+        while pending:
+            hedge_after = self.hedge_after if queue and not hedged else None
+            done, _ = wait(pending, timeout=hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                mirror = pending.pop(future)
+                try:
+                    response = future.result()
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    last_error = e
+                else:
+                    if response.status_code < 500:
+                        self.mirrors.success(mirror)
+                        if hedged:
+                            metrics.hub_hedged.inc(winner="primary" if mirror == first else "hedge")
+                        return response
+                    last_response = response
+                self.mirrors.failure(mirror)
+                metrics.hub_failovers.inc(mirror=mirror)
+            if not pending and queue:
+                launch()
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    @contextmanager
+    def _hub_session_budget(self):
+        '''
+        bound the requests huggingface_hub sends from this thread by the budget: they get
+        the remaining time as their timeout and a response body stops being read with
+        DeadlineExceeded once it is spent, so a slow download doesn't outlive the budget
+        on a thread estimate_within abandoned. huggingface_hub keeps a session per thread
+        '''
+        deadline = self.deadline
+        if deadline is None:
+            yield
+            return
+        session = get_session()
+        request = session.request
+
+        def stop_at_deadline(response, *args, **kwargs):
+            read = response.raw.read
+
+            def read_within_budget(*args, **kwargs):
+                if time.monotonic() >= deadline:
+                    raise DeadlineExceeded(f"time budget spent while reading {response.url}")
+                return read(*args, **kwargs)
+            response.raw.read = read_within_budget
+            return response
+
+        def request_within_budget(method, url, **kwargs):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"time budget spent before requesting {url}")
+            kwargs['timeout'] = min(kwargs.get('timeout') or remaining, remaining)
+            kwargs['hooks'] = {'response': [stop_at_deadline]}
+            return request(method, url, **kwargs)
+
+        session.request = request_within_budget
+        try:
+            yield
+        finally:
+            del session.request
+
+    def call(self, endpoint, fn, /, *args, **kwargs):
+        '''call a huggingface_hub function, retrying the HTTP errors it raises. endpoint and fn are positional so fn may take an endpoint argument'''
+        def send():
+            try:
+                with self._hub_session_budget():
+                    return (fn(*args, **kwargs), None), None, None, 0
+            except requests.HTTPError as e:
+                if e.response is None:
+                    raise
+                return (None, e), e.response.status_code, e.response.headers, 0
+
+        def raise_error(outcome):
+            raise outcome[1]
+
+        result, error = self._run(endpoint, send, raise_error)
+        if error is not None:
+            raise error
+        return result
+
+    def report(self):
+        '''per-endpoint request counts and concurrency limits'''
+        lines = []
+        for endpoint, stats in sorted(self.stats.items()):
+            line = (f"{endpoint}: {stats.requests} request(s), {stats.retries} retr{'y' if stats.retries == 1 else 'ies'}, "
+                    f"{stats.throttled} rate limited, max {stats.max_in_flight}/{stats.limit} in flight")
+            if stats.rate_limit_policy:
+                line += f", policy {stats.rate_limit_policy}"
+            lines.append(line)
+        return lines
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    '''the process wide scheduler, configured from the hfest config on first use'''
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            config = read_config()
+            settings = {k: config.get(k) if config.get(k) is not None else v
+                        for k, v in DEFAULT_SCHEDULER_CONFIG.items()}
+            _scheduler = RequestScheduler(
+                requests_per_second=float(settings['requests_per_second']),
+                burst=int(settings['burst']),
+                max_retries=int(settings['max_retries']),
+                max_concurrency=int(settings['max_concurrency']),
+                hedge_after=float(settings['hedge_after_ms']) / 1000 if settings['hedge_after_ms'] is not None else None,
+            )
+        return _scheduler
+
+def reset_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
@@ -0,0 +1,10 @@
+import pytest
+
+from src.hfest.utils import scheduler
+
+
+@pytest.fixture(autouse=True)
+def fast_scheduler(monkeypatch):
+    """Hub requests in tests run without rate limiting or backoff delays."""
+    monkeypatch.setattr(scheduler, "_scheduler",
+                        scheduler.RequestScheduler(requests_per_second=1000, burst=1000, backoff_base=0))
@@ -0,0 +1,30 @@
+import json
+
+from benchmarks.run import (BENCHMARKS, BASELINES_FILE, compare_to_baseline, load_baselines, save_baselines, measure,
+                            bench_estimate_model_files, bench_amd_parser, bench_nvidia_mig_parser)
+
+
+def test_compare_to_baseline_flags_slowdowns():
+    rows = compare_to_baseline({'a': 1.4, 'b': 1.6, 'c': 1.0}, {'a': 1.0, 'b': 1.0}, tolerance=0.5)
+    assert [(name, regressed) for name, _, _, regressed in rows] == [('a', False), ('b', True), ('c', False)]
+    assert rows[2][2] is None
+
+
+def test_baselines_round_trip(tmp_path):
+    path = str(tmp_path / "baselines.json")
+    assert load_baselines(path) == {}
+    save_baselines(path, {'a': 0.5})
+    assert load_baselines(path) == {'a': 0.5}
+    with open(path) as f:
+        assert 'python' in json.load(f)
+
+
+def test_benchmarks_have_baselines():
+    assert set(BENCHMARKS) <= set(load_baselines(BASELINES_FILE))
+
+
+def test_hub_and_parser_benchmarks_run():
+    # one sample each, checks the replayed hub and synthetic tool outputs still work end to end
+    assert measure(bench_estimate_model_files(100), number=1, repeat=1) > 0
+    assert measure(bench_amd_parser(16), number=1, repeat=1) > 0
+    assert measure(bench_nvidia_mig_parser(2), number=1, repeat=1) > 0
@@ -0,0 +1,192 @@
+import pytest
+from unittest.mock import patch
+import json
+import time
+
+import requests
+from huggingface_hub import HfApi
+
+from src.hfest.utils.cassette import Cassette, HubStandIn, interaction_key
+from src.hfest.commands.estimate_size import request_model_info, _fetch_model_config
+from src.hfest.utils.scheduler import get_scheduler
+from src.hfest.utils.config import hub_endpoint
+from src.hfest.utils import metrics
+
+MODEL_INFO = {"usedStorage": 1024, "safetensors": {"total": 10}, "siblings": [{"rfilename": "model.safetensors"}]}
+CONFIG = {"model_type": "llama", "torch_dtype": "bfloat16"}
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+@pytest.fixture
+def hub_cassette(tmp_path):
+    cassette = Cassette(str(tmp_path / "hub.json"))
+    cassette.record(interaction_key("GET", "/api/models/org/model", "fields=usedStorage&fields=safetensors&fields=siblings"),
+                    200, {"Content-Type": "application/json"}, json.dumps(MODEL_INFO).encode())
+    cassette.record(interaction_key("GET", "/api/models", "author=org&limit=1000"),
+                    200, {"Content-Type": "application/json"}, json.dumps([{"id": "org/a"}]).encode())
+    cassette.record(interaction_key("POST", "/api/models/org/model/paths-info/main", body=b"paths=model.safetensors&expand=False",
+                                    content_type="application/x-www-form-urlencoded"),
+                    200, {"Content-Type": "application/json"},
+                    json.dumps([{"type": "file", "path": "model.safetensors", "size": 100, "oid": "abc"}]).encode())
+    cassette.record(interaction_key("GET", "/model.safetensors", range_header="bytes=0-7"),
+                    206, {"Content-Range": "bytes 0-7/100"}, b"\x08\x00\x00\x00\x00\x00\x00\xff")
+    config_headers = {"X-Repo-Commit": COMMIT, "ETag": '"config-etag"', "Content-Length": str(len(json.dumps(CONFIG)))}
+    cassette.record(interaction_key("HEAD", "/org/model/resolve/main/config.json"), 200, config_headers, b"")
+    cassette.record(interaction_key("GET", "/org/model/resolve/main/config.json"), 200, config_headers, json.dumps(CONFIG).encode())
+    return cassette
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(cassette, **kwargs):
+        server = HubStandIn(cassette, **kwargs)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_interaction_key_ignores_query_order():
+    assert interaction_key("get", "/api/models", "b=2&a=1") == interaction_key("GET", "/api/models", "a=1&b=2")
+    assert interaction_key("GET", "/f", range_header="bytes=0-7") == "GET /f [bytes=0-7]"
+
+
+def test_cassette_round_trip(hub_cassette):
+    hub_cassette.save()
+    loaded = Cassette(hub_cassette.path)
+    assert loaded.load()
+    assert len(loaded) == len(hub_cassette)
+    status, headers, body = loaded.lookup(interaction_key("GET", "/model.safetensors", range_header="bytes=0-7"))
+    assert (status, body) == (206, b"\x08\x00\x00\x00\x00\x00\x00\xff")
+    assert loaded.lookup("GET /missing") is None
+
+
+class TestReplay:
+
+    def test_serves_recorded_responses(self, hub_cassette, serve):
+        server = serve(hub_cassette)
+        response = requests.get(f"{server.url}/api/models/org/model",
+                                params={"fields": ["siblings", "safetensors", "usedStorage"]})
+        assert response.status_code == 200
+        assert response.json() == MODEL_INFO
+
+        response = requests.get(f"{server.url}/model.safetensors", headers={"Range": "bytes=0-7"})
+        assert response.status_code == 206
+        assert response.content == b"\x08\x00\x00\x00\x00\x00\x00\xff"
+
+    def test_paths_info_through_stand_in(self, hub_cassette, serve):
+        server = serve(hub_cassette)
+        paths_info = HfApi(endpoint=server.url, token="key").get_paths_info("org/model", ["model.safetensors"])
+        assert [(info.path, info.size) for info in paths_info] == [("model.safetensors", 100)]
+
+    def test_unrecorded_request_is_404(self, hub_cassette, serve):
+        server = serve(hub_cassette)
+        response = requests.get(f"{server.url}/api/models/org/other")
+        assert response.status_code == 404
+        assert "No recorded response for GET /api/models/org/other" in response.json()["error"]
+        assert server.stats.misses == 1
+
+    def test_injected_latency(self, hub_cassette, serve):
+        server = serve(hub_cassette, latency=0.05)
+        start = time.monotonic()
+        requests.get(f"{server.url}/api/models/org/model")
+        assert time.monotonic() - start >= 0.05
+
+    def test_injected_429s(self, hub_cassette, serve):
+        server = serve(hub_cassette, throttle_every=2, retry_after=0)
+        statuses = [requests.get(f"{server.url}/api/models/org/other").status_code for _ in range(4)]
+        assert statuses == [404, 429, 404, 429]
+        assert server.stats.throttled == 2
+
+    def test_scheduler_retries_injected_429s(self, hub_cassette, serve):
+        server = serve(hub_cassette, throttle_every=2, retry_after=0)
+        requests.get(f"{server.url}/api/models/org/model")
+        with patch("src.hfest.commands.estimate_size.hub_endpoint", return_value=server.url):
+            response = request_model_info("org/model", "key")
+        assert response.status_code == 200
+        assert get_scheduler().stats["model-info"].throttled == 1
+
+    def test_hf_hub_download_through_stand_in(self, hub_cassette, serve, tmp_path, monkeypatch):
+        server = serve(hub_cassette)
+        monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+        with patch("src.hfest.commands.estimate_size.hub_endpoint", return_value=server.url):
+            assert _fetch_model_config("org/model", token="key") == CONFIG
+
+
+def test_record_through_stand_in(hub_cassette, serve, tmp_path):
+    upstream = serve(hub_cassette)
+    hub_cassette.record(interaction_key("GET", "/api/models", "author=org&limit=1000"),
+                        200, {"Content-Type": "application/json", "Link": f'<{upstream.url}/api/models?cursor=2>; rel="next"'},
+                        json.dumps([{"id": "org/a"}]).encode())
+    recording = Cassette(str(tmp_path / "recorded.json"))
+    recorder = serve(recording, upstream=upstream.url)
+
+    response = requests.get(f"{recorder.url}/api/models", params={"author": "org", "limit": 1000},
+                            headers={"Authorization": "Bearer secret"})
+    assert response.json() == [{"id": "org/a"}]
+    # pagination links point at the recorder, not at the upstream Hub
+    assert response.links["next"]["url"] == f"{recorder.url}/api/models?cursor=2"
+    response = requests.get(f"{recorder.url}/model.safetensors", headers={"Range": "bytes=0-7"})
+    assert response.content == b"\x08\x00\x00\x00\x00\x00\x00\xff"
+    paths_info = HfApi(endpoint=recorder.url, token="secret").get_paths_info("org/model", ["model.safetensors"])
+    assert paths_info[0].size == 100
+    recording.save()
+
+    with open(recording.path) as f:
+        saved = f.read()
+    assert "secret" not in saved
+    replayed = Cassette(recording.path)
+    replayed.load()
+    status, headers, body = replayed.lookup(interaction_key("GET", "/api/models", "limit=1000&author=org"))
+    assert status == 200
+    assert json.loads(body) == [{"id": "org/a"}]
+    assert recorder.stats.recorded == 3
+
+
+class TestMirrors:
+
+    @pytest.fixture
+    def mirrors(self):
+        def configure(endpoint, *mirrors):
+            return patch("src.hfest.utils.config.read_config",
+                         return_value={'endpoint': endpoint, 'mirrors': ",".join(mirrors)})
+        return configure
+
+    def test_fails_over_to_the_next_mirror(self, hub_cassette, serve, mirrors):
+        mirror = serve(hub_cassette)
+        down = serve(hub_cassette)
+        down.stop()
+        failovers = metrics.hub_failovers.values.get((down.url,), 0)
+        with mirrors(down.url, mirror.url):
+            assert hub_endpoint() == down.url
+            response = request_model_info("org/model", "key")
+            assert response.status_code == 200
+            assert response.json() == MODEL_INFO
+            # the failed endpoint stays behind the mirror until its cooldown ends
+            assert hub_endpoint() == mirror.url
+        assert metrics.hub_failovers.values[(down.url,)] == failovers + 1
+
+    def test_hedged_request_takes_the_first_answer(self, hub_cassette, serve, mirrors, monkeypatch):
+        slow = serve(hub_cassette, latency=0.5)
+        fast = serve(hub_cassette)
+        monkeypatch.setattr(get_scheduler(), "hedge_after", 0.05)
+        hedges = metrics.hub_hedged.values.get(("hedge",), 0)
+        with mirrors(slow.url, fast.url):
+            start = time.monotonic()
+            response = request_model_info("org/model", "key")
+            elapsed = time.monotonic() - start
+        assert response.json() == MODEL_INFO
+        assert elapsed < 0.4
+        assert slow.stats.requests == 1 and fast.stats.requests == 1
+        assert metrics.hub_hedged.values[("hedge",)] == hedges + 1
+
+    def test_single_endpoint_is_not_hedged(self, hub_cassette, serve, mirrors, monkeypatch):
+        server = serve(hub_cassette, latency=0.1)
+        monkeypatch.setattr(get_scheduler(), "hedge_after", 0.01)
+        with mirrors(server.url):
+            assert request_model_info("org/model", "key").status_code == 200
+        assert server.stats.requests == 1
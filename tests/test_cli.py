@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import patch
+import socket
 import sys
 from io import StringIO
 
@@ -71,6 +72,43 @@ class TestMain:
             # Should exit with error code
             assert excinfo.value.code != 0
 
+    @patch('src.hfest.commands.estimate_size.handle')
+    def test_profile_and_trace(self, mock_handle, tmp_path):
+        """Test that --profile prints a breakdown and --trace writes a Chrome trace"""
+        mock_handle.return_value = 0
+        trace = tmp_path / "trace.json"
+        with patch('sys.argv', ['hfest', '--profile', '--trace', str(trace), 'estimate-size', 'deepseek-ai/DeepSeek-V3']):
+            with patch('sys.stderr', new=StringIO()) as fake_stderr:
+                assert main() == 0
+                assert "Phase" in fake_stderr.getvalue()
+                assert "estimate-size" in fake_stderr.getvalue()
+        assert trace.exists()
+
+    @patch('src.hfest.commands.estimate_size.handle')
+    def test_metrics_file(self, mock_handle, tmp_path):
+        """Test that --metrics writes Prometheus metrics when the command ends"""
+        mock_handle.return_value = 0
+        path = tmp_path / "metrics.prom"
+        with patch('sys.argv', ['hfest', '--metrics', str(path), 'estimate-size', 'deepseek-ai/DeepSeek-V3']):
+            with patch('sys.stderr', new=StringIO()):
+                assert main() == 0
+        assert "# TYPE hfest_hub_requests_total counter" in path.read_text()
+
+    @patch('src.hfest.commands.estimate_size.handle')
+    def test_metrics_port_in_use(self, mock_handle):
+        """Test that a busy --metrics_port exits with a one-line error before the command runs"""
+        with socket.socket() as busy:
+            busy.bind(("127.0.0.1", 0))
+            busy.listen()
+            port = busy.getsockname()[1]
+            with patch('sys.argv', ['hfest', '--metrics_port', str(port), 'estimate-size', 'deepseek-ai/DeepSeek-V3']):
+                with patch('sys.stderr', new=StringIO()) as fake_stderr:
+                    with pytest.raises(SystemExit) as excinfo:
+                        main()
+        assert excinfo.value.code == 1
+        assert f"ERROR: Unable to serve metrics on port {port}" in fake_stderr.getvalue()
+        mock_handle.assert_not_called()
+
     @patch('argparse.ArgumentParser.parse_args')
     def test_argument_parser_exception(self, mock_parse_args):
         """Test that SystemExit from argparse is re-raised"""
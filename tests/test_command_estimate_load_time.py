@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import json
+
+from src.hfest.commands.estimate_load_time import setup_parser, parse_size, benchmark_disk_read, get_shard_sizes, predict_load_time, handle
+
+GB = 1024 ** 3
+
+@pytest.fixture
+def load_time_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    return setup_parser(subparsers)
+
+@pytest.mark.parametrize("value, expected", [
+    ("4K", 4096),
+    ("1M", 1024 ** 2),
+    ("256M", 256 * 1024 ** 2),
+    ("1G", GB),
+    ("512", 512),
+    ("2MiB", 2 * 1024 ** 2),
+])
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+def test_parse_size_invalid():
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+@pytest.mark.parametrize("io_method", ["mmap", "direct"])
+def test_benchmark_disk_read(tmp_path, io_method):
+    try:
+        bandwidth = benchmark_disk_read(str(tmp_path), block_size=64 * 1024, total_size=1024 ** 2, io_method=io_method)
+    except OSError:
+        pytest.skip("O_DIRECT is not supported on this filesystem")
+    assert bandwidth > 0
+    # the scratch file is cleaned up
+    assert list(tmp_path.iterdir()) == []
+
+def test_get_shard_sizes_fills_unknown_with_average():
+    estimated_total = {'MODEL_FILES': {'safetensors': [("a", 2 * GB), ("b", 4 * GB), ("c", "Unknown")]}}
+    assert get_shard_sizes(estimated_total, 'safetensors') == [2 * GB, 4 * GB, 3 * GB]
+    assert get_shard_sizes(estimated_total, 'pytorch') == []
+
+def test_predict_load_time_sequential_and_parallel():
+    shards = [4 * GB] * 4
+    prediction = predict_load_time(shards, disk_bandwidth=2.0, pcie_bandwidth=16.0, workers=4)
+    assert prediction['sequential'] == pytest.approx(4 * (4 / 2.0 + 4 / 16.0))
+    # parallel loading is bound by the disk
+    assert prediction['parallel'] == pytest.approx(16 / 2.0)
+
+def test_predict_load_time_unpickle_is_slower():
+    shards = [4 * GB] * 4
+    mmap_time = predict_load_time(shards, 2.0, 16.0, workers=4)
+    bin_time = predict_load_time(shards, 2.0, 16.0, workers=4, unpickle_bandwidth=1.0)
+    assert bin_time['sequential'] > mmap_time['sequential']
+    assert bin_time['parallel'] >= mmap_time['parallel']
+
+def test_predict_load_time_no_shards():
+    assert predict_load_time([], 2.0, 16.0) == {'sequential': 0.0, 'parallel': 0.0}
+
+@patch("src.hfest.commands.estimate_load_time.estimate_model_files")
+def test_handle_success(mock_estimate, load_time_parser, capsys):
+    mock_estimate.return_value = {
+        'safetensors': 8 * GB,
+        'MODEL_FILES': {'safetensors': [("model-00001-of-00002.safetensors", 4 * GB),
+                                        ("model-00002-of-00002.safetensors", 4 * GB)]},
+    }
+    args = load_time_parser.parse_args(["org/model", "--disk_bandwidth", "2", "--pcie_bandwidth", "16"])
+    assert handle(args) == 0
+    stdout_content = capsys.readouterr().out
+    assert "[safetensors (mmap)] 2 shard(s), 8.00 GB:" in stdout_content
+    assert "Sequential load: 4.5 s" in stdout_content
+    assert "Parallel load (4 workers): 4.0 s" in stdout_content
+
+@patch("src.hfest.commands.estimate_load_time.estimate_model_files")
+def test_handle_json_output(mock_estimate, load_time_parser, capsys):
+    mock_estimate.return_value = {
+        'safetensors': 8 * GB,
+        'MODEL_FILES': {'safetensors': [("model.safetensors", 8 * GB)]},
+    }
+    args = load_time_parser.parse_args(["org/model", "--disk_bandwidth", "2", "--pcie_bandwidth", "16", "--output", "json"])
+    assert handle(args) == 0
+    result = json.loads(capsys.readouterr().out)[0]
+    assert result['model']['model_id'] == "org/model"
+    assert result['disk_bandwidth_gbps'] == 2
+    assert result['predictions'][0]['format'] == 'safetensors'
+    assert result['predictions'][0]['sequential_seconds'] == pytest.approx(4.5)
+
+@patch("src.hfest.commands.estimate_load_time.estimate_model_files")
+def test_handle_failure(mock_estimate, load_time_parser):
+    mock_estimate.return_value = None
+    args = load_time_parser.parse_args(["org/model", "--disk_bandwidth", "2"])
+    assert handle(args) == 1
+
+def test_handle_invalid_io_method(load_time_parser, capsys):
+    args = load_time_parser.parse_args(["org/model", "--io_method", "aio"])
+    assert handle(args) == 1
+    assert "Invalid io method: aio" in capsys.readouterr().out
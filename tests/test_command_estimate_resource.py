@@ -4,7 +4,12 @@ import subprocess
 import io
 import sys
 
-from src.hfest.commands.estimate_resource import detect_os, detect_gpu, get_nvidia_gpu_info, get_intel_gpu_info, get_amd_gpu_info, get_apple_gpu_info, compare_single_setup, handle
+from src.hfest.commands.estimate_resource import detect_os, detect_gpu, get_nvidia_gpu_info, get_intel_gpu_info, get_amd_gpu_info, get_apple_gpu_info, compare_single_setup, analyze_fit, analyze_variants, setup_parser, handle, get_nvidia_process_info, apply_evictions, eviction_plans, get_nvidia_gpu_info
+import argparse
+import json
+import time
+
+from src.hfest.core.catalog import Catalog
 
 
 # detect os
@@ -384,10 +389,419 @@ Generic Display Adapter  1073741824  1.0.0.1
         # Check the printed output
         assert "GPU is not detected." in mock_stdout.getvalue()
 
+GPU_INFO = [{'index': '0', 'name': 'NVIDIA A10', 'memory.total': '24576 MiB',
+             'memory.used': '0 MiB', 'memory.free': '24576 MiB'}]
+
+# compare model size against free GPU memory
+class TestAnalyzeFit:
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_compare_single_setup_returns_checks(self, mock_stdout):
+        checks = compare_single_setup(30 * 1024 ** 3, 2, GPU_INFO)
+        assert len(checks) == 1
+        assert checks[0]['required_gb'] == pytest.approx(15)
+        assert checks[0]['free_gb'] == pytest.approx(24)
+        assert checks[0]['fits'] is True
+        assert "[MEMORY CHECK PASSED]" in mock_stdout.getvalue()
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_precisions_below_stored_dtype(self, mock_stdout):
+        estimated_total = {'safetensors': 32 * 1024 ** 3, 'pytorch': 0, 'onnx': 0,
+                           'MODEL_DTYPES': ('bfloat16', [])}
+        checks = analyze_fit(estimated_total, GPU_INFO)
+        # bfloat16 weights aren't checked as float16
+        assert [c.precision for c in checks] == ['bfloat16', 'int8', 'int4']
+        assert [c.fits for c in checks] == [False, True, True]
+        assert checks[1].required_gb == pytest.approx(16)
+
+        estimated_total['MODEL_DTYPES'] = ('float16', [])
+        checks = analyze_fit(estimated_total, GPU_INFO)
+        assert [c.precision for c in checks] == ['float16', 'bfloat16', 'int8', 'int4']
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_requested_precision_above_stored_dtype(self, mock_stdout):
+        estimated_total = {'safetensors': 1024 ** 3, 'MODEL_DTYPES': ('int8', [])}
+        assert analyze_fit(estimated_total, GPU_INFO, precision='float32') == []
+        assert "Desired precision level is larger" in mock_stdout.getvalue()
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_unknown_dtype_is_not_compared(self, mock_stdout):
+        estimated_total = {'safetensors': 0, 'pytorch': 8 * 1024 ** 3, 'MODEL_DTYPES': (None, [])}
+        assert analyze_fit(estimated_total, GPU_INFO, precision='int8') == []
+        assert "Cannot compare model size and GPU memory. Model data type is unknown." in mock_stdout.getvalue()
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_each_variant_is_checked_at_its_stored_size(self, mock_stdout):
+        variants = {'model': {'format': 'safetensors', 'files': ['model.safetensors'], 'bytes': 16 * 1024 ** 3, 'primary': True},
+                    'fp32/model': {'format': 'safetensors', 'files': ['fp32/model.safetensors'], 'bytes': 32 * 1024 ** 3, 'primary': False},
+                    'onnx/model': {'format': 'onnx', 'files': ['onnx/model.onnx'], 'bytes': 4 * 1024 ** 3, 'primary': True}}
+        checks = analyze_variants({'VARIANTS': variants}, GPU_INFO)
+        assert [(c.variant, c.precision, c.fits) for c in checks] == [
+            ('model', 'stored', True), ('fp32/model', 'stored', False), ('onnx/model', 'stored', True)]
+        assert "[VARIANT fp32/model]" in mock_stdout.getvalue()
+        assert [c.variant for c in analyze_variants({'VARIANTS': variants}, GPU_INFO, filetype='onnx')] == ['onnx/model']
+        # a single copy of the weights is already covered by analyze_fit
+        assert analyze_variants({'VARIANTS': {'model': variants['model']}}, GPU_INFO) == []
+
+
+NVIDIA_UUIDS = "0, GPU-aaaa\n1, GPU-bbbb\n"
+NVIDIA_APPS = ("GPU-aaaa, 4242, /usr/bin/python3, 12000 MiB\n"
+               "GPU-aaaa, 4343, python -c import a,b, 6000 MiB\n"
+               "GPU-bbbb, 4444, ollama, [N/A]\n")
+SHARED_GPU_INFO = [{'index': '0', 'name': 'NVIDIA A10', 'memory.total': '24576 MiB',
+                    'memory.used': '18000 MiB', 'memory.free': '6576 MiB'}]
+
+def nvidia_smi(cmd, **kwargs):
+    return NVIDIA_APPS if '--query-compute-apps=gpu_uuid,pid,process_name,used_memory' in cmd else NVIDIA_UUIDS
+
+# captured from a node with GPU 0 split into 3g.40gb + 2g.20gb + 1g.10gb and GPU 1 without MIG
+MIG_QUERY = ("0, NVIDIA A100-SXM4-80GB, 81920 MiB, 400 MiB, 81520 MiB\n"
+             "1, NVIDIA A100-SXM4-80GB, 81920 MiB, 1024 MiB, 80896 MiB\n")
+MIG_MODE = "0, Enabled\n1, Disabled\n"
+MIG_LIST = """GPU 0: NVIDIA A100-SXM4-80GB (UUID: GPU-5d5ba0d6-d33d-2b2c-524d-8d3c5b9a1c2e)
+  MIG 3g.40gb     Device  0: (UUID: MIG-0a1b2c3d-0000-5000-8000-000000000001)
+  MIG 2g.20gb     Device  1: (UUID: MIG-0a1b2c3d-0000-5000-8000-000000000002)
+  MIG 1g.10gb     Device  2: (UUID: MIG-0a1b2c3d-0000-5000-8000-000000000003)
+GPU 1: NVIDIA A100-SXM4-80GB (UUID: GPU-8f1e0c55-a1b3-4c47-9e8e-7a5c6f0d2b11)
+"""
+MIG_TABLE = """+-----------------------------------------------------------------------------------------+
+| NVIDIA-SMI 550.54.15              Driver Version: 550.54.15      CUDA Version: 12.4     |
+|-----------------------------------------+------------------------+----------------------+
+| GPU  Name                 Persistence-M | Bus-Id          Disp.A | Volatile Uncorr. ECC |
+|=========================================+========================+======================|
+|   0  NVIDIA A100-SXM4-80GB          On  |   00000000:07:00.0 Off |                   On |
+| N/A   33C    P0             62W /  400W |     400MiB /  81920MiB |     N/A      Default |
++-----------------------------------------+------------------------+----------------------+
+
++-----------------------------------------------------------------------------------------+
+| MIG devices:                                                                            |
++------------------+----------------------------------+-----------+-----------------------+
+| GPU  GI  CI  MIG |                     Memory-Usage |        Vol|      Shared           |
+|      ID  ID  Dev |                       BAR1-Usage | SM     Unc| CE ENC DEC OFA JPG    |
+|                  |                                  |        ECC|                       |
+|==================+==================================+===========+=======================|
+|  0    2   0   0  |           10240MiB / 40192MiB    | 42      0 |  3   0    2    0    0 |
+|                  |                 0MiB / 65535MiB  |           |                       |
++------------------+----------------------------------+-----------+-----------------------+
+|  0    3   0   1  |              13MiB / 19968MiB    | 28      0 |  2   0    1    0    0 |
+|                  |                 0MiB / 32767MiB  |           |                       |
++------------------+----------------------------------+-----------+-----------------------+
+|  0    9   0   2  |              13MiB /  9728MiB    | 14      0 |  1   0    0    0    0 |
+|                  |                 0MiB / 16383MiB  |           |                       |
++------------------+----------------------------------+-----------+-----------------------+
+
++-----------------------------------------------------------------------------------------+
+| Processes:                                                                              |
+|  GPU   GI   CI        PID   Type   Process name                              GPU Memory |
+|=========================================================================================|
+|    0    2    0      4242      C   python3                                      10226MiB |
++-----------------------------------------------------------------------------------------+
+"""
+
+MIG_UUIDS = "0, GPU-5d5ba0d6-d33d-2b2c-524d-8d3c5b9a1c2e\n1, GPU-8f1e0c55-a1b3-4c47-9e8e-7a5c6f0d2b11\n"
+# --query-compute-apps reports the parent GPU of a process running in a MIG device
+MIG_APPS = ("GPU-5d5ba0d6-d33d-2b2c-524d-8d3c5b9a1c2e, 4242, python3, 10226 MiB\n"
+            "GPU-8f1e0c55-a1b3-4c47-9e8e-7a5c6f0d2b11, 4545, ollama, 2048 MiB\n")
+
+def nvidia_smi_mig(cmd, **kwargs):
+    if cmd == ['nvidia-smi', '-L']:
+        return MIG_LIST
+    if cmd == ['nvidia-smi']:
+        return MIG_TABLE
+    if '--query-gpu=index,mig.mode.current' in cmd:
+        return MIG_MODE
+    if '--query-gpu=index,uuid' in cmd:
+        return MIG_UUIDS
+    if '--query-compute-apps=gpu_uuid,pid,process_name,used_memory' in cmd:
+        return MIG_APPS
+    return MIG_QUERY
+
+# MIG devices replace their GPU in the device list
+class TestMig:
+
+    @patch('subprocess.check_output', side_effect=nvidia_smi_mig)
+    def test_mig_devices_are_enumerated(self, mock_check_output):
+        gpu_info = get_nvidia_gpu_info()
+        assert [(g['index'], g['name'], g['memory.total'], g['memory.free']) for g in gpu_info] == [
+            ('0:0', 'NVIDIA A100-SXM4-80GB MIG 3g.40gb', '40192 MiB', '29952 MiB'),
+            ('0:1', 'NVIDIA A100-SXM4-80GB MIG 2g.20gb', '19968 MiB', '19955 MiB'),
+            ('0:2', 'NVIDIA A100-SXM4-80GB MIG 1g.10gb', '9728 MiB', '9715 MiB'),
+            ('1', 'NVIDIA A100-SXM4-80GB', '81920 MiB', '80896 MiB')]
+        assert gpu_info[0]['parent'] == '0'
+        assert gpu_info[0]['compute_fraction'] == pytest.approx(3 / 7)
+
+    @patch('subprocess.check_output', side_effect=lambda cmd, **kw: "0, Disabled\n1, [N/A]\n" if '--query-gpu=index,mig.mode.current' in cmd else MIG_QUERY)
+    def test_mig_disabled_skips_the_mig_probe(self, mock_check_output):
+        assert [g['index'] for g in get_nvidia_gpu_info()] == ['0', '1']
+        assert mock_check_output.call_count == 2
+
+    def test_mig_mode_unknown_to_the_driver(self):
+        # older drivers reject mig.mode.current, the GPUs are still detected without it
+        def nvidia_smi(cmd, **kwargs):
+            if '--query-gpu=index,mig.mode.current' in cmd:
+                raise subprocess.CalledProcessError(2, cmd, output='Field "mig.mode.current" is not a valid field to query.')
+            return MIG_QUERY
+        with patch('subprocess.check_output', side_effect=nvidia_smi):
+            assert [g['index'] for g in get_nvidia_gpu_info()] == ['0', '1']
+
+    def test_failing_mig_probe_keeps_the_gpus(self, capsys):
+        def nvidia_smi(cmd, **kwargs):
+            if cmd == ['nvidia-smi', '-L']:
+                raise subprocess.CalledProcessError(255, cmd)
+            return nvidia_smi_mig(cmd)
+        with patch('subprocess.check_output', side_effect=nvidia_smi):
+            assert [g['index'] for g in get_nvidia_gpu_info()] == ['0', '1']
+        assert "Could not list MIG devices" in capsys.readouterr().out
+
+    @patch('subprocess.check_output', side_effect=nvidia_smi_mig)
+    def test_fit_checks_use_slice_memory(self, mock_check_output):
+        gpu_info = get_nvidia_gpu_info()
+        # 18 GB of int8 weights plus the margin fit the 3g.40gb slice, not the smaller ones
+        # even though their parent GPU has 80 GB free
+        estimated_total = {'safetensors': 36 * 1024 ** 3, 'MODEL_DTYPES': ('bfloat16', [])}
+        checks = analyze_fit(estimated_total, gpu_info, precision='int8', verbose=False)
+        assert {c.gpu_index: c.fits for c in checks} == {'0:0': True, '0:1': False, '0:2': False, '1': True}
+
+    @patch('src.hfest.commands.estimate_resource.process_owner', return_value=None)
+    @patch('subprocess.check_output', side_effect=nvidia_smi_mig)
+    def test_processes_are_counted_on_their_mig_device(self, mock_check_output, mock_owner):
+        gpu_info = get_nvidia_gpu_info()
+        processes = get_nvidia_process_info()
+        # PID 4242 runs in GPU instance 2 of GPU 0, MIG device 0
+        assert [(p['gpu_index'], p['pid']) for p in processes] == [('0:0', 4242), ('1', 4545)]
+
+        evicted = apply_evictions(gpu_info, processes, {4242})
+        assert evicted[0]['index'] == '0:0' and evicted[0]['memory.free'] == '40178 MiB'
+
+        # 30 GB of int8 weights plus the margin fit the 3g.40gb slice once PID 4242 is stopped
+        estimated_total = {'safetensors': 60 * 1024 ** 3, 'MODEL_DTYPES': ('bfloat16', [])}
+        checks = analyze_fit(estimated_total, gpu_info, precision='int8', verbose=False)
+        [plan] = [p for p in eviction_plans(checks, processes) if p.gpu_index == '0:0']
+        assert (plan.pids, plan.fits) == ([4242], True)
+
+# attribute GPU memory to processes and plan evictions
+class TestGpuProcesses:
+
+    @patch('src.hfest.commands.estimate_resource.process_owner', return_value='alice')
+    @patch('subprocess.check_output', side_effect=nvidia_smi)
+    def test_get_nvidia_process_info(self, mock_check_output, mock_owner):
+        processes = get_nvidia_process_info()
+        assert [(p['gpu_index'], p['pid'], p['name'], p['used_memory']) for p in processes] == [
+            ('0', 4242, '/usr/bin/python3', '12000 MiB'),
+            ('0', 4343, 'python -c import a,b', '6000 MiB'),
+            ('1', 4444, 'ollama', '0 MiB')]
+        assert processes[0]['user'] == 'alice'
+
+    @patch('src.hfest.commands.estimate_resource.process_owner', return_value='alice')
+    @patch('subprocess.check_output')
+    def test_get_nvidia_process_info_without_used_memory(self, mock_check_output, mock_owner):
+        mock_check_output.side_effect = lambda cmd, **kwargs: ("GPU-aaaa, 4242, python3, \n" if any(
+            arg.startswith('--query-compute-apps') for arg in cmd) else NVIDIA_UUIDS)
+        [process] = get_nvidia_process_info()
+        assert (process['pid'], process['used_memory']) == (4242, '0 MiB')
+
+    @patch('subprocess.check_output', side_effect=FileNotFoundError())
+    def test_get_nvidia_process_info_without_driver(self, mock_check_output):
+        assert "not found" in get_nvidia_process_info()
+
+    @patch('src.hfest.commands.estimate_resource.process_owner', return_value=None)
+    @patch('subprocess.check_output', side_effect=nvidia_smi)
+    def test_evictions(self, mock_check_output, mock_owner):
+        processes = get_nvidia_process_info()
+        evicted = apply_evictions(SHARED_GPU_INFO, processes, {4343})
+        assert evicted[0]['memory.free'] == '12576 MiB'
+        assert SHARED_GPU_INFO[0]['memory.free'] == '6576 MiB'
+
+        estimated_total = {'safetensors': 16 * 1024 ** 3, 'MODEL_DTYPES': ('bfloat16', [])}
+        checks = analyze_fit(estimated_total, SHARED_GPU_INFO, precision='int8', verbose=False)
+        plans = eviction_plans(checks, processes)
+        # the largest process alone frees enough for 8 GB of weights plus the margin
+        assert [(p.gpu_index, p.pids, p.fits) for p in plans] == [('0', [4242], True)]
+        assert plans[0].freed_gb == pytest.approx(12000 / 1024)
+
+        # stopping everything isn't enough for 24 GB of weights plus the margin on a 24 GB card
+        estimated_total = {'safetensors': 24 * 1024 ** 3, 'MODEL_DTYPES': ('bfloat16', [])}
+        checks = analyze_fit(estimated_total, SHARED_GPU_INFO, precision='bfloat16', verbose=False)
+        plans = eviction_plans(checks, processes)
+        assert [(p.pids, p.fits) for p in plans] == [([4242, 4343], False)]
+
 # estimate-resource
 # If model is invalid
 # If model is valid
 # If model is valid but
+class TestHandle:
+
+    @pytest.fixture
+    def resource_parser(self):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers(dest="command")
+        return setup_parser(subparsers)
+
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info')
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_ndjson(self, mock_estimate, mock_detect, mock_read_config, resource_parser, capsys):
+        mock_estimate.side_effect = [
+            {'safetensors': 16 * 1024 ** 3, 'pytorch': 0, 'onnx': 0, 'MODEL_DTYPES': ('float16', [])},
+            None,
+        ]
+        mock_detect.return_value = GPU_INFO
+        args = resource_parser.parse_args(['org/a', 'org/b', '--precision', 'float16', '--output', 'ndjson'])
+
+        assert handle(args) == 1
+
+        captured = capsys.readouterr()
+        lines = [json.loads(line) for line in captured.out.strip().split('\n')]
+        assert [line['model']['model_id'] for line in lines] == ['org/a', 'org/b']
+        assert lines[0]['gpus'][0]['memory_free_mb'] == 24576
+        assert lines[0]['checks'][0]['fits'] is True
+        assert lines[1]['model']['status'] == 'error'
+        assert lines[1]['checks'] == []
+        # GPUs are detected once per run
+        mock_detect.assert_called_once()
+        assert "[MEMORY CHECK PASSED]" in captured.err
+
+    @patch('src.hfest.commands.estimate_resource.prefetch_model_config')
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': 'key'})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info')
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_overlaps_hub_io_and_gpu_detection(self, mock_estimate, mock_detect, mock_read_config,
+                                                      mock_prefetch, resource_parser, capsys):
+        def slow_estimate(args):
+            time.sleep(0.2)
+            print("Repository Size: 1.00 GB")
+            return {'safetensors': 1024 ** 3, 'MODEL_DTYPES': ('float16', [])}
+
+        def slow_detect():
+            print("Operating System: Linux")
+            time.sleep(0.2)
+            return GPU_INFO
+
+        mock_estimate.side_effect = slow_estimate
+        mock_detect.side_effect = slow_detect
+        args = resource_parser.parse_args(['org/a', '--precision', 'float16'])
+
+        start = time.monotonic()
+        assert handle(args) == 0
+        elapsed = time.monotonic() - start
+
+        assert elapsed < 0.35
+        mock_prefetch.assert_called_once_with('org/a', token='key')
+        stdout_content = capsys.readouterr().out
+        # hardware output is replayed after the model estimate, not interleaved with it
+        assert stdout_content.index("Repository Size") < stdout_content.index("Operating System: Linux")
+        assert stdout_content.index("Operating System: Linux") < stdout_content.index("Number of Available GPUs: 1")
+
+    @patch('src.hfest.commands.estimate_resource.process_owner', return_value='bob')
+    @patch('src.hfest.commands.estimate_resource.get_nvidia_process_info')
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info', return_value=SHARED_GPU_INFO)
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_processes_and_evict(self, mock_estimate, mock_detect, mock_read_config,
+                                        mock_processes, mock_owner, resource_parser, capsys):
+        mock_estimate.return_value = {'safetensors': 16 * 1024 ** 3, 'MODEL_DTYPES': ('bfloat16', [])}
+        with patch('subprocess.check_output', side_effect=nvidia_smi):
+            mock_processes.return_value = get_nvidia_process_info()
+
+        args = resource_parser.parse_args(['org/a', '--precision', 'int8', '--processes', '--output', 'ndjson'])
+        assert handle(args) == 0
+        captured = capsys.readouterr()
+        result = json.loads(captured.out)
+        assert [p['pid'] for p in result['processes']] == [4242, 4343, 4444]
+        assert result['checks'][0]['fits'] is False
+        assert result['evictions'][0]['pids'] == [4242]
+        assert "[FITS IF EVICTED]" in captured.err
+
+        args = resource_parser.parse_args(['org/a', '--precision', 'int8', '--evict', '4242', '--output', 'ndjson'])
+        assert handle(args) == 0
+        result = json.loads(capsys.readouterr().out)
+        assert result['evicted_pids'] == [4242]
+        assert result['checks'][0]['fits'] is True
+        assert result['evictions'] == []
+
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info', return_value=GPU_INFO)
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_deadline_returns_partial_estimate(self, mock_estimate, mock_detect, mock_read_config,
+                                                      resource_parser, tmp_path, capsys):
+        def stalled_estimate(args, progress):
+            # model info answered, the paths-info queries hang
+            progress.update(REPO_SIZE=15.0, PARAM_COUNT=8 * 10 ** 9, PARAM_SOURCE='safetensors',
+                            MODEL_FILES={'safetensors': [('model.safetensors', 'Unknown')]})
+            time.sleep(2)
+
+        index = tmp_path / "index.db"
+        with Catalog(str(index)) as catalog:
+            catalog.upsert({'model_id': 'org/a', 'format': 'safetensors', 'main_dtype': 'bfloat16',
+                            'param_count': 8 * 10 ** 9, 'file_bytes': 16 * 10 ** 9})
+        mock_estimate.side_effect = stalled_estimate
+        args = resource_parser.parse_args(['org/a', '--precision', 'int8', '--deadline', '0.2', '--output', 'ndjson'])
+
+        start = time.monotonic()
+        with patch('src.hfest.commands.estimate_size.INDEX_FILE', str(index)):
+            assert handle(args) == 0
+        assert time.monotonic() - start < 1
+
+        captured = capsys.readouterr()
+        result = json.loads(captured.out)
+        assert result['model']['status'] == 'partial'
+        assert result['model']['confidence'] == {'param_count': 'exact', 'main_dtype': 'index', 'files.safetensors': 'index'}
+        assert result['model']['files']['safetensors']['bytes'] == 16 * 10 ** 9
+        # the partial estimate is still checked against the GPUs
+        assert result['checks'][0]['precision'] == 'int8'
+        assert "Deadline of 0.2s reached" in captured.err
+
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info', return_value=GPU_INFO)
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_deadline_with_nothing_known(self, mock_estimate, mock_detect, mock_read_config,
+                                                resource_parser, tmp_path, capsys):
+        mock_estimate.side_effect = lambda args, progress: time.sleep(2)
+        args = resource_parser.parse_args(['org/a', '--deadline', '0.1', '--output', 'ndjson'])
+        with patch('src.hfest.commands.estimate_size.INDEX_FILE', str(tmp_path / "missing.db")):
+            assert handle(args) == 1
+        assert json.loads(capsys.readouterr().out)['model']['status'] == 'error'
+
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.detect_gpu_info', return_value=GPU_INFO)
+    @patch('src.hfest.commands.estimate_size.estimate_model_files')
+    def test_handle_compares_revision_fits(self, mock_estimate, mock_detect, mock_read_config, resource_parser, capsys):
+        totals = {'main': {'safetensors': 16 * 1024 ** 3, 'MODEL_DTYPES': ('float16', [])},
+                  'v2': {'safetensors': 24 * 1024 ** 3, 'MODEL_DTYPES': ('float16', [])}}
+        mock_estimate.side_effect = lambda args: totals[args.revision]
+        args = resource_parser.parse_args(['org/a', '--revision', 'main', 'v2', '--precision', 'float16',
+                                           '--fail_if_growth', '25%', '--output', 'json'])
+
+        assert handle(args) == 1
+
+        captured = capsys.readouterr()
+        [comparison] = json.loads(captured.out)
+        assert comparison['status'] == 'growth'
+        assert [r['model']['revision'] for r in comparison['results']] == ['main', 'v2']
+        assert [r['checks'][0]['fits'] for r in comparison['results']] == [True, False]
+        assert comparison['diffs'][0]['exceeds_threshold'] is True
+        assert "Fit by revision:" in captured.err
+        assert "16.00 GB fits" in captured.err and "24.00 GB NO FIT" in captured.err
+
+    def test_handle_deadline_with_several_revisions(self, resource_parser, capsys):
+        args = resource_parser.parse_args(['org/a', '--revision', 'main', 'v2', '--deadline', '5'])
+        assert handle(args) == 1
+        assert "--deadline applies to a single revision" in capsys.readouterr().out
+
+    def test_handle_invalid_precision(self, resource_parser, capsys):
+        args = resource_parser.parse_args(['org/a', '--precision', 'fp8'])
+        assert handle(args) == 1
+        assert "Invalid precision: fp8" in capsys.readouterr().out
+
+    @patch('src.hfest.commands.estimate_resource.read_config', return_value={'api_key': None})
+    @patch('src.hfest.commands.estimate_resource.estimate_model_files')
+    def test_handle_checks_options_before_any_model(self, mock_estimate, mock_read_config, resource_parser, capsys):
+        args = resource_parser.parse_args(['org/a', 'org/b', '--filetype', 'gguf', '--output', 'json'])
+        assert handle(args) == 1
+        captured = capsys.readouterr()
+        # nothing estimated, so no half written JSON document
+        mock_estimate.assert_not_called()
+        assert captured.out == "" and "Invalid file type: gguf" in captured.err
 
 if __name__ == "__main__":
     pytest.main()
\ No newline at end of file
@@ -6,7 +6,11 @@ import sys
 import os
 from io import StringIO
 
-from src.hfest.commands.estimate_size import setup_parser, validate_model_id, estimate_model_files, handle
+from src.hfest.commands.estimate_size import (setup_parser, validate_model_id, estimate_model_files, handle,
+                                             prefetch_model_config, download_model_config, iter_repo_tree,
+                                             variant_name, group_variants, parse_growth_threshold, read_file_range)
+from src.hfest.core.results import model_estimate_from_total
+from src.hfest.utils import metrics
 
 # Fixtures
 @pytest.fixture
@@ -48,6 +52,19 @@ def captured_stderr(monkeypatch):
     monkeypatch.setattr(sys, 'stderr', buffer)
     return buffer
 
+def hub_response(content, headers=None):
+    response = MagicMock()
+    response.status_code = 200
+    response.content = json.dumps(content).encode()
+    response.headers = headers or {}
+    return response
+
+def hub_get(model_info, files):
+    """requests.get side effect answering model info and one tree page of (path, size, oid) files."""
+    tree = [{"type": "file", "path": path, "size": size, **({"lfs": {"oid": oid}} if oid else {})}
+            for path, size, oid in files]
+    return lambda url, **kwargs: hub_response(tree if "/tree/" in url else model_info)
+
 # Tests for validate_model_id function
 @pytest.mark.parametrize("model_id, expected", [
     ("meta-llama/Llama-2-7b", True),
@@ -99,10 +116,9 @@ def test_no_api_key(mock_read_config, valid_model_id, mock_config_no_key, capsys
 
 
 @patch("src.hfest.commands.estimate_size.read_config")
-@patch("src.hfest.commands.estimate_size.login")
 @patch("src.hfest.commands.estimate_size.HfApi")
 @patch("src.hfest.commands.estimate_size.requests.get")
-def test_http_status_codes(mock_get, mock_hfapi, mock_login, mock_read_config, valid_model_id, 
+def test_http_status_codes(mock_get, mock_hfapi, mock_read_config, valid_model_id, 
                           mock_config, capsys):
     """Test handling of different HTTP status codes."""
     mock_read_config.return_value = mock_config
@@ -126,6 +142,7 @@ def test_http_status_codes(mock_get, mock_hfapi, mock_login, mock_read_config, v
         mock_response = MagicMock()
         mock_response.status_code = status_code
         mock_response.content = b"{}" 
+        mock_response.headers = {}
         mock_get.return_value = mock_response
         
         # Call the function
@@ -142,10 +159,9 @@ def test_http_status_codes(mock_get, mock_hfapi, mock_login, mock_read_config, v
 
 
 @patch("src.hfest.commands.estimate_size.read_config")
-@patch("src.hfest.commands.estimate_size.login")
 @patch("src.hfest.commands.estimate_size.HfApi")
 @patch("src.hfest.commands.estimate_size.requests.get")
-def test_empty_repository(mock_get, mock_hfapi, mock_login, mock_read_config, valid_model_id,
+def test_empty_repository(mock_get, mock_hfapi, mock_read_config, valid_model_id,
                          mock_config, capsys):
     """Test behavior with an empty repository."""
     mock_read_config.return_value = mock_config
@@ -153,14 +169,7 @@ def test_empty_repository(mock_get, mock_hfapi, mock_login, mock_read_config, va
     mock_hfapi.return_value = mock_api
     
     # Mock response with empty repository
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = json.dumps({
-        "usedStorage": "0",
-        "safetensors": {},
-        "siblings": []
-    }).encode()
-    mock_get.return_value = mock_response
+    mock_get.side_effect = hub_get({"usedStorage": "0", "safetensors": {}}, [])
     
     args = argparse.Namespace(model_id=valid_model_id)
     
@@ -174,36 +183,26 @@ def test_empty_repository(mock_get, mock_hfapi, mock_login, mock_read_config, va
 
 
 @patch("src.hfest.commands.estimate_size.read_config")
-@patch("src.hfest.commands.estimate_size.login")
 @patch("src.hfest.commands.estimate_size.HfApi")
 @patch("src.hfest.commands.estimate_size.requests.get")
-def test_successful_estimation(mock_get, mock_hfapi, mock_login, mock_read_config, valid_model_id,
+def test_successful_estimation(mock_get, mock_hfapi, mock_read_config, valid_model_id,
                              mock_config, capsys):
     """Test successful model size estimation."""
     mock_read_config.return_value = mock_config
     
-    # Mock API and file info
-    mock_api = MagicMock()
-    file_info = MagicMock()
-    file_info.size = 1024 * 1024 * 100  # 100 MB
-    mock_api.get_paths_info.return_value = [file_info]
-    mock_hfapi.return_value = mock_api
+    mock_hfapi.return_value = MagicMock()
     
-    # Mock response with repository data
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = json.dumps({
+    # Mock responses with repository data and its files, 100 MB each
+    mock_get.side_effect = hub_get({
         "usedStorage": str(1024 * 1024 * 1024 * 10),  # 10 GB
         "safetensors": {"total": 70000000},
-        "siblings": [
-            {"rfilename": "model-00001-of-00002.safetensors"},
-            {"rfilename": "model-00002-of-00002.safetensors"},
-            {"rfilename": "pytorch_model-00001-of-00002.bin"},
-            {"rfilename": "pytorch_model-00002-of-00002.bin"},
-            {"rfilename": "config.json"}
-        ]
-    }).encode()
-    mock_get.return_value = mock_response
+    }, [
+        ("model-00001-of-00002.safetensors", 1024 * 1024 * 100, "a"),
+        ("model-00002-of-00002.safetensors", 1024 * 1024 * 100, "b"),
+        ("pytorch_model-00001-of-00002.bin", 1024 * 1024 * 100, "c"),
+        ("pytorch_model-00002-of-00002.bin", 1024 * 1024 * 100, "d"),
+        ("config.json", 600, None),
+    ])
     
     args = argparse.Namespace(model_id=valid_model_id)
     
@@ -220,6 +219,61 @@ def test_successful_estimation(mock_get, mock_hfapi, mock_login, mock_read_confi
     assert "Estimated Model File Distribution:" in stdout_content
 
 
+@patch("src.hfest.commands.estimate_size.download_model_config")
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_param_count_from_config_without_safetensors(mock_get, mock_hfapi, mock_read_config, mock_download,
+                                                     valid_model_id, mock_config, capsys):
+    """Without safetensors metadata the parameter count is computed from config.json."""
+    mock_read_config.return_value = mock_config
+    mock_hfapi.return_value = MagicMock()
+    mock_get.side_effect = hub_get({"usedStorage": str(16 * 1024 ** 3)},
+                                   [("pytorch_model.bin", 1024 * 1024 * 100, "a"), ("config.json", 600, None)])
+    mock_download.return_value = {'model_type': 'mistral', 'torch_dtype': 'bfloat16', 'vocab_size': 32000,
+                                  'hidden_size': 4096, 'intermediate_size': 14336, 'num_hidden_layers': 32,
+                                  'num_attention_heads': 32, 'num_key_value_heads': 8, 'tie_word_embeddings': False}
+
+    result = estimate_model_files(argparse.Namespace(model_id=valid_model_id))
+
+    stdout_content = capsys.readouterr().out
+    assert result['PARAM_COUNT'] == 7241732096
+    assert result['PARAM_BREAKDOWN']['layers'] == [218112000] * 32
+    # every file size is listed, they beat a count worked out from config.json
+    assert result['pytorch'] == 1024 * 1024 * 100
+    assert "Model Parameter Count: 7,241,732,096 (computed from config.json, mistral)" in stdout_content
+    assert "32 layers: 218,112,000 each" in stdout_content
+    assert "Model Parameter Count: 0" not in stdout_content
+    # a formula over config.json, not read from the Hub or the headers
+    assert model_estimate_from_total(valid_model_id, result).confidence == {
+        'param_count': 'derived', 'main_dtype': 'exact', 'files.pytorch': 'exact'}
+
+@pytest.mark.parametrize("torch_dtype, expected", [
+    # a size is missing, the count and dtype size the weights
+    ('bfloat16', 7241732096 * 2),
+    # no byte width for float64, the listed sizes are averaged
+    ('float64', 1024 * 1024 * 100 * 2),
+])
+@patch("src.hfest.commands.estimate_size.download_model_config")
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_config_param_count_with_unlisted_sizes(mock_get, mock_hfapi, mock_read_config, mock_download,
+                                                torch_dtype, expected, valid_model_id, mock_config):
+    mock_read_config.return_value = mock_config
+    mock_hfapi.return_value = MagicMock()
+    mock_get.side_effect = hub_get({"usedStorage": str(16 * 1024 ** 3)},
+                                   [("pytorch_model-00001-of-00002.bin", 1024 * 1024 * 100, "a"),
+                                    ("pytorch_model-00002-of-00002.bin", None, "b"), ("config.json", 600, None)])
+    mock_download.return_value = {'model_type': 'mistral', 'torch_dtype': torch_dtype, 'vocab_size': 32000,
+                                  'hidden_size': 4096, 'intermediate_size': 14336, 'num_hidden_layers': 32,
+                                  'num_attention_heads': 32, 'num_key_value_heads': 8, 'tie_word_embeddings': False}
+
+    result = estimate_model_files(argparse.Namespace(model_id=valid_model_id))
+
+    assert result['PARAM_COUNT'] == 7241732096
+    assert result['pytorch'] == expected
+
 @patch("src.hfest.commands.estimate_size.estimate_model_files")
 def test_handle_function_success(mock_estimate, valid_model_id, capsys):
     """Test the handle function with successful estimation."""
@@ -258,4 +312,278 @@ def test_setup_parser(est_parser):
     """Test the setup_parser function."""
     args = est_parser.parse_args(["meta-llama/Llama-2-7b"])
     
-    assert args.model_id == "meta-llama/Llama-2-7b"
\ No newline at end of file
+    assert args.model_id == "meta-llama/Llama-2-7b"
+
+@patch("src.hfest.commands.estimate_size.estimate_model_files")
+def test_handle_ndjson_streams_one_line_per_model(mock_estimate, est_parser, capsys):
+    """Test that ndjson output writes one result per model and keeps stdout machine readable."""
+    mock_estimate.side_effect = [
+        {"safetensors": 1000, "pytorch": 0, "onnx": 0, "MODEL_DTYPES": ("bfloat16", []),
+         "REPO_SIZE": 1.5, "PARAM_COUNT": 500, "MODEL_FILES": {"safetensors": [("model.safetensors", 1000)]}},
+        None,
+    ]
+    args = est_parser.parse_args(["org/model-a", "org/model-b", "--output", "ndjson"])
+
+    result = handle(args)
+
+    captured = capsys.readouterr()
+    lines = captured.out.strip().split("\n")
+    assert result == 1
+    assert len(lines) == 2
+    first, second = json.loads(lines[0]), json.loads(lines[1])
+    assert first["model_id"] == "org/model-a"
+    assert first["status"] == "ok"
+    assert first["param_count"] == 500
+    assert first["main_dtype"] == "bfloat16"
+    assert first["files"]["safetensors"] == {"count": 1, "bytes": 1000}
+    assert second["model_id"] == "org/model-b"
+    assert second["status"] == "error"
+    # human readable text goes to stderr
+    assert "Model: org/model-a" in captured.err
+    assert "Model: org/model-a" not in captured.out
+
+
+@patch("src.hfest.commands.estimate_size.estimate_model_files")
+def test_handle_json_writes_single_array(mock_estimate, est_parser, capsys):
+    """Test that json output writes one array holding every result."""
+    mock_estimate.return_value = {"safetensors": 1000, "pytorch": 2000}
+    args = est_parser.parse_args(["org/model-a", "org/model-b", "--output", "json"])
+
+    assert handle(args) == 0
+
+    results = json.loads(capsys.readouterr().out)
+    assert [r["model_id"] for r in results] == ["org/model-a", "org/model-b"]
+    assert results[0]["files"]["pytorch"]["bytes"] == 2000
+
+
+def test_setup_parser_multiple_models_and_output(est_parser):
+    """Test that extra model IDs and the output format are parsed."""
+    args = est_parser.parse_args(["org/a", "org/b", "org/c", "--output", "json"])
+
+    assert args.model_id == "org/a"
+    assert args.extra_model_ids == ["org/b", "org/c"]
+    assert args.output == "json"
+
+@patch('src.hfest.commands.estimate_size._fetch_model_config')
+def test_download_model_config_uses_prefetch(mock_fetch):
+    mock_fetch.return_value = {'model_type': 'llama'}
+    prefetch_model_config("org/prefetched", token="key")
+    assert download_model_config("org/prefetched", token="key") == {'model_type': 'llama'}
+    mock_fetch.assert_called_once_with("org/prefetched", "key")
+
+@patch('src.hfest.commands.estimate_size._fetch_model_config')
+def test_download_model_config_retries_failed_prefetch(mock_fetch):
+    mock_fetch.side_effect = [OSError("offline"), {'model_type': 'llama'}]
+    prefetch_model_config("org/flaky", token="key")
+    assert download_model_config("org/flaky", token="key") == {'model_type': 'llama'}
+    assert mock_fetch.call_count == 2
+
+@patch("src.hfest.commands.estimate_size.hf_hub_download")
+@patch("src.hfest.commands.estimate_size.tempfile.gettempdir")
+def test_config_cache_hits_make_no_request(mock_tmp, mock_download, tmp_path):
+    mock_tmp.return_value = str(tmp_path)
+    sha = "0123456789abcdef0123456789abcdef01234567"
+    for revision in (sha, "main"):
+        local_dir = tmp_path / "hfest" / "org--model" / revision
+        local_dir.mkdir(parents=True)
+        (local_dir / "config.json").write_text('{"model_type": "llama"}')
+    mock_download.side_effect = lambda **kwargs: os.path.join(kwargs['local_dir'], "config.json")
+    hits = metrics.cache_requests.value(cache="config_file", result="hit")
+
+    # the files of a commit never change, its cached config is read as is
+    assert download_model_config("org/model", token="key", revision=sha) == {'model_type': 'llama'}
+    mock_download.assert_not_called()
+    # a branch may have moved, hf_hub_download checks the cached copy with the Hub
+    assert download_model_config("org/model", token="key", revision="main") == {'model_type': 'llama'}
+    mock_download.assert_called_once()
+    assert metrics.cache_requests.value(cache="config_file", result="hit") == hits + 1
+
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_token_is_verified_once_per_process(mock_get, mock_hfapi, mock_read_config, valid_model_id):
+    mock_read_config.return_value = {"api_key": "token_verified_once"}
+    mock_api = MagicMock()
+    mock_hfapi.return_value = mock_api
+    mock_response = MagicMock()
+    mock_response.status_code = 404
+    mock_response.content = b"{}"
+    mock_response.headers = {}
+    mock_get.return_value = mock_response
+
+    args = argparse.Namespace(model_id=valid_model_id)
+    estimate_model_files(args)
+    estimate_model_files(args)
+
+    mock_api.whoami.assert_called_once()
+    assert mock_get.call_count == 2
+
+@patch("src.hfest.commands.estimate_size.read_tensor_header")
+@patch("src.hfest.commands.estimate_size.download_model_config")
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_param_count_from_safetensors_headers(mock_get, mock_hfapi, mock_read_config, mock_download, mock_header,
+                                              valid_model_id, mock_config, capsys):
+    """Without safetensors metadata on the Hub the file headers give the exact count and sizes."""
+    mock_read_config.return_value = mock_config
+    shards = [f"model-{i:05d}-of-00012.safetensors" for i in range(1, 13)]
+    mock_api = MagicMock()
+    mock_hfapi.return_value = mock_api
+    mock_get.side_effect = hub_get({"usedStorage": str(16 * 1024 ** 3)},
+                                   [(shard, 1000 + i, f"{i:064x}") for i, shard in enumerate(shards)]
+                                   + [("config.json", 600, None)])
+    mock_download.return_value = {'model_type': 'llama', 'torch_dtype': 'bfloat16'}
+    mock_header.return_value = {'format': 'safetensors', 'tensors': {'w': ['BF16', [100, 10]], 'b': ['F32', [10]]}}
+
+    result = estimate_model_files(argparse.Namespace(model_id=valid_model_id))
+
+    # the tree listing has every size and oid, no paths-info query, then one header per shard by oid
+    assert mock_api.get_paths_info.call_count == 0
+    assert [c.args[2] for c in mock_header.call_args_list] == [f"{i:064x}" for i in range(12)]
+    assert result['PARAM_COUNT'] == 12 * 1010
+    assert result['PARAM_SOURCE'] == "headers"
+    assert result['PARAM_BREAKDOWN'] is None
+    # every shard has its size, not only the first 10
+    assert result['safetensors'] == sum(1000 + i for i in range(12))
+    assert result['MODEL_FILES']['safetensors'][-1] == (shards[-1], 1011)
+    assert model_estimate_from_total(valid_model_id, result).confidence == {
+        'param_count': 'exact', 'main_dtype': 'exact', 'files.safetensors': 'exact'}
+    stdout_content = capsys.readouterr().out
+    assert "Model Parameter Count: 12,120 (read from 12 file header(s))" in stdout_content
+    assert "  • BF16: 12,000" in stdout_content
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("model-00001-of-00004.safetensors", "model"),
+    ("fp16/diffusion_pytorch_model.fp16.safetensors", "fp16/diffusion_pytorch_model.fp16"),
+    ("unet/diffusion_pytorch_model-00002-of-00003.safetensors", "unet/diffusion_pytorch_model"),
+    ("onnx/model.onnx", "onnx/model"),
+    ("onnx/model.onnx_data", "onnx/model"),
+    ("onnx/model_quantized.onnx", "onnx/model_quantized"),
+])
+def test_variant_name(path, expected):
+    assert variant_name(path) == expected
+
+def test_group_variants_picks_the_top_level_copy():
+    variants = group_variants({
+        'safetensors': [("model-00001-of-00002.safetensors", 5), ("model-00002-of-00002.safetensors", 5),
+                        ("fp32/model.safetensors", 20)],
+        'pytorch': [],
+        'onnx': [("onnx/model.onnx", 1), ("onnx/model.onnx_data", 9), ("onnx/model_quantized.onnx", 3)],
+    })
+    assert {name: (v['format'], v['bytes'], v['primary']) for name, v in variants.items()} == {
+        'model': ('safetensors', 10, True), 'fp32/model': ('safetensors', 20, False),
+        'onnx/model': ('onnx', 10, True), 'onnx/model_quantized': ('onnx', 3, False)}
+
+@patch("src.hfest.commands.estimate_size.hub_endpoint", return_value="http://mirror")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_read_file_range_quotes_the_revision(mock_get, mock_endpoint):
+    response = hub_response({})
+    response.status_code, response.content = 206, b"abcd"
+    mock_get.return_value = response
+    assert read_file_range("org/m", "model.safetensors", 0, 3, "key", revision="refs/pr/3") == b"abcd"
+    assert mock_get.call_args.args[0] == "http://mirror/org/m/resolve/refs%2Fpr%2F3/model.safetensors"
+
+@patch("src.hfest.commands.estimate_size.hub_endpoint", return_value="http://mirror")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_iter_repo_tree_follows_next_links(mock_get, mock_endpoint):
+    next_link = '<https://huggingface.co/api/models/org/m/tree/main?recursive=true&expand=false&cursor=abc>; rel="next"'
+    mock_get.side_effect = [
+        hub_response([{"type": "directory", "path": "fp16"}, {"type": "file", "path": "a.bin", "size": 1,
+                                                               "lfs": {"oid": "x"}}], {"Link": next_link}),
+        hub_response([{"type": "file", "path": "fp16/b.json", "size": 2}]),
+    ]
+    assert list(iter_repo_tree("org/m", "key")) == [("a.bin", 1, "x"), ("fp16/b.json", 2, None)]
+    # the next page is asked from the configured endpoint
+    assert mock_get.call_args_list[1].args[0] == "http://mirror/api/models/org/m/tree/main"
+    assert mock_get.call_args_list[1].kwargs['params'] == {'recursive': 'true', 'expand': 'false', 'cursor': 'abc'}
+
+@patch("src.hfest.commands.estimate_size.download_model_config")
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_variants_are_not_summed(mock_get, mock_hfapi, mock_read_config, mock_download,
+                                 valid_model_id, mock_config, capsys):
+    """A repo with a copy of the weights in a subfolder is sized by one copy."""
+    mock_read_config.return_value = mock_config
+    mock_hfapi.return_value = MagicMock()
+    mock_get.side_effect = hub_get({"usedStorage": str(30 * 1024 ** 3)}, [
+        ("pytorch_model.bin", 10 * 1024 ** 3, "a"), ("fp32/pytorch_model.bin", 20 * 1024 ** 3, "b")])
+    mock_download.return_value = {'model_type': 'unknown', 'torch_dtype': 'float16', 'quantization_config': {'quant_method': 'gptq'}}
+
+    result = estimate_model_files(argparse.Namespace(model_id=valid_model_id))
+
+    assert result['pytorch'] == 10 * 1024 ** 3
+    assert result['SIZE_SOURCE']['pytorch'] == 'files'
+    assert result['VARIANTS']['fp32/pytorch_model']['bytes'] == 20 * 1024 ** 3
+    model = model_estimate_from_total(valid_model_id, result)
+    assert model.variants['pytorch_model'].primary and not model.variants['fp32/pytorch_model'].primary
+    stdout_content = capsys.readouterr().out
+    assert "in 2 variants (10.00 GB for one)" in stdout_content
+    assert "Model Variants: 2" in stdout_content
+
+
+def test_parse_growth_threshold():
+    assert parse_growth_threshold("5%") == (0.05, None)
+    assert parse_growth_threshold("512MB") == (None, 512 * 1024 ** 2)
+    assert parse_growth_threshold("1.5 gb") == (None, 1.5 * 1024 ** 3)
+    assert parse_growth_threshold("0") == (None, 0)
+    for text in ("-5%", "five", "5PB"):
+        with pytest.raises(ValueError):
+            parse_growth_threshold(text)
+
+def revision_total(tensors, nbytes):
+    return {'safetensors': nbytes, 'pytorch': 0, 'onnx': 0, 'MODEL_DTYPES': ('bfloat16', []), 'PARAM_COUNT': 100,
+            'TENSOR_HEADERS': {'model.safetensors': (nbytes, {'tensors': tensors})}}
+
+REVISION_TOTALS = {
+    'main': revision_total({'embed': ['BF16', [10, 4]], 'norm': ['F32', [4]]}, 10 * 1024 ** 3),
+    'v2': revision_total({'embed': ['BF16', [10, 4]], 'norm': ['BF16', [4]], 'head': ['BF16', [4, 10]]}, 11 * 1024 ** 3),
+}
+
+@patch("src.hfest.commands.estimate_size.estimate_model_files")
+def test_handle_compares_revisions(mock_estimate, est_parser, capsys):
+    mock_estimate.side_effect = lambda args: REVISION_TOTALS[args.revision]
+    args = est_parser.parse_args(["org/model", "--revision", "main", "v2", "--output", "json"])
+
+    assert handle(args) == 0
+
+    captured = capsys.readouterr()
+    [comparison] = json.loads(captured.out)
+    assert comparison['status'] == "ok"
+    assert [r['revision'] for r in comparison['results']] == ["main", "v2"]
+    [diff] = comparison['diffs']
+    assert (diff['base'], diff['revision'], diff['growth']) == ("main", "v2", pytest.approx(0.1))
+    assert [t['name'] for t in diff['added']] == ["head"] and diff['removed'] == []
+    assert diff['changed'] == [{'name': 'norm', 'old_dtype': 'F32', 'old_shape': [4], 'new_dtype': 'BF16', 'new_shape': [4]}]
+    # every revision is estimated with its headers, for the tensor diff
+    assert all(call.args[0].read_headers for call in mock_estimate.call_args_list)
+    assert "norm: F32 [4] -> BF16 [4]" in captured.err
+    assert "v2 vs main: +1.00 GB (+10.0%)" in captured.err
+
+@pytest.mark.parametrize("threshold, status", [("5%", 1), ("20%", 0), ("512MB", 1), ("2GB", 0)])
+@patch("src.hfest.commands.estimate_size.estimate_model_files")
+def test_handle_fail_if_growth(mock_estimate, threshold, status, est_parser, capsys):
+    mock_estimate.side_effect = lambda args: REVISION_TOTALS[args.revision]
+    args = est_parser.parse_args(["org/model", "--revision", "main", "v2", "--fail_if_growth", threshold])
+    assert handle(args) == status
+    assert ("FAILED: v2 grows the weights by 1.00 GB over main" in capsys.readouterr().out) == bool(status)
+
+def test_handle_fail_if_growth_needs_two_revisions(est_parser, capsys):
+    assert handle(est_parser.parse_args(["org/model", "--fail_if_growth", "5%"])) == 1
+    assert "needs at least two revisions" in capsys.readouterr().out
+
+@patch("src.hfest.commands.estimate_size.read_config")
+@patch("src.hfest.commands.estimate_size.HfApi")
+@patch("src.hfest.commands.estimate_size.requests.get")
+def test_estimate_a_revision(mock_get, mock_hfapi, mock_read_config, valid_model_id, mock_config):
+    mock_read_config.return_value = mock_config
+    mock_hfapi.return_value = MagicMock()
+    mock_get.side_effect = hub_get({"usedStorage": "100", "safetensors": {"total": 50}},
+                                   [("onnx/model.onnx", 100, "a")])
+    result = estimate_model_files(argparse.Namespace(model_id=valid_model_id, revision="refs/pr/1"))
+    assert result['onnx'] == 100
+    urls = [call.args[0] for call in mock_get.call_args_list]
+    assert urls[0].endswith(f"/api/models/{valid_model_id}/revision/refs%2Fpr%2F1")
+    assert urls[1].endswith(f"/api/models/{valid_model_id}/tree/refs%2Fpr%2F1")
@@ -0,0 +1,130 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import json
+
+from src.hfest.commands.find_quantized import (handle, quant_method, is_quantized_copy, find_derivatives,
+                                               gguf_quantization, derivative_variants)
+from src.hfest.core.hardware import GPU_CATALOG, match_detected_gpu
+
+BASE = "meta-llama/Llama-3.1-8B-Instruct"
+CONFIG = {'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 8, 'hidden_size': 4096}
+ESTIMATE = {'safetensors': 16e9, 'MODEL_DTYPES': ('bfloat16', []), 'PARAM_COUNT': 8_000_000_000, 'MODEL_CONFIG': CONFIG}
+GB = 1000 ** 3
+
+RELATED = [{'id': "bartowski/Llama-3.1-8B-Instruct-GGUF", 'tags': ["gguf"]},
+           {'id': "hugging-quants/Llama-3.1-8B-Instruct-AWQ-INT4", 'tags': ["awq", "4-bit"]}]
+SEARCHED = [{'id': "someone/Llama-3.1-8B-Instruct-GPTQ-INT4", 'tags': []},
+            {'id': "someone/Llama-3.1-8B-Instruct-abliterated-GGUF", 'tags': ["gguf"]},
+            {'id': "someone/Llama-3.1-8B-Instruct-finetune", 'tags': []},
+            {'id': "bartowski/Llama-3.1-8B-Instruct-GGUF", 'tags': ["gguf"]}]
+TREES = {
+    "bartowski/Llama-3.1-8B-Instruct-GGUF": [
+        ("Llama-3.1-8B-Instruct-Q2_K.gguf", 3.2 * GB, "a"), ("Llama-3.1-8B-Instruct-Q4_K_M.gguf", 4.9 * GB, "b"),
+        ("Llama-3.1-8B-Instruct-Q8_0.gguf", 8.5 * GB, "c"), ("Llama-3.1-8B-Instruct-f32.gguf", 32.1 * GB, "d"),
+        ("mmproj-f16.gguf", 0.6 * GB, "e"), ("README.md", 100, None)],
+    "hugging-quants/Llama-3.1-8B-Instruct-AWQ-INT4": [
+        ("model-00001-of-00002.safetensors", 4 * GB, "f"), ("model-00002-of-00002.safetensors", 1.7 * GB, "g"),
+        ("config.json", 100, None)],
+    "someone/Llama-3.1-8B-Instruct-GPTQ-INT4": [("model.safetensors", 5.8 * GB, "h")],
+}
+
+def find_args(**kwargs):
+    defaults = dict(model_id=BASE, methods="all", context=4096, min_bits=4.0, gpu=["L4"], limit=50, concurrency=4,
+                    top=10, output="json")
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+def hub_entries(api_key, filter=None, search=None, limit=None):
+    return iter(RELATED if filter else SEARCHED)
+
+def repo_tree(model_id, token=None, revision="main"):
+    return iter(TREES[model_id])
+
+
+def test_quant_method():
+    assert quant_method("bartowski/Llama-3.1-8B-Instruct-GGUF") == "gguf"
+    assert quant_method("org/model", tags=["gptq", "4-bit"]) == "gptq"
+    assert quant_method("unsloth/Llama-3.1-8B-bnb-4bit") == "bnb"
+    assert quant_method("org/Llama-3.1-8B-Instruct") is None
+
+def test_is_quantized_copy():
+    assert is_quantized_copy("org/Llama-3.1-8B-Instruct-AWQ-INT4", BASE)
+    assert is_quantized_copy("org/Llama-3.1-8B-Instruct-exl2-4.65bpw", BASE)
+    assert not is_quantized_copy("org/Llama-3.1-8B-Instruct-abliterated-GGUF", BASE)
+    assert not is_quantized_copy("org/Llama-3.1-70B-Instruct-GGUF", BASE)
+
+def test_gguf_quantization():
+    assert gguf_quantization("Llama-3.1-8B-Instruct-Q4_K_M") == "Q4_K_M"
+    assert gguf_quantization("Q5_K_S/llama-3.1-8b-instruct.IQ3_XXS") == "IQ3_XXS"
+    assert gguf_quantization("model-bf16") == "BF16"
+    assert gguf_quantization("model") is None
+
+def test_match_detected_gpu():
+    assert match_detected_gpu("NVIDIA H100 80GB HBM3") is GPU_CATALOG["H100-SXM"]
+    assert match_detected_gpu("NVIDIA H100 PCIe") is GPU_CATALOG["H100-PCIe"]
+    assert match_detected_gpu("NVIDIA A100-SXM4-40GB MIG 3g.20gb") is GPU_CATALOG["A100-40GB"]
+    assert match_detected_gpu("NVIDIA L40S") is GPU_CATALOG["L40S"]
+    assert match_detected_gpu("NVIDIA GeForce RTX 4090") is GPU_CATALOG["RTX-4090"]
+    assert match_detected_gpu("Apple M2 Max") is None
+
+@patch('src.hfest.commands.find_quantized.iter_hub_model_entries', side_effect=hub_entries)
+def test_find_derivatives(mock_entries):
+    # base_model relations first, then search results that are only the base name plus quantization words
+    assert find_derivatives(BASE, "key") == {"bartowski/Llama-3.1-8B-Instruct-GGUF": "gguf",
+                                             "hugging-quants/Llama-3.1-8B-Instruct-AWQ-INT4": "awq",
+                                             "someone/Llama-3.1-8B-Instruct-GPTQ-INT4": "gptq"}
+    assert list(find_derivatives(BASE, "key", methods=["awq"])) == ["hugging-quants/Llama-3.1-8B-Instruct-AWQ-INT4"]
+    assert mock_entries.call_args_list[0].kwargs['filter'] == f"base_model:quantized:{BASE}"
+
+@patch('src.hfest.commands.find_quantized.read_tensor_header')
+@patch('src.hfest.commands.find_quantized.iter_repo_tree')
+def test_derivative_variants(mock_tree, mock_header):
+    mock_tree.return_value = iter([("model-00001-of-00002.gguf", 3 * GB, "a"), ("model-00002-of-00002.gguf", 2 * GB, "b"),
+                                   ("mmproj-model-f16.gguf", GB, "c")])
+    mock_header.return_value = {'tensors': {'w': ['Q4_K', [4096, 4096]], 'norm': ['F32', [4096]]}}
+    [option] = derivative_variants("org/model-GGUF", "gguf", "key")
+    assert (option.variant, option.files, option.bytes) == ("model", 2, 5 * GB)
+    # the file name doesn't name the type, the first split file's header does
+    assert option.quantization == "Q4_K"
+    assert mock_header.call_args.args[:3] == ("org/model-GGUF", "model-00001-of-00002.gguf", "a")
+
+@patch('src.hfest.commands.find_quantized.read_config', return_value={'api_key': 'key'})
+@patch('src.hfest.commands.find_quantized.estimate_model_files', return_value=ESTIMATE)
+@patch('src.hfest.commands.find_quantized.iter_hub_model_entries', side_effect=hub_entries)
+@patch('src.hfest.commands.find_quantized.iter_repo_tree', side_effect=repo_tree)
+def test_handle_ranks_variants_that_fit(mock_tree, mock_entries, mock_estimate, mock_read_config, capsys):
+    assert handle(find_args()) == 0
+
+    captured = capsys.readouterr()
+    [search] = json.loads(captured.out)
+    assert (search['repos'], search['checked']) == (3, 5)
+    options = search['options']
+    ranked = [(option['model_id'].split('/')[0], option['quantization'] or option['method']) for option in options]
+    # fitting variants first, smaller ones decode faster; Q2_K is under --min_bits
+    assert ranked == [("bartowski", "Q4_K_M"), ("hugging-quants", "awq"), ("someone", "gptq"), ("bartowski", "Q8_0"),
+                      ("bartowski", "F32")]
+    assert [option['fits'] for option in options] == [True, True, True, True, False]
+    assert options[0]['gpu_name'] == "L4" and options[0]['bits_per_weight'] == pytest.approx(4.9)
+    # 300 GB/s at 80% over the weights and 512 MiB of KV cache
+    assert options[0]['tokens_per_second'] == pytest.approx(300e9 * 0.8 / (4.9 * GB + 4096 * 131072))
+    assert "Left out 1 variant(s) below 4 bits per weight" in captured.err
+
+@patch('src.hfest.commands.find_quantized.read_config', return_value={'api_key': 'key'})
+@patch('src.hfest.commands.find_quantized.estimate_model_files', return_value=None)
+@patch('src.hfest.commands.find_quantized.iter_hub_model_entries', side_effect=hub_entries)
+@patch('src.hfest.commands.find_quantized.iter_repo_tree', side_effect=repo_tree)
+@patch('src.hfest.commands.find_quantized.kv_cache_bytes', return_value=0)
+def test_handle_gated_base_model(mock_kv, mock_tree, mock_entries, mock_estimate, mock_read_config, capsys):
+    # without the base parameter count nothing is left out by --min_bits, the derivatives are still checked
+    assert handle(find_args(methods="gguf", gpu=["A10"], output="text")) == 0
+    out = capsys.readouterr().out
+    assert "Quantized derivatives found: 1" in out
+    assert "(Llama-3.1-8B-Instruct-Q2_K) gguf Q2_K" in out
+
+def test_handle_rejects_invalid_args(capsys):
+    assert handle(find_args(methods="awq,mlx")) == 1
+    assert handle(find_args(gpu=["TPUv5"])) == 1
+    assert handle(find_args(top=0)) == 1
+    err = capsys.readouterr().err
+    assert "Invalid quantization method: mlx" in err and "Unknown GPU type: TPUv5" in err
@@ -0,0 +1,185 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import argparse
+import json
+
+from src.hfest.core.catalog import Catalog
+from src.hfest.commands.index import setup_parser, fetch_catalog_record, refresh_models, handle
+
+GB = 1024 ** 3
+
+LLAMA_CONFIG = {
+    "architectures": ["LlamaForCausalLM"],
+    "model_type": "llama",
+    "torch_dtype": "bfloat16",
+    "num_hidden_layers": 32,
+    "num_attention_heads": 32,
+    "num_key_value_heads": 8,
+    "hidden_size": 4096,
+}
+
+@pytest.fixture
+def index_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    return setup_parser(subparsers)
+
+@pytest.fixture
+def catalog(tmp_path):
+    with Catalog(str(tmp_path / "index.db")) as catalog:
+        yield catalog
+
+def make_record(model_id, param_count, architecture="LlamaForCausalLM", model_format="safetensors", kv_bytes_per_token=0):
+    return {'model_id': model_id, 'sha': "abc", 'architecture': architecture, 'model_type': None,
+            'format': model_format, 'main_dtype': 'bfloat16', 'param_count': param_count,
+            'file_bytes': param_count * 2, 'num_layers': None, 'kv_bytes_per_token': kv_bytes_per_token}
+
+def make_response(content, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = json.dumps(content).encode()
+    return response
+
+def hub_content(sha):
+    return {
+        "sha": sha,
+        "safetensors": {"total": 8_000_000_000, "parameters": {"BF16": 8_000_000_000}},
+    }
+
+# a top-level checkpoint, a float32 copy of it in a subfolder and an ONNX export
+REPO_TREE = [("model-00001-of-00002.safetensors", 8 * GB, "a"), ("model-00002-of-00002.safetensors", 8 * GB, "b"),
+             ("fp32/model.safetensors", 32 * GB, "c"), ("onnx/model.onnx", 32 * GB, "d"),
+             ("config.json", 700, None), ("README.md", 5000, None)]
+
+class TestCatalog:
+
+    def test_query_filters_by_memory_budget(self, catalog):
+        catalog.upsert(make_record("org/small", 1_000_000_000))
+        catalog.upsert(make_record("org/medium", 8_000_000_000))
+        catalog.upsert(make_record("org/large", 70_000_000_000))
+
+        entries = catalog.query(precision='int4', max_memory_gb=24)
+
+        # ranked by parameter count, 70B at int4 (~39 GB with margin) doesn't fit
+        assert [e.model_id for e in entries] == ["org/medium", "org/small"]
+        assert entries[0].required_gb == pytest.approx(8_000_000_000 * 0.5 * 1.2 / GB)
+
+    def test_query_includes_kv_cache(self, catalog):
+        catalog.upsert(make_record("org/model", 8_000_000_000, kv_bytes_per_token=131072))
+        assert len(catalog.query(precision='int4', max_memory_gb=5)) == 1
+        # 8k tokens of KV cache adds 1 GB
+        assert len(catalog.query(precision='int4', max_memory_gb=5, context_length=8192)) == 0
+
+    def test_query_filters_architecture_and_format(self, catalog):
+        catalog.upsert(make_record("org/llama", 1_000_000_000))
+        catalog.upsert(make_record("org/bert", 1_000_000_000, architecture="BertModel", model_format="pytorch"))
+        assert [e.model_id for e in catalog.query(architecture="BertModel")] == ["org/bert"]
+        assert [e.model_id for e in catalog.query(model_format="safetensors")] == ["org/llama"]
+
+    def test_upsert_replaces_model_and_dtype_params(self, catalog):
+        catalog.upsert(make_record("org/model", 10), {"F32": 10})
+        catalog.upsert(make_record("org/model", 20), {"BF16": 20})
+        assert catalog.model_ids() == ["org/model"]
+        assert catalog.dtype_params("org/model") == {"BF16": 20}
+        assert catalog.remove("org/model")
+        assert catalog.dtype_params("org/model") == {}
+
+    def test_tensors_table_of_older_catalogs_is_renamed(self, tmp_path):
+        path = str(tmp_path / "index.db")
+        with Catalog(path) as catalog:
+            catalog.upsert(make_record("org/model", 10), {"F32": 10})
+            with catalog.conn:
+                catalog.conn.execute("ALTER TABLE dtype_params RENAME TO tensors")
+        with Catalog(path) as catalog:
+            assert catalog.dtype_params("org/model") == {"F32": 10}
+
+    def test_invalid_sort(self, catalog):
+        with pytest.raises(ValueError):
+            catalog.query(sort="name; DROP TABLE models")
+
+
+@patch("src.hfest.commands.index.download_model_config", return_value=LLAMA_CONFIG)
+@patch("src.hfest.commands.index.HfApi")
+@patch("src.hfest.commands.index.iter_repo_tree", side_effect=lambda *args: iter(REPO_TREE))
+@patch("src.hfest.commands.index.request_model_info")
+def test_fetch_catalog_record(mock_request, mock_tree, mock_hfapi, mock_download):
+    mock_request.return_value = make_response(hub_content("sha1"))
+
+    record, dtype_params, error = fetch_catalog_record("org/model", "key")
+
+    assert error is None
+    assert record['sha'] == "sha1"
+    assert record['architecture'] == "LlamaForCausalLM"
+    assert record['format'] == "safetensors"
+    assert record['param_count'] == 8_000_000_000
+    # the top-level checkpoint only, not the fp32 copy
+    assert record['file_bytes'] == 16 * GB
+    # 2 * 32 layers * 8 kv heads * 128 head dim * 2 bytes
+    assert record['kv_bytes_per_token'] == 131072
+    assert dtype_params == {"BF16": 8_000_000_000}
+    # the files are listed at the commit that was read, the tree sizes them all
+    assert mock_tree.call_args.args == ("org/model", "key", "sha1")
+    assert mock_download.call_args.kwargs['revision'] == "sha1"
+    mock_hfapi.return_value.get_paths_info.assert_not_called()
+
+
+@patch("src.hfest.commands.index.download_model_config", return_value=LLAMA_CONFIG)
+@patch("src.hfest.commands.index.read_model_headers")
+@patch("src.hfest.commands.index.HfApi")
+@patch("src.hfest.commands.index.iter_repo_tree", side_effect=lambda *args: iter(REPO_TREE))
+@patch("src.hfest.commands.index.request_model_info")
+def test_fetch_catalog_record_reads_headers(mock_request, mock_tree, mock_hfapi, mock_headers, mock_download):
+    mock_request.return_value = make_response({"sha": "sha1"})
+    header = {'tensors': {'embed': ['BF16', [128256, 4096]], 'norm': ['F32', [4096]]}}
+    mock_headers.return_value = {"model-00001-of-00002.safetensors": (8 * GB, header),
+                                 "model-00002-of-00002.safetensors": (8 * GB, {'tensors': {}})}
+
+    record, dtype_params, error = fetch_catalog_record("org/model", "key")
+
+    # without safetensors metadata the primary variant's headers give the count
+    assert mock_headers.call_args.args[2] == ["model-00001-of-00002.safetensors", "model-00002-of-00002.safetensors"]
+    assert dtype_params == {"BF16": 128256 * 4096, "F32": 4096}
+    assert record['param_count'] == 128256 * 4096 + 4096
+
+
+@patch("src.hfest.commands.index.request_model_info")
+def test_fetch_catalog_record_unchanged_sha(mock_request):
+    mock_request.return_value = make_response(hub_content("sha1"))
+    assert fetch_catalog_record("org/model", "key", known_sha="sha1") == (None, None, None)
+
+
+@patch("src.hfest.commands.index.fetch_catalog_record")
+def test_refresh_models_is_incremental(mock_fetch, catalog, capsys):
+    catalog.upsert(make_record("org/known", 10))
+    mock_fetch.side_effect = [(None, None, None),
+                              (make_record("org/new", 20), {}, None),
+                              (None, None, "Model not found.")]
+
+    failures = refresh_models(catalog, ["org/known", "org/new", "org/missing"], "key")
+
+    stdout_content = capsys.readouterr().out
+    assert failures == 1
+    assert mock_fetch.call_args_list[0][0] == ("org/known", "key", "abc")
+    assert "[UNCHANGED] org/known" in stdout_content
+    assert "[UPDATED] org/new" in stdout_content
+    assert "[FAILED] org/missing: Model not found." in stdout_content
+    assert catalog.model_ids() == ["org/known", "org/new"]
+
+
+def test_handle_query_json(index_parser, tmp_path, capsys):
+    db = str(tmp_path / "index.db")
+    with Catalog(db) as catalog:
+        catalog.upsert(make_record("org/model", 8_000_000_000))
+    args = index_parser.parse_args(["--db", db, "query", "--max_memory", "24", "--precision", "int4", "--output", "json"])
+
+    assert handle(args) == 0
+
+    results = json.loads(capsys.readouterr().out)
+    assert results[0]['model_id'] == "org/model"
+    assert results[0]['param_count'] == 8_000_000_000
+
+
+def test_handle_no_subcommand(index_parser, tmp_path, capsys):
+    args = index_parser.parse_args(["--db", str(tmp_path / "index.db")])
+    assert handle(args) == 1
+    assert "Please specify an index subcommand" in capsys.readouterr().out
@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import json
+import math
+
+from src.hfest.commands.plan_capacity import handle, plan_options, select_gpus, parse_prices
+from src.hfest.core.capacity import parse_mix, replica_performance, p95_queue_wait, size_replicas
+from src.hfest.core.hardware import GPU_CATALOG
+
+# Llama-2-7b like: 32 layers, 32 KV heads of 128, bf16 KV cache
+KV_PER_TOKEN = 2 * 32 * 32 * 128 * 2
+CONFIG = {'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 32, 'hidden_size': 4096}
+ESTIMATE = {'safetensors': 13.5 * 1024 ** 3, 'pytorch': 0, 'MODEL_DTYPES': ('bfloat16', []),
+            'PARAM_COUNT': 6_738_415_616, 'MODEL_CONFIG': CONFIG}
+
+def plan_args(**kwargs):
+    defaults = dict(model_id="meta-llama/Llama-2-7b-hf", qps=10.0, ttft_ms=1000.0, tpot_ms=None, mix="512:128",
+                    precision="auto", gpus=None, price=[], max_batch=256, max_utilization=0.8, output="text")
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+
+def test_parse_mix_normalizes_weights():
+    assert parse_mix("512:128") == [(512, 128, 1.0)]
+    assert parse_mix("512:128:3, 2048:256:1") == [(512, 128, 0.75), (2048, 256, 0.25)]
+    for text in ("512", "512:0", "a:b", "512:128:-1"):
+        with pytest.raises(ValueError):
+            parse_mix(text)
+
+def test_p95_queue_wait():
+    assert p95_queue_wait(10, 10) == math.inf
+    assert p95_queue_wait(0.1, 10) == 0.0
+    # M/M/1 at 50% utilization: P(wait > t) = 0.5 * exp(-5 t)
+    assert p95_queue_wait(5, 10) == pytest.approx(math.log(10) / 5)
+
+def test_replica_performance_is_bounded_by_memory():
+    spec = GPU_CATALOG["A10"]
+    weights = 14 * 1024 ** 3
+    mix = parse_mix("512:128")
+    # 24 GB * 0.9 leaves ~7.6 GB for a KV cache of 0.5 MB per token
+    performance = replica_performance(spec, 1, weights, 7e9, KV_PER_TOKEN, mix)
+    assert performance['batch'] == int((24 * 1024 ** 3 * 0.9 - weights) // (KV_PER_TOKEN * 640))
+    assert performance['capacity'] > 0
+    # a 140 GB model doesn't fit on one A10, nor four
+    assert replica_performance(spec, 4, 140 * 1024 ** 3, 70e9, KV_PER_TOKEN, mix) is None
+
+def test_replica_performance_shrinks_the_batch_for_tpot():
+    spec = GPU_CATALOG["H100-SXM"]
+    mix = parse_mix("2048:512")
+    loose = replica_performance(spec, 1, 14 * 1024 ** 3, 7e9, KV_PER_TOKEN, mix)
+    tight = replica_performance(spec, 1, 14 * 1024 ** 3, 7e9, KV_PER_TOKEN, mix, tpot=0.008)
+    assert tight['batch'] < loose['batch']
+    assert tight['step'] <= 0.008
+
+def test_size_replicas_keeps_utilization_below_the_limit():
+    performance = {'capacity': 20.0, 'prefill': [0.05]}
+    replicas, utilization, ttft_p95 = size_replicas(performance, qps=100, ttft=1.0, max_utilization=0.8)
+    assert replicas == 7
+    assert utilization == pytest.approx(100 / 7 / 20)
+    assert ttft_p95 <= 1.0
+    # a tighter TTFT needs replicas with shorter queues
+    assert size_replicas(performance, qps=100, ttft=0.2)[0] > 7
+    # prefill alone is slower than the target
+    assert size_replicas(performance, qps=100, ttft=0.01) == (None, None, 0.05)
+
+def test_plan_options_counts_the_memory_headroom_once():
+    # 20 GB of weights fit in 90% of a 24 GB A10, with another 20% margin on top they wouldn't
+    [option] = [o for o in plan_options(select_gpus("A10", {}), 10e9, "bfloat16", 0, parse_mix("512:128"), qps=1,
+                                        ttft=10.0) if o.tensor_parallel == 1]
+    assert option.reason is None and option.batch_size == 256
+
+def test_plan_options_puts_the_cheapest_option_first():
+    specs = select_gpus("H100-SXM,A10", parse_prices(["a10=0.5"]))
+    assert [spec.price_per_hour for spec in specs] == [4.0, 0.5]
+    options = plan_options(specs, 13e9, "bfloat16", KV_PER_TOKEN, parse_mix("512:128"), qps=5, ttft=1.0)
+    feasible = [o for o in options if o.meets_slo]
+    assert feasible == options[:len(feasible)]
+    assert [o.cost_per_hour for o in feasible] == sorted(o.cost_per_hour for o in feasible)
+    assert all(o.utilization <= 0.8 and o.ttft_p95_ms <= 1000 for o in feasible)
+    # 13B bf16 weights don't fit on one 24 GB A10
+    a10_tp1 = next(o for o in options if o.gpu == "A10" and o.tensor_parallel == 1)
+    assert not a10_tp1.meets_slo and a10_tp1.reason
+    # A10 nodes hold 4 GPUs, so no 8-way tensor parallelism
+    assert not any(o.gpu == "A10" and o.tensor_parallel == 8 for o in options)
+
+def test_select_gpus_rejects_unknown_types():
+    with pytest.raises(ValueError):
+        select_gpus("H100-SXM,TPUv5", {})
+    with pytest.raises(ValueError):
+        parse_prices(["TPUv5=1.0"])
+
+
+@patch('src.hfest.commands.plan_capacity.estimate_model_files', return_value=ESTIMATE)
+def test_handle_prints_the_cheapest_configuration(mock_estimate, capsys):
+    assert handle(plan_args(gpus="H100-SXM,L4")) == 0
+    output = capsys.readouterr().out
+    assert "[CHEAPEST]" in output
+    assert "Cheapest:" in output
+    assert "bfloat16 weights" in output
+
+@patch('src.hfest.commands.plan_capacity.estimate_model_files', return_value=ESTIMATE)
+def test_handle_writes_the_plan_as_json(mock_estimate, capsys):
+    assert handle(plan_args(gpus="A100-80GB", qps=50, output="json")) == 0
+    [plan] = json.loads(capsys.readouterr().out)
+    assert plan['best']['gpu'] == "A100-80GB"
+    assert plan['best']['gpus'] == plan['best']['replicas'] * plan['best']['tensor_parallel']
+    assert plan['model']['param_count'] == ESTIMATE['PARAM_COUNT']
+    assert len(plan['options']) == 4
+
+@patch('src.hfest.commands.plan_capacity.estimate_model_files', return_value=ESTIMATE)
+def test_handle_fails_when_nothing_meets_the_slo(mock_estimate, capsys):
+    assert handle(plan_args(gpus="L4", ttft_ms=1.0)) == 1
+    assert "No configuration meets the SLO." in capsys.readouterr().out
+
+@patch('src.hfest.commands.plan_capacity.estimate_model_files', return_value={**ESTIMATE, 'PARAM_COUNT': 0})
+def test_handle_needs_a_parameter_count(mock_estimate, capsys):
+    assert handle(plan_args()) == 1
+    assert "parameter count of the model is unknown" in capsys.readouterr().out
+
+def test_handle_rejects_invalid_args(capsys):
+    assert handle(plan_args(qps=0)) == 1
+    assert handle(plan_args(mix="512")) == 1
+    assert handle(plan_args(gpus="TPUv5")) == 1
+    assert handle(plan_args(precision="fp8")) == 1
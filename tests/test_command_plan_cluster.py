@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import json
+
+from src.hfest.commands.plan_cluster import handle
+from src.hfest.core.hardware import parse_cluster
+from src.hfest.core.parallel import parallel_splits, ring_all_reduce, placement_cost, rank_placements
+
+# Llama-3.1-405B like
+CONFIG = {'num_hidden_layers': 126, 'num_attention_heads': 128, 'num_key_value_heads': 8, 'hidden_size': 16384}
+MODEL = {'params': 405e9, 'weight_bytes': 810e9, 'layers': 126, 'hidden': 16384, 'kv_bytes_per_token': 2 * 126 * 8 * 128 * 2}
+ESTIMATE = {'safetensors': 810e9, 'MODEL_DTYPES': ('bfloat16', []), 'PARAM_COUNT': 405_000_000_000, 'MODEL_CONFIG': CONFIG}
+
+def cluster_args(**kwargs):
+    defaults = dict(model_id="meta-llama/Llama-3.1-405B", cluster="4x8xH100-SXM", network="ib-ndr", nics_per_node=None,
+                    intra=None, precision="auto", batch=64, context=4096, micro_batches=4, top=10, output="text")
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+
+def test_parse_cluster():
+    cluster = parse_cluster("4x8xH100-SXM", network="ib-ndr")
+    assert (cluster.nodes, cluster.gpus_per_node, cluster.total_gpus) == (4, 8, 32)
+    assert cluster.intra_gbps == 450
+    # one 400 Gbit/s NIC per GPU
+    assert cluster.inter_gbps == 50
+    # the GPU type's usual node size, two 100 Gbit/s NICs shared by four GPUs
+    cluster = parse_cluster("2xa10", network="100", nics_per_node=2)
+    assert (cluster.gpu.name, cluster.gpus_per_node, cluster.inter_gbps) == ("A10", 4, 6.25)
+    assert parse_cluster("1x8xH100-SXM", intra="pcie").intra_gbps == 32
+    for text, network in (("4xTPUv5", "ib-ndr"), ("H100-SXM", "ib-ndr"), ("4x8xH100-SXM", "token-ring")):
+        with pytest.raises(ValueError):
+            parse_cluster(text, network=network)
+
+def test_parallel_splits_use_every_gpu():
+    splits = list(parallel_splits(16, layers=4, heads=8))
+    assert all(tp * pp * dp == 16 for tp, pp, dp in splits)
+    # tensor parallelism divides the heads, pipeline stages are at most the layers
+    assert max(tp for tp, _, _ in splits) == 8
+    assert max(pp for _, pp, _ in splits) == 4
+    assert (2, 4, 2) in splits and (1, 1, 16) in splits
+
+def test_ring_all_reduce():
+    assert ring_all_reduce(1e9, 1, 100, 1e-5) == 0
+    assert ring_all_reduce(1e9, 4, 100, 0) == pytest.approx(2 * 3 / 4 * 0.01)
+
+def test_tensor_parallelism_across_nodes_pays_the_network():
+    cluster = parse_cluster("2x8xH100-SXM", network="eth-25")
+    within = placement_cost(cluster, 8, 2, MODEL, 64, 4096, 4)
+    across = placement_cost(cluster, 16, 1, MODEL, 64, 4096, 4)
+    assert not within['tp_crosses_nodes'] and within['inter_node_hops'] == 1
+    assert across['tp_crosses_nodes']
+    assert across['all_reduce'] > 10 * within['all_reduce']
+    assert across['tokens_per_second'] < within['tokens_per_second']
+
+def test_too_few_micro_batches_leave_a_bubble():
+    cluster = parse_cluster("4x8xH100-SXM")
+    placement = placement_cost(cluster, 4, 8, MODEL, 64, 4096, 2)
+    assert placement['bubble'] == pytest.approx(6 / 8)
+    assert placement['penalty'] > placement['bubble']
+    assert placement_cost(cluster, 4, 8, MODEL, 64, 4096, 8)['bubble'] == 0
+
+def test_rank_placements_recommends_a_split_that_fits():
+    cluster = parse_cluster("4x8xH100-SXM")
+    placements = rank_placements(cluster, MODEL, 64, 4096, 4, heads=128)
+    best = placements[0]
+    assert best['fits']
+    # 810 GB of weights don't fit unless split over at least 16 GPUs
+    assert best['tp'] * best['pp'] >= 16
+    fitting = [p for p in placements if p['fits']]
+    assert [p['tokens_per_second'] for p in fitting] == sorted((p['tokens_per_second'] for p in fitting), reverse=True)
+    assert not placements[-1]['fits']
+
+
+@patch('src.hfest.commands.plan_cluster.estimate_model_files', return_value=ESTIMATE)
+def test_handle_prints_the_recommended_split(mock_estimate, capsys):
+    assert handle(cluster_args()) == 0
+    output = capsys.readouterr().out
+    assert "[BEST]" in output
+    assert "Recommended: TP=" in output
+
+@patch('src.hfest.commands.plan_cluster.estimate_model_files', return_value=ESTIMATE)
+def test_handle_writes_the_plan_as_json(mock_estimate, capsys):
+    assert handle(cluster_args(output="json")) == 0
+    [plan] = json.loads(capsys.readouterr().out)
+    best = plan['best']
+    assert best['tensor_parallel'] * best['pipeline_parallel'] * best['data_parallel'] == 32
+    assert plan['options'][0] == best
+    assert (plan['nodes'], plan['gpus_per_node'], plan['cluster']) == (4, 8, "H100-SXM")
+
+@patch('src.hfest.commands.plan_cluster.estimate_model_files', return_value=ESTIMATE)
+def test_handle_fails_when_the_model_does_not_fit(mock_estimate, capsys):
+    assert handle(cluster_args(cluster="1x4xL4")) == 1
+    assert "No split fits the model in GPU memory." in capsys.readouterr().out
+
+@patch('src.hfest.commands.plan_cluster.estimate_model_files', return_value={**ESTIMATE, 'MODEL_CONFIG': {}})
+def test_handle_needs_the_layers(mock_estimate, capsys):
+    assert handle(cluster_args()) == 1
+    assert "unable to plan the cluster" in capsys.readouterr().out
+
+def test_handle_rejects_invalid_args(capsys):
+    assert handle(cluster_args(cluster="4xTPUv5")) == 1
+    assert handle(cluster_args(batch=0)) == 1
+    assert handle(cluster_args(precision="fp8")) == 1
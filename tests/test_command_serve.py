@@ -0,0 +1,168 @@
+import pytest
+from unittest.mock import patch
+import threading
+import time
+
+import requests
+
+from src.hfest.commands.serve import CoalescingCache, EstimationService, EstimationServer, parse_fit_query
+
+GPU_INFO = [{'index': '0', 'name': 'NVIDIA RTX 4090', 'memory.total': '24564 MiB',
+             'memory.used': '0 MiB', 'memory.free': '24564 MiB'}]
+
+def fake_estimate(args):
+    if args.model_id == "org/offline":
+        raise requests.ConnectionError("Connection refused")
+    if args.model_id == "org/missing":
+        print(f"ERROR: Model not found: {args.model_id} doesn't exist on HuggingFace Hub.")
+        return None
+    time.sleep(0.05)
+    return {'safetensors': 16 * 1024 ** 3, 'pytorch': 0, 'onnx': 0, 'MODEL_DTYPES': ('bfloat16', []),
+            'PARAM_COUNT': 8 * 10 ** 9,
+            'MODEL_CONFIG': {'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 8,
+                             'hidden_size': 4096}}
+
+@pytest.fixture
+def server():
+    with patch('src.hfest.commands.serve.estimate_model_files', side_effect=fake_estimate) as mock_estimate, \
+         patch('src.hfest.commands.serve.detect_gpu_info', side_effect=lambda: list(GPU_INFO)) as mock_detect:
+        service = EstimationService("key", cache_ttl=60, gpu_refresh=0.05, workers=4)
+        service.start()
+        server = EstimationServer(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        server.mock_estimate, server.mock_detect = mock_estimate, mock_detect
+        yield server
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+class TestCoalescingCache:
+
+    def test_concurrent_gets_share_one_fetch(self):
+        cache = CoalescingCache(ttl=60)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("k", fetch))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == ["value"] * 8
+        assert len(calls) == 1
+        assert cache.stats() == {'entries': 1, 'hits': 0, 'misses': 1, 'coalesced': 7, 'evictions': 0}
+
+    def test_failures_are_not_cached(self):
+        cache = CoalescingCache(ttl=60)
+        with pytest.raises(ValueError):
+            cache.get("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        assert cache.get("k", lambda: "value") == "value"
+
+    def test_entries_expire(self):
+        cache = CoalescingCache(ttl=0)
+        cache.get("k", lambda: 1)
+        assert cache.get("k", lambda: 2) == 2
+        assert cache.stats()['evictions'] == 1
+
+    def test_least_recently_used_entries_are_dropped(self):
+        cache = CoalescingCache(ttl=60, max_entries=2)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.get("a", lambda: 0)
+        cache.get("c", lambda: 3)
+        assert list(cache.entries) == ["a", "c"]
+        assert cache.stats()['evictions'] == 1
+
+    def test_expired_entries_are_dropped_first(self):
+        cache = CoalescingCache(ttl=60, max_entries=2)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.entries["b"] = (time.monotonic() - 1, 2)
+        cache.get("c", lambda: 3)
+        assert list(cache.entries) == ["a", "c"]
+
+
+@pytest.mark.parametrize("query, error", [
+    ("org/a", "A query must be a JSON object"),
+    ({'model_id': "bad id"}, "Invalid model ID format"),
+    ({'model_id': "org/a", 'precision': "fp3"}, "Invalid precision"),
+    ({'model_id': "org/a", 'context': -1}, "Invalid context"),
+    ({'model_id': "org/a", 'gpus': [{'name': "H100"}]}, "gpus entries need a name and memory_gb"),
+])
+def test_parse_fit_query_rejects(query, error):
+    with pytest.raises(ValueError, match=error):
+        parse_fit_query(query)
+
+
+def test_fit_uses_cached_metadata(server):
+    response = requests.post(f"{server.url}/v1/fit", json={'model_id': "org/a", 'precision': "int8"})
+    assert response.status_code == 200
+    result = response.json()
+    assert result['model']['param_count'] == 8 * 10 ** 9
+    assert [(c['precision'], c['fits']) for c in result['checks']] == [("int8", True)]
+
+    response = requests.post(f"{server.url}/v1/fit", json={'model_id': "org/a", 'precision': "int8", 'context': 131072})
+    check = response.json()['checks'][0]
+    assert check['required_gb'] == pytest.approx(24.0)
+    assert not check['fits']
+    server.mock_estimate.assert_called_once()
+
+
+def test_batch_coalesces_and_reports_errors(server):
+    queries = [{'model_id': "org/a"}, {'model_id': "org/a", 'precision': "int4"}, {'model_id': "org/missing"},
+               {'model_id': "org/b", 'gpus': [{'name': "H100", 'memory_gb': 80, 'count': 2}]}, {'model_id': "nope"}]
+    response = requests.post(f"{server.url}/v1/fit", json=queries)
+    results = response.json()
+    assert [r['model']['status'] for r in results] == ["ok", "ok", "error", "ok", "error"]
+    assert results[2]['model']['error'] == "Model not found: org/missing doesn't exist on HuggingFace Hub."
+    assert [g['name'] for g in results[3]['gpus']] == ["H100", "H100"]
+    assert sorted(c[0][0].model_id for c in server.mock_estimate.call_args_list) == ["org/a", "org/b", "org/missing"]
+
+
+def test_concurrent_requests_for_one_model_fetch_once(server):
+    with requests.Session() as session:
+        def query():
+            session.post(f"{server.url}/v1/fit", json={'model_id': "org/a"})
+        threads = [threading.Thread(target=query) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    server.mock_estimate.assert_called_once()
+
+
+def test_gpu_inventory_refreshes_in_background(server):
+    time.sleep(0.2)
+    assert server.mock_detect.call_count >= 2
+    assert requests.get(f"{server.url}/v1/gpus").json()[0]['name'] == "NVIDIA RTX 4090"
+
+
+def test_get_model_and_errors(server):
+    assert requests.get(f"{server.url}/v1/models/org/a").json()['status'] == "ok"
+    assert requests.get(f"{server.url}/v1/models/bad").status_code == 400
+    assert requests.get(f"{server.url}/v1/nothing").status_code == 404
+    assert requests.post(f"{server.url}/v1/fit", data=b"{not json").status_code == 400
+    assert requests.get(f"{server.url}/v1/health").json()['cache']['misses'] == 1
+    # a Hub connection failure is answered, not a dropped connection
+    response = requests.get(f"{server.url}/v1/models/org/offline")
+    assert response.status_code == 200
+    assert response.json()['status'] == "error"
+    assert response.json()['error'] == "Estimate failed: Connection refused"
+
+
+def test_metrics_endpoint(server):
+    requests.get(f"{server.url}/v1/models/org/a")
+    requests.get(f"{server.url}/v1/models/org/a")
+    response = requests.get(f"{server.url}/metrics")
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith("text/plain")
+    assert 'hfest_http_requests_total{path="/v1/models",status="200"}' in response.text
+    assert 'hfest_cache_requests_total{cache="metadata",result="hit"}' in response.text
+    assert 'hfest_http_request_duration_seconds_bucket{path="/v1/models",le="+Inf"}' in response.text
@@ -0,0 +1,108 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import io
+
+import requests
+
+from src.hfest.commands.shell import HfestShell, setup_parser, handle
+
+GPU_INFO = [{'index': '0', 'name': 'NVIDIA RTX 4090', 'memory.total': '24564 MiB',
+             'memory.used': '0 MiB', 'memory.free': '24564 MiB'}]
+LLAMA_CONFIG = {'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 8, 'hidden_size': 4096}
+
+def fake_estimate(args):
+    # 16 GB of bfloat16 weights
+    return {'safetensors': 16 * 1024 ** 3, 'pytorch': 0, 'onnx': 0,
+            'MODEL_DTYPES': ('bfloat16', []), 'MODEL_CONFIG': dict(LLAMA_CONFIG)}
+
+@pytest.fixture
+def session():
+    with patch('src.hfest.commands.shell.estimate_model_files', side_effect=fake_estimate) as mock_estimate, \
+         patch('src.hfest.commands.shell.detect_gpu_info', side_effect=lambda: [dict(g) for g in GPU_INFO]) as mock_detect:
+        yield HfestShell(), mock_estimate, mock_detect
+
+
+def test_follow_up_queries_reuse_cached_state(session, capsys):
+    shell, mock_estimate, mock_detect = session
+    shell.onecmd("estimate org/a")
+    shell.onecmd("set precision int8")
+    shell.onecmd("fit")
+    shell.onecmd("estimate org/a")
+
+    mock_estimate.assert_called_once()
+    mock_detect.assert_called_once()
+    stdout_content = capsys.readouterr().out
+    assert "[INT8 - SINGLE]" in stdout_content
+    assert "[MEMORY CHECK PASSED]" in stdout_content
+
+
+def test_context_adds_kv_cache(session, capsys):
+    shell, _, _ = session
+    shell.onecmd("estimate org/a")
+    shell.onecmd("set precision int8")
+    capsys.readouterr()
+    # 128 KiB per token, 128k tokens take 16 GB next to 8 GB of int8 weights
+    shell.onecmd("set context 131072")
+    stdout_content = capsys.readouterr().out
+    assert "Model size 8.00 GB + KV cache 16.00 GB" in stdout_content
+    assert "[NOT ENOUGH MEMORY]" in stdout_content
+
+
+def test_add_and_remove_gpu(session, capsys):
+    shell, _, mock_detect = session
+    shell.onecmd("estimate org/a")
+    shell.onecmd("set precision bfloat16")
+    capsys.readouterr()
+    shell.onecmd('add_gpu "NVIDIA H100 80GB" 80 2')
+    stdout_content = capsys.readouterr().out
+    assert "Number of Available GPUs: 3" in stdout_content
+    assert "for v1: NVIDIA H100 80GB. Model size 16.00 GB vs Free GPU memory 80.00 GB" in stdout_content
+
+    shell.onecmd("remove_gpu v0")
+    assert [gpu['index'] for gpu in shell.gpu_info] == ['0', 'v1']
+    shell.onecmd("refresh gpus")
+    assert [gpu['index'] for gpu in shell.gpu_info] == ['0', 'v1']
+    assert mock_detect.call_count == 2
+
+
+def test_hub_errors_keep_the_session(session, capsys):
+    shell, mock_estimate, _ = session
+    shell.onecmd("estimate org/a")
+    mock_estimate.side_effect = requests.ConnectionError("Connection refused")
+    shell.onecmd("estimate org/b org/c")
+    assert "ERROR: Unable to estimate org/b: Connection refused" in capsys.readouterr().out
+    assert list(shell.estimates) == ["org/a"]
+
+    # a failed refetch keeps the estimate already loaded
+    assert not shell.onecmd("refresh models")
+    assert "ERROR: Unable to refresh org/a, keeping the loaded estimate" in capsys.readouterr().out
+    assert list(shell.estimates) == ["org/a"] and shell.current == "org/a"
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("set precision fp3", "Invalid precision: fp3"),
+    ("set context -1", "Invalid context: -1"),
+    ("set colour red", "Usage: set precision|filetype|context|batch_size VALUE"),
+    ("fit", "No model estimated yet"),
+    ("add_gpu H100", "Usage: add_gpu NAME MEMORY_GB [COUNT]"),
+    ("frobnicate", "Unknown command: frobnicate"),
+])
+def test_invalid_input(session, capsys, line, expected):
+    shell, _, _ = session
+    shell.onecmd(line)
+    assert expected in capsys.readouterr().out
+
+
+def test_handle_runs_script_from_stdin(capsys):
+    parser = argparse.ArgumentParser()
+    setup_parser(parser.add_subparsers(dest="command"))
+    args = parser.parse_args(["shell", "org/a"])
+    with patch('src.hfest.commands.shell.estimate_model_files', side_effect=fake_estimate) as mock_estimate, \
+         patch('src.hfest.commands.shell.detect_gpu_info', return_value=list(GPU_INFO)), \
+         patch('sys.stdin', io.StringIO("set precision int4\nmodels\nquit\n")):
+        assert handle(args) == 0
+    mock_estimate.assert_called_once()
+    stdout_content = capsys.readouterr().out
+    assert "[INT4 - SINGLE]" in stdout_content
+    assert "* org/a (safetensors: 16.00 GB)" in stdout_content
@@ -0,0 +1,129 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import argparse
+import json
+
+from src.hfest.core.results import SweepResult
+from src.hfest.commands.sweep import SweepCheckpoint, iter_hub_models, resume_listing, setup_parser, handle
+
+
+def listing(model_ids):
+    yield from model_ids
+
+def make_page(model_ids, next_url=None):
+    response = MagicMock()
+    response.status_code = 200
+    response.content = json.dumps([{"id": model_id} for model_id in model_ids]).encode()
+    response.headers = {"Link": f'<{next_url}>; rel="next"'} if next_url else {}
+    return response
+
+@pytest.fixture
+def sweep_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command")
+    return setup_parser(subparsers)
+
+def fake_estimate(model_id, api_key):
+    if model_id == "org/broken":
+        return SweepResult(model_id=model_id, status="error", error="Model not found."), None
+    return SweepResult(model_id=model_id, param_count=10, format="safetensors"), {'model_id': model_id}
+
+
+class TestSweepCheckpoint:
+
+    def test_finished_ids_are_appended(self, tmp_path):
+        path = str(tmp_path / "sweep.txt")
+        checkpoint = SweepCheckpoint(path)
+        checkpoint.open()
+        checkpoint.finish("org/b")
+        checkpoint.finish("org/a")
+        with open(path) as f:
+            assert f.read() == "org/b\norg/a\n"
+        checkpoint.close()
+
+        loaded = SweepCheckpoint(path)
+        assert loaded.load()
+        assert loaded.completed == 2
+        assert loaded.done_ids == {"org/a", "org/b"}
+
+    def test_resume_listing_skips_finished_models(self, tmp_path):
+        checkpoint = SweepCheckpoint(str(tmp_path / "sweep.txt"))
+        checkpoint.done_ids = {"org/b", "org/d"}
+        remaining = list(resume_listing(listing(["org/a", "org/b", "org/c", "org/d", "org/e"]), checkpoint))
+        assert remaining == ["org/a", "org/c", "org/e"]
+
+    def test_resume_listing_without_the_last_finished_model(self, tmp_path):
+        # a model finished last time was deleted and the listing came back in another order
+        checkpoint = SweepCheckpoint(str(tmp_path / "sweep.txt"))
+        checkpoint.done_ids = {"org/a", "org/deleted"}
+        remaining = list(resume_listing(listing(["org/c", "org/a", "org/b"]), checkpoint))
+        assert remaining == ["org/c", "org/b"]
+
+
+@patch("src.hfest.commands.sweep.estimate_sweep_model", side_effect=fake_estimate)
+@patch("src.hfest.commands.sweep.iter_hub_models")
+@patch("src.hfest.commands.sweep.read_config")
+def test_handle_streams_ndjson_and_checkpoints(mock_read_config, mock_iter, mock_estimate, sweep_parser, tmp_path, capsys):
+    mock_read_config.return_value = {"api_key": "key"}
+    mock_iter.return_value = listing(["org/a", "org/broken", "org/c"])
+    path = str(tmp_path / "sweep.txt")
+    args = sweep_parser.parse_args(["--author", "org", "--checkpoint", path, "--concurrency", "2", "--output", "ndjson"])
+
+    assert handle(args) == 1
+
+    captured = capsys.readouterr()
+    results = [json.loads(line) for line in captured.out.strip().split("\n")]
+    assert sorted(r['model_id'] for r in results) == ["org/a", "org/broken", "org/c"]
+    assert "Sweep finished: 2 model(s), 1 failure(s)" in captured.err
+    # the failed model isn't checkpointed, so resuming retries it
+    with open(path) as f:
+        assert sorted(f.read().split()) == ["org/a", "org/c"]
+    mock_iter.return_value = listing(["org/a", "org/broken", "org/c"])
+    mock_estimate.reset_mock()
+    assert handle(args) == 1
+    assert [c[0][0] for c in mock_estimate.call_args_list] == ["org/broken"]
+
+
+@patch("src.hfest.commands.sweep.estimate_sweep_model", side_effect=fake_estimate)
+@patch("src.hfest.commands.sweep.iter_hub_models")
+@patch("src.hfest.commands.sweep.read_config")
+def test_handle_resumes_from_checkpoint(mock_read_config, mock_iter, mock_estimate, sweep_parser, tmp_path, capsys):
+    mock_read_config.return_value = {"api_key": "key"}
+    mock_iter.return_value = listing(["org/a", "org/b", "org/c"])
+    path = str(tmp_path / "sweep.txt")
+    with open(path, 'w') as f:
+        f.write("org/b\n")
+    args = sweep_parser.parse_args(["--author", "org", "--checkpoint", path])
+
+    assert handle(args) == 0
+
+    assert [c[0][0] for c in mock_estimate.call_args_list] == ["org/a", "org/c"]
+    assert "Resuming sweep after 1 model(s)" in capsys.readouterr().out
+    with open(path) as f:
+        assert sorted(f.read().split()) == ["org/a", "org/b", "org/c"]
+
+
+@patch("src.hfest.commands.estimate_size.hub_endpoint", return_value="http://mirror")
+@patch("src.hfest.utils.scheduler.requests.get")
+def test_iter_hub_models_follows_pages(mock_get, mock_endpoint):
+    mock_get.side_effect = [make_page(["org/a", "org/b"], next_url="https://huggingface.co/api/models?cursor=2"),
+                            make_page(["org/c"])]
+
+    assert list(iter_hub_models("key", author="org")) == ["org/a", "org/b", "org/c"]
+    assert mock_get.call_args_list[0][1]['params']['author'] == "org"
+    # the next page is asked from the configured endpoint, not the Hub the link names
+    assert mock_get.call_args_list[1][0][0] == "http://mirror/api/models"
+    assert mock_get.call_args_list[1][1]['params'] == {'cursor': '2'}
+
+
+@patch("src.hfest.utils.scheduler.requests.get")
+def test_iter_hub_models_limit(mock_get):
+    mock_get.return_value = make_page(["org/a", "org/b", "org/c"], next_url="https://huggingface.co/api/models?cursor=3")
+    assert list(iter_hub_models("key", author="org", limit=2)) == ["org/a", "org/b"]
+    mock_get.assert_called_once()
+
+
+def test_handle_requires_a_filter(sweep_parser, capsys):
+    args = sweep_parser.parse_args([])
+    assert handle(args) == 1
+    assert "Please specify at least one of --author, --filter or --search." in capsys.readouterr().out
@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import csv
+
+from src.hfest.commands import sweep_grid
+from src.hfest.commands.sweep_grid import handle
+from src.hfest.commands.estimate_resource import compare_single_setup, PRECISION_BITS
+from src.hfest.core.grid import parse_axis, parse_device_set, evaluate_grid
+from src.hfest.core.hardware import GPU_CATALOG
+
+np = pytest.importorskip("numpy")
+
+CONFIG = {'num_hidden_layers': 32, 'num_attention_heads': 32, 'num_key_value_heads': 8, 'hidden_size': 4096}
+KV_PER_TOKEN = 2 * 32 * 8 * 128 * 2
+ESTIMATE = {'safetensors': 16e9, 'MODEL_DTYPES': ('bfloat16', []), 'PARAM_COUNT': 8_000_000_000, 'MODEL_CONFIG': CONFIG}
+
+def grid_args(tmp_path, **kwargs):
+    defaults = dict(model_id=["meta-llama/Llama-3.1-8B"], precisions="float16,int4", contexts="1k,32k",
+                    batches="1:64:x4", devices="1xL4,2xA100-80GB", out=str(tmp_path / "grid.csv"), format=None)
+    defaults.update(kwargs)
+    return argparse.Namespace(**defaults)
+
+
+def test_parse_axis():
+    assert parse_axis("1024,4096,32k") == [1024, 4096, 32768]
+    assert parse_axis("1:256:x4") == [1, 4, 16, 64, 256]
+    assert parse_axis("8:32:8,1k") == [8, 16, 24, 32, 1024]
+    for text in ("0", "1:8", "1:8:x1", "a", "-4"):
+        with pytest.raises(ValueError):
+            parse_axis(text)
+
+def test_parse_device_set():
+    assert parse_device_set("8xH100-SXM") == ("8xH100-SXM", GPU_CATALOG["H100-SXM"], 8)
+    assert parse_device_set("mi300x") == ("1xMI300X", GPU_CATALOG["MI300X"], 1)
+    with pytest.raises(ValueError):
+        parse_device_set("2xTPUv5")
+
+def test_grid_matches_compare_single_setup():
+    device_sets = [(GPU_CATALOG["L4"], 1), (GPU_CATALOG["A100-80GB"], 2)]
+    precisions = ["float32", "bfloat16", "int8", "int4"]
+    columns = evaluate_grid([(8e9, KV_PER_TOKEN)], precisions, [1024, 32768], [1, 16], device_sets)
+    assert len(columns['fits']) == 4 * 2 * 2 * 2
+    for cell in range(len(columns['fits'])):
+        spec, count = device_sets[columns['devices_index'][cell]]
+        precision = precisions[columns['precision_index'][cell]]
+        gpu = {'index': '0', 'name': spec.name, 'memory.free': f"{spec.memory_gb * count * 1024} MiB"}
+        kv_cache = KV_PER_TOKEN * columns['context'][cell] * columns['batch'][cell]
+        # estimate_model_files totals are bytes at 32 bits per parameter, divided by 32 / bits
+        [check] = compare_single_setup(8e9 * 4, 32 / PRECISION_BITS[precision], [gpu], kv_cache_bytes=kv_cache, verbose=False)
+        assert bool(columns['fits'][cell]) == check['fits']
+        assert columns['required_gb'][cell] == pytest.approx(check['required_gb'] + columns['overhead_gb'][cell])
+        assert (columns['tokens_per_second'][cell] > 0) == check['fits']
+
+def test_throughput_grows_with_batch_and_gpus():
+    columns = evaluate_grid([(8e9, KV_PER_TOKEN)], ["bfloat16"], [1024], [1, 32],
+                            [(GPU_CATALOG["H100-SXM"], 1), (GPU_CATALOG["H100-SXM"], 2)])
+    single, double = columns['tokens_per_second'].reshape(2, 2).T
+    assert single[1] > single[0] and double[0] > single[0]
+
+
+@patch('src.hfest.commands.sweep_grid.estimate_model_files', return_value=ESTIMATE)
+def test_handle_writes_csv(mock_estimate, tmp_path, capsys):
+    args = grid_args(tmp_path)
+    assert handle(args) == 0
+    with open(args.out) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2 * 2 * 4 * 2
+    assert list(rows[0]) == sweep_grid.COLUMNS
+    assert {row['devices'] for row in rows} == {"1xL4", "2xA100-80GB"}
+    # 8B at fp16 (17.9 GB with the margin) fits a 24 GB L4 only with a small KV cache
+    l4 = [row for row in rows if row['devices'] == "1xL4" and row['precision'] == "float16"]
+    assert [row['fits'] for row in l4 if row['context'] == "1024" and row['batch'] == "1"] == ["True"]
+    assert all(row['fits'] == "False" and float(row['tokens_per_second']) == 0 for row in l4
+               if row['context'] == "32768" and row['batch'] != "1")
+    assert "32 cells" in capsys.readouterr().out
+
+@patch('src.hfest.commands.sweep_grid.estimate_model_files', return_value=ESTIMATE)
+def test_handle_writes_parquet(mock_estimate, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    args = grid_args(tmp_path, out=str(tmp_path / "grid.parquet"))
+    assert handle(args) == 0
+    table = pq.read_table(args.out)
+    assert table.num_rows == 32
+    assert table.column_names == sweep_grid.COLUMNS
+
+@patch('src.hfest.commands.sweep_grid.estimate_model_files', return_value={**ESTIMATE, 'PARAM_COUNT': 0})
+def test_handle_needs_a_parameter_count(mock_estimate, tmp_path, capsys):
+    assert handle(grid_args(tmp_path)) == 1
+    assert "No model to evaluate." in capsys.readouterr().out
+
+def test_handle_rejects_invalid_args(tmp_path, capsys):
+    assert handle(grid_args(tmp_path, precisions="fp8")) == 1
+    assert handle(grid_args(tmp_path, out=str(tmp_path / "grid.xlsx"))) == 1
+    assert handle(grid_args(tmp_path, contexts="1k:2k")) == 1
+    assert handle(grid_args(tmp_path, devices="2xTPUv5")) == 1
+
+def test_handle_without_numpy(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(sweep_grid.grid, "np", None)
+    assert handle(grid_args(tmp_path)) == 1
+    assert "needs numpy" in capsys.readouterr().out
@@ -0,0 +1,189 @@
+import pytest
+from unittest.mock import patch
+import argparse
+import json
+
+from src.hfest.commands.watch import RequirementTable, FitWatcher, handle
+from src.hfest.utils.gpu_monitor import NvmlProbe, AmdSysfsProbe, GpuProbeError
+
+ESTIMATE = {'safetensors': 16 * 1024 ** 3, 'pytorch': 0, 'onnx': 0, 'MODEL_DTYPES': ('bfloat16', [])}
+
+def gpu(free_mb, index='0'):
+    return {'index': index, 'name': 'NVIDIA RTX 4090', 'memory.total': '24564 MiB',
+            'memory.used': f'{24564 - free_mb} MiB', 'memory.free': f'{free_mb} MiB'}
+
+
+def test_requirement_table_includes_margin_and_kv_cache():
+    table = RequirementTable()
+    assert table.add("org/a", ESTIMATE, precision="int8", kv_cache_bytes=1024 ** 3) == 1
+    model_id, model_type, precision, required, needed = table.rows[0]
+    assert (model_id, model_type, precision) == ("org/a", "safetensors", "int8")
+    assert required == pytest.approx(9.0)
+    assert needed == pytest.approx(8 * 1.2 + 1)
+
+def test_watcher_reports_transitions_only():
+    table = RequirementTable()
+    table.add("org/a", ESTIMATE, precision="int8")
+    watcher = FitWatcher(table)
+    # the first poll reports what already fits, not what doesn't
+    assert [(e.event, e.gpu_index) for e in watcher.update([gpu(1000, '0'), gpu(20000, '1')])] == [("fits", "1")]
+    assert watcher.update([gpu(1000, '0'), gpu(20000, '1')]) == []
+    events = watcher.update([gpu(20000, '0'), gpu(1000, '1')])
+    assert [(e.event, e.gpu_index) for e in events] == [("fits", "0"), ("unfit", "1")]
+    assert watcher.update([gpu(20000, '0'), gpu(1000, '1')]) == []
+
+def test_watcher_forgets_gpus_that_disappear():
+    table = RequirementTable()
+    table.add("org/a", ESTIMATE, precision="int8")
+    watcher = FitWatcher(table)
+    assert len(watcher.update([gpu(20000)])) == 1
+    assert watcher.update([]) == []
+    assert [e.event for e in watcher.update([gpu(20000)])] == ["fits"]
+
+
+class FakeNvml:
+    '''NVML calls with two GPUs whose free memory changes between reads'''
+
+    def __init__(self, free):
+        self.free = free
+        self.shutdown = 0
+
+    def nvmlInit_v2(self):
+        return 0
+
+    def nvmlDeviceGetCount_v2(self, count):
+        count._obj.value = len(self.free)
+        return 0
+
+    def nvmlDeviceGetHandleByIndex_v2(self, index, handle):
+        handle._obj.value = index + 1
+        return 0
+
+    def nvmlDeviceGetName(self, handle, name, length):
+        name.value = b"NVIDIA H100 80GB HBM3"
+        return 0
+
+    def nvmlDeviceGetMemoryInfo(self, handle, memory):
+        memory._obj.total = 80 * 1024 ** 3
+        memory._obj.free = self.free[handle.value - 1]
+        memory._obj.used = memory._obj.total - memory._obj.free
+        return 0
+
+    def nvmlShutdown(self):
+        self.shutdown += 1
+        return 0
+
+def test_nvml_probe_reads_memory_in_probe_format():
+    nvml = FakeNvml([10 * 1024 ** 3, 70 * 1024 ** 3])
+    probe = NvmlProbe(library=nvml)
+    gpu_info = probe.read()
+    assert gpu_info == [
+        {'index': '0', 'name': 'NVIDIA H100 80GB HBM3', 'memory.total': '81920 MiB',
+         'memory.used': '71680 MiB', 'memory.free': '10240 MiB'},
+        {'index': '1', 'name': 'NVIDIA H100 80GB HBM3', 'memory.total': '81920 MiB',
+         'memory.used': '10240 MiB', 'memory.free': '71680 MiB'}]
+    nvml.free[0] = 0
+    assert probe.read()[0]['memory.free'] == '0 MiB'
+    probe.close()
+    assert nvml.shutdown == 1
+
+def test_nvml_probe_without_gpus_fails():
+    nvml = FakeNvml([])
+    with pytest.raises(GpuProbeError):
+        NvmlProbe(library=nvml)
+    assert nvml.shutdown == 1
+
+class FakeMigNvml(FakeNvml):
+    '''GPU 0 in MIG mode with two MIG devices in slots 0 and 2, GPU 1 without MIG support'''
+
+    def nvmlDeviceGetCount_v2(self, count):
+        count._obj.value = 2
+        return 0
+
+    def nvmlDeviceGetMigMode(self, handle, current, pending):
+        if handle.value != 1:
+            return 3  # NVML_ERROR_NOT_SUPPORTED
+        current._obj.value = 1
+        return 0
+
+    def nvmlDeviceGetMaxMigDeviceCount(self, handle, count):
+        count._obj.value = 7
+        return 0
+
+    def nvmlDeviceGetMigDeviceHandleByIndex(self, handle, index, mig_handle):
+        if index not in (0, 2):
+            return 6  # NVML_ERROR_NOT_FOUND
+        mig_handle._obj.value = 3 + index // 2
+        return 0
+
+def test_nvml_probe_lists_mig_devices():
+    probe = NvmlProbe(library=FakeMigNvml([0, 80 * 1024 ** 3, 10 * 1024 ** 3, 40 * 1024 ** 3]))
+    assert [(g['index'], g['memory.free']) for g in probe.read()] == [
+        ('0:0', '10240 MiB'), ('0:2', '40960 MiB'), ('1', '81920 MiB')]
+
+def test_amd_sysfs_probe(tmp_path):
+    for card, used in (("card1", 4), ("card0", 1)):
+        device = tmp_path / card / "device"
+        device.mkdir(parents=True)
+        (device / "mem_info_vram_total").write_text(f"{192 * 1024 ** 3}\n")
+        (device / "mem_info_vram_used").write_text(f"{used * 1024 ** 3}\n")
+    (tmp_path / "card0" / "device" / "product_name").write_text("AMD Instinct MI300X\n")
+    probe = AmdSysfsProbe(root=str(tmp_path))
+    try:
+        gpu_info = probe.read()
+        assert [(g['index'], g['name'], g['memory.free']) for g in gpu_info] == [
+            ('0', 'AMD Instinct MI300X', '195584 MiB'), ('1', 'AMD GPU', '192512 MiB')]
+        (tmp_path / "card0" / "device" / "mem_info_vram_used").write_text(f"{192 * 1024 ** 3}\n")
+        assert probe.read()[0]['memory.free'] == '0 MiB'
+    finally:
+        probe.close()
+
+def test_amd_sysfs_probe_without_gpus(tmp_path):
+    with pytest.raises(GpuProbeError):
+        AmdSysfsProbe(root=str(tmp_path))
+
+
+class ScriptedProbe:
+    name = "scripted"
+
+    def __init__(self, reads):
+        self.reads = reads
+        self.closed = False
+
+    def read(self):
+        return self.reads.pop(0) if len(self.reads) > 1 else self.reads[0]
+
+    def close(self):
+        self.closed = True
+
+def watch_args(**kwargs):
+    args = dict(model_ids=["org/a"], precision="int8", filetype="auto", context=0, batch_size=1,
+                interval=0.01, count=3, output="ndjson")
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+@patch('src.hfest.commands.watch.estimate_model_files', return_value=ESTIMATE)
+def test_handle_streams_events(mock_estimate, capsys):
+    probe = ScriptedProbe([[gpu(1000)], [gpu(20000)], [gpu(1000)]])
+    with patch('src.hfest.commands.watch.open_gpu_probe', return_value=probe):
+        assert handle(watch_args()) == 0
+    events = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(e['event'], e['model_id'], e['precision'], e['gpu_index']) for e in events] == [
+        ("fits", "org/a", "int8", "0"), ("unfit", "org/a", "int8", "0")]
+    assert probe.closed
+    # the requirement table is computed once, not on every poll
+    assert mock_estimate.call_count == 1
+
+@patch('src.hfest.commands.watch.estimate_model_files', return_value=ESTIMATE)
+@patch('src.hfest.commands.watch.open_gpu_probe', return_value=None)
+def test_handle_falls_back_to_vendor_tools(mock_probe, mock_estimate, capsys):
+    with patch('src.hfest.commands.watch.detect_gpu_info', return_value=[gpu(20000)]) as mock_detect:
+        assert handle(watch_args(output="text", count=2)) == 0
+    out = capsys.readouterr().out
+    assert "polling with the vendor tools" in out
+    assert out.count("[FITS]") == 1
+    assert mock_detect.call_count == 2
+
+def test_handle_rejects_invalid_args(capsys):
+    assert handle(watch_args(precision="int2", output="text")) == 1
+    assert "Invalid precision" in capsys.readouterr().out
@@ -0,0 +1,145 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import json
+import multiprocessing
+import os
+import struct
+
+from src.hfest.core.headers import (parse_safetensors_header, parse_gguf_header, tensor_param_counts, merged_tensors,
+                                   diff_tensors, IncompleteHeader)
+from src.hfest.utils.blob_cache import BlobCache
+from src.hfest.commands import estimate_size
+
+OID = "ab" + "0" * 62
+
+
+def safetensors_bytes(tensors, metadata=None):
+    header = {name: {'dtype': dtype, 'shape': shape, 'data_offsets': [0, 0]} for name, (dtype, shape) in tensors.items()}
+    if metadata:
+        header['__metadata__'] = metadata
+    encoded = json.dumps(header).encode()
+    return struct.pack('<Q', len(encoded)) + encoded + b"\0" * 64
+
+def gguf_string(value):
+    encoded = value.encode()
+    return struct.pack('<Q', len(encoded)) + encoded
+
+def gguf_bytes(tensors, vocab_size=3):
+    data = b"GGUF" + struct.pack('<IQQ', 3, len(tensors), 3)
+    data += gguf_string("general.architecture") + struct.pack('<I', 8) + gguf_string("llama")
+    data += gguf_string("llama.context_length") + struct.pack('<II', 4, 4096)
+    data += gguf_string("tokenizer.ggml.tokens") + struct.pack('<IIQ', 9, 8, vocab_size)
+    data += b"".join(gguf_string(f"tok{i}") for i in range(vocab_size))
+    for name, (ggml_type, dims) in tensors.items():
+        data += gguf_string(name) + struct.pack('<I', len(dims)) + struct.pack(f'<{len(dims)}Q', *dims)
+        data += struct.pack('<IQ', ggml_type, 0)
+    return data
+
+
+def test_parse_safetensors_header():
+    data = safetensors_bytes({'embed.weight': ('BF16', [32000, 4096]), 'norm.weight': ('F32', [4096])},
+                             metadata={'format': 'pt'})
+    header = parse_safetensors_header(data)
+    assert header['tensors'] == {'embed.weight': ['BF16', [32000, 4096]], 'norm.weight': ['F32', [4096]]}
+    assert header['metadata'] == {'format': 'pt'}
+    assert header['header_bytes'] == len(data) - 64
+    assert tensor_param_counts(header) == {'BF16': 32000 * 4096, 'F32': 4096}
+
+def test_parse_safetensors_header_reports_the_bytes_it_needs():
+    data = safetensors_bytes({'w': ('F16', [8, 8])})
+    with pytest.raises(IncompleteHeader) as e:
+        parse_safetensors_header(data[:20])
+    assert e.value.needed == len(data) - 64
+
+def test_parse_gguf_header():
+    data = gguf_bytes({'token_embd.weight': (12, [4096, 32000]), 'output_norm.weight': (0, [4096])})
+    header = parse_gguf_header(data + b"\0" * 32)
+    assert header['format'] == 'gguf'
+    assert header['header_bytes'] == len(data)
+    # arrays (the tokenizer) are skipped
+    assert header['metadata'] == {'general.architecture': 'llama', 'llama.context_length': 4096}
+    # shapes are outermost dimension first, like safetensors
+    assert header['tensors'] == {'token_embd.weight': ['Q4_K', [32000, 4096]], 'output_norm.weight': ['F32', [4096]]}
+    with pytest.raises(IncompleteHeader):
+        parse_gguf_header(data[:-4])
+    with pytest.raises(ValueError):
+        parse_gguf_header(b"GGML" + data[4:])
+
+
+def test_diff_tensors():
+    old = merged_tensors([{'tensors': {'embed': ['BF16', [32000, 4096]], 'lm_head': ['BF16', [32000, 4096]]}},
+                          {'tensors': {'norm': ['F32', [4096]], 'rotary': ['F32', [64]]}}])
+    new = {'embed': ['BF16', [32768, 4096]], 'lm_head': ['BF16', (32000, 4096)], 'norm': ['BF16', [4096]],
+           'score': ['F32', [4096, 2]]}
+    assert diff_tensors(old, new) == (['score'], ['rotary'], ['embed', 'norm'])
+    assert diff_tensors(new, new) == ([], [], [])
+
+def test_blob_cache_round_trip(tmp_path):
+    cache = BlobCache(str(tmp_path))
+    assert cache.get(OID) is None
+    cache.put(OID, {'tensors': {}})
+    assert cache.get(OID) == {'tensors': {}}
+    assert (tmp_path / "ab" / f"{OID}.json").exists()
+    with pytest.raises(ValueError):
+        cache.path("../etc/passwd")
+
+def test_blob_cache_ignores_corrupt_entries(tmp_path):
+    cache = BlobCache(str(tmp_path))
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / f"{OID}.json").write_text('{"tensors": ')
+    assert cache.get_or_fetch(OID, lambda: {'tensors': {'w': ['F16', [1]]}}) == {'tensors': {'w': ['F16', [1]]}}
+    assert cache.get(OID) == {'tensors': {'w': ['F16', [1]]}}
+
+def fetch_once(root, fetches, barrier):
+    barrier.wait()
+    def fetch():
+        fetches.put(1)
+        return {'tensors': {}}
+    BlobCache(root).get_or_fetch(OID, fetch)
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_blob_cache_fetches_once_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    fetches = context.Queue()
+    barrier = context.Barrier(4)
+    processes = [context.Process(target=fetch_once, args=(str(tmp_path), fetches, barrier)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    assert fetches.qsize() == 1
+
+
+def range_response(data):
+    def get(url, headers=None, **kwargs):
+        start, end = (int(v) for v in headers['Range'][len("bytes="):].split("-"))
+        response = MagicMock()
+        response.status_code = 206
+        response.content = data[start:end + 1]
+        return response
+    return get
+
+def test_read_tensor_header_uses_range_reads_and_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(estimate_size, "_header_cache", BlobCache(str(tmp_path)))
+    monkeypatch.setattr(estimate_size, "SAFETENSORS_PROBE_BYTES", 64)
+    data = safetensors_bytes({f'layers.{i}.weight': ('BF16', [1024, 1024]) for i in range(8)})
+    with patch("src.hfest.commands.estimate_size.requests.get", side_effect=range_response(data)) as mock_get:
+        header = estimate_size.read_tensor_header("org/model", "model.safetensors", OID, token="t", size=len(data))
+        # the probe, then the rest of the header
+        assert mock_get.call_count == 2
+        assert mock_get.call_args_list[0].kwargs['headers']['Range'] == "bytes=0-63"
+        assert "/org/model/resolve/main/model.safetensors" in mock_get.call_args_list[0].args[0]
+        # another repo with the same file reads it from the cache
+        assert estimate_size.read_tensor_header("fork/model", "model.safetensors", OID) == header
+        assert mock_get.call_count == 2
+    assert tensor_param_counts(header) == {'BF16': 8 * 1024 * 1024}
+    assert BlobCache(str(tmp_path)).get(OID)['size'] == len(data)
+
+def test_fetch_gguf_header_grows_the_read(monkeypatch):
+    monkeypatch.setattr(estimate_size, "GGUF_PROBE_BYTES", 64)
+    data = gguf_bytes({'token_embd.weight': (30, [64, 100])}, vocab_size=20) + b"\0" * 256
+    with patch("src.hfest.commands.estimate_size.requests.get", side_effect=range_response(data)) as mock_get:
+        header = estimate_size.fetch_tensor_header("org/model-GGUF", "model-q4.gguf")
+    assert header['tensors'] == {'token_embd.weight': ['BF16', [100, 64]]}
+    assert mock_get.call_count > 1
@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from src.hfest.utils import metrics
+from src.hfest.utils.metrics import Registry, serve_metrics
+from src.hfest.utils.scheduler import RequestScheduler
+
+
+def test_render_counter_and_gauge():
+    registry = Registry()
+    counter = registry.counter("test_requests_total", "Requests", ("endpoint", "status"))
+    gauge = registry.gauge("test_in_flight", "In flight")
+    counter.inc(endpoint="model_info", status="200")
+    counter.inc(2, endpoint="model_info", status="200")
+    counter.inc(endpoint='a"b\\c', status="429")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    text = registry.render()
+    assert "# HELP test_requests_total Requests\n# TYPE test_requests_total counter\n" in text
+    assert 'test_requests_total{endpoint="model_info",status="200"} 3\n' in text
+    assert 'test_requests_total{endpoint="a\\"b\\\\c",status="429"} 1\n' in text
+    assert "# TYPE test_in_flight gauge\ntest_in_flight 1\n" in text
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Latency", ("path",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, path="/v1/fit")
+    text = registry.render()
+    assert 'test_seconds_bucket{path="/v1/fit",le="0.1"} 1\n' in text
+    assert 'test_seconds_bucket{path="/v1/fit",le="1"} 3\n' in text
+    assert 'test_seconds_bucket{path="/v1/fit",le="+Inf"} 4\n' in text
+    assert 'test_seconds_sum{path="/v1/fit"} 6.05\n' in text
+    assert 'test_seconds_count{path="/v1/fit"} 4\n' in text
+    assert histogram.count(path="/v1/fit") == 4
+
+def test_cache_hit_ratio_counts_coalesced_as_hits():
+    before = {result: metrics.cache_requests.value(cache="test", result=result) for result in ("hit", "miss", "coalesced")}
+    with patch.object(metrics.cache_requests, 'values', {}):
+        metrics.cache_requests.inc(cache="test", result="miss")
+        metrics.cache_requests.inc(cache="test", result="hit")
+        metrics.cache_requests.inc(cache="test", result="coalesced")
+        metrics.cache_requests.inc(cache="test", result="hit")
+        assert 'hfest_cache_hit_ratio{cache="test"} 0.75' in metrics.registry.render()
+    assert before == {result: metrics.cache_requests.value(cache="test", result=result) for result in before}
+
+def test_record_gpu_info_replaces_gauges():
+    metrics.record_gpu_info([{'index': '0', 'name': 'NVIDIA RTX 4090', 'memory.total': '24564 MiB',
+                              'memory.used': '0 MiB', 'memory.free': '24000 MiB'}])
+    metrics.record_gpu_info([{'index': '1', 'name': 'NVIDIA A100', 'memory.total': '81920 MiB',
+                              'memory.used': '0 MiB', 'memory.free': '1024 MiB'}])
+    text = metrics.registry.render()
+    assert 'hfest_gpu_memory_free_bytes{index="1",name="NVIDIA A100"} 1073741824\n' in text
+    assert 'index="0"' not in text.split("# HELP hfest_gpu_memory_free_bytes")[1]
+
+def test_scheduler_counts_status_codes():
+    scheduler = RequestScheduler(requests_per_second=1000, burst=1000, max_retries=1, backoff_base=0)
+    throttled = MagicMock(status_code=429, headers={}, content=b"")
+    ok = MagicMock(status_code=200, headers={}, content=b"{}")
+    before_429 = metrics.hub_requests.value(endpoint="metrics_test", status="429")
+    before_200 = metrics.hub_requests.value(endpoint="metrics_test", status="200")
+    before_count = metrics.hub_request_seconds.count(endpoint="metrics_test")
+    with patch('requests.get', side_effect=[throttled, ok]):
+        assert scheduler.request("metrics_test", "GET", "https://huggingface.co/api/x").status_code == 200
+    assert metrics.hub_requests.value(endpoint="metrics_test", status="429") == before_429 + 1
+    assert metrics.hub_requests.value(endpoint="metrics_test", status="200") == before_200 + 1
+    assert metrics.hub_request_seconds.count(endpoint="metrics_test") == before_count + 2
+    assert metrics.hub_in_flight.value(endpoint="metrics_test") == 0
+
+def test_scheduler_counts_connection_errors():
+    scheduler = RequestScheduler(requests_per_second=1000, burst=1000, max_retries=0, backoff_base=0)
+    before = metrics.hub_requests.value(endpoint="metrics_test", status="error")
+    with patch('requests.get', side_effect=requests.ConnectionError("down")):
+        with pytest.raises(requests.ConnectionError):
+            scheduler.request("metrics_test", "GET", "https://huggingface.co/api/x")
+    assert metrics.hub_requests.value(endpoint="metrics_test", status="error") == before + 1
+
+def test_serve_metrics():
+    server = serve_metrics(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        response = requests.get(f"{url}/metrics", timeout=5)
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith("text/plain; version=0.0.4")
+        assert "# TYPE hfest_hub_requests_total counter" in response.text
+        assert requests.get(f"{url}/other", timeout=5).status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,67 @@
+import pytest
+
+from src.hfest.core.params import count_parameters, bytes_by_precision
+
+# published parameter counts of the full checkpoints
+KNOWN_MODELS = {
+    'meta-llama/Meta-Llama-3-8B': ({'model_type': 'llama', 'vocab_size': 128256, 'hidden_size': 4096,
+                                    'intermediate_size': 14336, 'num_hidden_layers': 32, 'num_attention_heads': 32,
+                                    'num_key_value_heads': 8, 'tie_word_embeddings': False}, 8030261248),
+    'mistralai/Mistral-7B-v0.1': ({'model_type': 'mistral', 'vocab_size': 32000, 'hidden_size': 4096,
+                                   'intermediate_size': 14336, 'num_hidden_layers': 32, 'num_attention_heads': 32,
+                                   'num_key_value_heads': 8, 'tie_word_embeddings': False}, 7241732096),
+    'mistralai/Mixtral-8x7B-v0.1': ({'model_type': 'mixtral', 'vocab_size': 32000, 'hidden_size': 4096,
+                                     'intermediate_size': 14336, 'num_hidden_layers': 32, 'num_attention_heads': 32,
+                                     'num_key_value_heads': 8, 'num_local_experts': 8,
+                                     'tie_word_embeddings': False}, 46702792704),
+    'Qwen/Qwen2.5-7B': ({'model_type': 'qwen2', 'vocab_size': 152064, 'hidden_size': 3584,
+                         'intermediate_size': 18944, 'num_hidden_layers': 28, 'num_attention_heads': 28,
+                         'num_key_value_heads': 4, 'tie_word_embeddings': False}, 7615616512),
+    'Qwen/Qwen3-8B': ({'model_type': 'qwen3', 'vocab_size': 151936, 'hidden_size': 4096, 'intermediate_size': 12288,
+                       'num_hidden_layers': 36, 'num_attention_heads': 32, 'num_key_value_heads': 8, 'head_dim': 128,
+                       'tie_word_embeddings': False}, 8190735360),
+    'google/gemma-2b': ({'model_type': 'gemma', 'vocab_size': 256000, 'hidden_size': 2048, 'intermediate_size': 16384,
+                         'num_hidden_layers': 18, 'num_attention_heads': 8, 'num_key_value_heads': 1,
+                         'head_dim': 256}, 2506172416),
+    'microsoft/phi-2': ({'model_type': 'phi', 'vocab_size': 51200, 'hidden_size': 2560, 'intermediate_size': 10240,
+                         'num_hidden_layers': 32, 'num_attention_heads': 32, 'tie_word_embeddings': False}, 2779683840),
+    'microsoft/Phi-3-mini-4k-instruct': ({'model_type': 'phi3', 'vocab_size': 32064, 'hidden_size': 3072,
+                                          'intermediate_size': 8192, 'num_hidden_layers': 32, 'num_attention_heads': 32,
+                                          'num_key_value_heads': 32, 'tie_word_embeddings': False}, 3821079552),
+    'EleutherAI/pythia-160m': ({'model_type': 'gpt_neox', 'vocab_size': 50304, 'hidden_size': 768,
+                                'intermediate_size': 3072, 'num_hidden_layers': 12, 'num_attention_heads': 12,
+                                'tie_word_embeddings': False}, 162322944),
+    'tiiuae/falcon-7b': ({'model_type': 'falcon', 'vocab_size': 65024, 'hidden_size': 4544, 'num_attention_heads': 71,
+                          'num_hidden_layers': 32, 'multi_query': True, 'parallel_attn': True, 'bias': False,
+                          'new_decoder_architecture': False}, 6921720704),
+    'google-bert/bert-base-uncased': ({'model_type': 'bert', 'vocab_size': 30522, 'hidden_size': 768,
+                                       'intermediate_size': 3072, 'num_hidden_layers': 12, 'num_attention_heads': 12,
+                                       'max_position_embeddings': 512, 'type_vocab_size': 2}, 109482240),
+    'google-t5/t5-small': ({'model_type': 't5', 'vocab_size': 32128, 'd_model': 512, 'd_ff': 2048, 'd_kv': 64,
+                            'num_heads': 8, 'num_layers': 6, 'feed_forward_proj': 'relu'}, 60506624),
+}
+
+@pytest.mark.parametrize("model_id", list(KNOWN_MODELS))
+def test_count_matches_published_checkpoints(model_id):
+    config_json, expected = KNOWN_MODELS[model_id]
+    assert count_parameters(config_json)['total'] == expected
+
+def test_breakdown_of_llama():
+    counts = count_parameters(KNOWN_MODELS['meta-llama/Meta-Llama-3-8B'][0])
+    assert counts['embedding'] == counts['lm_head'] == 128256 * 4096
+    assert counts['layers'] == [218112000] * 32
+    assert counts['final_norm'] == 4096
+
+def test_tied_embeddings_are_counted_once():
+    config_json = dict(KNOWN_MODELS['meta-llama/Meta-Llama-3-8B'][0], tie_word_embeddings=True)
+    assert count_parameters(config_json)['total'] == 8030261248 - 128256 * 4096
+    # gemma ties them unless config.json says otherwise
+    assert count_parameters(KNOWN_MODELS['google/gemma-2b'][0])['lm_head'] == 0
+
+def test_unknown_or_incomplete_configs():
+    assert count_parameters({'model_type': 'mamba', 'hidden_size': 768}) is None
+    assert count_parameters({'model_type': 'llama', 'hidden_size': 4096}) is None
+    assert count_parameters(None) is None
+
+def test_bytes_by_precision():
+    assert bytes_by_precision(1000) == {'float32': 4000, 'float16': 2000, 'bfloat16': 2000, 'int8': 1000, 'int4': 500}
@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import json
+import threading
+
+from src.hfest.utils.profiling import Profiler
+from src.hfest.utils.scheduler import RequestScheduler
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    profiler.enable()
+    return profiler
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.phase("model-info"):
+        profiler.record_request(100)
+        profiler.record_cache(True)
+    assert profiler.events == []
+    assert profiler.summary() == []
+
+
+def test_counters_go_to_innermost_phase(profiler):
+    with profiler.phase("estimate-size"):
+        with profiler.phase("hub:model-info"):
+            profiler.record_request(1000)
+            profiler.record_request(24)
+        with profiler.phase("hub:config"):
+            profiler.record_cache(True)
+            profiler.record_cache(False)
+        with profiler.phase("hub:config"):
+            profiler.record_cache(False)
+
+    summary = {phase['name']: phase for phase in profiler.summary()}
+    assert [phase['name'] for phase in profiler.summary()] == ["estimate-size", "hub:model-info", "hub:config"]
+    assert summary["hub:model-info"]['requests'] == 2
+    assert summary["hub:model-info"]['bytes'] == 1024
+    assert summary["hub:config"]['calls'] == 2
+    assert (summary["hub:config"]['cache_hits'], summary["hub:config"]['cache_misses']) == (1, 2)
+    assert summary["estimate-size"]['requests'] == 0
+    assert summary["estimate-size"]['wall'] >= summary["hub:model-info"]['wall']
+
+
+def test_phases_are_per_thread(profiler):
+    def worker():
+        with profiler.phase("worker"):
+            profiler.record_request(1)
+
+    with profiler.phase("main"):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+    summary = {phase['name']: phase for phase in profiler.summary()}
+    assert summary["worker"]['requests'] == 1
+    assert summary["main"]['requests'] == 0
+
+
+def test_chrome_trace(profiler, tmp_path):
+    with profiler.phase("detect-gpu"):
+        pass
+    path = tmp_path / "trace.json"
+    profiler.write_chrome_trace(str(path))
+
+    trace = json.loads(path.read_text())
+    event = trace['traceEvents'][0]
+    assert event['name'] == "detect-gpu"
+    assert event['ph'] == "X"
+    assert event['dur'] >= 0
+    assert event['args'] == {'requests': 0, 'bytes': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+
+def test_format_breakdown(profiler):
+    with profiler.phase("hub:model-info"):
+        profiler.record_request(2048)
+    lines = profiler.format_breakdown()
+    assert lines[0].startswith("Phase")
+    assert lines[1].startswith("hub:model-info")
+    assert "2,048" in lines[1]
+
+
+@patch("src.hfest.utils.scheduler.requests.get")
+def test_scheduler_records_hub_phases(mock_get, profiler):
+    response = MagicMock()
+    response.status_code = 200
+    response.headers = {}
+    response.content = b"x" * 512
+    mock_get.return_value = response
+
+    with patch("src.hfest.utils.scheduler.profiler", profiler):
+        RequestScheduler(requests_per_second=1000, burst=1000).request("model-info", "GET", "https://huggingface.co/api/models/org/model")
+
+    summary = profiler.summary()
+    assert summary[0]['name'] == "hub:model-info"
+    assert (summary[0]['requests'], summary[0]['bytes']) == (1, 512)
@@ -0,0 +1,168 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import threading
+import time
+
+import requests
+from huggingface_hub import get_session
+
+from src.hfest.utils.scheduler import TokenBucket, RequestScheduler, DeadlineExceeded, retry_after_seconds
+
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+def http_error(status_code, headers=None):
+    return requests.HTTPError(f"{status_code} error", response=make_response(status_code, headers))
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(requests_per_second=1000, burst=1000, max_retries=3, backoff_base=0)
+
+
+class TestTokenBucket:
+
+    def test_burst_then_rate_limited(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        start = time.monotonic()
+        assert bucket.acquire() > 0
+        assert time.monotonic() - start >= 0.015
+
+    def test_drain_holds_callers(self):
+        bucket = TokenBucket(rate=100, capacity=10)
+        bucket.drain(0.05)
+        start = time.monotonic()
+        bucket.acquire()
+        assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({}, None),
+    ({'Retry-After': '3'}, 3.0),
+    ({'Retry-After': '-1'}, 0.0),
+    ({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, 0.0),
+    ({'Retry-After': 'soon'}, None),
+])
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(headers) == expected
+
+
+class TestRequestScheduler:
+
+    @patch("src.hfest.utils.scheduler.requests.get")
+    def test_request_retries_429_then_succeeds(self, mock_get, scheduler):
+        mock_get.side_effect = [make_response(429), make_response(503), make_response(200)]
+        response = scheduler.request("model-info", "GET", "https://huggingface.co/api/models/org/model")
+        assert response.status_code == 200
+        assert mock_get.call_count == 3
+        stats = scheduler.stats["model-info"]
+        assert (stats.requests, stats.retries, stats.throttled) == (3, 2, 1)
+
+    @patch("src.hfest.utils.scheduler.requests.get")
+    def test_request_gives_up_after_max_retries(self, mock_get, scheduler):
+        mock_get.return_value = make_response(429)
+        response = scheduler.request("model-info", "GET", "https://huggingface.co/api/models/org/model")
+        assert response.status_code == 429
+        assert mock_get.call_count == 4
+
+    @patch("src.hfest.utils.scheduler.requests.get")
+    def test_request_does_not_retry_client_errors(self, mock_get, scheduler):
+        mock_get.return_value = make_response(404)
+        assert scheduler.request("model-info", "GET", "https://huggingface.co/api/models/org/model").status_code == 404
+        assert mock_get.call_count == 1
+
+    @patch("src.hfest.utils.scheduler.requests.get")
+    def test_request_honors_retry_after(self, mock_get, scheduler):
+        mock_get.side_effect = [make_response(429, {'Retry-After': '0.1'}), make_response(200)]
+        start = time.monotonic()
+        scheduler.request("model-info", "GET", "https://huggingface.co/api/models/org/model")
+        assert time.monotonic() - start >= 0.1
+
+    def test_backoff_is_jittered_and_capped(self):
+        scheduler = RequestScheduler(backoff_base=1, backoff_max=5)
+        delays = [scheduler.backoff(10) for _ in range(50)]
+        assert all(0 <= d <= 5 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_call_retries_hub_http_errors(self, scheduler):
+        fn = MagicMock(side_effect=[http_error(429), "result"])
+        assert scheduler.call("paths-info", fn, repo_id="org/model") == "result"
+        assert fn.call_count == 2
+
+    def test_call_raises_after_max_retries(self, scheduler):
+        fn = MagicMock(side_effect=http_error(500))
+        with pytest.raises(requests.HTTPError):
+            scheduler.call("paths-info", fn)
+        assert fn.call_count == 4
+
+    def test_call_raises_client_errors_immediately(self, scheduler):
+        fn = MagicMock(side_effect=http_error(401))
+        with pytest.raises(requests.HTTPError):
+            scheduler.call("paths-info", fn)
+        assert fn.call_count == 1
+
+    def test_endpoint_concurrency_limit(self):
+        scheduler = RequestScheduler(requests_per_second=1000, burst=1000, endpoint_concurrency={"config": 2})
+        barrier = threading.Event()
+
+        def slow():
+            barrier.wait(0.05)
+            return True
+
+        threads = [threading.Thread(target=scheduler.call, args=("config", slow)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert scheduler.stats["config"].max_in_flight == 2
+        assert "config: 6 request(s), 0 retries, 0 rate limited, max 2/2 in flight" in scheduler.report()
+
+    @patch("src.hfest.utils.scheduler.requests.get")
+    def test_budget_bounds_request_timeouts(self, mock_get, scheduler):
+        mock_get.return_value = make_response(200)
+        with scheduler.budget(5):
+            scheduler.request("model-info", "GET", "https://huggingface.co/api/models/org/model", timeout=30)
+        assert 4 < mock_get.call_args.kwargs['timeout'] <= 5
+        assert scheduler.remaining() is None
+
+    @patch("requests.adapters.HTTPAdapter.send")
+    def test_budget_bounds_hub_library_calls(self, mock_send, scheduler):
+        def send(request, **kwargs):
+            response = requests.Response()
+            response.status_code, response.url, response.raw = 200, request.url, MagicMock()
+            response.raw.read.return_value = b"{}"
+            return response
+        mock_send.side_effect = send
+
+        def download():
+            # huggingface_hub sends through the session of the thread
+            response = get_session().get("https://huggingface.co/org/model/resolve/main/config.json", timeout=10)
+            time.sleep(0.2)
+            return response.raw.read(1024)
+
+        with scheduler.budget(0.1):
+            # the request gets the budget as its timeout, the body read stops once it's spent
+            with pytest.raises(DeadlineExceeded):
+                scheduler.call("config", download)
+        assert 0 < mock_send.call_args.kwargs['timeout'] <= 0.1
+        # without a budget the session is left alone
+        assert scheduler.call("config", download) == b"{}"
+        assert mock_send.call_args.kwargs['timeout'] == 10
+
+    def test_budget_stops_retries_and_new_requests(self):
+        scheduler = RequestScheduler(requests_per_second=1000, burst=1000, max_retries=3)
+        fn = MagicMock(side_effect=http_error(503, {'Retry-After': '10'}))
+        with scheduler.budget(1):
+            # waiting out the Retry-After would overrun the budget
+            with pytest.raises(DeadlineExceeded):
+                scheduler.call("paths-info", fn)
+            assert fn.call_count == 1
+        with scheduler.budget(0):
+            with pytest.raises(DeadlineExceeded):
+                scheduler.call("paths-info", fn)
+        assert fn.call_count == 1